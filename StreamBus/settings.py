@@ -307,6 +307,76 @@ GPS_BASE_URL = config('GPS_BASE_URL')
 GPS_TIMEOUT = config('GPS_TIMEOUT', default=30, cast=int)
 GPS_VERIFY_SSL = config('GPS_VERIFY_SSL', default=True, cast=bool)
 
+# Pool de conexiones keep-alive hacia el servidor GPS (ver sit/http_pool.py)
+GPS_HTTP_POOL_CONNECTIONS = config('GPS_HTTP_POOL_CONNECTIONS', default=4, cast=int)
+GPS_HTTP_POOL_SIZE = config('GPS_HTTP_POOL_SIZE', default=32, cast=int)
+
+# Cache de respuestas que cambian poco (vehículos, dispositivos, áreas) - ver sit/citos_cache.py
+GPS_RESPONSE_CACHE = config('GPS_RESPONSE_CACHE', default=True, cast=bool)
+
+# Agrupación de consultas de ubicación concurrentes - ver sit/citos_batching.py
+GPS_STATUS_BATCH_WINDOW_MS = config('GPS_STATUS_BATCH_WINDOW_MS', default=10, cast=int)
+GPS_STATUS_BATCH_SIZE = config('GPS_STATUS_BATCH_SIZE', default=50, cast=int)
+
+# Protección del servidor GPS - ver sit/citos_resilience.py
+GPS_RATE_LIMIT = config('GPS_RATE_LIMIT', default=20, cast=float)  # peticiones/segundo (0 = sin límite)
+GPS_RATE_BURST = config('GPS_RATE_BURST', default=40, cast=float)
+GPS_RETRY_ATTEMPTS = config('GPS_RETRY_ATTEMPTS', default=3, cast=int)
+GPS_CIRCUIT_FAILURES = config('GPS_CIRCUIT_FAILURES', default=5, cast=int)  # 0 = sin circuit breaker
+GPS_CIRCUIT_RESET = config('GPS_CIRCUIT_RESET', default=30, cast=int)
+
+# Cache en disco de tracks diarios (.npz por dispositivo y día) - ver sit/citos_tracks.py
+GPS_TRACK_STORE_DIR = config('GPS_TRACK_STORE_DIR', default=os.path.join(BASE_DIR, 'track_store'))
+
+# Grabación/reproducción del tráfico GPS para benchmarks - ver sit/citos_cassette.py
+GPS_CASSETTE_MODE = config('GPS_CASSETTE_MODE', default='')  # '', 'record' o 'replay'
+GPS_CASSETTE_PATH = config('GPS_CASSETTE_PATH', default='gps_cassette.jsonl.gz')
+GPS_CASSETTE_SPEED = config('GPS_CASSETTE_SPEED', default=1.0, cast=float)  # 0 = sin latencia
+
+# Stream de alarmas en tiempo real - ver sit/citos_alarms.py
+GPS_ALARM_STREAM_TYPES = config('GPS_ALARM_STREAM_TYPES', default='1,72,78', cast=Csv(int))
+GPS_ALARM_STREAM_INTERVAL = config('GPS_ALARM_STREAM_INTERVAL', default=5, cast=float)  # segundos entre consultas
+GPS_ALARM_STREAM_RING = config('GPS_ALARM_STREAM_RING', default=1000, cast=int)  # alarmas recientes en memoria
+GPS_ALARM_CELERY = config('GPS_ALARM_CELERY', default=False, cast=bool)  # encolar cada alarma en Celery (manage.py gps_alarm_stream)
+
+# Sesión GPS compartida entre procesos - ver sit/citos_session_broker.py
+GPS_SESSION_STORE = config('GPS_SESSION_STORE', default='cache')  # 'cache' (Redis/Memcached) o 'file'; con LocMemCache se usa 'file'
+GPS_SESSION_FILE = config('GPS_SESSION_FILE', default=os.path.join(BASE_DIR, 'gps_session.json'))
+GPS_SESSION_TTL = config('GPS_SESSION_TTL', default=1800, cast=int)
+
+# Pool de sesiones GPS para repartir carga: tracks, comandos a la flota y descarga de fotos
+# (1 = una sola sesión) - ver sit/citos_session_pool.py
+GPS_SESSION_POOL_SIZE = config('GPS_SESSION_POOL_SIZE', default=1, cast=int)
+GPS_SESSION_POOL_INFLIGHT = config('GPS_SESSION_POOL_INFLIGHT', default=1, cast=int)  # peticiones simultáneas por sesión
+
+# Comandos enviados a toda una flota - ver sit/citos_broadcast.py
+GPS_BROADCAST_WORKERS = config('GPS_BROADCAST_WORKERS', default=16, cast=int)  # dispositivos en paralelo
+
+# Modo sombra: compara citos y legacy en una muestra de llamadas - ver sit/citos_shadow.py
+GPS_SHADOW_SAMPLE_RATE = config('GPS_SHADOW_SAMPLE_RATE', default=0.0, cast=float)  # 0 = apagado, 0.05 = 5%
+GPS_SHADOW_FUNCTIONS = config('GPS_SHADOW_FUNCTIONS', default='', cast=Csv())  # vacío = todas
+GPS_SHADOW_WORKERS = config('GPS_SHADOW_WORKERS', default=2, cast=int)
+
+# Motor de descarga de fotos: fotos listadas en espera de un worker - ver sit/photo_pipeline.py
+# (los workers salen de DOWNLOAD_OPTIMIZATION['MAX_DOWNLOAD_WORKERS'])
+PHOTO_DOWNLOAD_QUEUE = config('PHOTO_DOWNLOAD_QUEUE', default=100, cast=int)
+
+# Manifiesto SQLite de fotos descargadas - ver sit/photo_manifest.py
+# (vacío = MEDIA_ROOT/security_photos/.manifest.sqlite3)
+PHOTO_MANIFEST_PATH = config('PHOTO_MANIFEST_PATH', default='')
+
+# Descargas programadas incrementales: margen antes de la marca de agua de cada
+# dispositivo para las fotos que el equipo sube tarde
+PHOTO_WATERMARK_OVERLAP_MINUTES = config('PHOTO_WATERMARK_OVERLAP_MINUTES', default=30, cast=int)
+
+# Fotos guardadas una vez por contenido (security_photos/.blobs) con el árbol por
+# vehículo como enlaces duros - ver sit/photo_blobs.py (sin efecto si el sistema
+# de archivos no admite enlaces duros)
+PHOTO_BLOB_STORE = config('PHOTO_BLOB_STORE', default=True, cast=bool)
+
+# IPs que pueden leer /sit/metrics/citos/ sin sesión de staff (scraper de Prometheus)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1', cast=Csv())
+
 # Credenciales GPS
 GPS_ACCOUNT = config('GPS_ACCOUNT')
 GPS_PASSWORD = config('GPS_PASSWORD')
@@ -314,6 +384,7 @@ GPS_PASSWORD = config('GPS_PASSWORD')
 # Funciones específicas a migrar (control granular)
 CITOS_ENABLED_FUNCTIONS = {
     'obtener_ultima_ubicacion': USE_CITOS_LIBRARY,
+    'obtener_ubicaciones_flota': USE_CITOS_LIBRARY,
     'obtener_vehiculos': USE_CITOS_LIBRARY,
     'query_security_photos': USE_CITOS_LIBRARY,
     'gps_login': USE_CITOS_LIBRARY,
@@ -0,0 +1,92 @@
+"""
+Objetos falsos compartidos por los tests de sit.
+
+Simulan el servidor GPS sin acceso a la red: respuestas y sesiones HTTP
+falsas para GPSCameraAPI, un servidor HTTP local para los clientes que
+abren sus propias conexiones y páginas de queryPhoto para el motor de fotos.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sit.citos_library import GPSCameraAPI
+
+
+class FakeResponse:
+    """Respuesta HTTP mínima compatible con requests.Response"""
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.content = json.dumps(payload).encode('utf-8')
+        self.headers = {'Content-Type': 'application/json'}
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class FakeSession:
+    """Sesión HTTP falsa que devuelve respuestas en orden y registra las URLs"""
+
+    def __init__(self, *payloads):
+        self.payloads = list(payloads)
+        self.urls = []
+
+    def _next(self, url, **kwargs):
+        self.urls.append(url)
+        return FakeResponse(self.payloads.pop(0))
+
+    get = _next
+    post = _next
+
+
+class StubGPSServer:
+    """Servidor HTTP local que responde JSON fijo (o calculado por ruta) para cualquier endpoint"""
+
+    def __init__(self, payload):
+        paths = self.paths = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                paths.append(self.path)
+                body = json.dumps(payload(self.path) if callable(payload) else payload).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_api(*payloads, **kwargs):
+    """
+    GPSCameraAPI con una FakeSession que responde ``payloads`` en orden y
+    una sesión ya iniciada
+
+    Returns:
+        tuple: (api, session)
+    """
+    session = FakeSession(*payloads)
+    api = GPSCameraAPI(base_url='http://gps.test', session=session, **kwargs)
+    api.jsession = 'abc'
+    return api, session
+
+
+def photo_page(page, total_pages, photos):
+    """Respuesta de queryPhoto con ``photos`` en la página ``page``"""
+    return {'result': 0, 'infos': photos,
+            'pagination': {'totalPages': total_pages, 'totalRecords': total_pages * len(photos)}}
@@ -0,0 +1,80 @@
+"""
+Tests del stream de alarmas en tiempo real (sit/citos_alarms.py).
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from django.test import SimpleTestCase
+
+from sit.citos_alarms import AlarmStream
+from sit.citos_library import GPSCameraAPI
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class AlarmStreamTestCase(SimpleTestCase):
+    """Tests del stream incremental de alarmas"""
+
+    def setUp(self):
+        self.emulator = CMSV6Emulator(SyntheticFleet(vehicles=2, alarm_interval=60), port=0).start()
+        self.api = GPSCameraAPI(base_url=self.emulator.base_url)
+        self.api.login('admin', 'admin')
+        self.now = datetime(2024, 5, 20, 12, 0, 0)
+
+    def tearDown(self):
+        self.api.jsession = None
+        self.emulator.stop()
+
+    def _stream(self, **kwargs):
+        return AlarmStream(self.api, alarm_types=[1], clock=lambda: self.now, **kwargs)
+
+    def test_overlapping_polls_are_deduplicated_by_guid(self):
+        stream = self._stream(lookback=300, overlap=60)
+        received = []
+        stream.subscribe(received.extend)
+
+        first = stream.poll_once()
+        self.assertGreater(len(first), 0)
+        self.assertEqual(stream.poll_once(), [])
+
+        self.now += timedelta(minutes=2)
+        second = stream.poll_once()
+        self.assertGreater(len(second), 0)
+
+        guids = [alarm['guid'] for _, alarm in received]
+        self.assertEqual(len(guids), len(set(guids)))
+        self.assertEqual([seq for seq, _ in received], list(range(1, len(received) + 1)))
+        self.assertEqual(stream.since(first[-1][0]), second)
+
+    def test_other_processes_resume_by_guid(self):
+        first, second = self._stream(lookback=600), self._stream(lookback=300)
+        first.poll_once()
+        second.poll_once()
+        self.assertNotEqual(first.last_seq, second.last_seq)
+
+        # Last-Event-ID de un proceso: el otro lo ubica por guid en su anillo
+        seen = first.recent()[-3][1]['guid']
+        self.assertEqual([alarm['guid'] for _, alarm in second.since(second.seq_of(seen))],
+                         [alarm['guid'] for _, alarm in first.recent()[-2:]])
+        self.assertIsNone(second.seq_of('desconocido'))
+
+    def test_ring_is_bounded_and_wait_returns_new_events(self):
+        stream = self._stream(lookback=3600, ring_size=5)
+        stream.poll_once()
+
+        self.assertEqual(len(stream.recent()), 5)
+        self.assertEqual(stream.recent()[-1][0], stream.last_seq)
+        self.assertEqual(stream.wait(stream.last_seq, timeout=0.01), [])
+        self.assertEqual(len(stream.wait(stream.last_seq - 2, timeout=0.01)), 2)
+
+    def test_stopped_stream_does_not_block_waiters(self):
+        stream = self._stream(interval=60)
+        stream.start()
+        self.assertFalse(stream.stopped)
+
+        stream.stop(timeout=5)
+
+        started = time.monotonic()
+        self.assertEqual(stream.wait(stream.last_seq, timeout=5), [])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertTrue(stream.stopped)
@@ -0,0 +1,122 @@
+"""
+Tests del cliente asíncrono (sit/citos_async.py).
+"""
+
+import asyncio
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover - dependencia opcional
+    aiohttp = None
+
+from sit.citos_async import AsyncGPSCameraAPI
+from sit.citos_library import APIError
+from sit.citos_cache import ResponseCache
+from sit.citos_resilience import ResiliencePolicy, RetryPolicy, retries_disabled
+
+from .fakes import StubGPSServer
+
+
+@skipIf(aiohttp is None, "aiohttp no instalado")
+class AsyncGPSCameraAPITestCase(SimpleTestCase):
+    """Tests del cliente asíncrono"""
+
+    def setUp(self):
+        self.server = StubGPSServer({'result': 0, 'status': [{'id': '100'}]})
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_concurrent_status_requests(self):
+        async def run():
+            async with AsyncGPSCameraAPI(self.server.base_url, max_concurrency=3) as api:
+                api.jsession = 'abc'
+                results = await asyncio.gather(*[
+                    api.get_device_status(device_ids=str(dev)) for dev in range(10)
+                ])
+                api.jsession = None
+                return results
+
+        results = asyncio.run(run())
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['status'][0]['id'], '100')
+        self.assertEqual(len(self.server.paths), 10)
+        self.assertTrue(all('jsession=abc' in path for path in self.server.paths))
+
+    def test_relogin_on_expired_session(self):
+        self.server.close()
+
+        def respond(path):
+            if 'login' in path:
+                return {'result': 0, 'jsession': 'new', 'account_name': 'demo'}
+            if 'jsession=old' in path:
+                return {'result': 5}
+            return {'result': 0, 'status': [{'id': '100'}]}
+
+        self.server = StubGPSServer(respond)
+
+        async def run():
+            api = AsyncGPSCameraAPI(self.server.base_url)
+            api.set_credentials('demo', 'secret')
+            api.adopt_session('old')
+            try:
+                return await api.get_fleet_snapshot(device_ids='100'), api.jsession
+            finally:
+                await api.close()
+
+        snapshot, jsession = asyncio.run(run())
+
+        self.assertEqual(jsession, 'new')
+        self.assertEqual(snapshot[0].device_id, '100')
+        self.assertEqual(sum('login' in path for path in self.server.paths), 1)
+
+    def test_policy_retries_and_honors_retries_disabled(self):
+        self.server.close()
+        self.server = StubGPSServer({'result': 6})
+
+        async def run():
+            policy = ResiliencePolicy(retry=RetryPolicy(max_attempts=3, base_delay=0))
+            async with AsyncGPSCameraAPI(self.server.base_url, resilience=policy) as api:
+                api.jsession = 'abc'
+                for _ in range(2):
+                    with self.assertRaises(APIError):
+                        await api.get_device_status(device_ids='100')
+                    with retries_disabled():
+                        with self.assertRaises(APIError):
+                            await api.get_device_status(device_ids='100')
+                api.jsession = None
+
+        asyncio.run(run())
+
+        self.assertEqual(len(self.server.paths), 2 * (3 + 1))
+
+    def test_cache_is_shared_through_public_methods(self):
+        self.server.close()
+        self.server = StubGPSServer({'result': 0, 'vehicles': [{'nm': '2045'}]})
+        cache = ResponseCache()
+
+        async def run():
+            async with AsyncGPSCameraAPI(self.server.base_url, cache=cache) as api:
+                api.jsession = 'abc'
+                first = await api.get_user_vehicles()
+                second = await api.get_user_vehicles()
+                api.jsession = None
+                return first, second
+
+        first, second = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.server.paths), 1)
+        self.assertEqual(cache.lookup('StandardApiAction_queryUserVehicle.action',
+                                      {'language': 'zh'}), first)
+
+    def test_sync_only_helpers_raise_type_error(self):
+        api = AsyncGPSCameraAPI(self.server.base_url)
+        with self.assertRaises(TypeError):
+            api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 23:59:59')
+        with self.assertRaises(TypeError):
+            api.download_file(url='http://gps.test/x.jpg', destination='/tmp/x.jpg')
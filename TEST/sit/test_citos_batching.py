@@ -0,0 +1,123 @@
+"""
+Tests de la agrupación de consultas de estado (sit/citos_batching.py).
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_batching import StatusCoalescer
+
+
+class StatusCoalescerTestCase(SimpleTestCase):
+    """Tests del agrupador de consultas de estado"""
+
+    def make_api(self, delay=0.0):
+        api = mock.Mock(timeout=5)
+        calls = []
+        release = threading.Event()
+
+        def get_device_status(vehicle_ids=None, **kwargs):
+            calls.append(list(vehicle_ids))
+            # La primera petición queda en vuelo hasta que el test la libera
+            if len(calls) == 1 and delay:
+                release.wait(delay)
+            return {'result': 0, 'status': [{'vid': vid, 'lat': int(vid)} for vid in vehicle_ids]}
+
+        api.get_device_status.side_effect = get_device_status
+        api.release = release
+        return api, calls
+
+    def start(self, coalescer, vehicle_ids, results):
+        threads = [threading.Thread(target=lambda vid=vid: results.__setitem__(
+            vid, coalescer.get_status(vehicle_id=vid))) for vid in vehicle_ids]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def wait_for(self, condition):
+        for _ in range(500):
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail("La condición no se cumplió a tiempo")
+
+    def test_lone_lookup_is_not_delayed(self):
+        api, calls = self.make_api()
+        coalescer = StatusCoalescer(api, window=2.0)
+
+        started = time.monotonic()
+        result = coalescer.get_status(vehicle_id='5')
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertEqual(result['lat'], 5)
+        self.assertEqual(calls, [['5']])
+
+    def test_many_ids_are_split_in_batches(self):
+        api, calls = self.make_api()
+        coalescer = StatusCoalescer(api, max_batch=2)
+
+        results = coalescer.get_statuses(vehicle_ids=['1', '2', '3', '2'])
+
+        self.assertEqual(calls, [['1', '2'], ['3']])
+        self.assertEqual({vid: info['lat'] for vid, info in results.items()}, {'1': 1, '2': 2, '3': 3})
+
+    def test_lookups_batch_while_request_in_flight(self):
+        api, calls = self.make_api(delay=10)
+        coalescer = StatusCoalescer(api, window=10, max_batch=4)
+        results = {}
+
+        threads = self.start(coalescer, ['99'], results)
+        self.wait_for(lambda: len(calls) == 1)
+        vehicle_ids = [str(n) for n in range(1, 9)]
+        threads += self.start(coalescer, vehicle_ids, results)
+        # Los lotes completos salen sin esperar la ventana
+        self.wait_for(lambda: len(calls) == 3)
+        api.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual({vid: r['lat'] for vid, r in results.items()},
+                         {vid: int(vid) for vid in vehicle_ids + ['99']})
+        self.assertEqual(calls[0], ['99'])
+        self.assertTrue(all(len(batch) == 4 for batch in calls[1:]))
+
+    def test_pending_batch_flushes_when_in_flight_returns(self):
+        api, calls = self.make_api(delay=10)
+        coalescer = StatusCoalescer(api, window=10, max_batch=50)
+        results = {}
+
+        threads = self.start(coalescer, ['1'], results)
+        self.wait_for(lambda: len(calls) == 1)
+        threads += self.start(coalescer, ['2', '3'], results)
+        self.wait_for(lambda: len(coalescer._open) == 1
+                      and len(next(iter(coalescer._open.values())).futures) == 2)
+        started = time.monotonic()
+        api.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(sorted(calls[1]), ['2', '3'])
+
+    def test_duplicate_lookups_are_deduplicated(self):
+        api, calls = self.make_api(delay=10)
+        coalescer = StatusCoalescer(api, window=0.2, max_batch=50)
+        results = {}
+
+        threads = self.start(coalescer, ['7'], results)
+        self.wait_for(lambda: len(calls) == 1)
+        shared = []
+        for _ in range(4):
+            thread = threading.Thread(target=lambda: shared.append(coalescer.get_status(vehicle_id='7')))
+            thread.start()
+            threads.append(thread)
+        time.sleep(0.2)
+        api.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [['7']])
+        self.assertEqual(len(shared), 4)
@@ -0,0 +1,103 @@
+"""
+Tests de los comandos a toda la flota (sit/citos_broadcast.py).
+"""
+
+from unittest import mock
+
+import requests
+
+from django.test import SimpleTestCase
+
+from sit.citos_broadcast import FleetBroadcaster, devices_for_companies
+from sit.citos_library import APIError, GPSCameraAPI
+from sit.citos_resilience import ResiliencePolicy, RetryPolicy
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+from .fakes import fake_api
+
+
+class FleetBroadcasterTestCase(SimpleTestCase):
+    """Tests del envío de comandos a una flota"""
+
+    def setUp(self):
+        self.emulator = CMSV6Emulator(SyntheticFleet(vehicles=20, companies=2), port=0).start()
+        self.api = GPSCameraAPI(base_url=self.emulator.base_url)
+        self.api.login('admin', 'admin')
+
+    def tearDown(self):
+        self.api.jsession = None
+        self.emulator.stop()
+
+    def test_offline_devices_are_skipped_and_reported(self):
+        devices = devices_for_companies(self.api, [1])
+        self.assertEqual(len(devices), 10)
+
+        report = FleetBroadcaster(self.api, workers=4).run('send_tts_message', devices, text='Hola')
+
+        # Vehículos 0 y 17 desconectados; solo el 0 es de la empresa 1
+        self.assertEqual(report.counts, {'ok': 9, 'offline': 1, 'failed': 0, 'unknown': 0})
+        self.assertEqual(report.offline, ['900000'])
+        self.assertEqual([r.device_id for r in report.results], devices)
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_vehicleTTS.action'], 9)
+
+    def test_code_32_marks_offline_and_transient_errors_are_retried(self):
+        calls = {}
+
+        def flaky(device_id, **params):
+            calls[device_id] = calls.get(device_id, 0) + 1
+            if device_id == 'a' and calls[device_id] == 1:
+                raise APIError(6, "Excepción del sistema")
+            if device_id == 'b':
+                raise APIError(32, "Dispositivo no en línea")
+            if device_id == 'c':
+                raise APIError(8, "Sin autoridad")
+            return {'result': 0}
+
+        api = mock.Mock(send_tts_message=flaky)
+        broadcaster = FleetBroadcaster(api, check_online=False,
+                                       retry=RetryPolicy(max_attempts=2, base_delay=0))
+        report = broadcaster.run('send_tts_message', ['a', 'b', 'c'], text='x')
+
+        self.assertEqual([r.status for r in report.results], ['ok', 'offline', 'failed'])
+        self.assertEqual(report.results[0].attempts, 2)
+        self.assertEqual(calls['c'], 1)
+        with self.assertRaises(ValueError):
+            broadcaster.run('delete_device', ['a'])
+
+    def test_client_policy_does_not_retry_broadcast_commands(self):
+        api, session = fake_api(*[{'result': 6}] * 6,
+                                resilience=ResiliencePolicy(retry=RetryPolicy(max_attempts=3, base_delay=0)))
+        broadcaster = FleetBroadcaster(api, check_online=False,
+                                       retry=RetryPolicy(max_attempts=2, base_delay=0))
+
+        report = broadcaster.run('send_tts_message', ['a'], text='x')
+
+        self.assertEqual(report.failed, ['a'])
+        self.assertEqual(report.results[0].attempts, 2)
+        self.assertEqual(len(session.urls), 2)
+
+    def test_only_unsent_requests_are_retried(self):
+        calls = {}
+
+        def send(device_id, **params):
+            calls[device_id] = calls.get(device_id, 0) + 1
+            if device_id == 'connect':
+                raise requests.ConnectTimeout("timeout al conectar")
+            if device_id == 'refused':
+                raise requests.ConnectionError("conexión rechazada")
+            if device_id == 'read':
+                raise requests.ReadTimeout("timeout de lectura")
+            try:
+                raise requests.ReadTimeout("timeout de lectura")
+            except requests.RequestException as e:
+                raise APIError(24, f"Error de conexión: {e}")
+
+        api = mock.Mock(send_tts_message=send)
+        broadcaster = FleetBroadcaster(api, check_online=False,
+                                       retry=RetryPolicy(max_attempts=3, base_delay=0))
+        report = broadcaster.run('send_tts_message', ['connect', 'refused', 'read', 'wrapped'], text='x')
+
+        self.assertEqual(calls, {'connect': 3, 'refused': 3, 'read': 1, 'wrapped': 1})
+        self.assertEqual(report.failed, ['connect', 'refused'])
+        self.assertEqual(report.unknown, ['read', 'wrapped'])
+        self.assertEqual(report.counts['unknown'], 2)
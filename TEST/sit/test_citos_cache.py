@@ -0,0 +1,73 @@
+"""
+Tests del cache de respuestas por endpoint (sit/citos_cache.py).
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_cache import ResponseCache
+
+from .fakes import fake_api
+
+
+class ResponseCacheTestCase(SimpleTestCase):
+    """Tests del cache de respuestas por endpoint"""
+
+    def make_api(self, *payloads, **cache_kwargs):
+        api, session = fake_api(*payloads, cache=ResponseCache(**cache_kwargs))
+        return api, session
+
+    def test_cached_endpoint_hits_server_once(self):
+        api, session = self.make_api({'result': 0, 'vehicles': [{'id': 1}]})
+
+        first = api.get_user_vehicles()
+        second = api.get_user_vehicles()
+
+        self.assertEqual(first, second)
+        self.assertEqual(len(session.urls), 1)
+
+    def test_uncached_endpoint_always_hits_server(self):
+        api, session = self.make_api({'result': 0}, {'result': 0})
+
+        api.get_device_status(device_ids='1')
+        api.get_device_status(device_ids='1')
+
+        self.assertEqual(len(session.urls), 2)
+
+    def test_mutating_call_invalidates(self):
+        api, session = self.make_api(
+            {'result': 0, 'vehicles': [{'id': 1}]},
+            {'result': 0},
+            {'result': 0, 'vehicles': []},
+        )
+
+        api.get_user_vehicles()
+        api.delete_device('100')
+        result = api.get_user_vehicles()
+
+        self.assertEqual(result['vehicles'], [])
+        self.assertEqual(len(session.urls), 3)
+
+    def test_stale_value_served_while_revalidating(self):
+        cache = ResponseCache(stale_ttl=60)
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            return {'n': len(calls)}
+
+        endpoint = 'StandardApiAction_getUserMarkers.action'
+        self.assertEqual(cache.get_or_fetch(endpoint, {}, fetch), {'n': 1})
+
+        expired = time.time() + cache.ttls[endpoint] + 1
+        with mock.patch('sit.citos_cache.time.time', return_value=expired):
+            self.assertEqual(cache.get_or_fetch(endpoint, {}, fetch), {'n': 1})
+
+        for _ in range(100):
+            if len(calls) == 2:
+                break
+            threading.Event().wait(0.01)
+        self.assertEqual(len(calls), 2)
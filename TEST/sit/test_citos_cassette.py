@@ -0,0 +1,74 @@
+"""
+Tests de la grabación y reproducción de respuestas (sit/citos_cassette.py).
+"""
+
+import gzip
+import os
+import tempfile
+
+from django.test import SimpleTestCase
+
+from sit import http_pool
+from sit.citos_cassette import CassettePlayer, CassetteRecorder, configure_cassette
+from sit.citos_library import APIError, GPSCameraAPI
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+from .fakes import StubGPSServer
+
+
+class CassetteTestCase(SimpleTestCase):
+    """Tests de grabación y reproducción del tráfico GPS"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.jsonl.gz')
+        os.close(handle)
+        os.unlink(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.unlink(self.path))
+
+    def test_record_then_replay_without_server(self):
+        recorder = CassetteRecorder(self.path)
+        with CMSV6Emulator(SyntheticFleet(vehicles=5), port=0) as emulator:
+            api = GPSCameraAPI(base_url=emulator.base_url, session=recorder.session())
+            api.login('admin', 'secreto')
+            recorded = list(api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 00:59:59',
+                                                     page_records=10))
+            api.jsession = None
+        recorder.close()
+
+        player = CassettePlayer(self.path, speed=0)
+        api = GPSCameraAPI(base_url=emulator.base_url, session=player.session())
+        api.login('admin', 'otra-clave')
+        replayed = list(api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 00:59:59',
+                                                 page_records=10))
+        api.jsession = None
+
+        self.assertEqual(replayed, recorded)
+        self.assertEqual(player.misses, 0)
+
+        with gzip.open(self.path, 'rt') as f:
+            self.assertNotIn('secreto', f.read())
+
+    def test_unrecorded_request_is_network_error(self):
+        with gzip.open(self.path, 'wt'):
+            pass
+
+        api = GPSCameraAPI(base_url='http://gps.test', session=CassettePlayer(self.path).session())
+        api.jsession = 'abc'
+
+        with self.assertRaises(APIError) as ctx:
+            api.get_user_vehicles()
+        self.assertEqual(ctx.exception.code, 24)
+        api.jsession = None
+
+    def test_transport_applies_to_shared_pool(self):
+        server = StubGPSServer({'result': 0, 'vehicles': []})
+        recorder = configure_cassette('record', self.path)
+        try:
+            self.assertIsInstance(recorder, CassetteRecorder)
+            http_pool.get_http_session().get(f"{server.base_url}/StandardApiAction_queryUserVehicle.action")
+        finally:
+            configure_cassette(None)
+            server.close()
+
+        self.assertEqual(recorder.recorded, 1)
+        self.assertIsNone(http_pool.get_transport())
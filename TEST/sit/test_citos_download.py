@@ -0,0 +1,71 @@
+"""
+Tests de la descarga de archivos en streaming (sit/citos_library.py).
+"""
+
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError, GPSCameraAPI
+from sit.citos_metrics import get_metrics
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class DownloadFileTestCase(SimpleTestCase):
+    """Tests de la descarga de archivos por streaming"""
+
+    def setUp(self):
+        self.emulator = CMSV6Emulator(SyntheticFleet(vehicles=1), port=0, photo_size=200000).start()
+        self.api = GPSCameraAPI(base_url=self.emulator.base_url)
+        self.api.login('admin', 'admin')
+        self.tmp = tempfile.TemporaryDirectory()
+        self.destination = f"{self.tmp.name}/fotos/foto.jpg"
+
+    def tearDown(self):
+        self.api.jsession = None
+        self.emulator.stop()
+        self.tmp.cleanup()
+
+    def test_download_streams_to_destination(self):
+        size = self.api.download_file('/photos/1/a.jpg', self.destination, chunk_size=4096)
+
+        self.assertEqual(size, 200000)
+        with open(self.destination, 'rb') as f:
+            self.assertEqual(f.read(), self.emulator._file_body('/photos/1/a.jpg'))
+        self.assertFalse(os.path.exists(self.destination + '.part'))
+
+    def test_partial_download_is_resumed_with_range(self):
+        body = self.emulator._file_body('/photos/1/a.jpg')
+        os.makedirs(os.path.dirname(self.destination))
+        with open(self.destination + '.part', 'wb') as f:
+            f.write(body[:150000])
+
+        get_metrics().reset()
+
+        self.api.download_file('/photos/1/a.jpg', self.destination)
+
+        with open(self.destination, 'rb') as f:
+            self.assertEqual(f.read(), body)
+        # Solo se transfirió lo que faltaba
+        self.assertEqual(get_metrics().snapshot()['StandardApiAction_downloadFile.action']['bytes'], 50000)
+
+    def test_failed_download_leaves_no_final_file(self):
+        with self.assertRaises(APIError) as ctx:
+            self.api.download_file(url=f"{self.emulator.base_url}/StandardApiAction_downloadFile.action",
+                                   destination=self.destination, max_attempts=1)
+
+        self.assertEqual(ctx.exception.code, 24)
+        self.assertFalse(os.path.exists(self.destination))
+
+    def test_client_error_is_not_retried(self):
+        url = f"{self.emulator.base_url}/StandardApiAction_downloadFile.action"
+
+        with mock.patch('sit.citos_library.time.sleep') as sleep:
+            with self.assertRaises(APIError) as ctx:
+                self.api.download_file(url=url, destination=self.destination, max_attempts=3)
+
+        self.assertEqual(ctx.exception.details, 'HTTP 404')
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_downloadFile.action'], 1)
+        sleep.assert_not_called()
@@ -0,0 +1,78 @@
+"""
+Tests de los cálculos geográficos vectorizados (sit/citos_geo.py).
+"""
+
+import math
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import format_speed, parse_coordinates
+from sit.gps_adapter import StreamBusGPSAdapter
+
+from .fakes import FakeSession
+
+try:
+    import numpy as np
+    from sit.citos_geo import (bearing, bounding_box, haversine, path_length, status_columns,
+                               within_radius)
+except ImportError:  # pragma: no cover - numpy es opcional
+    np = None
+
+
+@skipIf(np is None, "numpy no instalado")
+class GeoArraysTestCase(SimpleTestCase):
+    """Tests de los cálculos geográficos vectorizados"""
+
+    def test_status_columns_match_scalar_helpers(self):
+        statuses = [
+            {'id': '1', 'vid': 'A', 'lng': -60700000, 'lat': -31633333, 'sp': 455, 'yl': 1234},
+            {'id': '2', 'vid': 'B', 'lng': 0, 'lat': 0, 'sp': None},
+        ]
+
+        columns = status_columns(statuses)
+
+        self.assertEqual((columns['lng'][0], columns['lat'][0]), parse_coordinates(-60700000, -31633333))
+        self.assertEqual(columns['sp'][0], format_speed(455))
+        self.assertEqual(columns['vid'].tolist(), ['A', 'B'])
+        self.assertTrue(math.isnan(columns['lat'][1]))
+        self.assertTrue(math.isnan(columns['sp'][1]))
+
+    def test_distance_bearing_and_box(self):
+        # Un grado de latitud ~ 111,2 km
+        self.assertAlmostEqual(float(haversine(0, 0, 1, 0)), 111195, delta=5)
+        self.assertAlmostEqual(float(bearing(0, 0, 0, 1)), 90.0, places=6)
+        self.assertAlmostEqual(float(bearing(0, 0, -1, 0)), 180.0, places=6)
+
+        lat = np.array([-31.60, -31.61, np.nan, -31.62])
+        lng = np.array([-60.70, -60.70, np.nan, -60.71])
+        self.assertEqual(bounding_box(lat, lng), (-31.62, -60.71, -31.60, -60.70))
+        self.assertEqual(within_radius(lat, lng, -31.60, -60.70, 1200).tolist(), [True, True, False, False])
+        self.assertAlmostEqual(path_length(lat[:2], lng[:2]), 1112, delta=1)
+
+    def test_fleet_locations_batch_renew_session_and_skip_unknown_positions(self):
+        adapter = StreamBusGPSAdapter()
+        session = adapter.api.session = FakeSession(
+            {'result': 5},
+            {'result': 0, 'jsession': 'new'},
+            {'result': 0, 'status': [
+                {'vid': '1', 'lng': -60700000, 'lat': -31630000, 'sp': 455, 'gt': '2024-01-01 10:00:00'},
+                {'vid': '2', 'lng': 0, 'lat': 0, 'sp': 0},
+            ]},
+            {'result': 0, 'status': [{'vid': '3', 'lng': -60710000, 'lat': -31640000}]},
+        )
+        adapter.api.set_credentials('demo', 'secret')
+        adapter.api.adopt_session('old')
+        adapter._status_coalescer.max_batch = 2
+
+        with mock.patch.object(adapter, '_ensure_session', return_value=True):
+            ubicaciones = adapter.ejecutar_sin_fallback('obtener_ubicaciones_flota', ['1', '2', '3', '1'])
+
+        self.assertEqual(ubicaciones, {
+            '1': (-31.63, -60.7, 45.5, '2024-01-01 10:00:00', ''),
+            '3': (-31.64, -60.71, None, None, ''),
+        })
+        self.assertEqual(len(session.urls), 4)
+        self.assertIn('login', session.urls[1])
+        self.assertIn('jsession=new', session.urls[2])
+        self.assertIn('jsession=new', session.urls[3])
@@ -0,0 +1,62 @@
+"""
+Tests de los iteradores paginados con prefetch (iter_pages en sit/citos_library.py).
+"""
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import iter_pages
+
+from .fakes import fake_api
+
+
+class IterPagesTestCase(SimpleTestCase):
+    """Tests de la paginación automática"""
+
+    @staticmethod
+    def make_fetcher(total_pages, failing=()):
+        calls = []
+
+        def fetch_page(page):
+            calls.append(page)
+            if page in failing:
+                return None
+            return {'result': 0, 'infos': [{'page': page}],
+                    'pagination': {'totalPages': total_pages}}
+        return fetch_page, calls
+
+    def test_yields_pages_in_order_with_prefetch(self):
+        fetch_page, calls = self.make_fetcher(6)
+
+        pages = [page for page, _ in iter_pages(fetch_page, prefetch=3)]
+
+        self.assertEqual(pages, [1, 2, 3, 4, 5, 6])
+        self.assertEqual(sorted(calls), [1, 2, 3, 4, 5, 6])
+
+    def test_skips_failed_pages(self):
+        fetch_page, _ = self.make_fetcher(4, failing={3})
+
+        pages = [page for page, _ in iter_pages(fetch_page, prefetch=0)]
+
+        self.assertEqual(pages, [1, 2, 4])
+
+    def test_reuses_first_page(self):
+        fetch_page, calls = self.make_fetcher(2)
+        first = fetch_page(1)
+        calls.clear()
+
+        list(iter_pages(fetch_page, first_page=first))
+
+        self.assertEqual(calls, [2])
+
+    def test_iter_security_photos_flattens_records(self):
+        api, session = fake_api(
+            {'result': 0, 'infos': [{'id': 1}, {'id': 2}], 'pagination': {'totalPages': 2}},
+            {'result': 0, 'infos': [{'id': 3}], 'pagination': {'totalPages': 2}},
+        )
+
+        photos = list(api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 23:59:59',
+                                               prefetch=0))
+
+        self.assertEqual([p['id'] for p in photos], [1, 2, 3])
+        self.assertIn('StandardApiAction_queryPhoto.action', session.urls[0])
+        self.assertIn('currentPage=2', session.urls[1])
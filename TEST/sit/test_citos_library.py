@@ -0,0 +1,44 @@
+"""
+Tests del cliente citos (sit/citos_library.py).
+
+No requieren base de datos ni acceso al servidor GPS: las respuestas HTTP
+se simulan con los objetos de ``fakes.py`` o con el emulador CMSV6.
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError, GPSCameraAPI
+
+from .fakes import fake_api, FakeSession
+
+
+class GPSCameraAPITestCase(SimpleTestCase):
+    """Tests del cliente GPSCameraAPI"""
+
+    def test_uses_injected_session(self):
+        api, session = fake_api({'result': 0, 'vehicles': []})
+
+        api.get_user_vehicles()
+
+        self.assertEqual(len(session.urls), 1)
+        self.assertIn('jsession=abc', session.urls[0])
+
+    def test_uses_shared_pool_by_default(self):
+        session = FakeSession({'result': 0})
+        api = GPSCameraAPI(base_url='http://gps.test')
+        api.jsession = 'abc'
+
+        with mock.patch('sit.citos_library.get_http_session', return_value=session):
+            api.get_user_areas()
+
+        self.assertEqual(len(session.urls), 1)
+
+    def test_error_code_raises_api_error(self):
+        api = GPSCameraAPI(base_url='http://gps.test', session=FakeSession({'result': 8}))
+        api.jsession = 'abc'
+
+        with self.assertRaises(APIError) as ctx:
+            api.get_user_areas()
+        self.assertEqual(ctx.exception.code, 8)
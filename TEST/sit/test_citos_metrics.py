@@ -0,0 +1,50 @@
+"""
+Tests de las métricas del cliente citos (sit/citos_metrics.py).
+"""
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError
+from sit.citos_metrics import get_metrics, render_prometheus
+from sit.citos_resilience import ResiliencePolicy, RetryPolicy
+
+from .fakes import fake_api
+
+
+class MetricsTestCase(SimpleTestCase):
+    """Tests de las métricas por acción"""
+
+    def setUp(self):
+        self.metrics = get_metrics()
+        self.metrics.reset()
+
+    def test_client_records_latency_bytes_and_codes(self):
+        api, session = fake_api({'result': 0, 'infos': []}, {'result': 8})
+
+        api.get_user_areas()
+        with self.assertRaises(APIError):
+            api.get_user_areas()
+
+        data = self.metrics.snapshot()['StandardApiAction_getUserMarkers.action']
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['errors'], 1)
+        self.assertEqual(data['codes'], {0: 1, 8: 1})
+        self.assertGreater(data['bytes'], 0)
+
+    def test_retries_are_counted(self):
+        api, session = fake_api({'result': 24}, {'result': 0},
+                                resilience=ResiliencePolicy(retry=RetryPolicy(base_delay=0)))
+
+        api.get_user_areas()
+
+        self.assertEqual(self.metrics.snapshot()['StandardApiAction_getUserMarkers.action']['retries'], 1)
+
+    def test_prometheus_format(self):
+        self.metrics.record_request('StandardApiAction_queryPhoto.action', 0.3, 512, 0)
+
+        text = render_prometheus()
+
+        self.assertIn('citos_request_duration_seconds_bucket{action="StandardApiAction_queryPhoto.action",le="0.5"} 1', text)
+        self.assertIn('citos_request_duration_seconds_bucket{action="StandardApiAction_queryPhoto.action",le="0.25"} 0', text)
+        self.assertIn('citos_response_bytes_total{action="StandardApiAction_queryPhoto.action"} 512', text)
+        self.assertIn('citos_requests_total{action="StandardApiAction_queryPhoto.action",code="0"} 1', text)
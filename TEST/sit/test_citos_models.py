@@ -0,0 +1,52 @@
+"""
+Tests de los registros tipados del cliente citos (sit/citos_library.py).
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError, DeviceStatus, GPSCameraAPI
+
+from .fakes import fake_api, FakeResponse
+
+
+class TypedModelsTestCase(SimpleTestCase):
+    """Tests de los registros tipados"""
+
+    def test_fleet_snapshot_converts_units(self):
+        api, session = fake_api({'result': 0, 'status': [{
+            'id': '100', 'vid': '2045', 'lng': -60700000, 'lat': -31630000,
+            'sp': 455, 'ol': 1, 'gt': '2024-01-01 10:00:00', 'yl': 1250,
+        }]})
+
+        status = api.get_fleet_snapshot()[0]
+
+        self.assertIsInstance(status, DeviceStatus)
+        self.assertEqual((status.longitude, status.latitude), (-60.7, -31.63))
+        self.assertEqual(status.speed, 45.5)
+        self.assertEqual(status.fuel, 12.5)
+        self.assertTrue(status.online)
+        self.assertFalse(hasattr(status, '__dict__'))
+
+    def test_alarm_page(self):
+        api, session = fake_api({'result': 0, 'alarms': [{'guid': 'g1', 'atp': 11, 'did': '100'}],
+                               'pagination': {'totalPages': 1}})
+
+        alarms, pagination = api.get_alarm_page('2024-01-01 00:00:00', '2024-01-01 23:59:59', '11')
+
+        self.assertEqual(alarms[0].guid, 'g1')
+        self.assertEqual(alarms[0].alarm_type, 11)
+        self.assertIsNone(alarms[0].location_info)
+        self.assertEqual(pagination['totalPages'], 1)
+
+    def test_invalid_json_raises_api_error(self):
+        response = FakeResponse({})
+        response.content = b'<html>'
+        session = mock.Mock(get=mock.Mock(return_value=response))
+        api = GPSCameraAPI(base_url='http://gps.test', session=session)
+        api.jsession = 'abc'
+
+        with self.assertRaises(APIError) as ctx:
+            api.get_user_areas()
+        self.assertEqual(ctx.exception.code, 6)
@@ -0,0 +1,73 @@
+"""
+Tests de limitador, reintentos y circuit breaker (sit/citos_resilience.py).
+"""
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError
+from sit.citos_resilience import CircuitBreaker, ResiliencePolicy, RetryPolicy, TokenBucket
+
+from .fakes import fake_api
+
+
+class ResilienceTestCase(SimpleTestCase):
+    """Tests de limitador, reintentos y circuit breaker"""
+
+    def make_api(self, *payloads, **policy_kwargs):
+        api, session = fake_api(*payloads, resilience=ResiliencePolicy(**policy_kwargs))
+        return api, session
+
+    def test_retries_system_exception(self):
+        api, session = self.make_api({'result': 6}, {'result': 0, 'infos': []},
+                                     retry=RetryPolicy(max_attempts=3, base_delay=0))
+
+        api.get_user_areas()
+
+        self.assertEqual(len(session.urls), 2)
+
+    def test_never_retries_invalid_time_range(self):
+        api, session = self.make_api({'result': 9}, {'result': 0},
+                                     retry=RetryPolicy(max_attempts=3, base_delay=0))
+
+        with self.assertRaises(APIError) as ctx:
+            api.get_user_areas()
+        self.assertEqual(ctx.exception.code, 9)
+        self.assertEqual(len(session.urls), 1)
+
+    def test_circuit_opens_and_fails_fast(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        api, session = self.make_api({'result': 24}, {'result': 24}, {'result': 0},
+                                     breaker=breaker)
+
+        for _ in range(2):
+            with self.assertRaises(APIError):
+                api.get_user_areas()
+
+        with self.assertRaises(APIError) as ctx:
+            api.get_user_areas()
+        self.assertEqual(ctx.exception.code, 24)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(len(session.urls), 2)
+
+    def test_half_open_probe_closes_circuit(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_token_bucket_limits_rate(self):
+        bucket = TokenBucket(rate=100, capacity=1)
+
+        self.assertTrue(bucket.acquire(timeout=0))
+        self.assertFalse(bucket.acquire(timeout=0))
+        self.assertTrue(bucket.acquire(timeout=1))
+
+    def test_token_bucket_reservations_queue_up(self):
+        bucket = TokenBucket(rate=10, capacity=1)
+
+        self.assertEqual(bucket.reserve(), 0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, delta=0.02)
+        self.assertAlmostEqual(bucket.reserve(), 0.2, delta=0.02)
+        self.assertFalse(bucket.acquire(timeout=0))
@@ -0,0 +1,92 @@
+"""
+Tests de la validez optimista de la sesión y el re-login (sit/citos_library.py).
+"""
+
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError, GPSCameraAPI
+
+from .fakes import FakeSession
+
+
+class SessionManagementTestCase(SimpleTestCase):
+    """Tests de validez optimista y re-login automático"""
+
+    def test_is_session_valid_makes_no_requests(self):
+        session = FakeSession({'result': 0, 'jsession': 'abc'})
+        api = GPSCameraAPI(base_url='http://gps.test', session=session)
+        api.login('user', 'pass')
+
+        self.assertTrue(api.is_session_valid())
+        self.assertEqual(len(session.urls), 1)
+
+    def test_relogin_and_replay_on_session_not_exists(self):
+        session = FakeSession(
+            {'result': 5},
+            {'result': 0, 'jsession': 'new'},
+            {'result': 0, 'vehicles': []},
+        )
+        api = GPSCameraAPI(base_url='http://gps.test', session=session)
+        api.adopt_session('old')
+        api.set_credentials('user', 'pass')
+        changes = []
+        api.on_session_change = changes.append
+
+        result = api.get_user_vehicles()
+
+        self.assertEqual(result['vehicles'], [])
+        self.assertIn('jsession=old', session.urls[0])
+        self.assertIn('StandardApiAction_login.action', session.urls[1])
+        self.assertIn('jsession=new', session.urls[2])
+        self.assertEqual(changes, ['new'])
+
+    def test_session_not_exists_without_credentials_raises(self):
+        api = GPSCameraAPI(base_url='http://gps.test', session=FakeSession({'result': 5}))
+        api.adopt_session('old')
+
+        with self.assertRaises(APIError):
+            api.get_user_areas()
+        self.assertFalse(api.is_session_valid())
+
+    def test_background_refresh_before_expiry(self):
+        session = FakeSession(
+            {'result': 0, 'jsession': 'first'},
+            {'result': 0},
+            {'result': 0, 'jsession': 'second'},
+        )
+        api = GPSCameraAPI(base_url='http://gps.test', session=session,
+                           session_ttl=60, refresh_margin=60)
+        api.login('user', 'pass')
+
+        api.get_user_areas()
+        api._refresh_thread.join(timeout=5)
+
+        self.assertEqual(api.jsession, 'second')
+
+    def test_requests_do_not_wait_for_login_in_progress(self):
+        session = FakeSession({'result': 0, 'jsession': 'first'}, {'result': 0})
+        api = GPSCameraAPI(base_url='http://gps.test', session=session,
+                           session_ttl=60, refresh_margin=60)
+        api.login('user', 'pass')
+
+        # Otro hilo está haciendo login: la petición no se bloquea ni lanza otro
+        with api._session_lock:
+            started = time.monotonic()
+            api.get_user_areas()
+            elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 1)
+        self.assertIsNone(api._refresh_thread)
+        self.assertEqual(api.jsession, 'first')
+
+    def test_login_does_not_print_password(self):
+        session = FakeSession({'result': 0, 'jsession': 'abc'})
+        api = GPSCameraAPI(base_url='http://gps.test', session=session)
+
+        with mock.patch('builtins.print') as fake_print:
+            api.login('user', 'secret')
+
+        fake_print.assert_not_called()
@@ -0,0 +1,88 @@
+"""
+Tests de la sesión compartida entre procesos (sit/citos_session_broker.py).
+"""
+
+import tempfile
+import threading
+import time
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import SimpleTestCase, override_settings
+
+from sit.apps import gps_session_store
+from sit.citos_library import GPSCameraAPI
+from sit.citos_session_broker import (CacheSessionStore, FileSessionStore, MemorySessionStore,
+                                      SessionBroker, make_login)
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class SessionBrokerTestCase(SimpleTestCase):
+    """Tests del broker de sesión compartida"""
+
+    def test_expired_session_is_renewed_once_across_processes(self):
+        logins = []
+
+        def login():
+            time.sleep(0.05)
+            logins.append(1)
+            return f'session-{len(logins)}'
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = f'{tmp}/gps_session.json'
+            # Dos "procesos" con su propio broker sobre el mismo archivo
+            brokers = [SessionBroker(FileSessionStore(path), login, local_ttl=0) for _ in range(2)]
+            stale = brokers[0].get()
+            self.assertEqual(brokers[1].get(), stale)
+
+            results = []
+            threads = [threading.Thread(target=lambda b=b: results.append(b.refresh(stale)))
+                       for b in brokers * 4]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(logins), 2)  # el inicial y una sola renovación
+            self.assertEqual(set(results), {'session-2'})
+            self.assertEqual(brokers[1].current().generation, 2)
+
+    def test_clients_share_broker_session(self):
+        with CMSV6Emulator(SyntheticFleet(vehicles=3)) as emulator:
+            broker = SessionBroker(MemorySessionStore(),
+                                   make_login(emulator.base_url, 'admin', 'admin'))
+            clients = [GPSCameraAPI(base_url=emulator.base_url) for _ in range(3)]
+            for client in clients:
+                client.session_broker = broker
+                client.get_device_status(device_ids='900001')
+
+            self.assertEqual(emulator.request_counts['StandardApiAction_login.action'], 1)
+            self.assertEqual({client.jsession for client in clients}, {broker.get()})
+
+            # El servidor olvida la sesión: un solo re-login para todos
+            emulator.sessions.clear()
+            for client in clients:
+                client.get_device_status(device_ids='900001')
+            self.assertEqual(emulator.request_counts['StandardApiAction_login.action'], 2)
+            self.assertEqual(broker.stats()['reused'], 2)
+
+    def test_cache_store_reads_legacy_plain_jsession(self):
+        cache = LocMemCache('broker-test', {})
+        cache.set('streambus_gps_session', 'abc123')
+        store = CacheSessionStore(cache)
+        self.assertEqual(store.get().jsession, 'abc123')
+        with store.lock(timeout=1):
+            self.assertFalse(cache.add('streambus_gps_session:lock', 'x'))
+        self.assertTrue(cache.add('streambus_gps_session:lock', 'x'))
+
+    def test_process_local_cache_falls_back_to_file_store(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+        cache = LocMemCache('broker-store', {})
+
+        with override_settings(CACHES=locmem, GPS_SESSION_STORE='cache'):
+            with self.assertLogs('sit.apps', 'WARNING'):
+                self.assertIsInstance(gps_session_store(cache), FileSessionStore)
+        with override_settings(CACHES=redis, GPS_SESSION_STORE='cache'):
+            self.assertIsInstance(gps_session_store(cache), CacheSessionStore)
+        with override_settings(CACHES=redis, GPS_SESSION_STORE='file'):
+            self.assertIsInstance(gps_session_store(cache), FileSessionStore)
@@ -0,0 +1,74 @@
+"""
+Tests del pool de sesiones del servidor GPS (sit/citos_session_pool.py).
+"""
+
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError
+from sit.citos_session_pool import SessionPool, run_benchmark
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class SessionPoolTestCase(SimpleTestCase):
+    """Tests del pool de sesiones"""
+
+    def test_load_is_spread_across_sessions(self):
+        with CMSV6Emulator(SyntheticFleet(vehicles=5), latency_ms=20, serialize_sessions=True) as emulator:
+            results = {}
+            for size in (1, 4):
+                with SessionPool(emulator.base_url, 'admin', 'admin', size=size) as pool:
+                    results[size] = run_benchmark(pool, lambda api, n: api.get_device_status(),
+                                                  requests=40)
+                    stats = pool.stats()
+
+            self.assertEqual(stats['size'], 4)
+            self.assertTrue(all(s['requests'] > 0 for s in stats['sessions']))
+            self.assertEqual(results[4]['errors'], 0)
+            self.assertGreater(results[4]['throughput'], results[1]['throughput'] * 2)
+
+    def test_pool_stops_at_account_session_limit(self):
+        with CMSV6Emulator(SyntheticFleet(vehicles=5), max_sessions=2) as emulator:
+            pool = SessionPool(emulator.base_url, 'admin', 'admin', size=4).start()
+            self.assertEqual(len(pool), 2)
+            self.assertTrue(pool.limited)
+            self.assertEqual(len(pool.api().get_device_status(device_ids='900001')['status']), 1)
+            pool.close()
+
+    def test_failing_session_is_retired(self):
+        clients = []
+
+        def factory():
+            clients.append(mock.Mock())
+            return clients[-1]
+
+        pool = SessionPool('http://gps', 'admin', 'admin', size=2, max_failures=2,
+                           revive_interval=3600, client_factory=factory).start()
+
+        for _ in range(8):
+            try:
+                with pool.checkout() as api:
+                    if api is clients[0]:
+                        raise APIError(6, "Excepción del sistema")
+            except APIError:
+                pass
+
+        stats = pool.stats()
+        self.assertEqual([s['healthy'] for s in stats['sessions']], [False, True])
+        self.assertEqual([s['requests'] for s in stats['sessions']], [2, 6])
+
+    def test_iterators_keep_the_session_checked_out(self):
+        def factory():
+            client = mock.Mock()
+            client.iter_device_track.side_effect = lambda *args, **kwargs: iter([1, 2, 3])
+            return client
+
+        pool = SessionPool('http://gps', 'admin', 'admin', size=1, client_factory=factory).start()
+        points = pool.api().iter_device_track('900001', '2024-01-01 00:00:00', '2024-01-01 23:59:59')
+
+        self.assertEqual(next(points), 1)
+        self.assertEqual(pool.stats()['inflight'], 1)
+        self.assertEqual(list(points), [2, 3])
+        stats = pool.stats()
+        self.assertEqual((stats['inflight'], stats['requests']), (0, 1))
@@ -0,0 +1,94 @@
+"""
+Tests de la comparación en sombra citos/legacy (sit/citos_shadow.py y sit/gps_adapter.py).
+"""
+
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError
+from sit.citos_shadow import ShadowComparator, diff_results
+from sit.gps_adapter import StreamBusGPSAdapter
+
+
+class ShadowComparatorTestCase(SimpleTestCase):
+    """Tests del modo sombra citos/legacy"""
+
+    def test_adapter_without_fallback_raises_citos_errors(self):
+        adapter = StreamBusGPSAdapter()
+        adapter.api.get_user_vehicles = mock.Mock(side_effect=APIError(6, "Excepción del sistema"))
+
+        with mock.patch.object(adapter, '_ensure_session', return_value=True):
+            with self.assertRaises(APIError) as ctx:
+                adapter.ejecutar_sin_fallback('obtener_vehiculos')
+        self.assertEqual(ctx.exception.code, 6)
+
+        with mock.patch.object(adapter, '_ensure_session', return_value=False):
+            with self.assertRaises(APIError) as ctx:
+                adapter.ejecutar_sin_fallback('obtener_vehiculos')
+        self.assertEqual(ctx.exception.code, 5)
+
+        # Los métodos públicos siguen usando legacy ante cualquier error de citos
+        for session_ok in (False, True):
+            with mock.patch.object(adapter, '_ensure_session', return_value=session_ok), \
+                    mock.patch.object(adapter, '_fallback_to_legacy', return_value=['legacy']) as fallback:
+                self.assertEqual(adapter.obtener_vehiculos(), ['legacy'])
+            fallback.assert_called_once_with('obtener_vehiculos')
+
+        # Sin error, la ruta citos y el método público devuelven lo mismo
+        adapter.api.get_user_vehicles = mock.Mock(return_value={'result': 0, 'vehicles': [{'nm': '2045'}]})
+        with mock.patch.object(adapter, '_ensure_session', return_value=True):
+            self.assertEqual(adapter.ejecutar_sin_fallback('obtener_vehiculos'), [{'nm': '2045'}])
+            self.assertEqual(adapter.obtener_vehiculos(), [{'nm': '2045'}])
+
+    def test_diff_results_tolerates_small_float_noise(self):
+        self.assertEqual(diff_results((1.0, 'a', None), (1.0 + 1e-9, 'a', None)), [])
+        self.assertEqual(diff_results((1.5, {'sp': 10}), (1.6, {'sp': 10, 'x': 1})),
+                         ['[0]: 1.5 != 1.6', "[1].x: 'falta' != 1"])
+        self.assertEqual(diff_results([1, 2], [1]), ['.: largo 2 != 1'])
+
+    def test_shadow_runs_off_the_request_path(self):
+        release = threading.Event()
+
+        def slow_legacy():
+            release.wait(2)
+            return (1.0, 2.0, None)
+
+        shadow = ShadowComparator(sample_rate=1.0)
+        started = time.perf_counter()
+        result = shadow.run('ubicacion', ('citos', lambda: (1.0, 2.0, 3.0)), ('legacy', slow_legacy))
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(result, (1.0, 2.0, 3.0))
+
+        release.set()
+        self.assertTrue(shadow.wait_idle(2))
+        report = shadow.report()['ubicacion']
+        self.assertEqual((report['samples'], report['mismatches']), (1, 1))
+        self.assertEqual(report['diffs'][0]['diffs'], ['[2]: 3.0 != None'])
+        self.assertEqual(report['faster'], 'citos')
+        self.assertGreater(report['implementations']['citos']['avg_bytes'], 0)
+        shadow.close()
+
+    def test_sampling_errors_and_backpressure(self):
+        shadow = ShadowComparator(sample_rate=0.5, rng=iter([0.9, 0.1]).__next__)
+        self.assertEqual(shadow.run('f', ('legacy', lambda: 1), ('citos', lambda: 1)), 1)
+        with self.assertRaises(ValueError):
+            shadow.run('f', ('legacy', mock.Mock(side_effect=ValueError('boom'))), ('citos', lambda: 1))
+        shadow.wait_idle(2)
+        report = shadow.report()['f']
+        self.assertEqual(report['samples'], 1)
+        self.assertEqual(report['implementations']['legacy']['errors'], 1)
+        self.assertIn('legacy: ValueError: boom', report['diffs'][0]['diffs'])
+        shadow.close()
+
+        blocked = threading.Event()
+        shadow = ShadowComparator(sample_rate=1.0, workers=1, max_pending=1)
+        shadow.run('f', ('legacy', lambda: 1), ('citos', blocked.wait))
+        shadow.run('f', ('legacy', lambda: 1), ('citos', blocked.wait))
+        self.assertEqual(shadow.dropped, 1)
+        blocked.set()
+        shadow.wait_idle(2)
+        self.assertEqual(shadow.report()['f']['samples'], 1)
+        shadow.close()
@@ -0,0 +1,49 @@
+"""
+Tests de la división de rangos de tiempo en ventanas (sit/citos_library.py).
+"""
+
+from datetime import timedelta
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import APIError, GPSCameraAPI, split_time_range
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class TimeWindowTestCase(SimpleTestCase):
+    """Tests de la división automática de rangos de tiempo"""
+
+    def test_split_time_range(self):
+        windows = split_time_range('2024-01-01 00:00:00', '2024-01-03 12:00:00', timedelta(days=1))
+
+        self.assertEqual(windows, [
+            ('2024-01-01 00:00:00', '2024-01-01 23:59:59'),
+            ('2024-01-02 00:00:00', '2024-01-02 23:59:59'),
+            ('2024-01-03 00:00:00', '2024-01-03 12:00:00'),
+        ])
+        with self.assertRaises(APIError) as ctx:
+            split_time_range('2024-01-02 00:00:00', '2024-01-01 00:00:00', timedelta(days=1))
+        self.assertEqual(ctx.exception.code, 9)
+
+    def test_windows_are_fetched_in_parallel_and_merged_in_order(self):
+        with CMSV6Emulator(SyntheticFleet(vehicles=1), port=0, latency_ms=20) as emulator:
+            api = GPSCameraAPI(base_url=emulator.base_url)
+            api.login('admin', 'admin')
+            whole = list(api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 23:59:59'))
+            windowed = list(api.iter_security_photos('2024-01-01 00:00:00', '2024-01-01 23:59:59',
+                                                     window=timedelta(hours=3), workers=4))
+            api.jsession = None
+
+        self.assertEqual(len(whole), 144)
+        self.assertEqual(windowed, whole)
+
+    def test_rejected_range_is_split_automatically(self):
+        fleet = SyntheticFleet(vehicles=1)
+        with CMSV6Emulator(fleet, port=0, max_time_range=timedelta(hours=6)) as emulator:
+            api = GPSCameraAPI(base_url=emulator.base_url)
+            api.login('admin', 'admin')
+            alarms = list(api.iter_device_alarms('2024-01-01 00:00:00', '2024-01-02 23:59:59', [1]))
+            api.jsession = None
+
+        self.assertEqual(len(alarms), 96)
+        self.assertEqual([a['stm'] for a in alarms], sorted(a['stm'] for a in alarms))
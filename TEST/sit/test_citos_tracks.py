@@ -0,0 +1,97 @@
+"""
+Tests del cache columnar de tracks (sit/citos_tracks.py).
+"""
+
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import GPSCameraAPI
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+try:
+    from sit.citos_tracks import TrackArrays, TrackStore
+except ImportError:  # pragma: no cover - numpy es opcional
+    TrackArrays = TrackStore = None
+
+
+@skipIf(TrackStore is None, "numpy no instalado")
+class TrackStoreTestCase(SimpleTestCase):
+    """Tests del cache columnar de tracks"""
+
+    def setUp(self):
+        self.emulator = CMSV6Emulator(SyntheticFleet(vehicles=2, track_interval=60), port=0).start()
+        self.api = GPSCameraAPI(base_url=self.emulator.base_url)
+        self.api.login('admin', 'admin')
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.api.jsession = None
+        self.emulator.stop()
+        self.tmp.cleanup()
+
+    def test_day_is_fetched_in_slices_and_cached_on_disk(self):
+        store = TrackStore(self.tmp.name, self.api, slices=4)
+        track = store.get('900001', date(2024, 3, 10))
+
+        self.assertEqual(len(track), 1440)
+        self.assertEqual(track.nbytes, 1440 * 16)
+        self.assertTrue((track.offset[1:] > track.offset[:-1]).all())
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_queryTrackDetail.action'], 4)
+        self.assertTrue(os.path.exists(store.path('900001', date(2024, 3, 10))))
+
+        reloaded = TrackStore(self.tmp.name).get('900001', date(2024, 3, 10))
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_queryTrackDetail.action'], 4)
+        self.assertTrue((reloaded.lat == track.lat).all())
+        self.assertEqual(str(reloaded.timestamps[0]), '2024-03-10T00:00:00')
+
+    def test_recent_and_empty_days_are_not_cached(self):
+        store = TrackStore(self.tmp.name, self.api, slices=4, grace_hours=36)
+        yesterday = date.today() - timedelta(days=1)
+
+        self.assertFalse(store.is_final(yesterday))
+        self.assertTrue(store.is_final(yesterday, now=datetime.now() + timedelta(hours=36)))
+        store.get('900001', yesterday)
+        store.get('900001', yesterday)
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_queryTrackDetail.action'], 8)
+        self.assertFalse(os.path.exists(store.path('900001', yesterday)))
+
+        old_day = date(2024, 3, 10)
+        with mock.patch('sit.citos_tracks.fetch_track_day',
+                        return_value=TrackArrays.empty('900001', old_day)) as fetch:
+            store.get('900001', old_day)
+            store.get('900001', old_day)
+        self.assertEqual(fetch.call_count, 2)
+        self.assertFalse(os.path.exists(store.path('900001', old_day)))
+
+    def test_concurrent_saves_of_the_same_day_do_not_collide(self):
+        store = TrackStore(self.tmp.name, self.api, slices=4)
+        track = store.get('900001', date(2024, 3, 10))
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: store._save(track), range(16)))
+
+        directory = os.path.dirname(store.path('900001', date(2024, 3, 10)))
+        self.assertEqual(os.listdir(directory), ['2024-03-10.npz'])
+        self.assertEqual(len(TrackStore(self.tmp.name).get('900001', date(2024, 3, 10))), 1440)
+
+    def test_points_are_sorted_and_deduplicated(self):
+        points = [
+            {'gt': '2024-03-10 10:00:05', 'lat': -31600000, 'lng': -60700000, 'sp': 123, 'hx': 370},
+            {'gt': '2024-03-10 10:00:00', 'lat': -31500000, 'lng': -60600000, 'sp': 0, 'hx': 90},
+            {'gt': '2024-03-10 10:00:05', 'lat': 0, 'lng': 0, 'sp': 0, 'hx': 0},
+            {'gt': '2024-03-11 00:00:00', 'lat': 0, 'lng': 0, 'sp': 0, 'hx': 0},
+        ]
+
+        track = TrackArrays.from_points('1', date(2024, 3, 10), points)
+
+        self.assertEqual(track.offset.tolist(), [36000, 36005])
+        self.assertEqual(track.latitudes.tolist(), [-31.5, -31.6])
+        self.assertEqual(track.heading.tolist(), [90, 10])
+        self.assertEqual(track.speeds_kmh.tolist(), [0.0, 12.3])
+        window = track.between(datetime(2024, 3, 10, 10, 0, 1), datetime(2024, 3, 10, 11, 0, 0))
+        self.assertEqual(len(window), 1)
@@ -0,0 +1,58 @@
+"""
+Tests del emulador del servidor CMSV6 (sit/cmsv6_emulator.py).
+"""
+
+from django.test import SimpleTestCase
+
+from sit import http_pool
+from sit.citos_library import GPSCameraAPI
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet, _from_epoch
+
+
+class CMSV6EmulatorTestCase(SimpleTestCase):
+    """Tests del cliente contra el emulador local de CMSV6"""
+
+    def setUp(self):
+        self.emulator = CMSV6Emulator(SyntheticFleet(vehicles=25, companies=3), port=0).start()
+        self.api = GPSCameraAPI(base_url=self.emulator.base_url)
+        self.api.login('admin', 'admin')
+
+    def tearDown(self):
+        self.api.jsession = None
+        self.emulator.stop()
+
+    def test_fleet_and_status(self):
+        vehicles = self.api.get_user_vehicles()
+        status = self.api.get_device_status(vehicle_ids=['1003', '1004'])
+
+        self.assertEqual(len(vehicles['vehicles']), 25)
+        self.assertEqual(len(vehicles['companys']), 3)
+        self.assertEqual([s['vid'] for s in status['status']], ['1003', '1004'])
+
+    def test_status_time_uses_naive_utc_like_tracks(self):
+        status = self.emulator.fleet.status(3, 86400.0)
+        point = self.emulator.fleet.track_point(3, 86400.0)
+
+        self.assertEqual(status['gt'], '1970-01-02 00:00:00')
+        self.assertEqual(point['gt'], status['gt'])
+        self.assertEqual(_from_epoch(86400.0).strftime('%Y-%m-%d %H:%M:%S'), status['gt'])
+
+    def test_photo_paging_and_download(self):
+        photos = list(self.api.iter_security_photos(
+            '2024-01-01 00:00:00', '2024-01-01 00:59:59',
+            vehicle_ids=['1000', '1001'], page_records=5
+        ))
+
+        self.assertEqual(len(photos), 12)
+        self.assertEqual(len({p['FPATH'] for p in photos}), 12)
+
+        response = http_pool.get_http_session().get(photos[0]['downloadUrl'], headers={'Range': 'bytes=10-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(len(response.content), self.emulator.photo_size - 10)
+
+    def test_expired_session_is_renewed(self):
+        self.emulator.sessions.clear()
+
+        self.api.get_user_vehicles()
+
+        self.assertEqual(self.emulator.request_counts['StandardApiAction_login.action'], 2)
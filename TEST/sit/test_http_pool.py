@@ -0,0 +1,36 @@
+"""
+Tests del pool de conexiones HTTP compartido (sit/http_pool.py).
+"""
+
+import threading
+
+from django.test import SimpleTestCase
+
+from sit import http_pool
+
+
+class HttpPoolTestCase(SimpleTestCase):
+    """Tests del pool de conexiones compartido"""
+
+    def tearDown(self):
+        http_pool.configure_http_pool(**http_pool.DEFAULT_POOL_CONFIG)
+
+    def test_session_reused_in_same_thread(self):
+        self.assertIs(http_pool.get_http_session(), http_pool.get_http_session())
+
+    def test_threads_share_adapter(self):
+        sessions = []
+        thread = threading.Thread(target=lambda: sessions.append(http_pool.get_http_session()))
+        thread.start()
+        thread.join()
+
+        local = http_pool.get_http_session()
+        self.assertIsNot(local, sessions[0])
+        self.assertIs(local.get_adapter('http://x'), sessions[0].get_adapter('http://x'))
+
+    def test_configure_recreates_sessions(self):
+        before = http_pool.get_http_session()
+        config = http_pool.configure_http_pool(pool_maxsize=64)
+
+        self.assertEqual(config['pool_maxsize'], 64)
+        self.assertIsNot(before, http_pool.get_http_session())
@@ -0,0 +1,112 @@
+"""
+Tests del almacén de fotos por contenido (sit/photo_blobs.py).
+"""
+
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from sit.photo_blobs import GC_GRACE_SECONDS, BlobStore, get_blob_store, linked_blob_store
+from sit.photo_manifest import PhotoManifest
+from sit.photo_pipeline import PhotoSaver, STATUS_DOWNLOADED
+
+
+class PhotoBlobStoreTestCase(SimpleTestCase):
+    """Tests del almacén de fotos por contenido"""
+
+    def test_same_image_is_stored_once(self):
+        def download(url, path):
+            with open(path, 'wb') as f:
+                f.write(b'frame-' + url.rsplit('/', 1)[-1].encode())
+            return True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            blobs = BlobStore(os.path.join(tmp, '.blobs'))
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            saver = PhotoSaver(tmp, lambda v, d: f'ficha_{v or "x"}_mdvr_{d}', lambda v, d, t: f'{t}.jpg',
+                               os.path.exists, download, lambda fpath: f'http://gps/{fpath}',
+                               manifest=manifest, blobs=blobs)
+            # El mismo cuadro bajo dos vehículos (el equipo cambió de ficha) y uno distinto
+            photos = [{'vehiIdno': '1001', 'devIdno': '900001', 'fileTimeStr': 'f1', 'FPATH': 'a'},
+                      {'vehiIdno': '', 'devIdno': '900002', 'fileTimeStr': 'f1', 'FPATH': 'a'},
+                      {'vehiIdno': '1001', 'devIdno': '900001', 'fileTimeStr': 'f2', 'FPATH': 'b'}]
+            self.assertEqual([saver(photo) for photo in photos], [STATUS_DOWNLOADED] * 3)
+
+            self.assertEqual(blobs.stats()['blobs'], 2)
+            first = os.path.join(tmp, 'ficha_1001_mdvr_900001', 'f1.jpg')
+            second = os.path.join(tmp, 'ficha_x_mdvr_900002', 'f1.jpg')
+            with open(second, 'rb') as f:
+                self.assertEqual(f.read(), b'frame-a')
+            self.assertEqual(os.listdir(os.path.dirname(second)), ['f1.jpg'])
+            if blobs.supports_links():
+                self.assertTrue(os.path.samefile(first, second))
+            # El manifiesto guarda el sha256: índice foto -> blob
+            checksums = {row[0] for row in manifest._connection().execute('SELECT checksum FROM photos')}
+            self.assertEqual(len(checksums), 2)
+            self.assertTrue(all(os.path.exists(blobs.blob_path(digest)) for digest in checksums))
+
+    def test_dedupe_existing_tree_and_gc(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            for folder in ('ficha_1_mdvr_9', 'ficha__mdvr_9', 'ficha_2_mdvr_8'):
+                os.makedirs(os.path.join(tmp, folder))
+            for folder, body in (('ficha_1_mdvr_9', b'same'), ('ficha__mdvr_9', b'same'),
+                                 ('ficha_2_mdvr_8', b'other')):
+                with open(os.path.join(tmp, folder, 'f.jpg'), 'wb') as f:
+                    f.write(body)
+
+            blobs = BlobStore(os.path.join(tmp, '.blobs'))
+            if not blobs.supports_links():
+                self.skipTest('El sistema de archivos no admite enlaces duros')
+
+            counts = blobs.dedupe_tree(tmp)
+            self.assertEqual(counts, {'files': 3, 'adopted': 2, 'deduplicated': 1, 'bytes_saved': 4})
+            self.assertEqual(blobs.dedupe_tree(tmp)['deduplicated'], 0)
+
+            os.remove(os.path.join(tmp, 'ficha_2_mdvr_8', 'f.jpg'))
+            self.assertEqual(blobs.gc(grace=0), 1)
+            self.assertEqual(blobs.stats()['blobs'], 1)
+
+    def test_store_is_disabled_without_hard_links(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch('sit.photo_blobs.os.link', side_effect=OSError('EXDEV')) as link:
+                self.assertIsNone(linked_blob_store(tmp))
+                self.assertIsNone(linked_blob_store(tmp))
+                # Se prueba una sola vez por almacén
+                self.assertEqual(link.call_count, 1)
+                self.assertFalse(get_blob_store(tmp).supports_links())
+                with self.assertRaises(OSError):
+                    get_blob_store(tmp).dedupe_tree(tmp)
+                self.assertEqual(get_blob_store(tmp).gc(), 0)
+
+            self.assertIsInstance(linked_blob_store(os.path.join(tmp, 'otro')), BlobStore)
+
+    def test_gc_keeps_recent_blobs(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            blobs = BlobStore(os.path.join(tmp, '.blobs'))
+            if not blobs.supports_links():
+                self.skipTest('El sistema de archivos no admite enlaces duros')
+            dest = os.path.join(tmp, 'f.jpg')
+            with open(f'{dest}.download', 'wb') as f:
+                f.write(b'same')
+            digest = blobs.store(f'{dest}.download', dest)
+            blob = blobs.blob_path(digest)
+            os.remove(dest)
+            old = time.time() - GC_GRACE_SECONDS - 60
+            os.utime(blob, (old, old))
+
+            # Otra descarga de la misma imagen reutiliza el blob: queda reciente
+            with open(f'{dest}.download', 'wb') as f:
+                f.write(b'same')
+            with mock.patch('sit.photo_blobs.BlobStore.link'):
+                blobs.store(f'{dest}.download', dest)
+            self.assertEqual(blobs.gc(), 0)
+            self.assertTrue(os.path.exists(blob))
+
+            os.utime(blob, (old, old))
+            # Otro gc lo borró entre el stat y el borrado
+            with mock.patch('sit.photo_blobs.os.remove', side_effect=FileNotFoundError):
+                self.assertEqual(blobs.gc(), 0)
+            self.assertEqual(blobs.gc(), 1)
@@ -0,0 +1,105 @@
+"""
+Tests de las descargas con punto de control (sit/photo_jobs.py).
+"""
+
+import os
+import tempfile
+import time
+
+from django.test import SimpleTestCase
+
+from sit.citos_library import iter_pages
+from sit.photo_jobs import JOB_LEASE, JOB_PARTIAL, PhotoJobStore
+from sit.photo_pipeline import PhotoDownloadEngine, STATUS_DOWNLOADED
+
+from .fakes import photo_page
+
+
+class PhotoJobTestCase(SimpleTestCase):
+    """Tests de las descargas con punto de control"""
+
+    def test_resume_fetches_only_pending_pages(self):
+        fetched, saved = [], []
+        failing = {'900003'}
+
+        def fetch_page(page):
+            fetched.append(page)
+            photos = [{'vehiIdno': str(page), 'devIdno': f'90000{page}', 'n': n} for n in range(3)]
+            return photo_page(page, 4, photos)
+
+        def save(photo):
+            if photo['devIdno'] in failing:
+                return None
+            saved.append((photo['vehiIdno'], photo['n']))
+            return STATUS_DOWNLOADED
+
+        def download(job):
+            first_page = fetch_page(1)
+            done = job.plan(12, 4)
+            run = engine.run(iter_pages(fetch_page, prefetch=1, first_page=first_page, skip_pages=done),
+                             save, on_progress=job.track(), on_page_done=job.mark_page)
+            return run
+
+        engine = PhotoDownloadEngine(workers=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = PhotoJobStore(os.path.join(tmp, 'jobs.sqlite3'))
+            job = store.open('2025-05-01 00:00:00', '2025-05-03 00:00:00')
+            download(job)
+            self.assertEqual(job.status, JOB_PARTIAL)
+            self.assertEqual(job.done_pages, {1, 2, 4})
+            self.assertEqual([job.job_id], [pending.job_id for pending in store.pending()])
+
+            # Otro proceso: el mismo rango retoma solo la página que faltó
+            failing.clear()
+            fetched.clear()
+            resumed = PhotoJobStore(os.path.join(tmp, 'jobs.sqlite3')).open(
+                '2025-05-01 00:00:00', '2025-05-03 00:00:00')
+            self.assertTrue(resumed.resumed)
+            run = download(resumed)
+            engine.close()
+
+            self.assertEqual(fetched, [1, 3])
+            self.assertEqual(run.stats['descargadas'], 3)
+            self.assertEqual(resumed.status, 'completed')
+            self.assertEqual(store.pending(), [])
+            self.assertEqual(len(saved), 12)
+
+    def test_stale_jobs_are_not_resumed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store = PhotoJobStore(os.path.join(tmp, 'jobs.sqlite3'))
+            stale = store.open('2025-05-01 00:00:00', '2025-05-01 02:00:00')
+            fresh = store.open('2025-05-02 00:00:00', '2025-05-02 02:00:00')
+            store._update(fresh.job_id, status='cancelled')
+            with store._connection() as conn:
+                conn.execute('UPDATE jobs SET updated_at = ? WHERE job_id = ?',
+                             (time.time() - 4 * 24 * 3600, stale.job_id))
+
+            self.assertEqual([job.job_id for job in store.pending()], [fresh.job_id])
+            self.assertEqual(len(store.pending(max_age=None)), 2)
+            self.assertEqual(store.expire(), 1)
+            self.assertIsNone(store.get(stale.job_id))
+            self.assertEqual(len(store.pending(max_age=None)), 1)
+
+    def test_running_jobs_are_claimed_once(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'jobs.sqlite3')
+            store = PhotoJobStore(path)
+            job = store.open('2025-05-01 00:00:00', '2025-05-01 02:00:00')
+            job.plan(100, 2)
+
+            # En curso en otro proceso: no se lista ni se puede tomar
+            self.assertEqual(store.pending(), [])
+            self.assertIsNone(store.claim(job.job_id))
+
+            # Sin latido más allá del plazo: el proceso se cortó
+            with store._connection() as conn:
+                conn.execute('UPDATE jobs SET updated_at = ? WHERE job_id = ?',
+                             (time.time() - JOB_LEASE - 1, job.job_id))
+            self.assertEqual([pending.job_id for pending in store.pending()], [job.job_id])
+            claimed = store.claim(job.job_id)
+            self.assertEqual(claimed.status, 'running')
+            self.assertIsNone(PhotoJobStore(path).claim(job.job_id))
+            self.assertEqual(store.pending(), [])
+
+            store._update(job.job_id, status='completed')
+            self.assertIsNone(store.claim(job.job_id, lease=0))
@@ -0,0 +1,156 @@
+"""
+Tests del manifiesto de fotos descargadas (sit/photo_manifest.py).
+"""
+
+import os
+import tempfile
+from datetime import datetime
+
+from django.test import SimpleTestCase
+
+from sit.photo_manifest import PhotoManifest, UNKNOWN_CHANNEL, parse_photo_file
+from sit.photo_pipeline import PhotoDownloadEngine, PhotoSaver
+
+
+class PhotoManifestTestCase(SimpleTestCase):
+    """Tests del manifiesto de fotos descargadas"""
+
+    def test_second_run_skips_stored_photos_without_stat(self):
+        stats_calls, downloads = [], []
+
+        def file_exists(path):
+            stats_calls.append(path)
+            return os.path.exists(path)
+
+        def download(url, path):
+            downloads.append(url)
+            with open(path, 'wb') as f:
+                f.write(b'jpg')
+            return True
+
+        photos = [{'vehiIdno': '1001', 'devIdno': 'C900001', 'chn': n % 2,
+                   'fileTimeStr': f'2025-05-20 10:00:{n:02d}', 'FPATH': f'/{n}.jpg'} for n in range(6)]
+
+        def pages():
+            yield 1, {'infos': [dict(photo) for photo in photos],
+                      'pagination': {'totalPages': 1, 'totalRecords': 6}}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            saver = PhotoSaver(tmp, lambda v, d: f'veh_{v}',
+                               lambda v, d, t: t.replace(' ', '_').replace(':', '-') + f'_dev_{d}.jpg',
+                               file_exists, download, lambda fpath: f'http://gps/dl?filePath={fpath}',
+                               manifest=manifest)
+            engine = PhotoDownloadEngine(workers=2)
+            first = engine.run(pages(), saver)
+            self.assertEqual(first.stats['descargadas'], 6)
+            self.assertEqual(len(manifest), 6)
+
+            stats_calls.clear()
+            second = engine.run(pages(), saver)
+            engine.close()
+
+            self.assertEqual((second.stats['ya_existen'], second.stats['descargadas']), (6, 0))
+            self.assertEqual(stats_calls, [])
+            self.assertEqual(len(downloads), 6)
+            self.assertEqual(second.photos[0]['local_path'].split('/')[:2], ['security_photos', 'veh_1001'])
+
+    def test_reconcile_rebuilds_from_disk(self):
+        self.assertEqual(parse_photo_file('2025-05-20_10-15-30_dev_900001.jpg'),
+                         ('900001', '2025-05-20 10:15:30'))
+        self.assertIsNone(parse_photo_file('notas.jpg'))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, 'veh_1001'))
+            for name in ('2025-05-20_10-15-30_dev_900001.jpg', '2025-05-20_10-15-31_dev_900001.jpg',
+                         'notas.jpg'):
+                with open(os.path.join(tmp, 'veh_1001', name), 'wb') as f:
+                    f.write(b'jpg')
+
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            # Fila de una foto borrada y otra ya registrada con su canal
+            manifest.add(('900001', '2025-05-20 09:00:00', 0), 'veh_1001/borrada.jpg', 3)
+            manifest.add(('900001', '2025-05-20 10:15:30', 1), 'veh_1001/2025-05-20_10-15-30_dev_900001.jpg', 3)
+
+            counts = manifest.reconcile(tmp, checksum=True)
+            self.assertEqual(counts, {'files': 2, 'added': 1, 'updated': 0, 'removed': 1, 'unparsed': 1})
+            self.assertEqual(len(manifest), 2)
+
+            # La fila reconstruida no conoce el canal: vale para cualquiera
+            found = manifest.lookup([('900001', '2025-05-20 10:15:31', 3),
+                                     ('900001', '2025-05-20 10:15:30', 1),
+                                     ('900001', '2025-05-20 10:15:30', 0)])
+            self.assertEqual(sorted(key[2] for key in found), [1, 3])
+            self.assertEqual(manifest.lookup([('900001', '2025-05-20 10:15:31', UNKNOWN_CHANNEL)]),
+                             {('900001', '2025-05-20 10:15:31', UNKNOWN_CHANNEL):
+                              'veh_1001/2025-05-20_10-15-31_dev_900001.jpg'})
+
+
+class PhotoWatermarkTestCase(SimpleTestCase):
+    """Tests de las marcas de agua por dispositivo"""
+
+    def test_watermarks_and_incremental_begin(self):
+        end = datetime(2025, 5, 20, 12, 0, 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            self.assertIsNone(manifest.latest())
+            # Sin marcas de agua: la ventana fija completa
+            self.assertEqual(manifest.incremental_begin(end, 3), datetime(2025, 5, 20, 9, 0, 0))
+
+            manifest.add(('900001', '2025-05-20 11:40:00', 0), 'a/1.jpg', 3)
+            manifest.add(('900001', '2025-05-20 11:10:00', 0), 'a/2.jpg', 3)  # llegó tarde
+            manifest.add(('900002', '2025-05-20 11:20:00', 1), 'b/1.jpg', 3)
+            manifest.add(('900003', '2025-05-19 08:00:00', 0), 'c/1.jpg', 3)  # inactivo
+            # Guardar fotos no mueve las marcas: solo una descarga sin errores
+            self.assertIsNone(manifest.watermark('900001'))
+            self.assertEqual(manifest.advance_watermarks('2025-05-19 00:00:00', '2025-05-20 12:00:00'), 3)
+
+            self.assertEqual(manifest.watermark('900001'), '2025-05-20 11:40:00')
+            self.assertEqual(manifest.latest(), datetime(2025, 5, 20, 11, 40, 0))
+            # La marca más vieja entre los activos (900002) menos el solapamiento
+            self.assertEqual(manifest.incremental_begin(end, 3, overlap_minutes=15),
+                             datetime(2025, 5, 20, 11, 5, 0))
+            self.assertEqual(manifest.incremental_begin(end, 3, 15, devices=['900001']),
+                             datetime(2025, 5, 20, 11, 25, 0))
+            # Empresa sin marcas de agua propias: ventana completa
+            self.assertEqual(manifest.incremental_begin(end, 3, 15, devices=['900003']),
+                             datetime(2025, 5, 20, 9, 0, 0))
+
+    def test_watermark_does_not_skip_an_unfetched_gap(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            manifest.add(('900001', '2025-05-20 11:00:00', 0), 'a/1.jpg', 3)
+            manifest.advance_watermarks('2025-05-20 10:00:00', '2025-05-20 11:30:00')
+            manifest.add(('900001', '2025-05-20 12:10:00', 0), 'a/2.jpg', 3)
+
+            # La descarga empezó después de la marca: 11:00-12:00 no se revisó
+            self.assertEqual(manifest.advance_watermarks('2025-05-20 12:00:00', '2025-05-20 12:30:00'), 0)
+            self.assertEqual(manifest.watermark('900001'), '2025-05-20 11:00:00')
+            self.assertEqual(manifest.advance_watermarks('2025-05-20 10:45:00', '2025-05-20 12:30:00'), 1)
+            self.assertEqual(manifest.watermark('900001'), '2025-05-20 12:10:00')
+
+    def test_full_window_advances_devices_offline_longer_than_the_window(self):
+        end = datetime(2025, 5, 20, 12, 0, 0)
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            manifest.add(('900001', '2025-05-17 08:00:00', 0), 'a/1.jpg', 3)
+            manifest.advance_watermarks('2025-05-17 00:00:00', '2025-05-17 12:00:00')
+            manifest.add(('900001', '2025-05-20 11:00:00', 0), 'a/2.jpg', 3)
+
+            # Desconectado más que la ventana: se pide desde el piso
+            begin = manifest.incremental_begin(end, 3).strftime('%Y-%m-%d %H:%M:%S')
+            self.assertEqual(begin, '2025-05-20 09:00:00')
+            self.assertEqual(manifest.advance_watermarks(begin, '2025-05-20 12:00:00'), 0)
+            self.assertEqual(manifest.advance_watermarks('2025-05-20 10:00:00', '2025-05-20 12:00:00', 3), 0)
+            self.assertEqual(manifest.advance_watermarks(begin, '2025-05-20 12:00:00', 3), 1)
+            self.assertEqual(manifest.watermark('900001'), '2025-05-20 11:00:00')
+
+    def test_latest_reads_stored_photos(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = PhotoManifest(os.path.join(tmp, '.manifest.sqlite3'))
+            manifest.add(('900001', '2025-05-20 11:40:00', 0), 'a/1.jpg', 3)
+            manifest.add(('900002', '1747740000', 0), 'b/1.jpg', 3)  # fileTime sin formato
+
+            # Sin descargas completas no hay marcas, pero la foto está guardada
+            self.assertIsNone(manifest.watermark('900001'))
+            self.assertEqual(manifest.latest(), datetime(2025, 5, 20, 11, 40, 0))
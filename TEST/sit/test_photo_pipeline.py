@@ -0,0 +1,116 @@
+"""
+Tests del motor de descarga de fotos en pipeline (sit/photo_pipeline.py).
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+from django.test import SimpleTestCase
+
+from sit.photo_pipeline import (PhotoDownloadEngine, PhotoSaver, STATUS_DOWNLOADED, STATUS_EXISTS,
+                                empresa_predicate)
+
+from .fakes import photo_page
+
+
+class PhotoPipelineTestCase(SimpleTestCase):
+    """Tests del motor de descarga de fotos en pipeline"""
+
+    def test_next_page_is_listed_while_current_downloads(self):
+        page_two_listed = threading.Event()
+
+        def pages():
+            yield 1, photo_page(1, 2, [{'vehiIdno': '1001', 'devIdno': '900001', 'page': 1}])
+            page_two_listed.set()
+            yield 2, photo_page(2, 2, [{'vehiIdno': '1002', 'devIdno': '900002', 'page': 2}])
+
+        def save(photo):
+            # La foto de la página 1 no termina hasta que se listó la página 2
+            if photo['page'] == 1:
+                self.assertTrue(page_two_listed.wait(2))
+            return STATUS_DOWNLOADED
+
+        engine = PhotoDownloadEngine(workers=2)
+        run = engine.run(pages(), save)
+        engine.close()
+
+        self.assertEqual(run.status, 'completed')
+        self.assertEqual((run.stats['paginas'], run.stats['descargadas']), (2, 2))
+        self.assertEqual(run.progress, 100)
+        self.assertTrue(run.complete())
+
+    def test_filter_counts_and_bounded_queue(self):
+        photos = [{'vehiIdno': str(1000 + n), 'devIdno': f'C{900000 + n}'} for n in range(40)]
+        photos.append({'vehiIdno': '1', 'devIdno': 'x'})
+        # Empresa: fichas 1000-1019 más el dispositivo 900030
+        accept = empresa_predicate({'vehiIdnos': [str(1000 + n) for n in range(20)],
+                                    'devIdnos': [900030]})
+        listed, saved, ahead = [0], [0], []
+        lock = threading.Lock()
+
+        def pages():
+            for page in range(0, len(photos), 10):
+                chunk = photos[page:page + 10]
+                with lock:
+                    listed[0] += sum(1 for photo in chunk if photo['devIdno'] != 'x'
+                                     and accept(photo['vehiIdno'], photo['devIdno'][1:]))
+                yield page // 10 + 1, photo_page(page // 10 + 1, 5, chunk)
+
+        def save(photo):
+            time.sleep(0.005)
+            with lock:
+                saved[0] += 1
+                ahead.append(listed[0] - saved[0])
+            return STATUS_EXISTS if int(photo['vehiIdno']) % 2 else STATUS_DOWNLOADED
+
+        engine = PhotoDownloadEngine(workers=2, queue_size=3)
+        run = engine.run(pages(), save, accept)
+        engine.close()
+
+        stats = run.stats
+        self.assertEqual((stats['total_procesadas'], stats['incluidas'], stats['excluidas']), (41, 21, 19))
+        self.assertEqual((stats['descargadas'], stats['ya_existen'], stats['errores']), (11, 10, 1))
+        self.assertEqual(len(run.photos), 21)
+        # Completada pero con un error: no cuenta para las marcas de agua
+        self.assertEqual(run.status, 'completed')
+        self.assertFalse(run.complete())
+        # Nunca más de una página listada por delante de la cola y los workers
+        self.assertLessEqual(max(ahead), 10 + 3 + 2)
+
+    def test_photo_saver_and_cancel(self):
+        downloads = []
+
+        def download(url, path):
+            downloads.append(url)
+            with open(path, 'wb') as f:
+                f.write(b'jpg')
+            return True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            saver = PhotoSaver(tmp, lambda v, d: f'veh_{v}', lambda v, d, t: f'{t}.jpg',
+                               os.path.exists, download, lambda fpath: f'http://gps/dl?filePath={fpath}')
+            photo = {'vehiIdno': '1001', 'devIdno': '900001', 'fileTimeStr': 'f1', 'FPATH': '/a.jpg'}
+            self.assertEqual(saver(photo), STATUS_DOWNLOADED)
+            self.assertEqual(photo['local_path'], 'security_photos/veh_1001/f1.jpg')
+            self.assertEqual(saver(dict(photo)), STATUS_EXISTS)
+            self.assertIsNone(saver({'vehiIdno': '1001', 'devIdno': '1', 'fileTimeStr': 'f2'}))
+            self.assertEqual(downloads, ['http://gps/dl?filePath=/a.jpg'])
+
+        release = threading.Event()
+
+        def pages():
+            for page in range(1, 100):
+                yield page, photo_page(page, 99, [{'vehiIdno': str(page), 'devIdno': '1'}] * 5)
+
+        engine = PhotoDownloadEngine(workers=1, queue_size=2)
+        run = engine.submit(pages(), lambda photo: release.wait(2) and STATUS_DOWNLOADED)
+        time.sleep(0.05)
+        run.cancel()
+        release.set()
+        self.assertTrue(run.wait(5))
+        engine.close()
+        self.assertEqual(run.status, 'cancelled')
+        self.assertLess(run.stats['paginas'], 99)
+        self.assertEqual(run.stats['errores'], 0)
@@ -8,7 +8,6 @@ import time
 import threading
 import logging
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, List, Optional, Any, Callable
 
 from adapted_utils import (
@@ -16,6 +15,11 @@ from adapted_utils import (
     crear_nombre_carpeta_vehiculo, crear_nombre_archivo_foto,
     verificar_archivo_existe, download_and_save_image
 )
+from sit.citos_library import iter_pages
+from sit.photo_blobs import linked_blob_store
+from sit.photo_jobs import PhotoJobStore, get_photo_job_store
+from sit.photo_manifest import get_photo_manifest
+from sit.photo_pipeline import PhotoDownloadEngine, PhotoSaver, empresa_predicate
 
 logger = logging.getLogger(__name__)
 
@@ -47,7 +51,7 @@ class DownloadStatistics:
         self.ya_existen += page_stats.get('ya_existen', 0)
         self.descargadas += page_stats.get('descargadas', 0)
         self.errores += page_stats.get('errores', 0)
-        self.paginas_procesadas += 1
+        self.paginas_procesadas += page_stats.get('paginas', 1)
         
         if 'vehiculos' in page_stats:
             self.vehiculos_unicos.update(page_stats['vehiculos'])
@@ -135,6 +139,8 @@ class DownloadJob:
         self.error_message = None
         self.stats = None
         self.all_photos = []
+        self.pipeline = None  # PipelineRun del motor de descarga
+        self.checkpoint = None  # PhotoJob con el avance persistido
         
         # Callbacks para actualizar GUI
         self.progress_callback = None
@@ -193,6 +199,12 @@ class DownloadJob:
             except Exception as e:
                 logger.error(f"❌ Error en error_callback: {e}")
     
+    def cancel(self):
+        """Cancelar el trabajo: detiene el listado y descarta las fotos en cola"""
+        self.status = 'cancelled'
+        if self.pipeline is not None:
+            self.pipeline.cancel()
+    
     def get_duration(self):
         """Obtener duración del trabajo"""
         if self.start_time:
@@ -206,6 +218,19 @@ class DownloadManager:
     def __init__(self):
         self.active_jobs = {}
         self.job_counter = 0
+        self._engine = None
+        self._engine_lock = threading.Lock()
+    
+    @property
+    def engine(self) -> PhotoDownloadEngine:
+        """Pool de workers de descarga compartido por todos los trabajos"""
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = PhotoDownloadEngine(
+                    workers=get_config('download.max_workers', 15),
+                    queue_size=get_config('download.queue_size', None)
+                )
+            return self._engine
     
     def create_job(self) -> DownloadJob:
         """Crear un nuevo trabajo de descarga"""
@@ -219,14 +244,22 @@ class DownloadManager:
         """Obtener trabajo por ID"""
         return self.active_jobs.get(job_id)
     
-    def start_download(self, begin_time: str, end_time: str, empresa_filter: Dict = None) -> DownloadJob:
-        """Iniciar nueva descarga"""
+    def start_download(self, begin_time: str, end_time: str, empresa_filter: Dict = None,
+                       checkpoint: bool = True, window_hours: float = None) -> DownloadJob:
+        """
+        Iniciar nueva descarga
+        
+        Con ``checkpoint`` el avance por página se persiste para retomar el
+        rango (descargas por rango fijo); las incrementales no lo usan, las
+        retoma la marca de agua. ``window_hours`` es la ventana con la que se
+        calculó el rango (ver PhotoManifest.advance_watermarks).
+        """
         job = self.create_job()
         
         # Iniciar descarga en thread separado
         thread = threading.Thread(
             target=self._background_download_process,
-            args=(job, begin_time, end_time, empresa_filter),
+            args=(job, begin_time, end_time, empresa_filter, checkpoint, window_hours),
             daemon=True
         )
         thread.start()
@@ -234,7 +267,9 @@ class DownloadManager:
         logger.info(f"🚀 Descarga iniciada: {job.job_id}")
         return job
     
-    def _background_download_process(self, job: DownloadJob, begin_time: str, end_time: str, empresa_filter: Dict = None):
+    def _background_download_process(self, job: DownloadJob, begin_time: str, end_time: str,
+                                     empresa_filter: Dict = None, checkpoint: bool = True,
+                                     window_hours: float = None):
         """Proceso de descarga en background"""
         try:
             job.status = 'running'
@@ -245,8 +280,7 @@ class DownloadManager:
             global_stats = DownloadStatistics()
             
             # Crear directorio base
-            base_dir = get_config('download.base_directory', 'downloads/fotos')
-            photos_dir = os.path.join(base_dir, 'security_photos')
+            photos_dir = _photos_directory()
             os.makedirs(photos_dir, exist_ok=True)
             
             job.update_progress(5, "Obteniendo información de fotos...")
@@ -267,42 +301,67 @@ class DownloadManager:
                 return
             
             job.total_photos = total_records
-            job.update_progress(10, f'Procesando {total_records} fotos en {total_pages} páginas...')
-            
-            all_photos = []
-            
-            # Procesar primera página
-            self._process_photos_page_with_filter(
-                first_page_result, photos_dir, all_photos, global_stats, empresa_filter, job
-            )
             
-            job.update_progress(15, f"Página 1/{total_pages} completada")
+            # Avance persistido por página: tras un reinicio o una cancelación la
+            # misma descarga sigue desde las páginas pendientes
+            done_pages = set()
+            if checkpoint:
+                job.checkpoint = _job_store().open(
+                    begin_time, end_time,
+                    empresa_filter['empresa_info']['id'] if empresa_filter else None,
+                    page_records=10
+                )
+                done_pages = job.checkpoint.plan(total_records, total_pages)
+            if done_pages:
+                job.update_progress(10, f'Retomando: {len(done_pages)}/{total_pages} páginas ya completas...')
+            else:
+                job.update_progress(10, f'Procesando {total_records} fotos en {total_pages} páginas...')
             
-            # Procesar páginas restantes
-            for page in range(2, total_pages + 1):
+            def fetch_page(page):
                 page_result = query_security_photos(begin_time, end_time, page, 10)
-                
                 if not page_result or page_result.get('result') != 0:
                     logger.warning(f"⚠️ Error en página {page}, continuando...")
-                    continue
-                
-                self._process_photos_page_with_filter(
-                    page_result, photos_dir, all_photos, global_stats, empresa_filter, job
-                )
-                
-                # Actualizar progreso
-                progress = 15 + int((page / total_pages) * 80)  # 15-95%
+                    return None
+                return page_result
+            
+            def on_progress(run):
                 elapsed = time.time() - job.start_time
-                estimated_total = (elapsed / page) * total_pages
-                remaining = max(0, estimated_total - elapsed)
-                
+                processed = run.processed
+                remaining = elapsed / processed * (total_records - processed) if processed else 0
                 job.update_progress(
-                    progress,
-                    f"Página {page}/{total_pages} - {len(all_photos)} fotos - "
-                    f"Restante: {timedelta(seconds=int(remaining))}",
-                    len(all_photos)
+                    10 + int(run.progress * 0.85),  # 10-95%
+                    f"Página {run.stats['paginas']}/{total_pages} - {len(run.photos)} fotos - "
+                    f"Restante: {timedelta(seconds=int(max(0, remaining)))}",
+                    len(run.photos)
                 )
             
+            # Listado y descargas en pipeline: la página siguiente se lista mientras
+            # los workers persistentes descargan la actual
+            pages = iter_pages(fetch_page, prefetch=get_config('download.page_prefetch', 2),
+                               first_page=first_page_result, skip_pages=done_pages)
+            if job.checkpoint is not None:
+                run = self.engine.submit(pages, self._photo_saver(photos_dir),
+                                         empresa_predicate(empresa_filter),
+                                         job.checkpoint.track(on_progress), job.checkpoint.mark_page)
+            else:
+                run = self.engine.submit(pages, self._photo_saver(photos_dir),
+                                         empresa_predicate(empresa_filter), on_progress)
+            job.pipeline = run
+            if job.status == 'cancelled':
+                run.cancel()
+            run.wait()
+            if run.complete(len(done_pages)):
+                # Sin errores en todo el rango: recién ahora avanzan las marcas de agua
+                self._photo_manifest(photos_dir).advance_watermarks(begin_time, end_time, window_hours)
+            
+            all_photos = run.photos
+            global_stats.add_page_stats(run.stats)
+            if run.error:
+                raise RuntimeError(run.error)
+            if run.cancelled:
+                logger.info(f"❌ Descarga {job.job_id} cancelada: {len(all_photos)} fotos guardadas")
+                return
+            
             # Finalizar estadísticas
             global_stats.finalize()
             
@@ -326,145 +385,36 @@ class DownloadManager:
             logger.error(f"❌ Error en descarga: {e}", exc_info=True)
             job.error(f"Error en descarga: {str(e)}")
     
-    def _process_photos_page_with_filter(self, page_result, photos_dir, all_photos, global_stats, empresa_filter, job):
-        """Procesar página de fotos con filtro de empresa"""
-        prephotos = page_result.get('infos', [])
-        photos_to_download = []
-        
-        page_stats = {
-            'total_procesadas': 0,
-            'incluidas': 0,
-            'excluidas': 0,
-            'ya_existen': 0,
-            'descargadas': 0,
-            'errores': 0,
-            'vehiculos': set(),
-            'dispositivos': set()
-        }
-        
-        # Aplicar filtro de empresa
-        for photo in prephotos:
-            page_stats['total_procesadas'] += 1
-            
-            try:
-                devIdno_raw = photo.get('devIdno', '0')
-                devIdno = int(str(devIdno_raw).replace('C', '').replace('c', ''))
-                vehiIdno = str(photo.get('vehiIdno', ''))
-                
-                # Verificar filtro de empresa
-                if empresa_filter:
-                    fichas_validas = empresa_filter.get('vehiIdnos', [])
-                    devices_validos = [str(d) for d in empresa_filter.get('devIdnos', [])]
-                    
-                    ficha_valida = vehiIdno in fichas_validas
-                    device_valido = str(devIdno) in devices_validos
-                    
-                    if not (ficha_valida or device_valido):
-                        page_stats['excluidas'] += 1
-                        continue
-                
-                # La foto pasa el filtro
-                photos_to_download.append(photo)
-                page_stats['incluidas'] += 1
-                page_stats['vehiculos'].add(vehiIdno)
-                page_stats['dispositivos'].add(str(devIdno))
-                
-            except ValueError:
-                page_stats['errores'] += 1
-                logger.error(f"❌ Error interpretando devIdno: {photo.get('devIdno')}")
-                continue
-        
-        # Descargar fotos en paralelo
-        max_workers = get_config('download.max_workers', 15)
-        
-        def download_single_photo(photo_info):
-            return self._download_photo_optimized(photo_info, photos_dir, page_stats)
-        
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = [executor.submit(download_single_photo, photo) for photo in photos_to_download]
-            
-            for future in futures:
-                try:
-                    result = future.result(timeout=30)
-                    if result:
-                        all_photos.append(result)
-                except Exception as e:
-                    page_stats['errores'] += 1
-                    logger.error(f"❌ Error en descarga individual: {e}")
-        
-        # Agregar estadísticas de página
-        global_stats.add_page_stats(page_stats)
-        
-        # Log de página
-        empresa_nombre = "Todas"
-        if empresa_filter:
-            empresa_nombre = empresa_filter['empresa_info']['nombre']
-        
-        logger.info(f"""
-📊 ESTADÍSTICAS PÁGINA - {empresa_nombre}:
-├── Total procesadas: {page_stats['total_procesadas']}
-├── ✅ Incluidas: {page_stats['incluidas']}
-├── 🚫 Excluidas: {page_stats['excluidas']}
-├── ⏭️ Ya existían: {page_stats['ya_existen']}
-├── 📥 Descargadas: {page_stats['descargadas']}
-└── 💥 Errores: {page_stats['errores']}
-""")
+    def _photo_manifest(self, photos_dir: str):
+        return get_photo_manifest(photos_dir, get_config('download.manifest_path') or None)
     
-    def _download_photo_optimized(self, photo_info, photos_dir, page_stats):
-        """Descargar foto individual optimizada"""
-        try:
-            vehiIdno = photo_info.get('vehiIdno')
-            devIdno = photo_info.get('devIdno')
-            fileTimeStr = photo_info.get('fileTimeStr')
-            
-            # Crear directorio del vehículo
-            vehicle_folder = crear_nombre_carpeta_vehiculo(vehiIdno, devIdno)
-            vehicle_dir = os.path.join(photos_dir, vehicle_folder)
-            os.makedirs(vehicle_dir, exist_ok=True)
-            
-            # Generar nombre de archivo
-            file_name = crear_nombre_archivo_foto(vehiIdno, devIdno, fileTimeStr)
-            file_path = os.path.join(vehicle_dir, file_name)
-            
-            # Verificar si ya existe
-            if verificar_archivo_existe(file_path):
-                page_stats['ya_existen'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            
-            # Obtener URL de descarga
-            download_url = photo_info.get('downloadUrl')
-            if not download_url:
-                file_path_api = photo_info.get('FPATH')
-                if file_path_api:
-                    base_url = get_config('gps.base_url', 'http://190.183.254.253:8088')
-                    jsession = get_config('gps.current_session')
-                    download_url = f"{base_url}/StandardApiAction_downloadFile.action?jsession={jsession}&filePath={file_path_api}"
-                else:
-                    page_stats['errores'] += 1
-                    return None
-            
-            # Descargar
-            if download_and_save_image(download_url, file_path):
-                page_stats['descargadas'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            else:
-                page_stats['errores'] += 1
-                return None
-                
-        except Exception as e:
-            page_stats['errores'] += 1
-            logger.error(f"💥 Error descargando {vehiIdno}-{devIdno}: {e}")
-            return None
+    def _photo_saver(self, photos_dir: str) -> PhotoSaver:
+        """PhotoSaver con los nombres de archivo y la sesión de la app de escritorio"""
+        def file_url(file_path_api):
+            base_url = get_config('gps.base_url', 'http://190.183.254.253:8088')
+            jsession = get_config('gps.current_session')
+            return f"{base_url}/StandardApiAction_downloadFile.action?jsession={jsession}&filePath={file_path_api}"
+        
+        return PhotoSaver(
+            photos_dir,
+            folder_name=crear_nombre_carpeta_vehiculo,
+            file_name=crear_nombre_archivo_foto,
+            file_exists=verificar_archivo_existe,
+            download=download_and_save_image,
+            file_url=file_url,
+            manifest=self._photo_manifest(photos_dir),
+            blobs=linked_blob_store(photos_dir) if get_config('download.blob_store', True) else None
+        )
 
 # Instancia global del gestor de descargas
 download_manager = DownloadManager()
 
-def start_download_job(begin_time: str, end_time: str, empresa_id: str = None) -> DownloadJob:
-    """Función principal para iniciar una descarga"""
-    
-    # Obtener filtro de empresa si se especifica
+def _photos_directory() -> str:
+    base_dir = get_config('download.base_directory', 'downloads/fotos')
+    return os.path.join(base_dir, 'security_photos')
+
+def _empresa_filter(empresa_id: str = None) -> Optional[Dict]:
+    """Filtro de empresa (fichas y dispositivos) o None para todas"""
     empresa_filter = None
     if empresa_id:
         # 🔧 FIX: Convertir a string y limpiar
@@ -480,12 +430,75 @@ def start_download_job(begin_time: str, end_time: str, empresa_id: str = None) -
                 raise ValueError(f"La empresa seleccionada no tiene vehículos activos")
     else:
         logger.info("🌐 Descarga sin filtro de empresa")
+    return empresa_filter
+
+def _job_store() -> PhotoJobStore:
+    return get_photo_job_store(_photos_directory(), get_config('download.manifest_path') or None)
+
+def resume_download_job() -> Optional[DownloadJob]:
+    """
+    Retoma la descarga más reciente que quedó sin terminar (reinicio de la
+    app o del servicio, cancelación); None si no hay ninguna
+    """
+    store = _job_store()
+    pending = store.pending(max_age=get_config('download.job_max_age_hours', 72) * 3600)
+    # La primera que se pueda tomar (otro proceso puede haberla retomado recién)
+    saved = next(filter(None, (store.claim(job.job_id) for job in pending)), None)
+    if saved is None:
+        return None
+    logger.info(
+        f"♻️ Retomando descarga {saved.begin_time} → {saved.end_time}: "
+        f"{len(saved.done_pages)}/{saved.total_pages} páginas ya completas"
+    )
+    return download_manager.start_download(saved.begin_time, saved.end_time,
+                                           _empresa_filter(saved.empresa))
+
+def start_download_job(begin_time: str, end_time: str, empresa_id: str = None,
+                       checkpoint: bool = True) -> DownloadJob:
+    """
+    Función principal para iniciar una descarga
+    
+    ``checkpoint=False`` para los rangos que terminan "ahora" (descargas
+    programadas): cambian en cada ejecución y su avance no se podría retomar.
+    """
+    empresa_filter = _empresa_filter(empresa_id)
     
     # Iniciar descarga
-    job = download_manager.start_download(begin_time, end_time, empresa_filter)
+    job = download_manager.start_download(begin_time, end_time, empresa_filter, checkpoint)
     
     return job
 
+def start_incremental_download_job(max_hours: float, empresa_id: str = None) -> DownloadJob:
+    """
+    Descarga solo las fotos posteriores a la marca de agua de los dispositivos
+    (``max_hours`` como ventana máxima, ver sit/photo_manifest.py)
+    """
+    empresa_filter = _empresa_filter(empresa_id)
+    
+    photos_dir = _photos_directory()
+    manifest = get_photo_manifest(photos_dir, get_config('download.manifest_path') or None)
+    devices = None
+    if empresa_filter:
+        devices = {str(device) for device in empresa_filter.get('devIdnos', [])}
+    
+    end_time = datetime.now().replace(microsecond=0)
+    begin_time = manifest.incremental_begin(
+        end_time, max_hours,
+        overlap_minutes=get_config('download.watermark_overlap_minutes', 30),
+        devices=devices
+    )
+    logger.info(f"📅 Descarga incremental desde {begin_time:%Y-%m-%d %H:%M:%S}")
+    
+    # Sin punto de control: el rango termina "ahora" y cambia en cada ejecución;
+    # si se corta, la próxima sigue desde la marca de agua (que no avanzó)
+    return download_manager.start_download(
+        begin_time.strftime("%Y-%m-%d %H:%M:%S"),
+        end_time.strftime("%Y-%m-%d %H:%M:%S"),
+        empresa_filter,
+        checkpoint=False,
+        window_hours=max_hours
+    )
+
 def get_download_job(job_id: str) -> Optional[DownloadJob]:
     """Obtener trabajo de descarga por ID"""
     return download_manager.get_job(job_id)
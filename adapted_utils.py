@@ -17,9 +17,18 @@ from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from urllib.parse import urlencode
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from sit.http_pool import get_http_session, configure_http_pool
+from sit.citos_cache import ResponseCache
+from sit.citos_resilience import configure_resilience, get_default_policy, CircuitOpenError
+from sit.citos_cassette import configure_cassette
+from sit.citos_session_broker import configure_session_broker, get_session_broker, FileSessionStore
+from sit.citos_library import APIError, download_to_file
+from sit.citos_metrics import get_metrics
+
 # Configuración global (reemplaza Django settings)
 global_config = {}
 simple_cache = {}  # Reemplaza Django cache
+response_cache = ResponseCache()  # Cache en memoria de respuestas GPS (vehículos/empresas)
 current_session = None  # Reemplaza settings.JSESSION_GPS
 
 # Logger
@@ -32,6 +41,36 @@ def load_config(config_path="config.json"):
         with open(config_path, 'r', encoding='utf-8') as f:
             global_config = json.load(f)
         logger.info("✅ Configuración cargada correctamente")
+        
+        # Pool de conexiones keep-alive: al menos una conexión por worker de descarga
+        max_workers = get_config('download.max_workers', 15)
+        configure_http_pool(
+            pool_maxsize=get_config('gps.pool_size', max(32, max_workers + 5))
+        )
+        
+        # Limitador, reintentos y circuit breaker hacia el servidor GPS
+        configure_resilience(
+            rate_limit=get_config('gps.rate_limit', 20),
+            retry_attempts=get_config('gps.retry_attempts', 3),
+            failure_threshold=get_config('gps.circuit_failures', 5)
+        )
+        
+        # Grabación o reproducción del tráfico GPS (benchmarks)
+        cassette_mode = get_config('gps.cassette_mode', '')
+        if cassette_mode:
+            configure_cassette(
+                cassette_mode,
+                get_config('gps.cassette_path', 'gps_cassette.jsonl.gz'),
+                speed=get_config('gps.cassette_speed', 1.0)
+            )
+        
+        # Sesión GPS compartida entre instancias de la app (archivo con lock)
+        broker = configure_session_broker(
+            FileSessionStore(get_config('gps.session_file', 'gps_session.json')),
+            lambda: _request_login(get_config('gps.account'), get_config('gps.password')),
+            ttl=get_config('gps.session_ttl', 1800)
+        )
+        broker.subscribe(_set_current_session)
         return True
     except Exception as e:
         logger.error(f"❌ Error cargando configuración: {e}")
@@ -76,15 +115,14 @@ def set_config(key_path, value):
 # FUNCIONES GPS ORIGINALES ADAPTADAS
 # =========================================================================
 
-def gps_login(account: str = None, password: str = None) -> str:
-    """Login GPS adaptado para standalone"""
+def _set_current_session(jsession):
+    """Espejo del jsession del broker en current_session y config"""
     global current_session
-    
-    if not account:
-        account = get_config('gps.account')
-    if not password:
-        password = get_config('gps.password')
-    
+    current_session = jsession
+    set_config('gps.current_session', jsession)
+
+def _request_login(account: str, password: str) -> Optional[str]:
+    """Hace la petición de login y retorna el jsession (None si falla)"""
     if not account or not password:
         logger.error("❌ Credenciales GPS no configuradas")
         return None
@@ -104,15 +142,13 @@ def gps_login(account: str = None, password: str = None) -> str:
 
     try:
         gps_url_login = f"{base_url}/StandardApiAction_login.action"
-        response = requests.post(gps_url_login, data=payload, headers=headers, timeout=timeout)        
+        response = get_http_session().post(gps_url_login, data=payload, headers=headers, timeout=timeout)        
 
         if response.headers.get("Content-Type", "").startswith("application/json"):
             data = response.json()
             if data.get("result") == 0:
-                current_session = data["jsession"]
-                set_config('gps.current_session', current_session)
-                logger.info(f"✅ Login GPS exitoso: {current_session[:10]}...")
-                return current_session
+                logger.info(f"✅ Login GPS exitoso: {data['jsession'][:10]}...")
+                return data["jsession"]
             else:
                 logger.error(f"❌ Error en login GPS: {data.get('msg')}")
                 return None
@@ -123,6 +159,29 @@ def gps_login(account: str = None, password: str = None) -> str:
         logger.error(f"❌ Excepción en login GPS: {e}")
         return None
 
+def gps_login(account: str = None, password: str = None) -> str:
+    """Login GPS adaptado para standalone (login explícito, se comparte por el broker)"""
+    jsession = _request_login(account or get_config('gps.account'),
+                              password or get_config('gps.password'))
+    if jsession:
+        broker = get_session_broker()
+        if broker is not None:
+            broker.publish(jsession)
+        else:
+            _set_current_session(jsession)
+    return jsession
+
+def renew_session(stale: Optional[str]) -> Optional[str]:
+    """
+    Renueva la sesión tras un rechazo del servidor (código 5)
+    
+    Si otra instancia ya la renovó se reutiliza esa en lugar de hacer login.
+    """
+    broker = get_session_broker()
+    if broker is None:
+        return gps_login()
+    return broker.refresh(stale)
+
 def logout_api(jsession=None):
     """Logout GPS adaptado"""
     global current_session
@@ -142,13 +201,15 @@ def logout_api(jsession=None):
     params = {"jsession": jsession}
     
     try:
-        response = requests.get(url, params=params, timeout=timeout)      
+        response = get_http_session().get(url, params=params, timeout=timeout)      
         response.raise_for_status()
         result = response.json()
         
-        # Limpiar sesión local
-        current_session = None
-        set_config('gps.current_session', None)
+        # Limpiar sesión local y compartida
+        broker = get_session_broker()
+        if broker is not None:
+            broker.clear()
+        _set_current_session(None)
         
         logger.info("✅ Logout GPS exitoso")
         return result
@@ -161,6 +222,12 @@ def ensure_gps_session():
     """Asegurar que tenemos una sesión GPS válida"""
     global current_session
     
+    # Sesión compartida: el broker hace login solo si no hay una vigente
+    broker = get_session_broker()
+    if broker is not None:
+        current_session = broker.get()
+        return current_session is not None
+    
     # Intentar cargar sesión desde config
     if not current_session:
         current_session = get_config('gps.current_session')
@@ -189,7 +256,7 @@ def obtener_vehiculos():
     }
 
     try:
-        response = requests.get(url, params=params, timeout=timeout)
+        response = get_http_session().get(url, params=params, timeout=timeout)
         response.raise_for_status()
         data = response.json()
         
@@ -197,11 +264,11 @@ def obtener_vehiculos():
         if data.get("result") in [2, 4, 5] or 'error' in data.get("errmsg", "").lower():
             logger.warning("⚠️ Sesión GPS expirada. Intentando reconexión...")
             
-            # Intentar nuevo login
-            current_session = gps_login()
+            # Renovar por el broker (reutiliza la de otra instancia si ya la renovó)
+            current_session = renew_session(params["jsession"])
             if current_session:
                 params["jsession"] = current_session
-                response = requests.get(url, params=params, timeout=timeout)
+                response = get_http_session().get(url, params=params, timeout=timeout)
                 response.raise_for_status()
                 data = response.json()
         
@@ -215,11 +282,11 @@ def obtener_vehiculos():
         # Intentar reconexión en caso de error
         try:
             logger.info("🔄 Intentando reconexión debido a error...")
-            current_session = gps_login()
+            current_session = renew_session(params["jsession"])
             
             if current_session:
                 params["jsession"] = current_session
-                response = requests.get(url, params=params, timeout=timeout)
+                response = get_http_session().get(url, params=params, timeout=timeout)
                 response.raise_for_status()
                 data = response.json()
                 
@@ -240,13 +307,19 @@ def obtener_empresas_disponibles():
         if not ensure_gps_session():
             return [], []
         
-        response = requests.get(
-            f"{base_url}/StandardApiAction_queryUserVehicle.action",
-            params={"jsession": current_session, "language": "es"},
-            timeout=timeout
-        )
-        response.raise_for_status()
-        data = response.json()
+        endpoint = "StandardApiAction_queryUserVehicle.action"
+        params = {"jsession": current_session, "language": "es"}
+        
+        def fetch():
+            response = get_http_session().get(f"{base_url}/{endpoint}", params=params, timeout=timeout)
+            response.raise_for_status()
+            data = response.json()
+            if data.get("result", 0) != 0:
+                raise ValueError(f"API error: {data.get('result')}")
+            return data
+        
+        # El listado de la flota cambia poco: se reutiliza entre consultas por empresa
+        data = response_cache.get_or_fetch(endpoint, params, fetch)
 
         companys = data.get("companys", [])
         vehiculos_data = data.get("vehicles", [])
@@ -415,22 +488,13 @@ def download_and_save_image(url, full_file_path):
     timeout = get_config('download.timeout', 50)
     
     try:
-        response = requests.get(url, timeout=timeout)
-        response.raise_for_status()
-        
-        with open(full_file_path, 'wb') as f:
-            f.write(response.content)
-        
-        if os.path.getsize(full_file_path) > 0:
-            logger.debug(f"✅ Descargado: {os.path.basename(full_file_path)}")
-            return True
-        else:
-            logger.error(f"❌ Archivo descargado está vacío: {full_file_path}")
-            os.remove(full_file_path)
-            return False
+        # Streaming a archivo temporal, con reanudación y renombrado atómico
+        download_to_file(url, full_file_path, timeout=timeout)
+        logger.debug(f"✅ Descargado: {os.path.basename(full_file_path)}")
+        return True
             
-    except requests.RequestException as e:
-        logger.error(f"🌐 Error descargando {url}: {e}")
+    except APIError as e:
+        logger.error(f"🌐 Error descargando {url}: {e} {e.details or ''}")
         return False
     except IOError as e:
         logger.error(f"💾 Error escribiendo archivo {full_file_path}: {e}")
@@ -441,30 +505,50 @@ def download_and_save_image(url, full_file_path):
 # =========================================================================
 
 class AlarmAPIError(Exception):
-    pass
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code  # Código 'result' de la API, si lo hay
 
 def make_request(endpoint, params, method="GET"):
-    """Hacer petición HTTP al servidor GPS"""
+    """Hacer petición HTTP al servidor GPS (con limitador, reintentos y circuit breaker)"""
     base_url = get_config('gps.base_url', 'http://190.183.254.253:8088')
     timeout = get_config('gps.timeout', 30)
     
     url = f"{base_url}/{endpoint}"
     
-    try:
-        if method.upper() == "POST":
-            response = requests.post(url, data=params, timeout=timeout)
-        else:
-            response = requests.get(url, params=params, timeout=timeout)
+    def send():
+        started = time.perf_counter()
+        code, nbytes = 24, 0
+        try:
+            if method.upper() == "POST":
+                response = get_http_session().post(url, data=params, timeout=timeout)
+            else:
+                response = get_http_session().get(url, params=params, timeout=timeout)
 
-        response.raise_for_status()
-        data = response.json()
+            response.raise_for_status()
+            nbytes, code = len(response.content), 6
+            data = response.json()
+            code = data.get("result")
+        finally:
+            get_metrics().record_request(endpoint, time.perf_counter() - started, nbytes, code)
         
         if data.get("result") != 0:
-            raise AlarmAPIError(f"API error: {data}")
+            raise AlarmAPIError(f"API error: {data}", code=data.get("result"))
             
         return data
+    
+    try:
+        try:
+            return get_default_policy().execute(send, action=endpoint)
+        except AlarmAPIError as e:
+            # Sesión vencida: renovar por el broker y reintentar una vez
+            new_session = renew_session(params["jsession"]) if e.code == 5 and params.get("jsession") else None
+            if not new_session:
+                raise
+            params = dict(params, jsession=new_session)
+            return get_default_policy().execute(send, action=endpoint)
         
-    except (requests.RequestException, ValueError) as e:
+    except (requests.RequestException, ValueError, CircuitOpenError) as e:
         raise AlarmAPIError(f"Request failed: {e}")
 
 def query_security_photos(
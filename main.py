@@ -25,7 +25,7 @@ from adapted_utils import (
     obtener_vehiculos_por_empresa, query_security_photos
 )
 from adapted_downloader import (
-    start_download_job, get_download_job, DownloadJob
+    start_download_job, start_incremental_download_job, resume_download_job, get_download_job, DownloadJob
 )
 
 # Configurar logging
@@ -98,12 +98,21 @@ class StreamBusDownloader:
                 "base_url": "http://190.183.254.253:8088",
                 "account": "",
                 "password": "",
-                "timeout": 30
+                "timeout": 30,
+                "pool_size": 32,
+                "rate_limit": 20,
+                "retry_attempts": 3,
+                "circuit_failures": 5
             },
             "download": {
                 "base_directory": os.path.join(os.getcwd(), "downloads", "fotos"),
                 "max_workers": 15,
-                "concurrent_downloads": 10
+                "concurrent_downloads": 10,
+                "incremental": True,
+                "watermark_overlap_minutes": 30,
+                "resume_on_startup": True,
+                "job_max_age_hours": 72,
+                "blob_store": True
             },
             "automation": {
                 "enabled": False,
@@ -1184,12 +1193,17 @@ RESULTADO: {'✅ CONFIGURACIÓN OK' if all([get_config('gps.account'), get_confi
             if get_config('automation.smart_scheduling', True):
                 self.pause_scheduler()
             
-            # Iniciar descarga
-            self.current_job = start_download_job(
-                start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                end_time.strftime("%Y-%m-%d %H:%M:%S"),
-                empresa_id
-            )
+            # Iniciar descarga: primero la que quedó cortada por un reinicio de la app
+            # o del servicio (sigue desde las páginas pendientes)
+            self.current_job = None
+            if get_config('download.resume_on_startup', True):
+                self.current_job = resume_download_job()
+            if self.current_job is None:
+                self.current_job = start_download_job(
+                    start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    end_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    empresa_id
+                )
             
             # Configurar callbacks
             self.current_job.set_callbacks(
@@ -1605,7 +1619,7 @@ RESULTADO: {'✅ CONFIGURACIÓN OK' if all([get_config('gps.account'), get_confi
     def cancel_download(self):
         """Cancelar descarga actual"""
         if self.current_job:
-            self.current_job.status = 'cancelled'
+            self.current_job.cancel()
             self.current_job = None
             
             # Marcar fin de descarga
@@ -1718,12 +1732,16 @@ RESULTADO: {'✅ CONFIGURACIÓN OK' if all([get_config('gps.account'), get_confi
             if empresa_id_raw is not None:
                 empresa_id = str(empresa_id_raw)  # Convertir a string siempre
             
-            # Iniciar descarga
-            self.current_job = start_download_job(
-                start_time.strftime("%Y-%m-%d %H:%M:%S"),
-                end_time.strftime("%Y-%m-%d %H:%M:%S"),
-                empresa_id
-            )
+            # Iniciar descarga: solo lo nuevo desde la marca de agua (hours_back como máximo)
+            if get_config('download.incremental', True):
+                self.current_job = start_incremental_download_job(hours_back, empresa_id)
+            else:
+                self.current_job = start_download_job(
+                    start_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    end_time.strftime("%Y-%m-%d %H:%M:%S"),
+                    empresa_id,
+                    checkpoint=False
+                )
             
             # Configurar callbacks inteligentes
             self.current_job.set_callbacks(
@@ -1,14 +1,106 @@
+import logging
+
 from django.apps import AppConfig
 from django.conf import settings
 
+logger = logging.getLogger(__name__)
+
+# Backends de cache que no se comparten entre procesos
+PROCESS_LOCAL_CACHES = frozenset({
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+})
+
+
+def gps_session_store(cache):
+    """
+    Almacén de la sesión GPS compartida según GPS_SESSION_STORE
+    
+    Con 'cache' sobre una cache local del proceso (LocMemCache, DummyCache)
+    cada proceso tendría su propia sesión: se usa el archivo en su lugar.
+    """
+    from .citos_session_broker import CacheSessionStore, FileSessionStore
+    
+    session_file = getattr(settings, 'GPS_SESSION_FILE', 'gps_session.json')
+    if getattr(settings, 'GPS_SESSION_STORE', 'cache') == 'file':
+        return FileSessionStore(session_file)
+    
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in PROCESS_LOCAL_CACHES:
+        logger.warning(f"⚠️ La cache por defecto ({backend.rsplit('.', 1)[-1]}) no se comparte entre "
+                       f"procesos: la sesión GPS se guarda en {session_file}")
+        return FileSessionStore(session_file)
+    return CacheSessionStore(cache, ttl=getattr(settings, 'GPS_SESSION_TTL', 1800))
+
 
 class SitConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "sit"
 
     def ready(self):
-        from .utils import gps_login
+        from django.core.cache import cache
+        from .http_pool import configure_http_pool
+        from .citos_resilience import configure_resilience, get_default_policy
+        from .citos_cassette import configure_cassette
+        from .citos_shadow import configure_shadow
+        from .photo_pipeline import configure_photo_engine
+        from .citos_session_broker import configure_session_broker, make_login
+        
+        # Pool de conexiones compartido antes del primer login
+        configure_http_pool(
+            pool_connections=getattr(settings, 'GPS_HTTP_POOL_CONNECTIONS', 4),
+            pool_maxsize=getattr(settings, 'GPS_HTTP_POOL_SIZE', 32)
+        )
+        
+        # Limitador, reintentos y circuit breaker hacia el servidor GPS
+        configure_resilience(
+            rate_limit=getattr(settings, 'GPS_RATE_LIMIT', 20),
+            burst=getattr(settings, 'GPS_RATE_BURST', 40),
+            retry_attempts=getattr(settings, 'GPS_RETRY_ATTEMPTS', 3),
+            failure_threshold=getattr(settings, 'GPS_CIRCUIT_FAILURES', 5),
+            reset_timeout=getattr(settings, 'GPS_CIRCUIT_RESET', 30)
+        )
+        
+        # Grabación o reproducción del tráfico GPS (antes del login para incluirlo)
+        cassette_mode = getattr(settings, 'GPS_CASSETTE_MODE', '')
+        if cassette_mode:
+            configure_cassette(
+                cassette_mode,
+                getattr(settings, 'GPS_CASSETTE_PATH', 'gps_cassette.jsonl.gz'),
+                speed=getattr(settings, 'GPS_CASSETTE_SPEED', 1.0)
+            )
+        
+        # Comparación en sombra entre las rutas citos y legacy
+        configure_shadow(
+            getattr(settings, 'GPS_SHADOW_SAMPLE_RATE', 0.0),
+            workers=getattr(settings, 'GPS_SHADOW_WORKERS', 2),
+            functions=getattr(settings, 'GPS_SHADOW_FUNCTIONS', None) or None
+        )
+        
+        # Pool de workers de descarga de fotos compartido por vistas, Celery y comandos
+        configure_photo_engine(
+            workers=getattr(settings, 'DOWNLOAD_OPTIMIZATION', {}).get('MAX_DOWNLOAD_WORKERS', 15),
+            queue_size=getattr(settings, 'PHOTO_DOWNLOAD_QUEUE', 100)
+        )
+        
         # Usar credenciales desde settings (que vienen de .env)
         gps_account = getattr(settings, 'GPS_ACCOUNT', 'admin')
         gps_password = getattr(settings, 'GPS_PASSWORD', '')
-        settings.JSESSION_GPS = gps_login(gps_account, gps_password)
\ No newline at end of file
+        
+        # Sesión GPS única para web, Celery y comandos: se reutiliza la guardada
+        # por otro proceso y solo se hace login si no hay una vigente
+        broker = configure_session_broker(
+            gps_session_store(cache),
+            make_login(
+                getattr(settings, 'GPS_BASE_URL', 'http://190.183.254.253:8088'),
+                gps_account, gps_password,
+                timeout=getattr(settings, 'GPS_TIMEOUT', 30),
+                verify_ssl=getattr(settings, 'GPS_VERIFY_SSL', True),
+                resilience=get_default_policy()
+            ),
+            ttl=getattr(settings, 'GPS_SESSION_TTL', 1800)
+        )
+        
+        # settings.JSESSION_GPS queda como espejo para el código que aún lo lee
+        broker.subscribe(lambda jsession: setattr(settings, 'JSESSION_GPS', jsession))
+        settings.JSESSION_GPS = broker.get()
\ No newline at end of file
@@ -0,0 +1,264 @@
+"""
+Stream incremental de alarmas en tiempo real
+============================================
+
+``AlarmStream`` consulta ``queryAlarmDetail`` en un hilo de fondo, siempre
+desde el último punto leído (cursor) y no por rangos completos:
+
+- Cada consulta pide solo desde el fin de la anterior menos ``overlap``
+  segundos (para no perder alarmas que el servidor registra con demora).
+- Las alarmas repetidas por ese solapamiento se descartan por ``guid``.
+- Las alarmas nuevas reciben un número de secuencia creciente y se
+  guardan en un anillo acotado en memoria (``ring_size``).
+- Se notifican a los suscriptores (callbacks, por ejemplo para encolar
+  tareas de Celery) y despiertan a quienes esperan con ``wait`` (vistas
+  de server-sent events).
+
+La pantalla de alarmas lee el anillo (``recent``/``since``) en lugar de
+volver a consultar el servidor cada vez que alguien refresca. Los números
+de secuencia son locales al stream: entre procesos se retoma por ``guid``
+(``seq_of``).
+
+Ejemplo:
+
+    stream = AlarmStream(api, alarm_types=[1, 72, 78], interval=5)
+    stream.subscribe(lambda events: print(len(events), 'alarmas nuevas'))
+    stream.start()
+    ...
+    for seq, alarm in stream.since(ultimo_seq):
+        ...
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_alarms.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, List, Optional, Sequence, Tuple
+
+from .citos_library import APIError, TIME_FORMAT
+
+logger = logging.getLogger(__name__)
+
+# Evento del stream: (número de secuencia, alarma)
+AlarmEvent = Tuple[int, Dict[str, Any]]
+
+
+class AlarmStream:
+    """
+    Consulta incremental de alarmas con deduplicación por guid
+    """
+
+    def __init__(self, api, alarm_types: Sequence[int] = (1,), interval: float = 5.0,
+                 ring_size: int = 1000, overlap: int = 60, lookback: int = 300,
+                 page_records: int = 200, clock: Callable[[], datetime] = datetime.now,
+                 **query_kwargs):
+        """
+        Args:
+            api: Instancia de GPSCameraAPI
+            alarm_types: Tipos de alarma a seguir
+            interval: Segundos entre consultas
+            ring_size: Alarmas recientes que se mantienen en memoria
+            overlap: Segundos que cada consulta repite de la anterior
+            lookback: Segundos hacia atrás de la primera consulta
+            page_records: Registros por página
+            clock: Función que retorna la hora actual (hora del servidor GPS)
+            **query_kwargs: Resto de parámetros de get_device_alarms
+                (device_ids, vehicle_ids, geo_address...)
+        """
+        self.api = api
+        self.alarm_types = list(alarm_types)
+        self.interval = interval
+        self.overlap = timedelta(seconds=overlap)
+        self.lookback = timedelta(seconds=lookback)
+        self.page_records = page_records
+        self.clock = clock
+        self.query_kwargs = query_kwargs
+
+        self._ring: deque = deque(maxlen=max(1, ring_size))
+        self._seen: OrderedDict = OrderedDict()
+        self._max_seen = max(10000, ring_size * 10)
+        self._seq = 0
+        self._cursor: Optional[datetime] = None
+        self._subscribers: List[Callable[[List[AlarmEvent]], None]] = []
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.last_poll: Optional[datetime] = None
+
+    # =====================================================================
+    # CONSULTA
+    # =====================================================================
+
+    def poll_once(self) -> List[AlarmEvent]:
+        """
+        Consulta las alarmas desde el cursor y publica las nuevas
+
+        Returns:
+            Eventos nuevos (ya deduplicados)
+
+        Raises:
+            APIError: Si falla la consulta (el cursor no avanza)
+        """
+        end = self.clock().replace(microsecond=0)
+        begin = (self._cursor - self.overlap) if self._cursor else end - self.lookback
+
+        alarms = list(self.api.iter_device_alarms(
+            begin.strftime(TIME_FORMAT), end.strftime(TIME_FORMAT), self.alarm_types,
+            page_records=self.page_records, **self.query_kwargs
+        ))
+        alarms.sort(key=lambda alarm: alarm.get('stm') or 0)
+
+        events = []
+        with self._condition:
+            for alarm in alarms:
+                guid = alarm.get('guid')
+                if not guid or guid in self._seen:
+                    continue
+                self._seen[guid] = None
+                self._seq += 1
+                events.append((self._seq, alarm))
+                self._ring.append((self._seq, alarm))
+
+            while len(self._seen) > self._max_seen:
+                self._seen.popitem(last=False)
+
+            self._cursor = end
+            self.last_poll = end
+            if events:
+                self._condition.notify_all()
+
+        if events:
+            logger.debug(f"🚨 {len(events)} alarmas nuevas")
+            self._publish(events)
+        return events
+
+    def _publish(self, events: List[AlarmEvent]):
+        for callback in list(self._subscribers):
+            try:
+                callback(events)
+            except Exception as e:
+                logger.error(f"Error en suscriptor de alarmas {callback}: {e}")
+
+    # =====================================================================
+    # LECTURA
+    # =====================================================================
+
+    @property
+    def last_seq(self) -> int:
+        """Número de secuencia de la última alarma recibida"""
+        with self._condition:
+            return self._seq
+
+    def recent(self, limit: int = None) -> List[AlarmEvent]:
+        """Alarmas recientes del anillo, de la más vieja a la más nueva"""
+        with self._condition:
+            events = list(self._ring)
+        return events[-limit:] if limit else events
+
+    def since(self, seq: int) -> List[AlarmEvent]:
+        """Alarmas posteriores a ``seq`` que siguen en el anillo"""
+        with self._condition:
+            return [event for event in self._ring if event[0] > seq]
+
+    def seq_of(self, guid: str) -> Optional[int]:
+        """
+        Número de secuencia de la alarma ``guid`` si sigue en el anillo
+
+        Las secuencias son propias de cada stream (de cada proceso); el guid
+        lo asigna el servidor GPS y sirve para retomar en cualquier proceso.
+        """
+        with self._condition:
+            for seq, alarm in reversed(self._ring):
+                if alarm.get('guid') == guid:
+                    return seq
+        return None
+
+    def wait(self, seq: int, timeout: float = None) -> List[AlarmEvent]:
+        """
+        Espera alarmas posteriores a ``seq``
+
+        Returns:
+            Eventos nuevos o lista vacía si venció el timeout
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._seq > seq or self._stop.is_set(), timeout)
+            return [event for event in self._ring if event[0] > seq]
+
+    def subscribe(self, callback: Callable[[List[AlarmEvent]], None]) -> Callable[[], None]:
+        """
+        Registra una función que recibe cada lote de eventos nuevos
+
+        Se ejecuta en el hilo del stream: debe ser rápida (por ejemplo
+        encolar una tarea de Celery).
+
+        Returns:
+            Función que cancela la suscripción
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    # =====================================================================
+    # HILO DE FONDO
+    # =====================================================================
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def stopped(self) -> bool:
+        """Se llamó a ``stop``: ``wait`` ya no espera alarmas nuevas"""
+        return self._stop.is_set()
+
+    def start(self) -> 'AlarmStream':
+        """Inicia la consulta periódica en un hilo de fondo (idempotente)"""
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='citos-alarm-stream', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _run(self):
+        logger.info(f"🚨 Stream de alarmas iniciado (tipos {self.alarm_types}, cada {self.interval}s)")
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+                self.last_error = None
+            except APIError as e:
+                self.last_error = str(e)
+                logger.warning(f"⚠️ Error consultando alarmas: {e}")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"❌ Error inesperado en stream de alarmas: {e}")
+            self._stop.wait(self.interval)
+
+    def status(self) -> Dict[str, Any]:
+        """Estado del stream para diagnóstico"""
+        with self._condition:
+            return {
+                'running': self.running,
+                'last_seq': self._seq,
+                'buffered': len(self._ring),
+                'cursor': self._cursor.strftime(TIME_FORMAT) if self._cursor else None,
+                'last_error': self.last_error,
+                'subscribers': len(self._subscribers),
+            }
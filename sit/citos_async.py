@@ -0,0 +1,439 @@
+"""
+Cliente asíncrono para la API de GPS/Cámaras (CMSV6)
+===================================================
+
+Variante asyncio de ``GPSCameraAPI``. Expone los mismos métodos públicos
+(``get_device_status``, ``get_device_alarms``, ``get_device_track``,
+``query_video_files``, etc.) pero cada uno retorna una corrutina, de modo
+que un solo event loop puede mantener cientos de peticiones en vuelo sin
+necesidad de un hilo por petición.
+
+La concurrencia hacia el servidor se limita con un semáforo para no
+saturarlo durante barridos de flota. Como el cliente síncrono, renueva la
+sesión ante SESSION_NOT_EXISTS (código 5) con las credenciales guardadas o
+el ``session_broker``, aplica la ``ResiliencePolicy`` (limitador, reintentos
+y circuit breaker, esperando con ``asyncio.sleep``) y usa el
+``ResponseCache`` si se le pasa uno, consultando su backend en un executor.
+
+Los recorridos paginados (``iter_*``) y ``download_file`` trabajan con hilos
+y requests: no tienen versión asíncrona y lanzan ``TypeError``; para ellos
+se usa ``GPSCameraAPI``.
+
+Ejemplo:
+
+    async with AsyncGPSCameraAPI(base_url, max_concurrency=50) as api:
+        await api.login(account, password)
+        resultados = await asyncio.gather(*[
+            api.get_device_status(device_ids=dev) for dev in dispositivos
+        ])
+
+Requiere ``aiohttp``.
+
+Archivo: sit/citos_async.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import asyncio
+import time
+from typing import Dict, Any, List, Tuple, Union
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:  # pragma: no cover - dependencia opcional
+    aiohttp = None
+    URL = None
+
+from .citos_library import (
+    GPSCameraAPI, APIError, ErrorCodes, DeviceStatus, VehicleInfo, AlarmInfo, json_loads
+)
+from .citos_metrics import get_metrics, action_name
+from .citos_resilience import CircuitOpenError
+
+
+class AsyncGPSCameraAPI(GPSCameraAPI):
+    """
+    Cliente asíncrono para la API de GPS/Cámaras
+
+    Reutiliza la construcción de parámetros de ``GPSCameraAPI``: los métodos
+    públicos heredados delegan en ``_make_request``, que aquí retorna una
+    corrutina, por lo que basta con hacer ``await`` sobre ellos.
+    """
+
+    def __init__(self, base_url: str = "http://190.183.254.253:8088",
+                 timeout: int = 30, verify_ssl: bool = True,
+                 max_concurrency: int = 100, connection_limit: int = None,
+                 session_ttl: int = 1800, refresh_margin: int = 120,
+                 cache=None, resilience=None):
+        """
+        Inicializa el cliente asíncrono
+
+        Args:
+            base_url: URL base de la API
+            timeout: Timeout para las requests en segundos
+            verify_ssl: Si verificar certificados SSL
+            max_concurrency: Máximo de peticiones simultáneas al servidor
+            connection_limit: Conexiones TCP máximas (por defecto = max_concurrency)
+            session_ttl: Vida útil estimada del jsession en segundos (0 = sin vencimiento)
+            refresh_margin: Segundos antes del vencimiento en que se renueva el login
+            cache: Cache de respuestas por endpoint (None = sin cache)
+            resilience: Limitador, reintentos y circuit breaker (None = sin protección)
+        """
+        if aiohttp is None:
+            raise ImportError("AsyncGPSCameraAPI requiere el paquete 'aiohttp'")
+
+        super().__init__(base_url=base_url, timeout=timeout, verify_ssl=verify_ssl,
+                         session_ttl=session_ttl, refresh_margin=refresh_margin,
+                         cache=cache, resilience=resilience)
+        self.max_concurrency = max_concurrency
+        self.connection_limit = connection_limit or max_concurrency
+        self._semaphore = None
+        self._http = None
+        self._login_lock = None
+
+    def _get_http(self) -> 'aiohttp.ClientSession':
+        """Crea la sesión aiohttp dentro del event loop en ejecución"""
+        if self._http is None or self._http.closed:
+            connector_kwargs = {'limit': self.connection_limit}
+            if not self.verify_ssl:
+                connector_kwargs['ssl'] = False
+            connector = aiohttp.TCPConnector(**connector_kwargs)
+            self._http = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers=self.default_headers,
+                auto_decompress=True
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._http
+
+    async def _make_request(self, endpoint: str, method: str = 'GET',
+                            params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                            require_session: bool = True) -> Dict[str, Any]:
+        """
+        Realiza una petición asíncrona a la API (cache, sesión y resiliencia)
+
+        Con cache, una entrada vencida se vuelve a pedir en el momento (sin
+        la revalidación en background del cliente síncrono).
+
+        Raises:
+            APIError: Si hay error en la respuesta de la API
+        """
+        if self.cache is None or not require_session:
+            return await self._request_with_session(endpoint, method, params, data, require_session)
+
+        # El backend del cache puede ser de red (Redis): fuera del event loop
+        loop = asyncio.get_running_loop()
+        if self.cache.is_cacheable(endpoint):
+            scope = self.account_name or ''
+            cached = await loop.run_in_executor(None, self.cache.lookup, endpoint, params, scope)
+            if cached is not None:
+                return cached
+            result = await self._request_with_session(endpoint, method, params, data, require_session)
+            await loop.run_in_executor(None, self.cache.store, endpoint, params, result, scope)
+            return result
+
+        result = await self._request_with_session(endpoint, method, params, data, require_session)
+        await loop.run_in_executor(None, self.cache.invalidate_for, endpoint)
+        return result
+
+    async def _request_with_session(self, endpoint: str, method: str = 'GET',
+                                    params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                                    require_session: bool = True) -> Dict[str, Any]:
+        """
+        Realiza la petición renovando la sesión y reintentando si el servidor la rechaza
+
+        Raises:
+            APIError: Si hay error en la respuesta de la API
+        """
+        if require_session and self._session_expiring():
+            await self._relogin_async(self.jsession)
+
+        jsession = self.jsession
+
+        try:
+            result = await self._send_guarded(endpoint, method, params, data, require_session)
+        except APIError as e:
+            # Sesión vencida: re-login con las credenciales guardadas y reintentar una vez
+            if not (require_session and e.code == ErrorCodes.SESSION_NOT_EXISTS.value
+                    and await self._relogin_async(jsession)):
+                raise
+            result = await self._send_guarded(endpoint, method, params, data, require_session)
+
+        if require_session:
+            self._session_ok = True
+
+        return result
+
+    async def _send_guarded(self, endpoint: str, method: str = 'GET',
+                            params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                            require_session: bool = True) -> Dict[str, Any]:
+        """
+        Envía la petición aplicando la ``ResiliencePolicy`` del cliente
+
+        Usa las mismas decisiones que ``ResiliencePolicy.execute`` (incluido
+        ``retries_disabled()``) pero sin bloquear el event loop: el limitador
+        reserva el turno y las esperas se hacen con ``asyncio.sleep``.
+
+        Raises:
+            APIError: Si hay error en la respuesta o el circuito está abierto
+        """
+        policy = self.resilience
+        if policy is None:
+            return await self._send_request(endpoint, method, params, data, require_session)
+
+        action = action_name(endpoint)
+        attempt = 0
+
+        while True:
+            attempt += 1
+
+            try:
+                policy.check_circuit()
+            except CircuitOpenError as e:
+                raise APIError(24, str(e))
+
+            if policy.rate_limiter is not None:
+                await asyncio.sleep(policy.rate_limiter.reserve())
+
+            try:
+                result = await self._send_request(endpoint, method, params, data, require_session)
+            except APIError as e:
+                delay = policy.record_failure(e.code, attempt, action)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+
+            policy.record_success()
+            return result
+
+    async def _send_request(self, endpoint: str, method: str = 'GET',
+                            params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                            require_session: bool = True) -> Dict[str, Any]:
+        """
+        Envía una petición HTTP asíncrona a la API (sin lógica de re-login)
+
+        Raises:
+            APIError: Si hay error en la respuesta de la API
+        """
+        url = self._build_url(endpoint, params, require_session)
+        http = self._get_http()
+
+        # Los parámetros ya vienen codificados: evitar que yarl los recodifique
+        request_url = URL(url, encoded=True)
+
+        started = None
+        code, nbytes = 0, 0
+
+        try:
+            async with self._semaphore:
+                if method.upper() == 'POST':
+                    request = http.post(request_url, json=data) if data else http.post(request_url)
+                else:
+                    request = http.get(request_url)
+
+                started = time.perf_counter()
+                async with request as response:
+                    response.raise_for_status()
+                    body = await response.read()
+                    nbytes = len(body)
+
+            try:
+                result = json_loads(body)
+            except ValueError:
+                raise APIError(6, "Respuesta inválida del servidor")
+
+            return self._check_result(result)
+
+        except APIError as e:
+            code = e.code
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            code = 24
+            self.logger.error(f"Error de conexión: {e}")
+            raise APIError(24, f"Error de conexión: {str(e)}")
+        finally:
+            # La espera en el semáforo no cuenta como latencia del servidor
+            if started is not None:
+                get_metrics().record_request(
+                    action_name(endpoint), time.perf_counter() - started, nbytes, code
+                )
+
+    # =====================================================================
+    # AUTENTICACIÓN Y GESTIÓN DE SESIONES
+    # =====================================================================
+
+    async def login(self, account: str, password: str) -> Dict[str, Any]:
+        """
+        Inicia sesión en la API
+
+        Raises:
+            APIError: Si las credenciales son inválidas
+        """
+        result = await self._make_request(
+            'StandardApiAction_login.action',
+            method='GET',
+            params=self._build_login_params(account, password),
+            require_session=False
+        )
+
+        self._store_login(account, result)
+        self._credentials = (account, password)
+        return result
+
+    async def logout(self) -> Dict[str, Any]:
+        """Cierra la sesión actual"""
+        if not self.jsession:
+            return {'result': 0, 'message': 'No hay sesión activa'}
+
+        # Un logout explícito no debe disparar re-login automático
+        self._credentials = None
+        result = await self._make_request('StandardApiAction_logout.action')
+
+        self._clear_login()
+        return result
+
+    def _session_expiring(self) -> bool:
+        """La sesión está dentro del margen de renovación y se puede renovar"""
+        if (not self.session_ttl or self._session_started is None
+                or not (self._credentials or self.session_broker)):
+            return False
+        age = time.monotonic() - self._session_started
+        return age >= self.session_ttl - self.refresh_margin
+
+    async def _relogin_async(self, stale_jsession: str) -> bool:
+        """
+        Renueva la sesión (vencida o por vencer) una sola vez para todas las corrutinas
+
+        Returns:
+            True si hay una sesión nueva con la que reintentar
+        """
+        if self._login_lock is None:
+            self._login_lock = asyncio.Lock()
+
+        async with self._login_lock:
+            if self.jsession and self.jsession != stale_jsession:
+                return True
+
+            if self.session_broker is not None:
+                # El broker es síncrono (Redis/archivo): no bloquear el event loop
+                loop = asyncio.get_running_loop()
+                if not await loop.run_in_executor(None, self._adopt_from_broker, stale_jsession):
+                    return False
+            elif not self._credentials:
+                return False
+            else:
+                account, password = self._credentials
+                self.logger.info("Sesión GPS vencida, renovando login...")
+                try:
+                    await self.login(account, password)
+                except APIError as e:
+                    self.logger.error(f"Re-login fallido: {e}")
+                    return False
+
+        self._notify_session_change()
+        return True
+
+    # =====================================================================
+    # RESULTADOS TIPADOS
+    # =====================================================================
+
+    async def get_fleet_snapshot(self, device_ids: Union[str, List[str]] = None,
+                                 vehicle_ids: Union[str, List[str]] = None,
+                                 **kwargs) -> List[DeviceStatus]:
+        """Estado GPS de la flota como registros DeviceStatus"""
+        result = await self.get_device_status(device_ids=device_ids, vehicle_ids=vehicle_ids, **kwargs)
+        return [DeviceStatus.from_api(raw) for raw in result.get('status') or []]
+
+    async def get_fleet_arrays(self, device_ids: Union[str, List[str]] = None,
+                               vehicle_ids: Union[str, List[str]] = None,
+                               **kwargs) -> Dict[str, Any]:
+        """Estado GPS de la flota como columnas NumPy (ver ``citos_geo.status_columns``)"""
+        from .citos_geo import status_columns
+
+        result = await self.get_device_status(device_ids=device_ids, vehicle_ids=vehicle_ids, **kwargs)
+        return status_columns(result.get('status') or [])
+
+    async def get_vehicle_records(self, language: str = 'zh') -> List[VehicleInfo]:
+        """Vehículos del usuario como registros VehicleInfo"""
+        result = await self.get_user_vehicles(language=language)
+        return [VehicleInfo.from_api(raw) for raw in result.get('vehicles') or []]
+
+    async def get_alarm_page(self, start_time: str, end_time: str,
+                             alarm_types: Union[str, List[str]],
+                             **kwargs) -> Tuple[List[AlarmInfo], Dict[str, Any]]:
+        """Una página de alarmas como registros AlarmInfo, con la paginación"""
+        result = await self.get_device_alarms(start_time, end_time, alarm_types, **kwargs)
+        alarms = [AlarmInfo.from_api(raw) for raw in result.get('alarms') or []]
+        return alarms, result.get('pagination') or {}
+
+    # =====================================================================
+    # MÉTODOS SIN VERSIÓN ASÍNCRONA
+    # =====================================================================
+
+    def _sync_only(self, name: str):
+        raise TypeError(
+            f"AsyncGPSCameraAPI.{name} no tiene versión asíncrona: use GPSCameraAPI "
+            f"(por ejemplo en un executor)"
+        )
+
+    def iter_device_alarms(self, *args, **kwargs):
+        self._sync_only('iter_device_alarms')
+
+    def iter_device_track(self, *args, **kwargs):
+        self._sync_only('iter_device_track')
+
+    def iter_security_photos(self, *args, **kwargs):
+        self._sync_only('iter_security_photos')
+
+    def iter_vehicle_mileage(self, *args, **kwargs):
+        self._sync_only('iter_vehicle_mileage')
+
+    def iter_parking_detail(self, *args, **kwargs):
+        self._sync_only('iter_parking_detail')
+
+    def download_file(self, *args, **kwargs):
+        self._sync_only('download_file')
+
+    # =====================================================================
+    # MÉTODOS DE UTILIDAD
+    # =====================================================================
+
+    async def is_session_valid(self) -> bool:
+        """Verifica si la sesión actual es válida (sin peticiones al servidor)"""
+        return GPSCameraAPI.is_session_valid(self)
+
+    async def get_session_info(self) -> Dict[str, Any]:
+        """Obtiene información de la sesión actual"""
+        return {
+            'jsession': self.jsession,
+            'account_name': self.account_name,
+            'is_valid': await self.is_session_valid()
+        }
+
+    async def close(self):
+        """Cierra la sesión HTTP y libera las conexiones"""
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    def __enter__(self):
+        raise TypeError("Use 'async with' con AsyncGPSCameraAPI")
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    async def __aenter__(self):
+        """Soporte para async context manager"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """Limpieza al salir del async context manager"""
+        if self.jsession:
+            try:
+                await self.logout()
+            except Exception:
+                pass  # Ignorar errores durante logout
+        await self.close()
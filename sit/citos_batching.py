@@ -0,0 +1,233 @@
+"""
+Agrupador de consultas de estado GPS (micro-batching + singleflight)
+====================================================================
+
+``getDeviceStatus`` acepta listas de ``vehiIdno``/``devIdno`` separadas por
+coma, pero las vistas consultan vehículo por vehículo. ``StatusCoalescer``
+junta las consultas individuales que llegan desde distintos hilos y las
+responde con una sola petición multi-id: N consultas concurrentes pasan a
+ser ceil(N / max_batch) peticiones.
+
+Una consulta sin otra petición del mismo tipo en vuelo sale en el momento
+(sin latencia agregada). Mientras hay peticiones en vuelo, las nuevas
+consultas se juntan en un lote que sale cuando vuelven todas, al llenarse o
+al cumplirse la ventana, lo que ocurra primero.
+
+Además, las consultas idénticas que ya están en vuelo se comparten
+(singleflight): el segundo hilo espera la misma respuesta en lugar de
+repetir la petición.
+
+Ejemplo:
+
+    coalescer = StatusCoalescer(api, window=0.01, max_batch=50)
+    info = coalescer.get_status(vehicle_id='1234')   # dict o None
+    infos = coalescer.get_statuses(vehicle_ids=fichas)  # {ficha: dict o None}
+
+Archivo: sit/citos_batching.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _Batch:
+    """Lote abierto de ids pendientes para un mismo grupo de opciones"""
+
+    __slots__ = ('futures', 'flush')
+
+    def __init__(self):
+        self.futures: Dict[str, Future] = {}
+        self.flush = threading.Event()
+
+
+class StatusCoalescer:
+    """
+    Agrupa consultas individuales de estado GPS en peticiones multi-id
+    """
+
+    def __init__(self, api, window: float = 0.01, max_batch: int = 50,
+                 timeout: float = None):
+        """
+        Args:
+            api: Instancia de GPSCameraAPI
+            window: Espera máxima para armar un lote mientras hay otro en vuelo
+            max_batch: Máximo de ids por petición
+            timeout: Espera máxima por la respuesta (por defecto el de la API x2)
+        """
+        self.api = api
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        self.timeout = timeout if timeout is not None else api.timeout * 2
+        self._lock = threading.Lock()
+        self._open: Dict[Tuple, _Batch] = {}
+        self._inflight: Dict[Tuple, Future] = {}
+        self._running: Dict[Tuple, int] = {}
+
+    def get_status(self, vehicle_id: str = None, device_id: str = None,
+                   geo_address: bool = False, map_type: int = None,
+                   language: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el estado GPS de un vehículo o dispositivo
+
+        Args:
+            vehicle_id: ID del vehículo (ficha)
+            device_id: ID del dispositivo (si no se indica vehicle_id)
+            geo_address: Si resolver la posición geográfica
+            map_type: Conversión de coordenadas (1=Google, 2=Baidu)
+            language: Idioma para resolución geográfica
+
+        Returns:
+            Registro de estado del vehículo o None si no aparece en la respuesta
+
+        Raises:
+            APIError: Si falla la petición del lote
+        """
+        if vehicle_id:
+            kind, item_id = 'vehicle', str(vehicle_id)
+        elif device_id:
+            kind, item_id = 'device', str(device_id)
+        else:
+            raise ValueError("Debe indicar vehicle_id o device_id")
+
+        group = (kind, bool(geo_address), map_type, language)
+        future, batch, wait = self._enqueue(group, item_id)
+
+        if batch is not None:
+            if wait:
+                batch.flush.wait(self.window)
+            self._run_batch(group, batch)
+
+        return future.result(timeout=self.timeout)
+
+    def get_statuses(self, vehicle_ids: Iterable[str] = None, device_ids: Iterable[str] = None,
+                     geo_address: bool = False, map_type: int = None,
+                     language: str = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtiene el estado GPS de varios vehículos o dispositivos en lotes de ``max_batch``
+
+        Los ids se suman a los lotes que ya armaron otros hilos; los lotes
+        que abre esta llamada salen sin esperar la ventana.
+
+        Args:
+            vehicle_ids: IDs de vehículo (fichas)
+            device_ids: IDs de dispositivo (si no se indican vehicle_ids)
+            geo_address: Si resolver la posición geográfica
+            map_type: Conversión de coordenadas (1=Google, 2=Baidu)
+            language: Idioma para resolución geográfica
+
+        Returns:
+            Diccionario id -> registro de estado (None si no aparece en la respuesta)
+
+        Raises:
+            APIError: Si falla la petición de alguno de los lotes
+        """
+        if vehicle_ids is not None:
+            kind, ids = 'vehicle', vehicle_ids
+        else:
+            kind, ids = 'device', device_ids or ()
+        ids = list(dict.fromkeys(str(item_id) for item_id in ids))
+        group = (kind, bool(geo_address), map_type, language)
+
+        futures, led = {}, []
+        for item_id in ids:
+            futures[item_id], batch, _ = self._enqueue(group, item_id)
+            if batch is not None:
+                led.append(batch)
+
+        for batch in led:
+            self._run_batch(group, batch)
+
+        return {item_id: future.result(timeout=self.timeout) for item_id, future in futures.items()}
+
+    def _enqueue(self, group: Tuple, item_id: str) -> Tuple[Future, Optional[_Batch], bool]:
+        """
+        Suma un id al lote abierto del grupo (o comparte la consulta en vuelo)
+
+        Returns:
+            Tupla (future, lote a enviar si este hilo lo abrió o None, si hay lotes en vuelo)
+        """
+        leader = wait = False
+
+        with self._lock:
+            future = self._inflight.get(group + (item_id,))
+            if future is None:
+                batch = self._open.get(group)
+                if batch is None:
+                    batch = self._open[group] = _Batch()
+                    leader = True
+                    # Sin lotes en vuelo no hay con quién juntarse: sale ya
+                    wait = self._running.get(group, 0) > 0
+
+                future = batch.futures.get(item_id)
+                if future is None:
+                    future = batch.futures[item_id] = Future()
+                    if len(batch.futures) >= self.max_batch:
+                        # Lote completo: se cierra y el próximo id abre uno nuevo
+                        del self._open[group]
+                        batch.flush.set()
+
+        return future, (batch if leader else None), wait
+
+    def _run_batch(self, group: Tuple, batch: _Batch):
+        """Cierra el lote y resuelve todas sus consultas con una sola petición"""
+        with self._lock:
+            if self._open.get(group) is batch:
+                del self._open[group]
+            futures = dict(batch.futures)
+            for item_id, future in futures.items():
+                self._inflight[group + (item_id,)] = future
+            self._running[group] = self._running.get(group, 0) + 1
+
+        kind, geo_address, map_type, language = group
+        ids = list(futures)
+
+        try:
+            if kind == 'vehicle':
+                result = self.api.get_device_status(
+                    vehicle_ids=ids, geo_address=geo_address,
+                    map_type=map_type, language=language
+                )
+                key = 'vid'
+            else:
+                result = self.api.get_device_status(
+                    device_ids=ids, geo_address=geo_address,
+                    map_type=map_type, language=language
+                )
+                key = 'id'
+
+            statuses = result.get('status') or []
+            records = {}
+            for record in statuses:
+                records.setdefault(str(record.get(key)), record)
+
+            # Consulta de un solo id: mismo comportamiento que la llamada directa
+            if len(ids) == 1 and ids[0] not in records and statuses:
+                records[ids[0]] = statuses[0]
+
+            logger.debug(f"Lote de estado GPS: {len(ids)} ids en una petición")
+
+            for item_id, future in futures.items():
+                future.set_result(records.get(item_id))
+
+        except Exception as e:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(e)
+
+        finally:
+            with self._lock:
+                for item_id in futures:
+                    self._inflight.pop(group + (item_id,), None)
+                self._running[group] -= 1
+                if not self._running[group]:
+                    del self._running[group]
+                    # El lote que se armó mientras tanto sale sin esperar la ventana
+                    pending = self._open.get(group)
+                    if pending is not None:
+                        pending.flush.set()
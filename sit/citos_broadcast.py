@@ -0,0 +1,293 @@
+"""
+Envío de comandos a toda una flota (CMSV6)
+==========================================
+
+``capture_picture``, ``send_tts_message``, ``control_gps_reporting`` y
+``control_vehicle`` apuntan a un solo dispositivo. ``FleetBroadcaster``
+envía el mismo comando a una selección de dispositivos:
+
+- Consulta antes el estado en línea (``getDeviceOlStatus``, en lotes) y
+  no envía nada a los dispositivos desconectados.
+- Envía en paralelo con concurrencia acotada (``workers``); el limitador de
+  tasa del cliente sigue aplicando a cada petición.
+- Reintenta por dispositivo, con la misma ``RetryPolicy`` de
+  ``citos_resilience.py``, solo las fallas en que el comando no llegó a
+  ejecutarse: el código 6 del servidor y los errores al establecer la
+  conexión (``ConnectTimeout`` o ``ConnectionError`` sin respuesta). Un
+  timeout de lectura u otro error de red con la petición ya enviada no se
+  reintenta, porque los comandos no son idempotentes: el dispositivo queda
+  con estado ``unknown`` (el comando pudo haberse ejecutado). El código 32
+  (``DEVICE_NOT_ONLINE``) marca el dispositivo como desconectado. Es la
+  única capa de reintentos: mientras se envía el comando se desactivan los
+  de la ``ResiliencePolicy`` del cliente, así un comando llega como mucho
+  ``retry.max_attempts`` veces.
+- Retorna un ``BroadcastReport`` con el resultado de cada dispositivo.
+
+Ejemplo:
+
+    broadcaster = FleetBroadcaster(api, workers=16)
+    devices = devices_for_companies(api, [3])
+    report = broadcaster.run('send_tts_message', devices, text='Volver a base')
+    report.counts  # {'ok': 118, 'offline': 7, 'failed': 0, 'unknown': 0}
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_broadcast.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Any, Iterable, List, Optional, Set
+
+import requests
+from urllib3.exceptions import ProtocolError
+
+from .citos_library import APIError, ErrorCodes
+from .citos_resilience import CircuitOpenError, RetryPolicy, classify_error, retries_disabled
+
+logger = logging.getLogger(__name__)
+
+# Métodos de GPSCameraAPI que se pueden enviar a una flota
+BROADCAST_COMMANDS = frozenset({
+    'capture_picture',
+    'send_tts_message',
+    'control_gps_reporting',
+    'control_vehicle',
+})
+
+# Estados de cada dispositivo en el reporte
+STATUS_OK = 'ok'
+STATUS_OFFLINE = 'offline'
+STATUS_FAILED = 'failed'
+STATUS_UNKNOWN = 'unknown'
+
+# Dispositivos por consulta de estado en línea
+ONLINE_BATCH_SIZE = 100
+
+
+@dataclass(slots=True)
+class DeviceResult:
+    """Resultado del comando en un dispositivo"""
+    device_id: str
+    status: str
+    attempts: int = 0
+    elapsed: float = 0.0
+    code: Optional[int] = None
+    message: str = ''
+    response: Optional[Dict[str, Any]] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'device_id': self.device_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'elapsed': round(self.elapsed, 3),
+            'code': self.code,
+            'message': self.message,
+        }
+
+
+@dataclass(slots=True)
+class BroadcastReport:
+    """Resultado agregado de un comando enviado a varios dispositivos"""
+    command: str
+    params: Dict[str, Any]
+    results: List[DeviceResult] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        counts = {STATUS_OK: 0, STATUS_OFFLINE: 0, STATUS_FAILED: 0, STATUS_UNKNOWN: 0}
+        for result in self.results:
+            counts[result.status] = counts.get(result.status, 0) + 1
+        return counts
+
+    def devices(self, status: str) -> List[str]:
+        """IDs de los dispositivos con un estado"""
+        return [r.device_id for r in self.results if r.status == status]
+
+    @property
+    def succeeded(self) -> List[str]:
+        return self.devices(STATUS_OK)
+
+    @property
+    def offline(self) -> List[str]:
+        return self.devices(STATUS_OFFLINE)
+
+    @property
+    def failed(self) -> List[str]:
+        return self.devices(STATUS_FAILED)
+
+    @property
+    def unknown(self) -> List[str]:
+        """Dispositivos en que el comando pudo haberse ejecutado o no"""
+        return self.devices(STATUS_UNKNOWN)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'command': self.command,
+            'params': self.params,
+            'elapsed': round(self.elapsed, 3),
+            'counts': self.counts,
+            'results': [result.to_dict() for result in self.results],
+        }
+
+
+def request_not_sent(exc: Exception) -> bool:
+    """
+    Indica si una excepción ocurrió antes de enviar la petición al servidor
+
+    Recorre la cadena de excepciones (GPSCameraAPI envuelve los errores de
+    ``requests`` en ``APIError(24)``). Cuenta como no enviada un circuito
+    abierto, un ``ConnectTimeout`` o un ``ConnectionError`` sin respuesta
+    que no sea una conexión cortada a mitad de la petición.
+    """
+    while exc is not None:
+        if isinstance(exc, (CircuitOpenError, requests.ConnectTimeout)):
+            return True
+        if isinstance(exc, requests.ConnectionError):
+            reason = exc.args[0] if exc.args else None
+            return exc.response is None and not isinstance(reason, ProtocolError)
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def devices_for_companies(api, company_ids: Iterable[int]) -> List[str]:
+    """
+    IDs de los dispositivos de los vehículos de una o más empresas
+
+    Args:
+        api: Instancia de GPSCameraAPI
+        company_ids: IDs de empresa (campo 'pid' de queryUserVehicle)
+
+    Returns:
+        Lista de IDs de dispositivo sin repetidos
+    """
+    company_ids = {int(company_id) for company_id in company_ids}
+    devices = []
+    for vehicle in api.get_vehicle_records():
+        if vehicle.company_id in company_ids:
+            devices.extend(str(device.get('id')) for device in vehicle.devices if device.get('id'))
+    return list(dict.fromkeys(devices))
+
+
+class FleetBroadcaster:
+    """Envía un comando a muchos dispositivos con concurrencia acotada"""
+
+    def __init__(self, api, workers: int = 16, retry: RetryPolicy = None,
+                 check_online: bool = True, online_batch: int = ONLINE_BATCH_SIZE):
+        """
+        Args:
+            api: Instancia de GPSCameraAPI
+            workers: Dispositivos atendidos en paralelo
+            retry: Reintentos por dispositivo (por defecto 2 intentos, solo
+                en el código 6 y en errores al conectar)
+            check_online: Consultar el estado en línea antes de enviar
+            online_batch: Dispositivos por consulta de estado en línea
+        """
+        self.api = api
+        self.workers = max(1, workers)
+        self.retry = retry or RetryPolicy(max_attempts=2)
+        self.check_online = check_online
+        self.online_batch = max(1, online_batch)
+
+    def online_devices(self, device_ids: List[str]) -> Optional[Set[str]]:
+        """
+        Dispositivos en línea de la lista
+
+        Returns:
+            Conjunto de IDs en línea o None si no se pudo consultar
+            (en ese caso se envía a todos)
+        """
+        online = set()
+        for start in range(0, len(device_ids), self.online_batch):
+            chunk = device_ids[start:start + self.online_batch]
+            try:
+                result = self.api.get_device_online_status(device_ids=chunk)
+            except APIError as e:
+                logger.warning(f"⚠️ No se pudo consultar el estado en línea: {e}")
+                return None
+            online.update(str(item.get('did')) for item in result.get('onlines') or []
+                          if item.get('online') == 1)
+        return online
+
+    def run(self, command: str, device_ids: Iterable[str],
+            on_result: Callable[[DeviceResult], None] = None,
+            **params) -> BroadcastReport:
+        """
+        Envía un comando a una lista de dispositivos
+
+        Args:
+            command: Método de GPSCameraAPI (ver BROADCAST_COMMANDS)
+            device_ids: IDs de dispositivo
+            on_result: Función llamada con cada DeviceResult al terminar
+            **params: Parámetros del comando (sin device_id)
+
+        Returns:
+            BroadcastReport en el orden de ``device_ids``
+
+        Raises:
+            ValueError: Si el comando no se puede enviar a una flota
+        """
+        if command not in BROADCAST_COMMANDS:
+            raise ValueError(f"Comando no permitido para envío masivo: {command}")
+
+        started = time.monotonic()
+        device_ids = list(dict.fromkeys(str(device_id) for device_id in device_ids))
+        send = getattr(self.api, command)
+
+        online = self.online_devices(device_ids) if self.check_online and device_ids else None
+
+        def execute(device_id: str) -> DeviceResult:
+            if online is not None and device_id not in online:
+                result = DeviceResult(device_id, STATUS_OFFLINE,
+                                      code=ErrorCodes.DEVICE_NOT_ONLINE.value,
+                                      message='Dispositivo desconectado')
+            else:
+                result = self._send(send, device_id, params)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='citos-broadcast') as executor:
+            results = list(executor.map(execute, device_ids))
+
+        report = BroadcastReport(command, params, results, time.monotonic() - started)
+        logger.info(f"📣 {command} a {len(device_ids)} dispositivos en {report.elapsed:.1f}s: {report.counts}")
+        return report
+
+    def _send(self, send: Callable, device_id: str, params: Dict[str, Any]) -> DeviceResult:
+        """Envía el comando a un dispositivo reintentando las fallas en que no se ejecutó"""
+        started = time.monotonic()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            try:
+                with retries_disabled():
+                    response = send(device_id, **params)
+            except Exception as e:
+                code = classify_error(e)
+                if code == ErrorCodes.DEVICE_NOT_ONLINE.value:
+                    return DeviceResult(device_id, STATUS_OFFLINE, attempt,
+                                        time.monotonic() - started, code, 'Dispositivo desconectado')
+                not_sent = request_not_sent(e)
+                retryable = code == ErrorCodes.SYSTEM_EXCEPTION.value or not_sent
+                if retryable and self.retry.should_retry(code, attempt):
+                    time.sleep(self.retry.backoff(attempt))
+                    continue
+                message = e.message if isinstance(e, APIError) else str(e)
+                if code == ErrorCodes.NETWORK_CONNECTION_EXCEPTION.value and not not_sent:
+                    logger.warning(f"⚠️ Resultado desconocido de {device_id}: {message}")
+                    return DeviceResult(device_id, STATUS_UNKNOWN, attempt,
+                                        time.monotonic() - started, code, message)
+                return DeviceResult(device_id, STATUS_FAILED, attempt,
+                                    time.monotonic() - started, code, message)
+
+            return DeviceResult(device_id, STATUS_OK, attempt,
+                                time.monotonic() - started, response=response)
@@ -0,0 +1,255 @@
+"""
+Cache de respuestas por endpoint para la API de GPS/Cámaras (CMSV6)
+==================================================================
+
+Guarda las respuestas de los endpoints que cambian poco (vehículos,
+dispositivos, áreas) con un TTL propio por endpoint, para no volver a
+pedir el listado completo de la flota en cada vista.
+
+- Stale-while-revalidate: pasado el TTL, durante ``stale_ttl`` segundos se
+  sigue respondiendo con el valor anterior mientras un hilo lo refresca.
+- Invalidación explícita: las llamadas que modifican datos (``add_vehicle``,
+  ``edit_area``, ``delete_device``...) invalidan los endpoints afectados.
+
+La invalidación usa una "generación" por endpoint que forma parte de la
+clave, por lo que funciona igual con cualquier backend (incluido el cache
+de Django, que no permite borrar por prefijo).
+
+Backends:
+    - ``MemoryCacheBackend``: diccionario en memoria (aplicación de escritorio)
+    - ``DjangoCacheBackend``: cache configurado en settings.CACHES
+
+Los valores en memoria se comparten entre llamadas: no modificarlos.
+
+Archivo: sit/citos_cache.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Dict, Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# TTL en segundos por endpoint (solo estos endpoints se cachean)
+DEFAULT_TTLS = {
+    'StandardApiAction_queryUserVehicle.action': 300,
+    'StandardApiAction_getDeviceByVehicle.action': 300,
+    'StandardApiAction_getLoadDeviceInfo.action': 600,
+    'StandardApiAction_getUserMarkers.action': 600,
+    'MapMarkerAction_findMark.action': 600,
+}
+
+_FLEET_ENDPOINTS = (
+    'StandardApiAction_queryUserVehicle.action',
+    'StandardApiAction_getDeviceByVehicle.action',
+    'StandardApiAction_getLoadDeviceInfo.action',
+)
+
+_AREA_ENDPOINTS = (
+    'StandardApiAction_getUserMarkers.action',
+    'MapMarkerAction_findMark.action',
+)
+
+# Endpoints que modifican datos -> endpoints cacheados que invalidan
+INVALIDATIONS = {
+    'StandardApiAction_addDevice.action': _FLEET_ENDPOINTS,
+    'StandardApiAction_addVehicle.action': _FLEET_ENDPOINTS,
+    'StandardApiAction_deleteDevice.action': _FLEET_ENDPOINTS,
+    'StandardApiAction_deleteVehicle.action': _FLEET_ENDPOINTS,
+    'MapMarkerAction_addMark.action': _AREA_ENDPOINTS,
+    'MapMarkerAction_editMark.action': _AREA_ENDPOINTS,
+    'MapMarkerAction_deleteMark.action': _AREA_ENDPOINTS,
+}
+
+
+class MemoryCacheBackend:
+    """Backend en memoria, thread-safe"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Any, Optional[float]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = None):
+        expires = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DjangoCacheBackend:
+    """Backend sobre el cache de Django (import diferido)"""
+
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+
+    @property
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, key: str) -> Any:
+        return self._cache.get(key)
+
+    def set(self, key: str, value: Any, timeout: Optional[float] = None):
+        self._cache.set(key, value, timeout)
+
+    def delete(self, key: str):
+        self._cache.delete(key)
+
+
+class ResponseCache:
+    """
+    Cache de respuestas con TTL por endpoint y stale-while-revalidate
+    """
+
+    def __init__(self, backend=None, ttls: Dict[str, int] = None,
+                 stale_ttl: int = 60, key_prefix: str = 'citos'):
+        """
+        Args:
+            backend: Backend de almacenamiento (por defecto en memoria)
+            ttls: TTL en segundos por endpoint (por defecto DEFAULT_TTLS)
+            stale_ttl: Segundos que se sirve un valor vencido mientras se refresca
+            key_prefix: Prefijo de las claves en el backend
+        """
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.stale_ttl = stale_ttl
+        self.key_prefix = key_prefix
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def is_cacheable(self, endpoint: str) -> bool:
+        """Indica si el endpoint tiene TTL configurado"""
+        return self.ttls.get(endpoint, 0) > 0
+
+    def _generation(self, endpoint: str) -> int:
+        key = f"{self.key_prefix}:gen:{endpoint}"
+        generation = self.backend.get(key)
+        if generation is None:
+            generation = 0
+            self.backend.set(key, generation, None)
+        return generation
+
+    def _make_key(self, endpoint: str, params: Dict[str, Any], scope: str) -> str:
+        """Clave estable: endpoint + generación + hash de los parámetros"""
+        params = {k: v for k, v in (params or {}).items() if k != 'jsession' and v is not None}
+        raw = json.dumps([scope, params], sort_keys=True, default=str)
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f"{self.key_prefix}:{endpoint}:{self._generation(endpoint)}:{digest}"
+
+    def get_or_fetch(self, endpoint: str, params: Dict[str, Any],
+                     fetch: Callable[[], Any], scope: str = '') -> Any:
+        """
+        Retorna la respuesta cacheada o la obtiene con ``fetch``
+
+        Args:
+            endpoint: Endpoint de la API
+            params: Parámetros de la petición (jsession se ignora)
+            fetch: Función que hace la petición real
+            scope: Separador adicional de claves (por ejemplo la cuenta)
+
+        Returns:
+            Respuesta de la API
+        """
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return fetch()
+
+        key = self._make_key(endpoint, params, scope)
+        entry = self.backend.get(key)
+
+        if entry is not None:
+            value, stored_at = entry
+            age = time.time() - stored_at
+            if age < ttl:
+                return value
+            if age < ttl + self.stale_ttl:
+                self._revalidate(key, ttl, fetch)
+                return value
+
+        value = fetch()
+        self._store(key, ttl, value)
+        return value
+
+    def lookup(self, endpoint: str, params: Dict[str, Any], scope: str = '') -> Any:
+        """
+        Retorna la respuesta cacheada si sigue dentro del TTL, sin refrescarla
+
+        Para quien hace la petición por su cuenta (cliente asíncrono): una
+        entrada vencida se trata como ausente.
+
+        Returns:
+            Respuesta cacheada o None
+        """
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return None
+
+        entry = self.backend.get(self._make_key(endpoint, params, scope))
+        if entry is not None and time.time() - entry[1] < ttl:
+            return entry[0]
+        return None
+
+    def store(self, endpoint: str, params: Dict[str, Any], value: Any, scope: str = ''):
+        """Guarda la respuesta de un endpoint cacheable"""
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl > 0:
+            self._store(self._make_key(endpoint, params, scope), ttl, value)
+
+    def _store(self, key: str, ttl: int, value: Any):
+        self.backend.set(key, (value, time.time()), ttl + self.stale_ttl)
+
+    def _revalidate(self, key: str, ttl: int, fetch: Callable[[], Any]):
+        """Refresca una entrada vencida en background (una sola vez por clave)"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._store(key, ttl, fetch())
+            except Exception as e:
+                logger.warning(f"No se pudo refrescar {key}: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name='citos-cache-refresh', daemon=True).start()
+
+    def invalidate(self, endpoint: str):
+        """Invalida todas las respuestas cacheadas de un endpoint"""
+        self.backend.set(f"{self.key_prefix}:gen:{endpoint}", time.time_ns(), None)
+
+    def invalidate_for(self, mutating_endpoint: str):
+        """Invalida los endpoints afectados por una llamada que modifica datos"""
+        for endpoint in INVALIDATIONS.get(mutating_endpoint, ()):
+            self.invalidate(endpoint)
+
+    def clear(self):
+        """Invalida todos los endpoints cacheados"""
+        for endpoint in self.ttls:
+            self.invalidate(endpoint)
@@ -0,0 +1,298 @@
+"""
+Grabación y reproducción de tráfico con el servidor GPS (CMSV6)
+===============================================================
+
+Transporte intercambiable para ``requests`` con dos modos:
+
+- ``CassetteRecorder``: deja pasar las peticiones al servidor real y guarda
+  cada intercambio (URL, código HTTP, cabeceras, cuerpo, duración y errores
+  de red) en un "cassette" JSONL comprimido con gzip.
+- ``CassettePlayer``: responde desde un cassette sin tocar la red, con la
+  latencia original o acelerada (``speed``).
+
+Como se instala en el pool de ``sit/http_pool.py``, cubre tanto al cliente
+citos (``GPSCameraAPI``) como a los ``make_request`` legacy y a los
+descargadores. Sirve para repetir tráfico con forma de producción
+(paginación, tamaños, códigos de error) y comparar el rendimiento entre
+versiones.
+
+Las peticiones se emparejan por método, ruta y parámetros, ignorando
+``jsession`` y ``password`` (que además no se guardan). Si la misma petición
+se grabó varias veces, se reproducen en orden y se repite la última.
+
+Ejemplo:
+
+    configure_cassette('record', 'trafico.jsonl.gz')   # grabar
+    configure_cassette('replay', 'trafico.jsonl.gz', speed=10)  # 10x más rápido
+    configure_cassette(None)                           # volver a la red
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_cassette.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import atexit
+import base64
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl, unquote, urlencode
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from . import http_pool
+
+logger = logging.getLogger(__name__)
+
+# Parámetros que no participan del emparejamiento y no se graban
+VOLATILE_PARAMS = frozenset({'jsession', 'password'})
+
+# Cabeceras de respuesta que se graban
+RECORDED_HEADERS = ('Content-Type', 'Content-Length', 'Content-Range', 'Accept-Ranges')
+
+# Cuerpos más grandes se graban solo por tamaño (se reproducen con ceros)
+DEFAULT_MAX_BODY = 1024 * 1024
+
+
+class CassetteMissError(requests.ConnectionError):
+    """La petición no está en el cassette (se trata como error de red)"""
+
+
+def _clean(value: str) -> str:
+    """Deshace la codificación múltiple que aplica el cliente citos"""
+    for _ in range(3):
+        decoded = unquote(value)
+        if decoded == value:
+            break
+        value = decoded
+    return value
+
+
+def _params(query: str) -> List[Tuple[str, str]]:
+    return sorted((k, _clean(v)) for k, v in parse_qsl(query, keep_blank_values=True)
+                  if k not in VOLATILE_PARAMS)
+
+
+def request_key(method: str, url: str, body: Any = None) -> str:
+    """
+    Clave de emparejamiento de una petición
+
+    Usa método, ruta y parámetros (de la URL y del formulario), sin el host
+    para poder reproducir contra otra ``base_url``.
+    """
+    parts = urlsplit(url)
+    params = _params(parts.query)
+    if body:
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', 'replace')
+        if isinstance(body, str) and not body.lstrip().startswith('{'):
+            params = sorted(params + _params(body))
+    return f"{method.upper()} {parts.path}?{urlencode(params)}"
+
+
+def _redact(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(k, '***' if k in VOLATILE_PARAMS else v)
+             for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return parts._replace(query=urlencode(query)).geturl()
+
+
+class CassetteRecorder(BaseAdapter):
+    """Adapter que reenvía al servidor real y graba cada intercambio"""
+
+    def __init__(self, path: str, inner: BaseAdapter = None, max_body: int = DEFAULT_MAX_BODY):
+        """
+        Args:
+            path: Archivo del cassette (.jsonl.gz); se agrega al final si existe
+            inner: Adapter real (por defecto uno nuevo con la config del pool)
+            max_body: Tamaño máximo de cuerpo que se graba completo
+        """
+        super().__init__()
+        self.path = path
+        self.inner = inner or http_pool.create_adapter()
+        self.max_body = max_body
+        self.recorded = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        started = time.monotonic()
+        entry = {
+            'offset': round(started - self._started, 6),
+            'key': request_key(request.method, request.url, request.body),
+            'method': request.method,
+            'url': _redact(request.url),
+        }
+
+        try:
+            response = self.inner.send(request, **kwargs)
+            content = response.content  # lee el cuerpo completo (también con stream=True)
+        except requests.RequestException as e:
+            entry['elapsed'] = round(time.monotonic() - started, 6)
+            entry['error'] = type(e).__name__
+            entry['message'] = str(e)
+            self._write(entry)
+            raise
+
+        entry['elapsed'] = round(time.monotonic() - started, 6)
+        entry['status'] = response.status_code
+        entry['reason'] = response.reason
+        entry['headers'] = {name: response.headers[name] for name in RECORDED_HEADERS
+                            if name in response.headers}
+
+        if len(content) > self.max_body:
+            entry['size'] = len(content)
+        else:
+            entry['body'] = base64.b64encode(content).decode('ascii')
+
+        self._write(entry)
+        return response
+
+    def _write(self, entry: Dict[str, Any]):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self.recorded += 1
+            if self.recorded % 100 == 0:
+                self._file.flush()
+
+    def session(self) -> requests.Session:
+        """Sesión que graba (para pasar a ``GPSCameraAPI(session=...)``)"""
+        return _mounted_session(self)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                logger.info(f"📼 Cassette {self.path}: {self.recorded} intercambios grabados")
+        self.inner.close()
+
+
+class CassettePlayer(BaseAdapter):
+    """Adapter que responde desde un cassette grabado"""
+
+    def __init__(self, path: str, speed: float = 1.0):
+        """
+        Args:
+            path: Archivo del cassette (.jsonl.gz)
+            speed: Factor de aceleración de la latencia grabada
+                (1 = original, 10 = diez veces más rápido, 0 = sin espera)
+        """
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.played = 0
+        self.misses = 0
+        self._tracks: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._tracks.setdefault(entry['key'], deque()).append(entry)
+
+        logger.info(f"📼 Cassette {path}: {sum(map(len, self._tracks.values()))} intercambios cargados")
+
+    def _next_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            track = self._tracks.get(key)
+            if not track:
+                self.misses += 1
+                return None
+            self.played += 1
+            # Las repeticiones se consumen en orden; la última queda fija
+            return track.popleft() if len(track) > 1 else track[0]
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        entry = self._next_entry(key)
+        if entry is None:
+            raise CassetteMissError(f"Petición no grabada en {self.path}: {key}", request=request)
+
+        if self.speed:
+            time.sleep(entry.get('elapsed', 0) / self.speed)
+
+        if 'error' in entry:
+            error_class = getattr(requests.exceptions, entry['error'], requests.ConnectionError)
+            raise error_class(entry.get('message', ''), request=request)
+
+        if 'body' in entry:
+            content = base64.b64decode(entry['body'])
+        else:
+            content = bytes(entry.get('size', 0))
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.reason = entry.get('reason', '')
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(content)
+        response._content = content
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(seconds=entry.get('elapsed', 0))
+        return response
+
+    def session(self) -> requests.Session:
+        """Sesión que reproduce (para pasar a ``GPSCameraAPI(session=...)``)"""
+        return _mounted_session(self)
+
+    def close(self):
+        logger.info(f"📼 Cassette {self.path}: {self.played} reproducidos, {self.misses} sin grabar")
+
+
+def _mounted_session(adapter: BaseAdapter) -> requests.Session:
+    session = requests.Session()
+    session.headers.update(http_pool.DEFAULT_HEADERS)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def configure_cassette(mode: Optional[str], path: str = None, speed: float = 1.0,
+                       max_body: int = DEFAULT_MAX_BODY) -> Optional[BaseAdapter]:
+    """
+    Instala el grabador o el reproductor en el pool HTTP compartido
+
+    Args:
+        mode: 'record', 'replay' o None/'' para volver a la red
+        path: Archivo del cassette
+        speed: Aceleración de la reproducción
+        max_body: Tamaño máximo de cuerpo grabado completo
+
+    Returns:
+        Adapter instalado o None
+    """
+    previous = http_pool.get_transport()
+
+    if not mode:
+        transport = None
+    elif not path:
+        raise ValueError("Debe indicar el archivo del cassette")
+    elif mode == 'record':
+        transport = CassetteRecorder(path, max_body=max_body)
+        atexit.register(transport.close)
+    elif mode == 'replay':
+        transport = CassettePlayer(path, speed=speed)
+    else:
+        raise ValueError(f"Modo de cassette inválido: {mode}")
+
+    http_pool.set_transport(transport)
+    if isinstance(previous, (CassetteRecorder, CassettePlayer)):
+        previous.close()
+    return transport
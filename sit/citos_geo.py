@@ -0,0 +1,213 @@
+"""
+Conversiones y cálculos geográficos vectorizados (NumPy)
+========================================================
+
+Equivalentes sobre arreglos de ``parse_coordinates``, ``format_speed`` y
+``format_fuel`` de ``citos_library.py``, más distancia haversine, rumbo y
+bounding box. Convierten un lote completo de estados o un track en una sola
+operación NumPy en lugar de un bucle Python por vehículo o punto.
+
+Todas las funciones aceptan escalares, listas o arreglos y aplican las
+reglas de broadcasting de NumPy.
+
+Ejemplo:
+
+    columns = status_columns(api.get_device_status()['status'])
+    lat, lng = columns['lat'], columns['lng']
+    cerca = within_radius(lat, lng, -31.63, -60.70, radius_m=500)
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_geo.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+from typing import Dict, Any, Sequence, Tuple
+
+import numpy as np
+
+# Escalas de la API
+COORDINATE_SCALE = 1000000.0   # grados x 1.000.000
+SPEED_SCALE = 10.0             # décimas de km/h
+FUEL_SCALE = 100.0             # centésimas de litro
+
+# Radio medio de la Tierra en metros
+EARTH_RADIUS_M = 6371008.8
+
+# Campos numéricos de getDeviceStatus y su escala
+STATUS_FIELDS = {
+    'lng': COORDINATE_SCALE,
+    'lat': COORDINATE_SCALE,
+    'sp': SPEED_SCALE,
+    'hx': 1.0,
+    'yl': FUEL_SCALE,
+    'lc': 1.0,
+}
+
+
+def parse_coordinates_array(lng, lat, missing_as_nan: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Convierte coordenadas de la API (grados x 1e6) a grados decimales
+
+    Args:
+        lng: Longitudes en formato API
+        lat: Latitudes en formato API
+        missing_as_nan: Si tratar los pares (0, 0) como posición desconocida
+
+    Returns:
+        Tupla (longitudes, latitudes) en grados
+    """
+    lng = np.asarray(lng, dtype=np.float64) / COORDINATE_SCALE
+    lat = np.asarray(lat, dtype=np.float64) / COORDINATE_SCALE
+    if missing_as_nan:
+        missing = (lng == 0) & (lat == 0)
+        lng = np.where(missing, np.nan, lng)
+        lat = np.where(missing, np.nan, lat)
+    return lng, lat
+
+
+def format_speed_array(speed) -> np.ndarray:
+    """Convierte velocidades de la API (décimas) a km/h"""
+    return np.asarray(speed, dtype=np.float64) / SPEED_SCALE
+
+
+def format_fuel_array(fuel) -> np.ndarray:
+    """Convierte combustible de la API (centésimas) a litros"""
+    return np.asarray(fuel, dtype=np.float64) / FUEL_SCALE
+
+
+def status_columns(statuses: Sequence[Dict[str, Any]],
+                   fields: Dict[str, float] = None) -> Dict[str, np.ndarray]:
+    """
+    Convierte una lista de estados GPS (getDeviceStatus) en columnas
+
+    Los campos ausentes quedan en NaN; las posiciones (0, 0) también.
+
+    Args:
+        statuses: Registros de 'status'
+        fields: Campos a extraer y su escala (por defecto STATUS_FIELDS)
+
+    Returns:
+        Diccionario con 'id' y 'vid' (arreglos de texto) y una columna
+        float64 por campo, ya en unidades (grados, km/h, litros)
+    """
+    fields = STATUS_FIELDS if fields is None else fields
+    count = len(statuses)
+
+    columns = {
+        'id': np.array([str(s.get('id') or '') for s in statuses], dtype=str),
+        'vid': np.array([str(s.get('vid') or '') for s in statuses], dtype=str),
+    }
+    for name, scale in fields.items():
+        values = np.fromiter(
+            (np.nan if s.get(name) is None else s.get(name) for s in statuses),
+            dtype=np.float64, count=count
+        )
+        columns[name] = values / scale
+
+    if 'lat' in columns and 'lng' in columns:
+        missing = (columns['lat'] == 0) & (columns['lng'] == 0)
+        columns['lat'][missing] = np.nan
+        columns['lng'][missing] = np.nan
+
+    return columns
+
+
+def haversine(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """
+    Distancia de círculo máximo en metros
+
+    Args:
+        lat1, lng1: Punto(s) de origen en grados
+        lat2, lng2: Punto(s) de destino en grados
+
+    Returns:
+        Distancias en metros
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lng1, lat2, lng2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def bearing(lat1, lng1, lat2, lng2) -> np.ndarray:
+    """
+    Rumbo inicial de origen a destino
+
+    Returns:
+        Grados desde el norte, en sentido horario (0-360)
+    """
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64))
+                              for v in (lat1, lng1, lat2, lng2))
+    delta = lng2 - lng1
+    x = np.sin(delta) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(delta)
+    return np.degrees(np.arctan2(x, y)) % 360.0
+
+
+def segment_distances(lat, lng) -> np.ndarray:
+    """Distancias en metros entre puntos consecutivos de un recorrido (n-1 valores)"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    return haversine(lat[:-1], lng[:-1], lat[1:], lng[1:])
+
+
+def path_length(lat, lng) -> float:
+    """Largo total de un recorrido en metros (ignora tramos con NaN)"""
+    if np.size(lat) < 2:
+        return 0.0
+    return float(np.nansum(segment_distances(lat, lng)))
+
+
+def bounding_box(lat, lng, padding: float = 0.0) -> Tuple[float, float, float, float]:
+    """
+    Rectángulo que contiene todos los puntos (ignora NaN)
+
+    Args:
+        lat: Latitudes en grados
+        lng: Longitudes en grados
+        padding: Margen en grados a agregar de cada lado
+
+    Returns:
+        Tupla (lat_min, lng_min, lat_max, lng_max)
+
+    Raises:
+        ValueError: Si no hay puntos válidos
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lng))
+    if not valid.any():
+        raise ValueError("No hay posiciones válidas para calcular el rectángulo")
+    lat, lng = lat[valid], lng[valid]
+    return (float(lat.min() - padding), float(lng.min() - padding),
+            float(lat.max() + padding), float(lng.max() + padding))
+
+
+def within_bounds(lat, lng, box: Tuple[float, float, float, float]) -> np.ndarray:
+    """Máscara de los puntos dentro de un rectángulo (lat_min, lng_min, lat_max, lng_max)"""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    lat_min, lng_min, lat_max, lng_max = box
+    return (lat >= lat_min) & (lat <= lat_max) & (lng >= lng_min) & (lng <= lng_max)
+
+
+def within_radius(lat, lng, center_lat: float, center_lng: float, radius_m: float) -> np.ndarray:
+    """Máscara de los puntos a menos de ``radius_m`` metros del centro"""
+    return haversine(lat, lng, center_lat, center_lng) <= radius_m
+
+
+def nearest(lat, lng, target_lat: float, target_lng: float) -> Tuple[int, float]:
+    """
+    Punto más cercano a una posición
+
+    Returns:
+        Tupla (índice, distancia en metros); (-1, inf) si no hay puntos válidos
+    """
+    distances = haversine(lat, lng, target_lat, target_lng)
+    if np.size(distances) == 0 or np.all(np.isnan(distances)):
+        return -1, float('inf')
+    index = int(np.nanargmin(distances))
+    return index, float(distances[index])
@@ -27,13 +27,41 @@ DOCUMENTACIÓN DE LA API
 import requests
 import json
 import hashlib
-from typing import Dict, List, Optional, Union, Any
+from typing import Dict, List, Optional, Union, Any, Callable, Collection, Iterable, Iterator, Tuple
 from urllib.parse import urlencode, quote
 import logging
-from datetime import datetime
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
+from .http_pool import get_http_session
+from .citos_cache import ResponseCache
+from .citos_resilience import ResiliencePolicy, CircuitOpenError
+from .citos_metrics import get_metrics, action_name
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de bloque de las descargas de archivos
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Errores HTTP 4xx de una descarga que sí se reintentan (timeout, límite de tasa)
+RETRYABLE_CLIENT_STATUSES = frozenset({408, 429})
+
+# Formato de fechas de la API y ventana mínima al dividir rangos de tiempo
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+MIN_TIME_WINDOW = timedelta(hours=1)
+
 
 class APIError(Exception):
     """Excepción personalizada para errores de la API"""
@@ -78,7 +106,7 @@ class ErrorCodes(Enum):
     SINGLE_SIGN_ON_ALREADY_LOGGED = 34
 
 
-@dataclass
+@dataclass(slots=True)
 class DeviceStatus:
     """Estructura para el estado de un dispositivo GPS"""
     device_id: str
@@ -91,13 +119,39 @@ class DeviceStatus:
     direction: int
     mileage: int
     fuel: float
-    temperature_sensors: List[float]
-    status_flags: Dict[str, int]
-    map_coordinates: Optional[Dict[str, str]] = None
+    temperature_sensors: Tuple[float, ...]
+    status_flags: Tuple[int, ...]
+    map_coordinates: Optional[Tuple[float, float]] = None
     geographic_position: Optional[str] = None
+    
+    @classmethod
+    def from_api(cls, raw: Dict[str, Any]) -> 'DeviceStatus':
+        """
+        Crea el registro desde un elemento de 'status' de getDeviceStatus
+        
+        Convierte coordenadas (1e-6 grados), velocidad (1/10 km/h) y
+        combustible (1/100 L) una sola vez, al parsear.
+        """
+        mlng, mlat = raw.get('mlng'), raw.get('mlat')
+        return cls(
+            device_id=str(raw.get('id') or ''),
+            vehicle_id=raw.get('vid'),
+            longitude=(raw.get('lng') or 0) / 1000000.0,
+            latitude=(raw.get('lat') or 0) / 1000000.0,
+            speed=(raw.get('sp') or 0) / 10.0,
+            online=raw.get('ol') == 1,
+            gps_time=raw.get('gt') or '',
+            direction=raw.get('hx') or 0,
+            mileage=raw.get('lc') or 0,
+            fuel=(raw.get('yl') or 0) / 100.0,
+            temperature_sensors=tuple((raw.get(k) or 0) / 100.0 for k in ('t1', 't2', 't3', 't4')),
+            status_flags=tuple(raw.get(k) or 0 for k in ('s1', 's2', 's3', 's4')),
+            map_coordinates=(float(mlng), float(mlat)) if mlng and mlat else None,
+            geographic_position=raw.get('ps') or None
+        )
 
 
-@dataclass
+@dataclass(slots=True)
 class VehicleInfo:
     """Información básica de un vehículo"""
     id: int
@@ -108,9 +162,23 @@ class VehicleInfo:
     plate_type: str
     devices: List[Dict]
     vehicle_type: int = 0
+    
+    @classmethod
+    def from_api(cls, raw: Dict[str, Any]) -> 'VehicleInfo':
+        """Crea el registro desde un elemento de 'vehicles' de queryUserVehicle"""
+        return cls(
+            id=raw.get('id') or 0,
+            plate_number=str(raw.get('nm') or ''),
+            icon=raw.get('ic') or 0,
+            company_id=raw.get('pid') or 0,
+            company_name=raw.get('pnm') or '',
+            plate_type=str(raw.get('pt') or ''),
+            devices=raw.get('dl') or [],
+            vehicle_type=raw.get('vehiType') or 0
+        )
 
 
-@dataclass
+@dataclass(slots=True)
 class AlarmInfo:
     """Información de una alarma"""
     guid: str
@@ -122,8 +190,31 @@ class AlarmInfo:
     end_time: Optional[int]
     description: str
     handled: bool
-    parameters: Dict[str, Any]
-    location_info: Dict[str, Any]
+    parameters: Tuple[int, ...]
+    location_info: Optional[Tuple[float, float]]
+    
+    @classmethod
+    def from_api(cls, raw: Dict[str, Any]) -> 'AlarmInfo':
+        """
+        Crea el registro desde un elemento de 'alarms' de queryAlarmDetail
+        
+        location_info queda como (longitud, latitud) en grados.
+        """
+        gps = raw.get('Gps') or raw.get('sGps') or {}
+        lng, lat = gps.get('lng'), gps.get('lat')
+        return cls(
+            guid=raw.get('guid') or '',
+            alarm_type=raw.get('atp') or 0,
+            device_id=str(raw.get('did') or raw.get('devIdno') or ''),
+            vehicle_id=raw.get('vid') or raw.get('vehiIdno'),
+            company_id=raw.get('pid') or 0,
+            start_time=raw.get('stm') or 0,
+            end_time=raw.get('etm'),
+            description=raw.get('desc') or '',
+            handled=bool(raw.get('hd')),
+            parameters=tuple(raw.get(k) or 0 for k in ('p1', 'p2', 'p3', 'p4')),
+            location_info=parse_coordinates(lng, lat) if lng and lat else None
+        )
 
 
 class GPSCameraAPI:
@@ -135,7 +226,11 @@ class GPSCameraAPI:
     """
     
     def __init__(self, base_url: str = "http://190.183.254.253:8088", 
-                 timeout: int = 30, verify_ssl: bool = True):
+                 timeout: int = 30, verify_ssl: bool = True,
+                 session: requests.Session = None,
+                 session_ttl: int = 1800, refresh_margin: int = 120,
+                 cache: ResponseCache = None,
+                 resilience: ResiliencePolicy = None):
         """
         Inicializa el cliente de la API
         
@@ -143,13 +238,32 @@ class GPSCameraAPI:
             base_url: URL base de la API
             timeout: Timeout para las requests en segundos
             verify_ssl: Si verificar certificados SSL
+            session: Sesión HTTP propia (por defecto usa el pool compartido)
+            session_ttl: Vida útil estimada del jsession en segundos (0 = sin vencimiento)
+            refresh_margin: Segundos antes del vencimiento en que se renueva en background
+            cache: Cache de respuestas por endpoint (None = sin cache)
+            resilience: Limitador, reintentos y circuit breaker (None = sin protección)
         """
         self.base_url = base_url.rstrip('/')
         self.timeout = timeout
         self.verify_ssl = verify_ssl
+        self.session = session
+        self.cache = cache
+        self.resilience = resilience
         self.jsession = None
         self.account_name = None
         
+        # Estado de la sesión (seguimiento optimista, sin round-trips extra)
+        self.session_ttl = session_ttl
+        self.refresh_margin = refresh_margin
+        self.on_session_change = None  # Callback(jsession) al renovarse la sesión
+        self.session_broker = None  # SessionBroker compartido (ver citos_session_broker.py)
+        self._credentials = None
+        self._session_started = None
+        self._session_ok = False
+        self._session_lock = threading.Lock()
+        self._refresh_thread = None
+        
         # Configurar logging
         self.logger = logging.getLogger(__name__)
         
@@ -199,62 +313,165 @@ class GPSCameraAPI:
         Raises:
             APIError: Si hay error en la respuesta de la API
         """
-        if require_session and not self.jsession:
-            raise APIError(5, "No hay sesión activa. Debe hacer login primero.")
+        if self.cache is None or not require_session:
+            return self._request_with_session(endpoint, method, params, data, require_session)
         
-        # Preparar parámetros
-        if params is None:
-            params = {}
+        if self.cache.is_cacheable(endpoint):
+            return self.cache.get_or_fetch(
+                endpoint, params,
+                lambda: self._request_with_session(endpoint, method, params, data, require_session),
+                scope=self.account_name or ''
+            )
         
-        if require_session and self.jsession:
-            params['jsession'] = self.jsession
+        result = self._request_with_session(endpoint, method, params, data, require_session)
+        self.cache.invalidate_for(endpoint)
+        return result
+    
+    def _request_with_session(self, endpoint: str, method: str = 'GET',
+                              params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                              require_session: bool = True) -> Dict[str, Any]:
+        """
+        Realiza la petición renovando la sesión y reintentando si el servidor la rechaza
         
-        # Construir URL
-        url = f"{self.base_url}/{endpoint.lstrip('/')}"
-        if params:
-            url += '?' + self._encode_url_params(params)
+        Raises:
+            APIError: Si hay error en la respuesta de la API
+        """
+        jsession = self.jsession
+        
+        try:
+            result = self._send_guarded(endpoint, method, params, data, require_session)
+        except APIError as e:
+            # Sesión vencida: re-login con las credenciales guardadas y reintentar una vez
+            if not (require_session and e.code == ErrorCodes.SESSION_NOT_EXISTS.value
+                    and self._relogin(jsession)):
+                raise
+            result = self._send_guarded(endpoint, method, params, data, require_session)
+        
+        if require_session:
+            self._mark_session_ok()
+        
+        return result
+    
+    def _send_guarded(self, endpoint: str, method: str = 'GET',
+                      params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                      require_session: bool = True) -> Dict[str, Any]:
+        """
+        Envía la petición aplicando limitador, reintentos y circuit breaker
+        
+        Raises:
+            APIError: Si hay error en la respuesta o el circuito está abierto
+        """
+        if self.resilience is None:
+            return self._send_request(endpoint, method, params, data, require_session)
+        
+        try:
+            return self.resilience.execute(
+                lambda: self._send_request(endpoint, method, params, data, require_session),
+                action=action_name(endpoint)
+            )
+        except CircuitOpenError as e:
+            raise APIError(24, str(e))
+    
+    def _send_request(self, endpoint: str, method: str = 'GET',
+                      params: Dict[str, Any] = None, data: Dict[str, Any] = None,
+                      require_session: bool = True) -> Dict[str, Any]:
+        """
+        Envía una petición HTTP a la API (sin lógica de re-login)
+        
+        Raises:
+            APIError: Si hay error en la respuesta de la API
+        """
+        url = self._build_url(endpoint, params, require_session)
         
         # Preparar headers
         headers = self.default_headers.copy()
         
+        # Sesión con conexiones keep-alive reutilizables
+        http = self.session or get_http_session()
+        
+        # Métricas de latencia, bytes y código de resultado
+        started = time.perf_counter()
+        code, nbytes = 0, 0
+        
         # Realizar petición
         try:
             if method.upper() == 'POST':
                 if data:
-                    response = requests.post(
+                    response = http.post(
                         url, json=data, headers=headers, 
                         timeout=self.timeout, verify=self.verify_ssl
                     )
                 else:
-                    response = requests.post(
+                    response = http.post(
                         url, headers=headers,
                         timeout=self.timeout, verify=self.verify_ssl
                     )
             else:
-                response = requests.get(
+                response = http.get(
                     url, headers=headers,
                     timeout=self.timeout, verify=self.verify_ssl
                 )
             
             response.raise_for_status()
+            nbytes = len(response.content)
             
-            # Parsear respuesta JSON
+            # Parsear respuesta JSON (orjson si está disponible)
             try:
-                result = response.json()
-            except json.JSONDecodeError:
+                result = json_loads(response.content)
+            except ValueError:
                 raise APIError(6, "Respuesta inválida del servidor")
             
-            # Verificar código de resultado
-            if 'result' in result and result['result'] != 0:
-                error_code = result['result']
-                error_msg = self._get_error_message(error_code)
-                raise APIError(error_code, error_msg)
-            
-            return result
+            return self._check_result(result)
             
+        except APIError as e:
+            code = e.code
+            raise
         except requests.RequestException as e:
+            code = 24
             self.logger.error(f"Error de conexión: {e}")
             raise APIError(24, f"Error de conexión: {str(e)}")
+        finally:
+            get_metrics().record_request(
+                action_name(endpoint), time.perf_counter() - started, nbytes, code
+            )
+    
+    def _build_url(self, endpoint: str, params: Dict[str, Any] = None,
+                   require_session: bool = True) -> str:
+        """
+        Construye la URL completa de una petición agregando el jsession
+        
+        Raises:
+            APIError: Si la petición requiere sesión y no hay una activa
+        """
+        if require_session and not self.jsession:
+            raise APIError(5, "No hay sesión activa. Debe hacer login primero.")
+        
+        # Preparar parámetros
+        params = dict(params) if params else {}
+        
+        if require_session and self.jsession:
+            params['jsession'] = self.jsession
+        
+        # Construir URL
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        if params:
+            url += '?' + self._encode_url_params(params)
+        
+        return url
+    
+    def _check_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Verifica el código de resultado de una respuesta de la API
+        
+        Raises:
+            APIError: Si el código de resultado indica error
+        """
+        if 'result' in result and result['result'] != 0:
+            error_code = result['result']
+            error_msg = self._get_error_message(error_code)
+            raise APIError(error_code, error_msg)
+        
+        return result
     
     def _get_error_message(self, code: int) -> str:
         """Obtiene el mensaje de error para un código específico"""
@@ -310,36 +527,57 @@ class GPSCameraAPI:
         Raises:
             APIError: Si las credenciales son inválidas
         """
-        # DEBUGGING - agregar estas líneas
-        print(f"🔍 CITOS DEBUG: account recibida = '{account}'")
-        print(f"🔍 CITOS DEBUG: password recibida = '{password}'")
+        result = self._make_request(
+            'StandardApiAction_login.action',
+            method='GET',
+            params=self._build_login_params(account, password),
+            require_session=False
+        )
+        
+        self._store_login(account, result)
+        self._credentials = (account, password)
+        return result
+    
+    def set_credentials(self, account: str, password: str):
+        """
+        Guarda credenciales para re-login automático sin iniciar sesión ahora
         
+        Con credenciales guardadas, una petición que falle con
+        SESSION_NOT_EXISTS (o sin sesión activa) hace login y se reintenta.
+        """
+        self._credentials = (account, password)
+    
+    def adopt_session(self, jsession: str, account_name: str = None):
+        """
+        Usa un jsession obtenido por otro medio (cache, otro proceso)
+        
+        Su antigüedad es desconocida: no se renueva por TTL, pero si el
+        servidor lo rechaza se hace re-login con las credenciales guardadas.
+        """
+        self.jsession = jsession
+        self.account_name = account_name or self.account_name
+        self._session_started = None
+        self._session_ok = bool(jsession)
+    
+    def _build_login_params(self, account: str, password: str) -> Dict[str, Any]:
+        """Arma los parámetros de login aplicando MD5 a la contraseña"""
         # Aplicar hash MD5 a la contraseña
         if len(password) != 32:  # No es un hash MD5 ya
-            original_password = password
             password = hashlib.md5(password.encode('utf-8')).hexdigest()
-            print(f"🔍 CITOS DEBUG: '{original_password}' -> MD5: {password}")
-        else:
-            print(f"🔍 CITOS DEBUG: Password ya es MD5: {password}")
         
-        params = {
+        return {
             'account': account,
             'password': password
         }
-        
-        result = self._make_request(
-            'StandardApiAction_login.action',
-            method='GET',
-            params=params,
-            require_session=False
-        )
-        
-        # Guardar información de sesión
+    
+    def _store_login(self, account: str, result: Dict[str, Any]):
+        """Guarda la información de sesión devuelta por el login"""
         self.jsession = result.get('jsession')
         self.account_name = result.get('account_name')
+        self._session_started = time.monotonic()
+        self._session_ok = bool(self.jsession)
         
         self.logger.info(f"Login exitoso para usuario: {account}")
-        return result
     
     def logout(self) -> Dict[str, Any]:
         """
@@ -351,14 +589,131 @@ class GPSCameraAPI:
         if not self.jsession:
             return {'result': 0, 'message': 'No hay sesión activa'}
         
+        # Un logout explícito no debe disparar re-login automático
+        self._credentials = None
         result = self._make_request('StandardApiAction_logout.action')
         
-        # Limpiar información de sesión
+        self._clear_login()
+        return result
+    
+    def _clear_login(self):
+        """Limpia la información de sesión local"""
         self.jsession = None
         self.account_name = None
+        self._credentials = None
+        self._session_started = None
+        self._session_ok = False
         
         self.logger.info("Logout exitoso")
-        return result
+    
+    def _relogin(self, stale_jsession: Optional[str]) -> bool:
+        """
+        Renueva la sesión tras un SESSION_NOT_EXISTS
+        
+        Si otro hilo ya la renovó mientras tanto, solo se reutiliza la nueva.
+        
+        Args:
+            stale_jsession: jsession con el que falló la petición
+            
+        Returns:
+            True si hay una sesión nueva con la que reintentar
+        """
+        with self._session_lock:
+            if self.jsession and self.jsession != stale_jsession:
+                return True
+            
+            self._session_ok = False
+            if self.session_broker is not None:
+                # El broker reutiliza la sesión renovada por otro proceso si la hay
+                if not self._adopt_from_broker(stale_jsession):
+                    return False
+            elif not self._credentials:
+                return False
+            else:
+                account, password = self._credentials
+                self.logger.info("Sesión GPS vencida, renovando login...")
+                try:
+                    self.login(account, password)
+                except APIError as e:
+                    self.logger.error(f"Re-login fallido: {e}")
+                    return False
+        
+        self._notify_session_change()
+        return True
+    
+    def _adopt_from_broker(self, stale_jsession: Optional[str]) -> bool:
+        """
+        Toma del broker un jsession distinto de ``stale_jsession``
+        
+        El broker reutiliza el que haya renovado otro proceso o hace login
+        una sola vez; la antigüedad del registro se respeta para el TTL.
+        """
+        if stale_jsession:
+            jsession = self.session_broker.refresh(stale_jsession)
+        else:
+            jsession = self.session_broker.get()
+        if not jsession:
+            return False
+        
+        record = self.session_broker.current()
+        age = record.age if record is not None and record.jsession == jsession else 0.0
+        self.jsession = jsession
+        self._session_started = time.monotonic() - age
+        self._session_ok = True
+        return True
+    
+    def _mark_session_ok(self):
+        """Marca la sesión como válida y la renueva en background si está por vencer"""
+        self._session_ok = True
+        
+        if (not self.session_ttl or self._session_started is None
+                or not (self._credentials or self.session_broker)):
+            return
+        
+        age = time.monotonic() - self._session_started
+        if age < self.session_ttl - self.refresh_margin:
+            return
+        
+        # Sin esperar: si el lock está tomado hay un login en curso (renovación
+        # o re-login) y la petición sigue con la sesión actual
+        if not self._session_lock.acquire(blocking=False):
+            return
+        try:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_session, name='citos-session-refresh', daemon=True
+            )
+            self._refresh_thread.start()
+        finally:
+            self._session_lock.release()
+    
+    def _refresh_session(self):
+        """Renueva el login antes de que venza la sesión actual"""
+        with self._session_lock:
+            if self.session_broker is not None:
+                if not self._adopt_from_broker(self.jsession):
+                    self.logger.warning("No se pudo renovar la sesión GPS desde el broker")
+                    return
+            elif not self._credentials:
+                return
+            else:
+                account, password = self._credentials
+                try:
+                    self.login(account, password)
+                except APIError as e:
+                    self.logger.warning(f"No se pudo renovar la sesión GPS: {e}")
+                    return
+        
+        self._notify_session_change()
+    
+    def _notify_session_change(self):
+        """Avisa al callback registrado que cambió el jsession"""
+        if self.on_session_change is not None:
+            try:
+                self.on_session_change(self.jsession)
+            except Exception as e:
+                self.logger.error(f"Error en callback de sesión: {e}")
     
     # =====================================================================
     # GESTIÓN DE VEHÍCULOS Y DISPOSITIVOS
@@ -749,6 +1104,54 @@ class GPSCameraAPI:
             params=params
         )
     
+    def query_security_photos(self, start_time: str, end_time: str,
+                              vehicle_ids: Union[str, List[str]] = None,
+                              device_ids: Union[str, List[str]] = None,
+                              alarm_type: int = 1, file_type: int = 2,
+                              current_page: int = 1,
+                              page_records: int = 50) -> Dict[str, Any]:
+        """
+        Consulta fotos de seguridad almacenadas en el servidor
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            vehicle_ids: IDs de vehículos (fichas)
+            device_ids: IDs de dispositivos
+            alarm_type: Tipo de alarma asociada a la foto
+            file_type: Tipo de archivo (2=imagen)
+            current_page: Página actual
+            page_records: Registros por página
+            
+        Returns:
+            Lista paginada de fotos (clave 'infos')
+        """
+        params = {
+            'filetype': file_type,
+            'alarmType': alarm_type,
+            'begintime': start_time,
+            'endtime': end_time,
+            'currentPage': current_page,
+            'pageRecords': page_records
+        }
+        
+        if vehicle_ids:
+            if isinstance(vehicle_ids, list):
+                params['vehiIdno'] = ','.join(vehicle_ids)
+            else:
+                params['vehiIdno'] = vehicle_ids
+        
+        if device_ids:
+            if isinstance(device_ids, list):
+                params['devIdno'] = ','.join(device_ids)
+            else:
+                params['devIdno'] = device_ids
+        
+        return self._make_request(
+            'StandardApiAction_queryPhoto.action',
+            params=params
+        )
+    
     # =====================================================================
     # CONTROL DE VEHÍCULOS
     # =====================================================================
@@ -1209,6 +1612,278 @@ class GPSCameraAPI:
             params=params
         )
     
+    # =====================================================================
+    # RESULTADOS TIPADOS
+    # =====================================================================
+    
+    def get_fleet_snapshot(self, device_ids: Union[str, List[str]] = None,
+                           vehicle_ids: Union[str, List[str]] = None,
+                           **kwargs) -> List[DeviceStatus]:
+        """
+        Obtiene el estado GPS de la flota como registros DeviceStatus
+        
+        Args:
+            device_ids: ID(s) de dispositivo (None = todos)
+            vehicle_ids: ID(s) de vehículo
+            **kwargs: Resto de parámetros de get_device_status
+            
+        Returns:
+            Lista de DeviceStatus con unidades ya convertidas
+        """
+        result = self.get_device_status(device_ids=device_ids, vehicle_ids=vehicle_ids, **kwargs)
+        return [DeviceStatus.from_api(raw) for raw in result.get('status') or []]
+    
+    def get_fleet_arrays(self, device_ids: Union[str, List[str]] = None,
+                         vehicle_ids: Union[str, List[str]] = None,
+                         **kwargs) -> Dict[str, Any]:
+        """
+        Obtiene el estado GPS de la flota como columnas NumPy
+        
+        Ver ``citos_geo.status_columns`` (requiere numpy).
+        
+        Args:
+            device_ids: ID(s) de dispositivo (None = todos)
+            vehicle_ids: ID(s) de vehículo
+            **kwargs: Resto de parámetros de get_device_status
+            
+        Returns:
+            Diccionario de columnas ('id', 'vid', 'lat', 'lng', 'sp', ...)
+        """
+        from .citos_geo import status_columns
+        
+        result = self.get_device_status(device_ids=device_ids, vehicle_ids=vehicle_ids, **kwargs)
+        return status_columns(result.get('status') or [])
+    
+    def get_vehicle_records(self, language: str = 'zh') -> List[VehicleInfo]:
+        """
+        Obtiene los vehículos del usuario como registros VehicleInfo
+        
+        Args:
+            language: Idioma ('zh' o 'en')
+            
+        Returns:
+            Lista de VehicleInfo
+        """
+        result = self.get_user_vehicles(language=language)
+        return [VehicleInfo.from_api(raw) for raw in result.get('vehicles') or []]
+    
+    def get_alarm_page(self, start_time: str, end_time: str,
+                       alarm_types: Union[str, List[str]],
+                       **kwargs) -> Tuple[List[AlarmInfo], Dict[str, Any]]:
+        """
+        Obtiene una página de alarmas como registros AlarmInfo
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            alarm_types: Tipos de alarma
+            **kwargs: Resto de parámetros de get_device_alarms
+            
+        Returns:
+            Tupla (lista de AlarmInfo, paginación)
+        """
+        result = self.get_device_alarms(start_time, end_time, alarm_types, **kwargs)
+        alarms = [AlarmInfo.from_api(raw) for raw in result.get('alarms') or []]
+        return alarms, result.get('pagination') or {}
+    
+    # =====================================================================
+    # PAGINACIÓN AUTOMÁTICA
+    # =====================================================================
+    
+    def iter_device_alarms(self, start_time: str, end_time: str,
+                           alarm_types: Union[str, List[str]],
+                           page_records: int = 50, prefetch: int = 2,
+                           window: timedelta = None, workers: int = 4,
+                           **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todas las alarmas del rango, página por página
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            alarm_types: Tipos de alarma
+            page_records: Registros por página
+            prefetch: Páginas a pedir por adelantado en paralelo
+            window: Dividir el rango en ventanas de este largo (ver iter_time_windows)
+            workers: Ventanas a pedir en paralelo
+            **kwargs: Resto de parámetros de get_device_alarms
+            
+        Yields:
+            Cada alarma como diccionario
+        """
+        def fetch_window(begin, end):
+            def fetch_page(page):
+                return self.get_device_alarms(begin, end, alarm_types,
+                                              current_page=page, page_records=page_records,
+                                              **kwargs)
+            return iter_records(fetch_page, ('alarms', 'infos'), prefetch=prefetch)
+        
+        return iter_time_windows(fetch_window, start_time, end_time, window, workers)
+    
+    def iter_device_track(self, device_id: str, start_time: str, end_time: str,
+                          page_records: int = 200, prefetch: int = 2,
+                          window: timedelta = None, workers: int = 4,
+                          **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todos los puntos del track de un dispositivo
+        
+        Args:
+            device_id: ID del dispositivo
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            page_records: Registros por página
+            prefetch: Páginas a pedir por adelantado en paralelo
+            window: Dividir el rango en ventanas de este largo (ver iter_time_windows)
+            workers: Ventanas a pedir en paralelo
+            **kwargs: Resto de parámetros de get_device_track
+            
+        Yields:
+            Cada punto del track como diccionario
+        """
+        def fetch_window(begin, end):
+            def fetch_page(page):
+                return self.get_device_track(device_id, begin, end,
+                                             current_page=page, page_records=page_records,
+                                             **kwargs)
+            return iter_records(fetch_page, ('tracks', 'infos'), prefetch=prefetch)
+        
+        return iter_time_windows(fetch_window, start_time, end_time, window, workers)
+    
+    def iter_security_photos(self, start_time: str, end_time: str,
+                             page_records: int = 50, prefetch: int = 2,
+                             window: timedelta = None, workers: int = 4,
+                             **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todas las fotos de seguridad del rango
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            page_records: Registros por página
+            prefetch: Páginas a pedir por adelantado en paralelo
+            window: Dividir el rango en ventanas de este largo (ver iter_time_windows)
+            workers: Ventanas a pedir en paralelo
+            **kwargs: Resto de parámetros de query_security_photos
+            
+        Yields:
+            Cada foto como diccionario
+        """
+        def fetch_window(begin, end):
+            def fetch_page(page):
+                return self.query_security_photos(begin, end,
+                                                  current_page=page, page_records=page_records,
+                                                  **kwargs)
+            return iter_records(fetch_page, ('infos',), prefetch=prefetch)
+        
+        return iter_time_windows(fetch_window, start_time, end_time, window, workers)
+    
+    def iter_vehicle_mileage(self, start_time: str, end_time: str,
+                             page_records: int = 50, prefetch: int = 2,
+                             window: timedelta = None, workers: int = 4,
+                             **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre el reporte de kilometraje del rango
+        
+        Con ``window`` se obtiene un registro por vehículo y por ventana
+        (en orden de ventana); sumarlos queda a cargo del llamador.
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            page_records: Registros por página
+            prefetch: Páginas a pedir por adelantado en paralelo
+            window: Dividir el rango en ventanas de este largo (ver iter_time_windows)
+            workers: Ventanas a pedir en paralelo
+            **kwargs: Resto de parámetros de get_vehicle_mileage
+            
+        Yields:
+            Cada registro de kilometraje como diccionario
+        """
+        def fetch_window(begin, end):
+            def fetch_page(page):
+                return self.get_vehicle_mileage(begin, end,
+                                                current_page=page, page_records=page_records,
+                                                **kwargs)
+            return iter_records(fetch_page, ('infos',), prefetch=prefetch)
+        
+        return iter_time_windows(fetch_window, start_time, end_time, window, workers)
+    
+    def iter_parking_detail(self, start_time: str, end_time: str,
+                            park_time: int, map_type: int,
+                            page_records: int = 50, prefetch: int = 2,
+                            window: timedelta = None, workers: int = 4,
+                            **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre todos los registros de estacionamiento del rango
+        
+        Args:
+            start_time: Tiempo de inicio
+            end_time: Tiempo de fin
+            park_time: Tiempo mínimo de estacionamiento en segundos
+            map_type: Conversión de coordenadas
+            page_records: Registros por página
+            prefetch: Páginas a pedir por adelantado en paralelo
+            window: Dividir el rango en ventanas de este largo (ver iter_time_windows)
+            workers: Ventanas a pedir en paralelo
+            **kwargs: Resto de parámetros de get_parking_detail
+            
+        Yields:
+            Cada registro de estacionamiento como diccionario
+        """
+        def fetch_window(begin, end):
+            def fetch_page(page):
+                return self.get_parking_detail(begin, end, park_time, map_type,
+                                               current_page=page, page_records=page_records,
+                                               **kwargs)
+            return iter_records(fetch_page, ('infos', 'parks'), prefetch=prefetch)
+        
+        return iter_time_windows(fetch_window, start_time, end_time, window, workers)
+    
+    # =====================================================================
+    # DESCARGA DE ARCHIVOS
+    # =====================================================================
+    
+    def download_file(self, file_path: str = None, destination: str = None,
+                      url: str = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+                      max_attempts: int = 3, expected_size: int = None) -> int:
+        """
+        Descarga un archivo del servidor (foto, video) directo a disco
+        
+        Usa StandardApiAction_downloadFile.action con ``filePath`` o una URL
+        de descarga ya armada (por ejemplo ``downloadUrl`` de queryPhoto).
+        Ver ``download_to_file``: streaming por bloques, reanudación con
+        Range y renombrado atómico.
+        
+        Args:
+            file_path: Ruta del archivo en el servidor (FPATH)
+            destination: Ruta local de destino
+            url: URL de descarga completa (en lugar de file_path)
+            chunk_size: Tamaño de bloque en bytes
+            max_attempts: Intentos totales (cada uno reanuda el anterior)
+            expected_size: Tamaño esperado en bytes (opcional)
+            
+        Returns:
+            Tamaño del archivo descargado en bytes
+            
+        Raises:
+            APIError: Si la descarga falla tras todos los intentos
+        """
+        if not destination:
+            raise ValueError("Debe indicar el destino")
+        
+        if url is None:
+            if not file_path:
+                raise ValueError("Debe indicar file_path o url")
+            url = self._build_url('StandardApiAction_downloadFile.action', {'filePath': file_path})
+        
+        return download_to_file(
+            url, destination,
+            session=self.session or get_http_session(),
+            timeout=self.timeout, verify=self.verify_ssl,
+            chunk_size=chunk_size, max_attempts=max_attempts,
+            expected_size=expected_size
+        )
+    
     # =====================================================================
     # MÉTODOS DE UTILIDAD
     # =====================================================================
@@ -1217,23 +1892,20 @@ class GPSCameraAPI:
         """
         Verifica si la sesión actual es válida
         
+        No hace peticiones: se basa en la última respuesta recibida y en la
+        antigüedad del login. Si el servidor rechaza la sesión, la próxima
+        petición hace re-login automáticamente (si hay credenciales).
+        
         Returns:
             True si la sesión es válida, False en caso contrario
         """
-        if not self.jsession:
+        if not self.jsession or not self._session_ok:
             return False
         
-        try:
-            # Intentar una operación simple que requiera sesión
-            self.get_user_vehicles()
-            return True
-        except APIError as e:
-            if e.code == 5:  # Session does not exist
-                return False
-            # Si es otro error, la sesión podría ser válida
-            return True
-        except Exception:
-            return False
+        if self.session_ttl and self._session_started is not None:
+            return time.monotonic() - self._session_started < self.session_ttl
+        
+        return True
     
     def get_session_info(self) -> Dict[str, Any]:
         """
@@ -1265,6 +1937,19 @@ class GPSCameraAPI:
 # FUNCIONES DE UTILIDAD
 # =====================================================================
 
+def json_loads(data: Union[bytes, str]) -> Any:
+    """
+    Decodifica JSON con orjson si está instalado (varias veces más rápido
+    que json en los listados grandes de la flota)
+    
+    Raises:
+        ValueError: Si el contenido no es JSON válido
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
 def create_md5_password(password: str) -> str:
     """
     Crea un hash MD5 de una contraseña
@@ -1288,6 +1973,8 @@ def parse_coordinates(lng: int, lat: int) -> tuple:
         
     Returns:
         Tupla con (longitud, latitud) en formato decimal
+        
+    Para lotes ver ``citos_geo.parse_coordinates_array``.
     """
     return (lng / 1000000.0, lat / 1000000.0)
 
@@ -1301,6 +1988,8 @@ def format_speed(speed: int) -> float:
         
     Returns:
         Velocidad en km/h
+        
+    Para lotes ver ``citos_geo.format_speed_array``.
     """
     return speed / 10.0
 
@@ -1314,7 +2003,329 @@ def format_fuel(fuel: int) -> float:
         
     Returns:
         Combustible en litros
+        
+    Para lotes ver ``citos_geo.format_fuel_array``.
     """
     return fuel / 100.0
 
 
+def iter_pages(fetch_page: Callable[[int], Optional[Dict[str, Any]]],
+               prefetch: int = 2,
+               first_page: Dict[str, Any] = None,
+               skip_pages: Collection[int] = ()) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Recorre una consulta paginada pidiendo las siguientes páginas en paralelo
+    
+    Lee ``pagination.totalPages`` de la primera página y, mientras el
+    llamador procesa la página actual, ya tiene en vuelo las ``prefetch``
+    siguientes. En memoria nunca hay más de ``prefetch + 1`` páginas.
+    
+    Args:
+        fetch_page: Función que recibe el número de página y retorna la
+                    respuesta de la API (o None si la página falló)
+        prefetch: Páginas a pedir por adelantado (0 = secuencial)
+        first_page: Primera página ya obtenida por el llamador (opcional)
+        skip_pages: Páginas ya procesadas que no se piden ni se entregan
+                    (la primera se pide igual para conocer totalPages)
+        
+    Yields:
+        Tuplas (número de página, respuesta de la página). Las páginas
+        para las que fetch_page retornó None se omiten.
+    """
+    if first_page is None:
+        first_page = fetch_page(1)
+    if not first_page:
+        return
+    
+    if 1 not in skip_pages:
+        yield 1, first_page
+    
+    pagination = first_page.get('pagination') or {}
+    total_pages = int(pagination.get('totalPages') or 1)
+    
+    pages = [page for page in range(2, total_pages + 1) if page not in skip_pages]
+    if not pages:
+        return
+    
+    if prefetch <= 0:
+        for page in pages:
+            result = fetch_page(page)
+            if result:
+                yield page, result
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix='citos-prefetch')
+    pending = deque()
+    upcoming = iter(pages)
+    
+    try:
+        for next_page in upcoming:
+            pending.append((next_page, executor.submit(fetch_page, next_page)))
+            if len(pending) >= prefetch:
+                break
+        
+        while pending:
+            page, future = pending.popleft()
+            
+            # Mantener la ventana de prefetch llena
+            next_page = next(upcoming, None)
+            if next_page is not None:
+                pending.append((next_page, executor.submit(fetch_page, next_page)))
+            
+            result = future.result()
+            if result:
+                yield page, result
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def iter_records(fetch_page: Callable[[int], Optional[Dict[str, Any]]],
+                 records_keys: Tuple[str, ...] = ('infos',),
+                 prefetch: int = 2) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre los registros de una consulta paginada de forma perezosa
+    
+    Args:
+        fetch_page: Función que recibe el número de página y retorna la respuesta
+        records_keys: Claves posibles de la lista de registros en la respuesta
+        prefetch: Páginas a pedir por adelantado en paralelo
+        
+    Yields:
+        Cada registro de cada página
+    """
+    for _, result in iter_pages(fetch_page, prefetch=prefetch):
+        for key in records_keys:
+            records = result.get(key)
+            if records:
+                yield from records
+                break
+
+
+def split_time_range(start_time: str, end_time: str,
+                     window: timedelta) -> List[Tuple[str, str]]:
+    """
+    Divide un rango de tiempo en ventanas consecutivas
+    
+    Las ventanas no se superponen: cada una termina un segundo antes del
+    inicio de la siguiente (los rangos de la API incluyen ambos extremos).
+    
+    Args:
+        start_time: Tiempo de inicio ('YYYY-MM-DD HH:MM:SS')
+        end_time: Tiempo de fin
+        window: Largo máximo de cada ventana
+        
+    Returns:
+        Lista de tuplas (inicio, fin) en orden
+        
+    Raises:
+        APIError: Código 9 si el inicio es posterior al fin
+    """
+    begin = datetime.strptime(start_time, TIME_FORMAT)
+    end = datetime.strptime(end_time, TIME_FORMAT)
+    if begin > end:
+        raise APIError(ErrorCodes.INVALID_TIME_RANGE.value,
+                       "La hora de inicio no es mayor que la hora de fin")
+    
+    window = max(window, timedelta(seconds=1))
+    windows = []
+    while begin <= end:
+        window_end = min(begin + window - timedelta(seconds=1), end)
+        windows.append((begin.strftime(TIME_FORMAT), window_end.strftime(TIME_FORMAT)))
+        begin = window_end + timedelta(seconds=1)
+    return windows
+
+
+def iter_time_windows(fetch_window: Callable[[str, str], Iterable[Dict[str, Any]]],
+                      start_time: str, end_time: str, window: timedelta = None,
+                      workers: int = 4,
+                      min_window: timedelta = MIN_TIME_WINDOW) -> Iterator[Dict[str, Any]]:
+    """
+    Recorre un rango de tiempo arbitrario dividiéndolo en ventanas
+    
+    Con ``window`` el rango se divide de entrada y las ventanas se piden
+    de a ``workers`` en paralelo, entregando los registros en orden de
+    ventana. Sin ``window`` se pide el rango completo de forma perezosa.
+    En ambos casos, si el servidor rechaza una ventana por larga (código
+    10) se parte en dos mitades, hasta ``min_window``.
+    
+    Args:
+        fetch_window: Función (inicio, fin) que retorna los registros de la ventana
+        start_time: Tiempo de inicio
+        end_time: Tiempo de fin
+        window: Largo de cada ventana (None = rango completo)
+        workers: Ventanas a pedir en paralelo
+        min_window: Largo mínimo al partir ventanas rechazadas
+        
+    Yields:
+        Cada registro de cada ventana, en orden
+    """
+    def stream(begin: str, end: str) -> Iterator[Dict[str, Any]]:
+        produced = False
+        try:
+            for record in fetch_window(begin, end):
+                produced = True
+                yield record
+        except APIError as e:
+            if produced or e.code != ErrorCodes.TIME_RANGE_TOO_LONG.value:
+                raise
+            span = (datetime.strptime(end, TIME_FORMAT)
+                    - datetime.strptime(begin, TIME_FORMAT) + timedelta(seconds=1))
+            if span <= min_window:
+                raise
+            half = timedelta(seconds=math.ceil(span.total_seconds() / 2))
+            logger.info(f"Rango {begin} - {end} demasiado largo, se divide en dos")
+            for sub_begin, sub_end in split_time_range(begin, end, half):
+                yield from stream(sub_begin, sub_end)
+    
+    windows = split_time_range(start_time, end_time, window) if window else [(start_time, end_time)]
+    
+    if len(windows) == 1 or workers <= 1:
+        for begin, end in windows:
+            yield from stream(begin, end)
+        return
+    
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='citos-window')
+    pending = deque()
+    remaining = iter(windows)
+    
+    try:
+        for begin, end in remaining:
+            pending.append(executor.submit(lambda b=begin, e=end: list(stream(b, e))))
+            if len(pending) >= workers:
+                break
+        
+        while pending:
+            future = pending.popleft()
+            
+            # Mantener ``workers`` ventanas en vuelo
+            for begin, end in remaining:
+                pending.append(executor.submit(lambda b=begin, e=end: list(stream(b, e))))
+                break
+            
+            yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def _content_range_total(value: Optional[str]) -> Optional[int]:
+    """Obtiene el tamaño total de una cabecera Content-Range ('bytes 0-9/100')"""
+    if value and '/' in value:
+        total = value.rsplit('/', 1)[1].strip()
+        if total.isdigit():
+            return int(total)
+    return None
+
+
+def download_to_file(url: str, destination: str, session: requests.Session = None,
+                     timeout: float = 30, verify: bool = True,
+                     chunk_size: int = DOWNLOAD_CHUNK_SIZE, max_attempts: int = 3,
+                     expected_size: int = None) -> int:
+    """
+    Descarga una URL a disco por bloques, con reanudación y escritura atómica
+    
+    El cuerpo se escribe por bloques en ``destino.part`` (la memoria usada
+    no depende del tamaño del archivo). Si la conexión se corta, el próximo
+    intento pide solo lo que falta con ``Range`` (si el servidor responde 200
+    en lugar de 206 se empieza de nuevo). Al terminar se verifica el tamaño
+    contra Content-Length/Content-Range y se renombra al destino final, por
+    lo que nunca queda un archivo final a medias.
+    
+    Los errores 4xx fallan sin reintentar, salvo 408 y 429 (y el 416 de
+    un ``.part`` que ya estaba completo).
+    
+    Args:
+        url: URL de descarga
+        destination: Ruta local de destino
+        session: Sesión HTTP (por defecto la del pool compartido)
+        timeout: Timeout de conexión/lectura en segundos
+        verify: Si verificar el certificado SSL
+        chunk_size: Tamaño de bloque en bytes
+        max_attempts: Intentos totales (cada uno reanuda el anterior)
+        expected_size: Tamaño esperado en bytes (opcional)
+        
+    Returns:
+        Tamaño del archivo descargado en bytes
+        
+    Raises:
+        APIError: Código 24 si la descarga falla tras todos los intentos
+    """
+    http = session or get_http_session()
+    action = 'StandardApiAction_downloadFile.action'
+    partial = destination + '.part'
+    
+    directory = os.path.dirname(destination)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    
+    attempt = 0
+    while True:
+        attempt += 1
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+        
+        # Sin compresión: los offsets de Range son bytes del archivo
+        headers = {'Accept-Encoding': 'identity'}
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+        
+        started = time.perf_counter()
+        code, nbytes = 24, 0
+        
+        try:
+            with http.get(url, headers=headers, stream=True,
+                          timeout=timeout, verify=verify) as response:
+                
+                if response.status_code == 416 and offset:
+                    # El .part ya tiene todo (o más de lo que hay en el servidor)
+                    total = _content_range_total(response.headers.get('Content-Range'))
+                    if total != offset:
+                        os.remove(partial)
+                        raise requests.RequestException(f"Rango inválido reanudando {destination}")
+                elif (400 <= response.status_code < 500
+                      and response.status_code not in RETRYABLE_CLIENT_STATUSES):
+                    # Archivo inexistente, URL o sesión inválida: reintentar no lo arregla
+                    raise APIError(24, f"Error descargando {os.path.basename(destination)}",
+                                   f"HTTP {response.status_code}")
+                else:
+                    response.raise_for_status()
+                    
+                    if offset and response.status_code == 206:
+                        mode = 'ab'
+                        total = _content_range_total(response.headers.get('Content-Range'))
+                    else:
+                        mode, offset = 'wb', 0
+                        length = response.headers.get('Content-Length')
+                        total = int(length) if length and length.isdigit() else None
+                    
+                    with open(partial, mode) as f:
+                        for chunk in response.iter_content(chunk_size):
+                            if chunk:
+                                f.write(chunk)
+                                nbytes += len(chunk)
+            
+            size = os.path.getsize(partial)
+            total = expected_size or total
+            
+            if total is not None and size != total:
+                if size > total:
+                    os.remove(partial)
+                raise requests.RequestException(f"Descarga incompleta: {size} de {total} bytes")
+            if size == 0:
+                os.remove(partial)
+                raise requests.RequestException("El servidor devolvió un archivo vacío")
+            
+            os.replace(partial, destination)
+            code = 0
+            return size
+        
+        except requests.RequestException as e:
+            if attempt >= max_attempts:
+                raise APIError(24, f"Error descargando {os.path.basename(destination)}", str(e))
+            logger.warning(f"⚠️ Descarga interrumpida ({e}), reanudando intento {attempt + 1}")
+            time.sleep(min(2.0, 0.25 * attempt))
+        
+        finally:
+            get_metrics().record_request(action, time.perf_counter() - started, nbytes, code)
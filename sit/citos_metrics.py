@@ -0,0 +1,170 @@
+"""
+Métricas de las llamadas al servidor GPS (CMSV6)
+================================================
+
+Registra, por acción de la API (por ejemplo
+``StandardApiAction_queryPhoto.action``):
+
+- histograma de latencia de cada petición HTTP
+- bytes recibidos
+- cantidad de peticiones por código de resultado (0 = éxito)
+- reintentos
+
+Los datos se consultan en el proceso con ``get_metrics().snapshot()`` o
+en formato de texto Prometheus con ``render_prometheus()`` (expuesto en la
+vista ``sit:citos_metrics``).
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_metrics.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import bisect
+import threading
+from typing import Dict, Any, Optional
+
+# Límites superiores de los buckets de latencia, en segundos
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _ActionStats:
+    """Contadores de una acción de la API"""
+
+    __slots__ = ('bucket_counts', 'latency_sum', 'count', 'bytes', 'codes', 'retries')
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(LATENCY_BUCKETS) + 1)  # el último es +Inf
+        self.latency_sum = 0.0
+        self.count = 0
+        self.bytes = 0
+        self.codes: Dict[int, int] = {}
+        self.retries = 0
+
+
+class MetricsRegistry:
+    """Registro thread-safe de métricas por acción"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._actions: Dict[str, _ActionStats] = {}
+
+    def _stats(self, action: str) -> _ActionStats:
+        stats = self._actions.get(action)
+        if stats is None:
+            stats = self._actions[action] = _ActionStats()
+        return stats
+
+    def record_request(self, action: str, duration: float, nbytes: int = 0,
+                       code: Optional[int] = 0):
+        """
+        Registra una petición terminada
+
+        Args:
+            action: Nombre de la acción (endpoint sin parámetros)
+            duration: Duración en segundos
+            nbytes: Bytes recibidos
+            code: Código de resultado de la API (0 = éxito, 24 = red)
+        """
+        index = bisect.bisect_left(LATENCY_BUCKETS, duration)
+        with self._lock:
+            stats = self._stats(action)
+            stats.bucket_counts[index] += 1
+            stats.latency_sum += duration
+            stats.count += 1
+            stats.bytes += nbytes
+            stats.codes[code] = stats.codes.get(code, 0) + 1
+
+    def record_retry(self, action: str):
+        """Registra un reintento de la acción"""
+        with self._lock:
+            self._stats(action).retries += 1
+
+    def reset(self):
+        """Borra todas las métricas"""
+        with self._lock:
+            self._actions.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retorna una copia de las métricas por acción
+
+        Returns:
+            {acción: {count, errors, retries, bytes, latency_avg, latency_buckets, codes}}
+        """
+        with self._lock:
+            result = {}
+            for action, stats in self._actions.items():
+                cumulative, buckets = 0, {}
+                for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), stats.bucket_counts):
+                    cumulative += count
+                    buckets[bound] = cumulative
+                result[action] = {
+                    'count': stats.count,
+                    'errors': stats.count - stats.codes.get(0, 0),
+                    'retries': stats.retries,
+                    'bytes': stats.bytes,
+                    'latency_sum': stats.latency_sum,
+                    'latency_avg': stats.latency_sum / stats.count if stats.count else 0.0,
+                    'latency_buckets': buckets,
+                    'codes': dict(stats.codes),
+                }
+            return result
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Retorna el registro de métricas del proceso"""
+    return _registry
+
+
+def action_name(endpoint: str) -> str:
+    """Obtiene el nombre de la acción de un endpoint o URL (sin query string)"""
+    return endpoint.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
+
+def _format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def render_prometheus(registry: MetricsRegistry = None) -> str:
+    """Genera las métricas en formato de texto de Prometheus"""
+    snapshot = (registry or _registry).snapshot()
+    lines = [
+        '# HELP citos_request_duration_seconds Latencia de las peticiones al servidor GPS',
+        '# TYPE citos_request_duration_seconds histogram',
+    ]
+    for action, data in sorted(snapshot.items()):
+        for bound, count in data['latency_buckets'].items():
+            lines.append(
+                f'citos_request_duration_seconds_bucket{{action="{action}",le="{_format_bound(bound)}"}} {count}'
+            )
+        lines.append(f'citos_request_duration_seconds_sum{{action="{action}"}} {data["latency_sum"]}')
+        lines.append(f'citos_request_duration_seconds_count{{action="{action}"}} {data["count"]}')
+
+    lines += [
+        '# HELP citos_response_bytes_total Bytes recibidos del servidor GPS',
+        '# TYPE citos_response_bytes_total counter',
+    ]
+    for action, data in sorted(snapshot.items()):
+        lines.append(f'citos_response_bytes_total{{action="{action}"}} {data["bytes"]}')
+
+    lines += [
+        '# HELP citos_requests_total Peticiones por código de resultado de la API',
+        '# TYPE citos_requests_total counter',
+    ]
+    for action, data in sorted(snapshot.items()):
+        for code, count in sorted(data['codes'].items(), key=lambda item: str(item[0])):
+            lines.append(f'citos_requests_total{{action="{action}",code="{code}"}} {count}')
+
+    lines += [
+        '# HELP citos_retries_total Reintentos por acción',
+        '# TYPE citos_retries_total counter',
+    ]
+    for action, data in sorted(snapshot.items()):
+        lines.append(f'citos_retries_total{{action="{action}"}} {data["retries"]}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,410 @@
+"""
+Protección de llamadas al servidor GPS (CMSV6)
+==============================================
+
+Cuando el servidor GPS está lento, los pools de hilos de descarga lo
+saturan sin ningún tipo de espera. Este módulo agrega tres piezas que se
+combinan en ``ResiliencePolicy``:
+
+- ``TokenBucket``: limita las peticiones por segundo, compartido entre hilos.
+- ``RetryPolicy``: reintenta según el código de error con backoff exponencial
+  con jitter. Reintenta en 6 (excepción del sistema) y 24 (red), nunca en
+  7/9/10 (parámetros o rango de tiempo inválidos: repetir no sirve).
+- ``CircuitBreaker``: tras varias fallas seguidas del servidor deja de
+  llamarlo durante ``reset_timeout`` segundos y falla de inmediato.
+
+El cliente citos (``GPSCameraAPI``) y las funciones legacy usan la política
+compartida del proceso (``get_default_policy``), que se ajusta con
+``configure_resilience`` desde settings o desde config.json.
+
+Quien ya reintenta por su cuenta (``FleetBroadcaster``, con comandos que no
+son idempotentes) desactiva los reintentos de la política en su hilo con
+``retries_disabled()`` para que haya una sola capa de reintentos.
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_resilience.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+import requests
+
+from .citos_metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Códigos de la API que indican falla del servidor o de la red
+SERVER_FAILURE_CODES = frozenset({6, 24})
+
+# Códigos que nunca se reintentan
+NON_RETRYABLE_CODES = frozenset({7, 9, 10})
+
+
+# Reintentos desactivados en el hilo actual (ver retries_disabled)
+_local = threading.local()
+
+
+@contextmanager
+def retries_disabled() -> Iterator[None]:
+    """
+    Desactiva los reintentos de toda ``ResiliencePolicy`` en el hilo actual
+
+    El limitador y el circuit breaker siguen aplicando.
+    """
+    previous = getattr(_local, 'no_retries', False)
+    _local.no_retries = True
+    try:
+        yield
+    finally:
+        _local.no_retries = previous
+
+
+class CircuitOpenError(Exception):
+    """El circuito está abierto: el servidor GPS se considera caído"""
+
+
+class TokenBucket:
+    """Limitador de tasa thread-safe (token bucket)"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        """
+        Args:
+            rate: Tokens (peticiones) por segundo
+            capacity: Ráfaga máxima (por defecto = rate)
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1, timeout: float = None) -> bool:
+        """
+        Toma tokens, esperando si hace falta
+
+        Args:
+            tokens: Cantidad de tokens a consumir
+            timeout: Espera máxima en segundos (None = sin límite)
+
+        Returns:
+            True si se obtuvieron los tokens, False si venció el timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Toma tokens sin esperar, dejando el saldo en negativo si hace falta
+
+        Para quien no puede bloquear el hilo (event loop): espera por su
+        cuenta el tiempo retornado. Las reservas siguientes esperan más.
+
+        Returns:
+            Segundos a esperar antes de hacer la petición
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+
+class CircuitBreaker:
+    """Circuit breaker de tres estados: closed, open y half_open"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        """
+        Args:
+            failure_threshold: Fallas seguidas que abren el circuito
+            reset_timeout: Segundos que permanece abierto antes de probar de nuevo
+        """
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """
+        Indica si se puede hacer una petición
+
+        Con el circuito medio abierto deja pasar una sola petición de prueba
+        (otra más si la prueba no terminó tras ``reset_timeout`` segundos).
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+
+            if self._probing and now - self._probe_started < self.reset_timeout:
+                return False
+            self._probing = True
+            self._probe_started = now
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("🟢 Servidor GPS respondió, circuito cerrado")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"🔴 Servidor GPS con {self._failures} fallas seguidas, "
+                        f"circuito abierto por {self.reset_timeout}s"
+                    )
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class RetryPolicy:
+    """Política de reintentos según código de error, con backoff y jitter"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5,
+                 max_delay: float = 8.0,
+                 retry_codes: Iterable[int] = SERVER_FAILURE_CODES,
+                 never_retry_codes: Iterable[int] = NON_RETRYABLE_CODES):
+        """
+        Args:
+            max_attempts: Intentos totales (1 = sin reintentos)
+            base_delay: Espera base en segundos
+            max_delay: Espera máxima en segundos
+            retry_codes: Códigos que se reintentan
+            never_retry_codes: Códigos que nunca se reintentan
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_codes = frozenset(retry_codes) - frozenset(never_retry_codes)
+
+    def should_retry(self, code: Optional[int], attempt: int) -> bool:
+        """Indica si reintentar tras fallar el intento número ``attempt``"""
+        return attempt < self.max_attempts and code in self.retry_codes
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes del próximo intento ("full jitter")"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def classify_error(exc: Exception) -> Optional[int]:
+    """
+    Obtiene el código de error de la API asociado a una excepción
+
+    Returns:
+        Código de la API, 24 para errores de red, 6 para respuestas
+        inválidas o None si la excepción no proviene de la petición
+    """
+    code = getattr(exc, 'code', None)
+    if isinstance(code, int):
+        return code
+    if isinstance(exc, requests.RequestException):
+        return 24
+    if isinstance(exc, ValueError):
+        return 6
+    return None
+
+
+class ResiliencePolicy:
+    """Combina limitador, reintentos y circuit breaker alrededor de una petición"""
+
+    def __init__(self, rate_limiter: TokenBucket = None, retry: RetryPolicy = None,
+                 breaker: CircuitBreaker = None):
+        self.rate_limiter = rate_limiter
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.breaker = breaker
+
+    def execute(self, operation: Callable[[], Any],
+                classify: Callable[[Exception], Optional[int]] = classify_error,
+                action: str = None) -> Any:
+        """
+        Ejecuta una petición aplicando la política
+
+        Args:
+            operation: Función sin argumentos que hace la petición
+            classify: Función que obtiene el código de error de una excepción
+            action: Nombre de la acción de la API (para métricas de reintentos)
+
+        Returns:
+            Resultado de ``operation``
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+            Exception: La última excepción de ``operation`` si no se reintenta
+        """
+        attempt = 0
+
+        while True:
+            attempt += 1
+            self.check_circuit()
+
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+
+            try:
+                result = operation()
+            except Exception as e:
+                code = classify(e)
+                if code is None:
+                    raise
+
+                delay = self.record_failure(code, attempt, action)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+
+            self.record_success()
+            return result
+
+    # Decisiones de la política, compartidas con el cliente asíncrono
+    # (que espera con asyncio.sleep en lugar de time.sleep)
+
+    def check_circuit(self):
+        """
+        Verifica el circuit breaker antes de un intento
+
+        Raises:
+            CircuitOpenError: Si el circuito está abierto
+        """
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("Servidor GPS no disponible (circuito abierto)")
+
+    def record_success(self):
+        """Registra un intento exitoso"""
+        if self.breaker is not None:
+            self.breaker.record_success()
+
+    def record_failure(self, code: int, attempt: int, action: str = None) -> Optional[float]:
+        """
+        Registra el intento fallido número ``attempt`` y decide si reintentar
+
+        Respeta ``retries_disabled()`` del hilo actual.
+
+        Returns:
+            Segundos a esperar antes del próximo intento, o None si no se reintenta
+        """
+        if self.breaker is not None:
+            # Solo las fallas del servidor abren el circuito
+            if code in SERVER_FAILURE_CODES:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+
+        if getattr(_local, 'no_retries', False) or not self.retry.should_retry(code, attempt):
+            return None
+
+        if action:
+            get_metrics().record_retry(action)
+
+        delay = self.retry.backoff(attempt)
+        logger.warning(f"⚠️ Error {code} en petición GPS, reintento {attempt} en {delay:.2f}s")
+        return delay
+
+
+_default_policy = ResiliencePolicy(
+    retry=RetryPolicy(),
+    breaker=CircuitBreaker()
+)
+
+
+def get_default_policy() -> ResiliencePolicy:
+    """Retorna la política compartida del proceso"""
+    return _default_policy
+
+
+def configure_resilience(rate_limit: float = None, burst: float = None,
+                         retry_attempts: int = None, failure_threshold: int = None,
+                         reset_timeout: float = None) -> Dict[str, Any]:
+    """
+    Ajusta la política compartida
+
+    Se modifica el objeto existente, por lo que los clientes creados antes
+    también toman la nueva configuración.
+
+    Args:
+        rate_limit: Peticiones por segundo (0 = sin límite)
+        burst: Ráfaga máxima del limitador
+        retry_attempts: Intentos totales por petición
+        failure_threshold: Fallas seguidas que abren el circuito (0 = sin circuito)
+        reset_timeout: Segundos con el circuito abierto
+
+    Returns:
+        Configuración efectiva
+    """
+    policy = _default_policy
+
+    if rate_limit is not None:
+        policy.rate_limiter = TokenBucket(rate_limit, burst) if rate_limit > 0 else None
+
+    if retry_attempts is not None:
+        policy.retry = RetryPolicy(max_attempts=retry_attempts)
+
+    if failure_threshold is not None or reset_timeout is not None:
+        current = policy.breaker or CircuitBreaker()
+        threshold = failure_threshold if failure_threshold is not None else current.failure_threshold
+        timeout = reset_timeout if reset_timeout is not None else current.reset_timeout
+        policy.breaker = CircuitBreaker(threshold, timeout) if threshold > 0 else None
+
+    config = {
+        'rate_limit': policy.rate_limiter.rate if policy.rate_limiter else 0,
+        'burst': policy.rate_limiter.capacity if policy.rate_limiter else 0,
+        'retry_attempts': policy.retry.max_attempts,
+        'failure_threshold': policy.breaker.failure_threshold if policy.breaker else 0,
+        'reset_timeout': policy.breaker.reset_timeout if policy.breaker else 0,
+    }
+    logger.info(f"Protección de servidor GPS configurada: {config}")
+    return config
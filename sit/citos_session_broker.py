@@ -0,0 +1,422 @@
+"""
+Sesión GPS única compartida entre procesos (CMSV6)
+==================================================
+
+El ``jsession`` vivía en varios lugares que se desincronizaban
+(``settings.JSESSION_GPS``, ``adapted_utils.current_session`` más
+``config.json`` y el cache de Django del adapter) y cada uno hacía su
+propio re-login. ``SessionBroker`` es la única fuente del jsession:
+
+- Lo guarda en un almacén compartido entre procesos: el cache de Django
+  (``CacheSessionStore``, con Redis/Memcached sirve para web y Celery) o
+  un archivo JSON (``FileSessionStore``, app de escritorio o un solo host).
+- ``get()`` retorna el jsession vigente y solo hace login si no hay uno o
+  superó ``ttl``.
+- ``refresh(stale)`` se llama cuando el servidor rechaza ``stale``: toma el
+  lock del almacén y, si otro proceso ya lo renovó, reutiliza el nuevo en
+  lugar de volver a loguearse. Así, cuando vence la sesión, N workers
+  hacen un solo login y no una "tormenta" de logins.
+- ``subscribe(callback)`` avisa cada jsession nuevo (para mantener
+  ``settings.JSESSION_GPS`` o ``current_session`` como espejo).
+
+``GPSCameraAPI`` usa el broker si se le asigna ``session_broker``; las
+funciones legacy lo usan por ``current_jsession``/``renew_jsession`` de
+``sit/utils.py`` y ``adapted_utils.py``.
+
+Ejemplo:
+
+    broker = configure_session_broker(
+        FileSessionStore('gps_session.json'),
+        make_login('http://gps:8088', 'admin', 'secreto'),
+    )
+    jsession = broker.get()
+    jsession = broker.refresh(jsession)   # tras un código 5
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_session_broker.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+from .citos_library import GPSCameraAPI
+
+logger = logging.getLogger(__name__)
+
+# Clave del jsession en el cache de Django (la misma que usaba el adapter)
+DEFAULT_CACHE_KEY = 'streambus_gps_session'
+
+# Vida útil estimada del jsession en segundos
+DEFAULT_TTL = 1800
+
+
+class SessionLockTimeout(Exception):
+    """No se pudo tomar el lock del almacén de sesión a tiempo"""
+
+
+@dataclass(slots=True)
+class SessionRecord:
+    """jsession guardado en el almacén compartido"""
+    jsession: str
+    created: float
+    generation: int = 1
+
+    @property
+    def age(self) -> float:
+        return max(0.0, time.time() - self.created)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Any) -> Optional['SessionRecord']:
+        if not isinstance(data, dict) or not data.get('jsession'):
+            return None
+        return cls(str(data['jsession']), float(data.get('created') or 0),
+                   int(data.get('generation') or 1))
+
+
+# =========================================================================
+# ALMACENES
+# =========================================================================
+
+class MemorySessionStore:
+    """Almacén dentro del proceso (pruebas o un solo proceso)"""
+
+    def __init__(self):
+        self._record: Optional[SessionRecord] = None
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[SessionRecord]:
+        return self._record
+
+    def set(self, record: SessionRecord):
+        self._record = record
+
+    def delete(self):
+        self._record = None
+
+    @contextmanager
+    def lock(self, timeout: float = 30.0) -> Iterator[None]:
+        if not self._lock.acquire(timeout=timeout):
+            raise SessionLockTimeout("Lock de sesión GPS ocupado")
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+
+class CacheSessionStore:
+    """
+    Almacén en un cache con la API de Django (get/set/add/delete)
+
+    El lock usa ``cache.add`` (atómico en Redis y Memcached); con
+    LocMemCache solo coordina hilos de un mismo proceso.
+    """
+
+    def __init__(self, cache, key: str = DEFAULT_CACHE_KEY, ttl: int = DEFAULT_TTL,
+                 lock_ttl: float = 30.0):
+        """
+        Args:
+            cache: Cache de Django (o compatible)
+            key: Clave del jsession
+            ttl: Segundos que el registro permanece en el cache
+            lock_ttl: Vencimiento del lock si el proceso que lo tomó muere
+        """
+        self.cache = cache
+        self.key = key
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    def get(self) -> Optional[SessionRecord]:
+        data = self.cache.get(self.key)
+        if isinstance(data, str):
+            # Formato anterior: solo el jsession (edad desconocida, se asume nuevo)
+            return SessionRecord(data, time.time())
+        return SessionRecord.from_dict(data)
+
+    def set(self, record: SessionRecord):
+        self.cache.set(self.key, record.to_dict(), self.ttl)
+
+    def delete(self):
+        self.cache.delete(self.key)
+
+    @contextmanager
+    def lock(self, timeout: float = 30.0) -> Iterator[None]:
+        lock_key = f'{self.key}:lock'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + timeout
+        while not self.cache.add(lock_key, token, int(self.lock_ttl) or 1):
+            if time.monotonic() >= deadline:
+                raise SessionLockTimeout("Lock de sesión GPS ocupado")
+            time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+
+class FileSessionStore:
+    """
+    Almacén en un archivo JSON, con un archivo ``.lock`` como lock entre procesos
+
+    Un lock con más de ``lock_ttl`` segundos se considera abandonado.
+    """
+
+    def __init__(self, path: str, lock_ttl: float = 30.0):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.lock_ttl = lock_ttl
+        self._thread_lock = threading.Lock()
+
+    def get(self) -> Optional[SessionRecord]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return SessionRecord.from_dict(json.load(f))
+        except (OSError, ValueError):
+            return None
+
+    def set(self, record: SessionRecord):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        partial = f'{self.path}.{os.getpid()}.part'
+        with open(partial, 'w', encoding='utf-8') as f:
+            json.dump(record.to_dict(), f)
+        os.replace(partial, self.path)
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def lock(self, timeout: float = 30.0) -> Iterator[None]:
+        deadline = time.monotonic() + timeout
+        if not self._thread_lock.acquire(timeout=timeout):
+            raise SessionLockTimeout("Lock de sesión GPS ocupado")
+        try:
+            while True:
+                try:
+                    fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                    os.write(fd, str(os.getpid()).encode('ascii'))
+                    os.close(fd)
+                    break
+                except FileExistsError:
+                    try:
+                        if time.time() - os.path.getmtime(self.lock_path) > self.lock_ttl:
+                            logger.warning(f"⚠️ Lock de sesión abandonado, se elimina: {self.lock_path}")
+                            os.remove(self.lock_path)
+                            continue
+                    except FileNotFoundError:
+                        continue
+                    if time.monotonic() >= deadline:
+                        raise SessionLockTimeout("Lock de sesión GPS ocupado")
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                try:
+                    os.remove(self.lock_path)
+                except FileNotFoundError:
+                    pass
+        finally:
+            self._thread_lock.release()
+
+
+# =========================================================================
+# BROKER
+# =========================================================================
+
+def make_login(base_url: str, account: str, password: str,
+               **client_kwargs) -> Callable[[], str]:
+    """
+    Función de login para el broker usando un GPSCameraAPI descartable
+
+    Returns:
+        Función sin argumentos que retorna un jsession nuevo
+    """
+    def login() -> str:
+        client = GPSCameraAPI(base_url=base_url, **client_kwargs)
+        return client.login(account, password)['jsession']
+
+    return login
+
+
+class SessionBroker:
+    """Fuente única del jsession, compartida entre procesos por un almacén"""
+
+    def __init__(self, store, login: Callable[[], Optional[str]], ttl: float = DEFAULT_TTL,
+                 lock_timeout: float = 30.0, local_ttl: float = 2.0):
+        """
+        Args:
+            store: MemorySessionStore, CacheSessionStore o FileSessionStore
+            login: Función que hace login y retorna el jsession
+            ttl: Vida útil del jsession (0 = sin vencimiento)
+            lock_timeout: Espera máxima por el lock del almacén
+            local_ttl: Segundos que se reutiliza la última lectura del almacén
+        """
+        self.store = store
+        self.login = login
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.local_ttl = local_ttl
+        self.logins = 0
+        self.reused = 0
+        self.failures = 0
+        self._record: Optional[SessionRecord] = None
+        self._read_at = 0.0
+        self._subscribers: List[Callable[[Optional[str]], None]] = []
+        self._lock = threading.Lock()
+
+    def current(self) -> Optional[SessionRecord]:
+        """Registro vigente según el almacén (sin hacer login)"""
+        now = time.monotonic()
+        if self._record is not None and now - self._read_at < self.local_ttl:
+            return self._record
+        record = self.store.get()
+        self._remember(record)
+        return record
+
+    def _fresh(self, record: Optional[SessionRecord]) -> bool:
+        return record is not None and (not self.ttl or record.age < self.ttl)
+
+    def get(self) -> Optional[str]:
+        """
+        jsession vigente; hace login solo si no hay uno o venció
+
+        Returns:
+            jsession o None si no se pudo iniciar sesión
+        """
+        record = self.current()
+        if self._fresh(record):
+            return record.jsession
+        return self.refresh(record.jsession if record else None)
+
+    def refresh(self, stale: Optional[str] = None) -> Optional[str]:
+        """
+        Renueva la sesión tras un rechazo de ``stale``
+
+        Si otro hilo o proceso ya guardó un jsession distinto y vigente se
+        reutiliza ese; si no, se hace login una sola vez bajo el lock.
+
+        Returns:
+            jsession nuevo o None si falló el login
+        """
+        with self._lock:
+            try:
+                with self.store.lock(self.lock_timeout):
+                    return self._refresh_locked(stale)
+            except SessionLockTimeout as e:
+                # Quien tiene el lock está logueando: usar lo que haya guardado
+                logger.warning(f"⚠️ {e}; se usa la sesión guardada")
+                record = self.store.get()
+                self._remember(record)
+                return record.jsession if record and record.jsession != stale else None
+
+    def _refresh_locked(self, stale: Optional[str]) -> Optional[str]:
+        record = self.store.get()
+        if self._fresh(record) and record.jsession != stale:
+            self.reused += 1
+            self._remember(record)
+            return record.jsession
+
+        try:
+            jsession = self.login()
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"❌ Login GPS fallido: {e}")
+            return None
+        if not jsession:
+            self.failures += 1
+            return None
+
+        self.logins += 1
+        generation = record.generation + 1 if record else 1
+        self._store(SessionRecord(jsession, time.time(), generation))
+        logger.info(f"🔑 Nueva sesión GPS (generación {generation})")
+        return jsession
+
+    def publish(self, jsession: str):
+        """Guarda un jsession obtenido por un login explícito"""
+        with self._lock:
+            record = self.store.get()
+            generation = record.generation + 1 if record else 1
+            self._store(SessionRecord(jsession, time.time(), generation))
+
+    def clear(self):
+        """Olvida el jsession (tras un logout)"""
+        with self._lock:
+            self.store.delete()
+            self._record = None
+            self._read_at = 0.0
+        self._notify(None)
+
+    def _store(self, record: SessionRecord):
+        self.store.set(record)
+        self._remember(record)
+
+    def _remember(self, record: Optional[SessionRecord]):
+        previous = self._record
+        self._record = record
+        self._read_at = time.monotonic()
+        if record is not None and (previous is None or previous.jsession != record.jsession):
+            self._notify(record.jsession)
+
+    def subscribe(self, callback: Callable[[Optional[str]], None]):
+        """Registra una función que recibe cada jsession nuevo"""
+        self._subscribers.append(callback)
+
+    def _notify(self, jsession: Optional[str]):
+        for callback in list(self._subscribers):
+            try:
+                callback(jsession)
+            except Exception as e:
+                logger.error(f"Error en suscriptor de sesión GPS: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        record = self._record
+        return {
+            'logins': self.logins,
+            'reused': self.reused,
+            'failures': self.failures,
+            'generation': record.generation if record else 0,
+            'age': round(record.age, 1) if record else None,
+        }
+
+
+_broker: Optional[SessionBroker] = None
+
+
+def configure_session_broker(store, login: Callable[[], Optional[str]],
+                             **kwargs) -> SessionBroker:
+    """
+    Instala el broker del proceso
+
+    Args:
+        store: Almacén compartido
+        login: Función de login (ver make_login)
+        **kwargs: ttl, lock_timeout, local_ttl
+
+    Returns:
+        Broker instalado
+    """
+    global _broker
+    _broker = SessionBroker(store, login, **kwargs)
+    return _broker
+
+
+def get_session_broker() -> Optional[SessionBroker]:
+    """Broker del proceso o None si no se configuró"""
+    return _broker
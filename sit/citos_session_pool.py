@@ -0,0 +1,383 @@
+"""
+Pool de sesiones autenticadas contra el servidor GPS (CMSV6)
+============================================================
+
+Todo el sistema comparte un único ``jsession``. Si el servidor atiende en
+serie las peticiones de una misma sesión, ese jsession limita el
+paralelismo sin importar cuántos hilos de descarga haya. ``SessionPool``
+mantiene varias sesiones de la misma cuenta, cada una en su propio
+``GPSCameraAPI`` (mismo pool HTTP, cache y política de resiliencia):
+
+- ``checkout()``: presta la sesión menos ocupada (context manager); si todas
+  están al máximo de peticiones simultáneas espera a que se libere una.
+- Seguimiento de salud por sesión: peticiones, errores, latencia. Tras
+  ``max_failures`` fallas seguidas del servidor (códigos 5, 6 y 24) la
+  sesión se aparta y se vuelve a loguear pasado ``revive_interval``.
+- Si el servidor rechaza más sesiones para la cuenta
+  (``USER_SESSION_EXISTS`` o ``SINGLE_SIGN_ON_ALREADY_LOGGED``) el pool
+  se queda con las que obtuvo.
+- ``api()``: objeto con la misma interfaz que ``GPSCameraAPI`` que reparte
+  cada llamada entre las sesiones, para pasarlo a código existente
+  (``TrackStore``, ``FleetBroadcaster``...). Los métodos ``iter_*`` usan
+  la sesión que les toca para toda la iteración.
+
+``run_benchmark`` mide el rendimiento con distintos tamaños de pool
+(ver ``python manage.py gps_session_benchmark``).
+
+Ejemplo:
+
+    pool = SessionPool('http://gps:8088', 'admin', 'secreto', size=4).start()
+    with pool.checkout() as api:
+        api.get_device_status(device_ids='900001')
+    pool.api().get_device_status(device_ids='900002')
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_session_pool.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Iterator, List, Optional
+
+from .citos_library import GPSCameraAPI, APIError, ErrorCodes
+from .citos_resilience import SERVER_FAILURE_CODES, classify_error
+
+logger = logging.getLogger(__name__)
+
+# Códigos con los que el servidor indica que la cuenta no admite más sesiones
+SESSION_LIMIT_CODES = frozenset({
+    ErrorCodes.USER_SESSION_EXISTS.value,
+    ErrorCodes.SINGLE_SIGN_ON_ALREADY_LOGGED.value,
+})
+
+# Códigos que cuentan como falla de la sesión
+SESSION_FAILURE_CODES = SERVER_FAILURE_CODES | {ErrorCodes.SESSION_NOT_EXISTS.value}
+
+
+@dataclass(slots=True)
+class PooledSession:
+    """Una sesión del pool y sus estadísticas"""
+    index: int
+    api: GPSCameraAPI
+    inflight: int = 0
+    requests: int = 0
+    errors: int = 0
+    consecutive_failures: int = 0
+    busy_time: float = 0.0
+    healthy: bool = True
+    retired_at: float = 0.0
+    last_error: str = ''
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'index': self.index,
+            'healthy': self.healthy,
+            'inflight': self.inflight,
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_ms': round(self.busy_time / self.requests * 1000, 1) if self.requests else 0.0,
+            'last_error': self.last_error,
+        }
+
+
+class SessionPool:
+    """Varias sesiones de la misma cuenta con préstamo y seguimiento de salud"""
+
+    def __init__(self, base_url: str, account: str, password: str, size: int = 4,
+                 max_inflight: int = 1, max_failures: int = 3, revive_interval: float = 30.0,
+                 checkout_timeout: float = 30.0,
+                 client_factory: Callable[[], GPSCameraAPI] = None, **client_kwargs):
+        """
+        Args:
+            base_url: URL base de la API
+            account: Cuenta de usuario
+            password: Contraseña
+            size: Sesiones a mantener
+            max_inflight: Peticiones simultáneas por sesión
+            max_failures: Fallas seguidas para apartar una sesión
+            revive_interval: Segundos antes de volver a loguear una sesión apartada
+            checkout_timeout: Espera máxima por una sesión libre
+            client_factory: Función que crea cada GPSCameraAPI (por defecto
+                ``GPSCameraAPI(base_url, **client_kwargs)``)
+            **client_kwargs: timeout, verify_ssl, cache, resilience...
+        """
+        self.base_url = base_url
+        self.size = max(1, size)
+        self.max_inflight = max(1, max_inflight)
+        self.max_failures = max(1, max_failures)
+        self.revive_interval = revive_interval
+        self.checkout_timeout = checkout_timeout
+        self.limited = False
+        self._account = account
+        self._password = password
+        self._factory = client_factory or (lambda: GPSCameraAPI(base_url=base_url, **client_kwargs))
+        self._members: List[PooledSession] = []
+        self._condition = threading.Condition()
+
+    # =====================================================================
+    # SESIONES
+    # =====================================================================
+
+    def start(self) -> 'SessionPool':
+        """
+        Inicia sesión hasta completar ``size`` sesiones
+
+        Raises:
+            APIError: Si no se pudo obtener ni una sesión
+        """
+        with self._condition:
+            while len(self._members) < self.size:
+                api = self._factory()
+                try:
+                    api.login(self._account, self._password)
+                except APIError as e:
+                    if e.code in SESSION_LIMIT_CODES and self._members:
+                        self.limited = True
+                        logger.warning(f"⚠️ La cuenta admite {len(self._members)} sesiones "
+                                       f"(pedidas {self.size}): {e}")
+                        break
+                    raise
+                self._members.append(PooledSession(len(self._members), api))
+
+            self._condition.notify_all()
+
+        logger.info(f"🔑 Pool de sesiones GPS: {len(self._members)} sesiones")
+        return self
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def _available(self) -> Optional[PooledSession]:
+        """Sesión sana menos ocupada con lugar libre (con el lock tomado)"""
+        now = time.monotonic()
+        candidates = [m for m in self._members if m.inflight < self.max_inflight
+                      and (m.healthy or now - m.retired_at >= self.revive_interval)]
+        if not candidates:
+            return None
+        # Preferir sesiones sanas; entre ellas la de menos carga
+        return min(candidates, key=lambda m: (not m.healthy, m.inflight, m.requests))
+
+    @contextmanager
+    def checkout(self, timeout: float = None) -> Iterator[GPSCameraAPI]:
+        """
+        Presta una sesión durante el bloque ``with``
+
+        Raises:
+            APIError: (24) Si no hay sesiones o no se liberó ninguna a tiempo
+        """
+        if not self._members:
+            self.start()
+
+        timeout = self.checkout_timeout if timeout is None else timeout
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._available() is not None, timeout):
+                raise APIError(24, "No hay sesiones GPS libres en el pool")
+            member = self._available()
+            member.inflight += 1
+
+        if not member.healthy:
+            self._revive(member)
+
+        started = time.monotonic()
+        error = None
+        try:
+            yield member.api
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._release(member, time.monotonic() - started, error)
+
+    def _revive(self, member: PooledSession):
+        """Vuelve a loguear una sesión apartada"""
+        try:
+            member.api.login(self._account, self._password)
+        except APIError as e:
+            member.retired_at = time.monotonic()
+            member.last_error = str(e)
+            logger.warning(f"⚠️ No se pudo recuperar la sesión {member.index} del pool: {e}")
+            return
+        with self._condition:
+            member.healthy = True
+            member.consecutive_failures = 0
+        logger.info(f"🔑 Sesión {member.index} del pool recuperada")
+
+    def _release(self, member: PooledSession, elapsed: float, error: Optional[Exception]):
+        with self._condition:
+            member.inflight -= 1
+            member.requests += 1
+            member.busy_time += elapsed
+
+            code = classify_error(error) if error is not None else None
+            if error is not None:
+                member.errors += 1
+                member.last_error = str(error)
+
+            if code in SESSION_FAILURE_CODES:
+                member.consecutive_failures += 1
+                if member.healthy and member.consecutive_failures >= self.max_failures:
+                    member.healthy = False
+                    member.retired_at = time.monotonic()
+                    logger.warning(f"⚠️ Sesión {member.index} del pool apartada "
+                                   f"tras {member.consecutive_failures} fallas: {error}")
+            else:
+                member.consecutive_failures = 0
+
+            self._condition.notify()
+
+    # =====================================================================
+    # USO
+    # =====================================================================
+
+    def call(self, method: str, *args, **kwargs) -> Any:
+        """Llama un método de GPSCameraAPI con una sesión del pool"""
+        with self.checkout() as api:
+            return getattr(api, method)(*args, **kwargs)
+
+    def iterate(self, method: str, *args, **kwargs) -> Iterator[Any]:
+        """
+        Recorre un método ``iter_*`` de GPSCameraAPI con una sesión del pool
+
+        La sesión queda prestada (y cuenta como petición en vuelo) hasta que
+        se consume o se cierra el iterador, no solo mientras se lo crea.
+        """
+        with self.checkout() as api:
+            yield from getattr(api, method)(*args, **kwargs)
+
+    def map(self, operation: Callable[[GPSCameraAPI, Any], Any], items,
+            workers: int = None) -> List[Any]:
+        """
+        Aplica ``operation(api, item)`` a cada item repartiendo entre las sesiones
+
+        Returns:
+            Resultados en el orden de ``items`` (la primera excepción se propaga)
+        """
+        items = list(items)
+        workers = workers or max(1, len(self._members) or self.size) * self.max_inflight
+
+        def run(item):
+            with self.checkout() as api:
+                return operation(api, item)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='citos-pool') as executor:
+            return list(executor.map(run, items))
+
+    def api(self) -> 'PooledAPI':
+        """Objeto con la interfaz de GPSCameraAPI que reparte cada llamada"""
+        return PooledAPI(self)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del pool para diagnóstico"""
+        with self._condition:
+            members = [member.to_dict() for member in self._members]
+        return {
+            'size': len(members),
+            'requested': self.size,
+            'limited': self.limited,
+            'healthy': sum(1 for m in members if m['healthy']),
+            'inflight': sum(m['inflight'] for m in members),
+            'requests': sum(m['requests'] for m in members),
+            'errors': sum(m['errors'] for m in members),
+            'sessions': members,
+        }
+
+    def close(self):
+        """Cierra todas las sesiones"""
+        with self._condition:
+            members, self._members = self._members, []
+        for member in members:
+            try:
+                member.api.logout()
+            except Exception as e:
+                logger.debug(f"Error cerrando sesión {member.index} del pool: {e}")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PooledAPI:
+    """Envoltorio con la interfaz de GPSCameraAPI sobre un SessionPool"""
+
+    def __init__(self, pool: SessionPool):
+        self.pool = pool
+
+    def __getattr__(self, name: str):
+        if name.startswith('_') or not callable(getattr(GPSCameraAPI, name, None)):
+            raise AttributeError(name)
+
+        if name.startswith('iter_'):
+            # Retornan generadores: la sesión se presta durante la iteración
+            def pooled(*args, **kwargs):
+                return self.pool.iterate(name, *args, **kwargs)
+        else:
+            def pooled(*args, **kwargs):
+                return self.pool.call(name, *args, **kwargs)
+
+        pooled.__name__ = name
+        return pooled
+
+
+def run_benchmark(pool: SessionPool, operation: Callable[[GPSCameraAPI, int], Any],
+                  requests: int = 200, workers: int = None) -> Dict[str, Any]:
+    """
+    Mide el rendimiento de un pool ejecutando ``operation`` muchas veces
+
+    Args:
+        pool: Pool ya iniciado
+        operation: Función ``operation(api, n)`` que hace una petición
+        requests: Cantidad de peticiones
+        workers: Hilos cliente (por defecto sesiones x max_inflight)
+
+    Returns:
+        Diccionario con sessions, requests, errors, elapsed, throughput (req/s)
+        y latencias p50/p95 en ms
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def run(n):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            with pool.checkout() as api:
+                operation(api, n)
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    workers = workers or len(pool) * pool.max_inflight
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='citos-bench') as executor:
+        list(executor.map(run, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return 0.0
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+    return {
+        'sessions': len(pool),
+        'requests': requests,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'throughput': round(requests / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+    }
@@ -0,0 +1,389 @@
+"""
+Modo sombra: comparación entre la ruta CITOS y la legacy
+========================================================
+
+``_should_use_citos`` en ``sit/utils.py`` elige para cada función entre
+``StreamBusGPSAdapter`` y la implementación ``*_legacy``. Con el modo
+sombra, una fracción de las llamadas (``sample_rate``) ejecuta además la
+otra implementación en un hilo aparte, sin demorar la respuesta:
+
+- la implementación elegida responde como siempre y se mide su latencia;
+- la otra se ejecuta en segundo plano con los mismos argumentos;
+- por función e implementación se registran latencia (promedio, p50,
+  p95), tamaño del resultado serializado y errores;
+- los dos resultados se comparan (con tolerancia en los números) y se
+  guardan las últimas diferencias encontradas.
+
+Si la cola de comparaciones pendientes está llena la muestra se descarta,
+así el modo sombra nunca acumula trabajo. Los datos son del proceso:
+``report()`` los retorna como diccionario y ``render_text()`` como tabla
+(ver la vista ``sit:citos_shadow_report`` y
+``python manage.py gps_shadow_compare``).
+
+Ejemplo:
+
+    shadow = ShadowComparator(sample_rate=0.05)
+    resultado = shadow.run('obtener_vehiculos',
+                           ('citos', lambda: adapter.obtener_vehiculos()),
+                           ('legacy', obtener_vehiculos_legacy))
+    shadow.report()['obtener_vehiculos']['faster']
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_shadow.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import json
+import logging
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Muestras de latencia guardadas por implementación para los percentiles
+LATENCY_SAMPLES = 500
+
+Implementation = Tuple[str, Callable[[], Any]]
+
+
+def payload_size(value: Any) -> int:
+    """Bytes del resultado serializado como JSON (aproximación del payload)"""
+    try:
+        return len(json.dumps(value, default=str, ensure_ascii=False).encode('utf-8'))
+    except (TypeError, ValueError):
+        return len(repr(value).encode('utf-8'))
+
+
+def diff_results(left: Any, right: Any, tolerance: float = 1e-6,
+                 limit: int = 10, path: str = '') -> List[str]:
+    """
+    Diferencias entre dos resultados
+
+    Tuplas y listas se comparan elemento a elemento, los diccionarios por
+    clave y los números con tolerancia relativa.
+
+    Returns:
+        Hasta ``limit`` descripciones del tipo ``"[0].lat: 1.5 != 1.6"``
+    """
+    diffs: List[str] = []
+
+    def walk(a, b, where):
+        if len(diffs) >= limit:
+            return
+        if isinstance(a, dict) and isinstance(b, dict):
+            for key in sorted(set(a) | set(b), key=str):
+                if key not in a or key not in b:
+                    diffs.append(f"{where}.{key}: {'falta' if key not in a else a[key]!r} != "
+                                 f"{'falta' if key not in b else b[key]!r}")
+                else:
+                    walk(a[key], b[key], f"{where}.{key}")
+                if len(diffs) >= limit:
+                    return
+        elif isinstance(a, (list, tuple)) and isinstance(b, (list, tuple)):
+            if len(a) != len(b):
+                diffs.append(f"{where or '.'}: largo {len(a)} != {len(b)}")
+            for index, (item_a, item_b) in enumerate(zip(a, b)):
+                walk(item_a, item_b, f"{where}[{index}]")
+                if len(diffs) >= limit:
+                    return
+        elif (isinstance(a, (int, float)) and isinstance(b, (int, float))
+              and not isinstance(a, bool) and not isinstance(b, bool)):
+            if not math.isclose(a, b, rel_tol=tolerance, abs_tol=tolerance):
+                diffs.append(f"{where or '.'}: {a!r} != {b!r}")
+        elif a != b:
+            diffs.append(f"{where or '.'}: {a!r} != {b!r}")
+
+    walk(left, right, path)
+    return diffs
+
+
+class _ImplStats:
+    """Mediciones de una implementación de una función"""
+
+    __slots__ = ('count', 'errors', 'latency_sum', 'latencies', 'bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.bytes = 0
+
+    def record(self, elapsed: float, result: Any, error: Optional[BaseException]):
+        self.count += 1
+        self.latency_sum += elapsed
+        self.latencies.append(elapsed)
+        if error is not None:
+            self.errors += 1
+        else:
+            self.bytes += payload_size(result)
+
+    def median(self) -> float:
+        ordered = sorted(self.latencies)
+        return ordered[len(ordered) // 2] if ordered else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            if not ordered:
+                return 0.0
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000, 1)
+
+        ok = self.count - self.errors
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(self.latency_sum / self.count * 1000, 1) if self.count else 0.0,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'avg_bytes': round(self.bytes / ok) if ok else 0,
+        }
+
+
+class _FunctionStats:
+    """Comparaciones acumuladas de una función"""
+
+    __slots__ = ('impls', 'matches', 'mismatches', 'diffs')
+
+    def __init__(self, max_diffs: int):
+        self.impls: Dict[str, _ImplStats] = {}
+        self.matches = 0
+        self.mismatches = 0
+        self.diffs = deque(maxlen=max_diffs)
+
+
+class ShadowComparator:
+    """Ejecuta en sombra la implementación alternativa de una muestra de llamadas"""
+
+    def __init__(self, sample_rate: float = 0.0, workers: int = 2, max_pending: int = 100,
+                 max_diffs: int = 20, tolerance: float = 1e-6,
+                 functions: Optional[List[str]] = None,
+                 rng: Callable[[], float] = random.random):
+        """
+        Args:
+            sample_rate: Fracción de llamadas comparadas (0 a 1)
+            workers: Hilos que ejecutan la implementación en sombra
+            max_pending: Comparaciones en cola antes de descartar muestras
+            max_diffs: Diferencias recientes guardadas por función
+            tolerance: Tolerancia de la comparación de números
+            functions: Funciones habilitadas (None = todas)
+            rng: Generador de números en [0, 1) para el muestreo
+        """
+        self.sample_rate = max(0.0, min(1.0, sample_rate))
+        self.max_pending = max(1, max_pending)
+        self.max_diffs = max_diffs
+        self.tolerance = tolerance
+        self.functions = set(functions) if functions else None
+        self.dropped = 0
+        self._rng = rng
+        self._pending = 0
+        self._stats: Dict[str, _FunctionStats] = {}
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers),
+                                            thread_name_prefix='citos-shadow')
+
+    # =====================================================================
+    # EJECUCIÓN
+    # =====================================================================
+
+    def sampled(self, function_name: str) -> bool:
+        """Decide si esta llamada se compara"""
+        if self.sample_rate <= 0:
+            return False
+        if self.functions is not None and function_name not in self.functions:
+            return False
+        return self._rng() < self.sample_rate
+
+    def run(self, function_name: str, primary: Implementation, shadow: Implementation) -> Any:
+        """
+        Ejecuta ``primary`` y, si la llamada sale en la muestra, ``shadow`` en segundo plano
+
+        Args:
+            function_name: Nombre de la función comparada
+            primary: (nombre, función) de la implementación que responde
+            shadow: (nombre, función) de la implementación alternativa
+
+        Returns:
+            Resultado de ``primary`` (sus excepciones se propagan igual)
+        """
+        primary_name, primary_fn = primary
+        if not self.sampled(function_name):
+            return primary_fn()
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.dropped += 1
+                return primary_fn()
+            self._pending += 1
+
+        started = time.perf_counter()
+        try:
+            result = primary_fn()
+        except Exception as e:
+            self._submit(function_name, (primary_name, time.perf_counter() - started, None, e), shadow)
+            raise
+        self._submit(function_name, (primary_name, time.perf_counter() - started, result, None), shadow)
+        return result
+
+    def _submit(self, function_name: str, primary_outcome: tuple, shadow: Implementation):
+        try:
+            self._executor.submit(self._compare, function_name, primary_outcome, shadow)
+        except RuntimeError:
+            # Executor cerrado (apagado del proceso)
+            self._done()
+
+    def _compare(self, function_name: str, primary_outcome: tuple, shadow: Implementation):
+        shadow_name, shadow_fn = shadow
+        started = time.perf_counter()
+        shadow_result, shadow_error = None, None
+        try:
+            shadow_result = shadow_fn()
+        except Exception as e:
+            shadow_error = e
+        shadow_outcome = (shadow_name, time.perf_counter() - started, shadow_result, shadow_error)
+
+        try:
+            self._record(function_name, primary_outcome, shadow_outcome)
+        except Exception as e:
+            logger.error(f"Error registrando comparación de {function_name}: {e}")
+        finally:
+            self._done()
+
+    def _record(self, function_name: str, primary_outcome: tuple, shadow_outcome: tuple):
+        primary_name, _, primary_result, primary_error = primary_outcome
+        shadow_name, _, shadow_result, shadow_error = shadow_outcome
+
+        if primary_error is not None or shadow_error is not None:
+            diffs = [f"{name}: {type(error).__name__}: {error}"
+                     for name, _, _, error in (primary_outcome, shadow_outcome) if error is not None]
+        else:
+            diffs = diff_results(primary_result, shadow_result, tolerance=self.tolerance)
+
+        with self._lock:
+            stats = self._stats.get(function_name)
+            if stats is None:
+                stats = self._stats[function_name] = _FunctionStats(self.max_diffs)
+            for name, elapsed, result, error in (primary_outcome, shadow_outcome):
+                stats.impls.setdefault(name, _ImplStats()).record(elapsed, result, error)
+            if diffs:
+                stats.mismatches += 1
+                stats.diffs.append({'at': time.time(), 'primary': primary_name,
+                                    'shadow': shadow_name, 'diffs': diffs})
+            else:
+                stats.matches += 1
+
+        if diffs:
+            logger.debug(f"👥 {function_name}: {primary_name} y {shadow_name} difieren: {diffs[:3]}")
+
+    def _done(self):
+        with self._lock:
+            self._pending -= 1
+            self._idle.notify_all()
+
+    def wait_idle(self, timeout: float = None) -> bool:
+        """Espera a que terminen las comparaciones pendientes"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    # =====================================================================
+    # REPORTE
+    # =====================================================================
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Resumen por función
+
+        Returns:
+            {función: {samples, matches, mismatches, match_rate,
+            implementations: {nombre: {count, errors, avg_ms, p50_ms, p95_ms,
+            avg_bytes}}, faster, speedup, diffs}}
+        """
+        with self._lock:
+            snapshot = {
+                name: (stats.matches, stats.mismatches, list(stats.diffs),
+                       {impl: data.to_dict() for impl, data in stats.impls.items()},
+                       sorted((data.median(), impl) for impl, data in stats.impls.items()
+                              if data.count > data.errors))
+                for name, stats in self._stats.items()
+            }
+
+        report = {}
+        for name, (matches, mismatches, diffs, impls, timed) in sorted(snapshot.items()):
+            samples = matches + mismatches
+            # Comparar la mediana de las implementaciones que respondieron bien
+            faster, speedup = None, None
+            if len(timed) >= 2 and timed[0][0] > 0:
+                faster = timed[0][1]
+                speedup = round(timed[-1][0] / timed[0][0], 1)
+            report[name] = {
+                'samples': samples,
+                'matches': matches,
+                'mismatches': mismatches,
+                'match_rate': round(matches / samples, 3) if samples else None,
+                'implementations': impls,
+                'faster': faster,
+                'speedup': speedup,
+                'diffs': diffs,
+            }
+        return report
+
+    def render_text(self) -> str:
+        """Reporte como tabla de texto"""
+        lines = [f"{'función':<28} {'impl':<7} {'n':>5} {'err':>4} {'p50 ms':>8} "
+                 f"{'p95 ms':>8} {'bytes':>8}"]
+        for name, data in self.report().items():
+            for impl, stats in sorted(data['implementations'].items()):
+                lines.append(f"{name:<28} {impl:<7} {stats['count']:>5} {stats['errors']:>4} "
+                             f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['avg_bytes']:>8}")
+            verdict = (f"{data['faster']} es {data['speedup']}x más rápida"
+                       if data['faster'] else 'sin datos suficientes')
+            rate = f"{data['match_rate']:.0%}" if data['match_rate'] is not None else '-'
+            lines.append(f"   coincidencias {data['matches']}/{data['samples']} ({rate}); {verdict}")
+            for entry in data['diffs'][-3:]:
+                lines.append(f"   ≠ {'; '.join(entry['diffs'][:3])}")
+        if self.dropped:
+            lines.append(f"Muestras descartadas por cola llena: {self.dropped}")
+        return '\n'.join(lines)
+
+    def reset(self):
+        """Borra las mediciones"""
+        with self._lock:
+            self._stats.clear()
+            self.dropped = 0
+
+    def close(self):
+        """Detiene los hilos de sombra"""
+        self._executor.shutdown(wait=False)
+
+
+_shadow: Optional[ShadowComparator] = None
+
+
+def configure_shadow(sample_rate: float, **kwargs) -> Optional[ShadowComparator]:
+    """
+    Configura el comparador del proceso (``sample_rate`` 0 lo desactiva)
+
+    Returns:
+        El comparador o None si quedó desactivado
+    """
+    global _shadow
+    if _shadow is not None:
+        _shadow.close()
+    _shadow = ShadowComparator(sample_rate, **kwargs) if sample_rate > 0 else None
+    if _shadow is not None:
+        logger.info(f"👥 Modo sombra CITOS/legacy activo ({sample_rate:.1%} de las llamadas)")
+    return _shadow
+
+
+def get_shadow() -> Optional[ShadowComparator]:
+    """Retorna el comparador del proceso o None si el modo sombra está apagado"""
+    return _shadow
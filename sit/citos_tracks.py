@@ -0,0 +1,351 @@
+"""
+Tracks GPS por día en arreglos columnares (NumPy)
+=================================================
+
+``get_device_track`` devuelve los puntos como diccionarios JSON, página por
+página. Para reproducción de recorridos y análisis este módulo:
+
+- ``fetch_track_day``: baja el día completo de un dispositivo en franjas
+  horarias pedidas en paralelo (``iter_device_track`` con ``window``).
+- ``TrackArrays``: guarda los puntos como columnas NumPy compactas
+  (16 bytes por punto; un día a 1 Hz son ~1,4 MB por vehículo).
+- ``TrackStore``: cache en disco de un ``.npz`` por dispositivo y día, más
+  un LRU en memoria, para que volver a ver un día sea instantáneo. Un día
+  se cachea recién pasado un margen (``grace_hours``) desde su fin, porque
+  los equipos que estuvieron sin señal suben sus puntos con atraso.
+
+Columnas de ``TrackArrays``:
+
+    offset   int32   segundos desde el inicio del día
+    lat/lng  int32   grados x 1.000.000 (mismo formato que la API)
+    speed    uint16  décimas de km/h
+    heading  uint16  grados (0-359)
+
+Los horarios son los del servidor GPS, sin zona horaria.
+
+Ejemplo:
+
+    store = TrackStore('/var/cache/streambus/tracks', api)
+    track = store.get('900001', date(2025, 5, 20))
+    track.latitudes, track.speeds_kmh
+
+Este módulo no depende de Django.
+
+Archivo: sit/citos_tracks.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional
+
+import numpy as np
+
+from .citos_geo import bounding_box, path_length
+
+logger = logging.getLogger(__name__)
+
+# Tipos de cada columna
+COLUMNS = {
+    'offset': np.int32,
+    'lat': np.int32,
+    'lng': np.int32,
+    'speed': np.uint16,
+    'heading': np.uint16,
+}
+
+SECONDS_PER_DAY = 86400
+
+# Horas desde el fin del día hasta considerarlo completo (carga atrasada de puntos)
+DEFAULT_GRACE_HOURS = 36
+
+
+def _day_start(day: date) -> int:
+    """Inicio del día en segundos (epoch sin zona horaria)"""
+    return int(np.datetime64(day.isoformat(), 's').astype(np.int64))
+
+
+@dataclass(slots=True)
+class TrackArrays:
+    """Puntos de un dispositivo en un día, en columnas NumPy ordenadas por hora"""
+    device_id: str
+    day: date
+    offset: np.ndarray
+    lat: np.ndarray
+    lng: np.ndarray
+    speed: np.ndarray
+    heading: np.ndarray
+
+    @classmethod
+    def empty(cls, device_id: str, day: date) -> 'TrackArrays':
+        columns = {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+        return cls(device_id=device_id, day=day, **columns)
+
+    @classmethod
+    def from_points(cls, device_id: str, day: date,
+                    points: Iterable[Dict[str, Any]]) -> 'TrackArrays':
+        """
+        Crea las columnas desde puntos de queryTrackDetail
+
+        Los puntos sin hora ('gt') o fuera del día se descartan; si hay
+        puntos repetidos para el mismo segundo queda el primero.
+        """
+        times, lat, lng, speed, heading = [], [], [], [], []
+        for point in points:
+            gt = point.get('gt')
+            if not gt:
+                continue
+            times.append(gt)
+            lat.append(point.get('lat') or 0)
+            lng.append(point.get('lng') or 0)
+            speed.append(point.get('sp') or 0)
+            heading.append(point.get('hx') or 0)
+
+        if not times:
+            return cls.empty(device_id, day)
+
+        offset = np.array(times, dtype='datetime64[s]').astype(np.int64) - _day_start(day)
+        inside = (offset >= 0) & (offset < SECONDS_PER_DAY)
+
+        # Orden estable por hora y sin segundos repetidos
+        order = np.argsort(offset, kind='stable')
+        order = order[inside[order]]
+        _, first = np.unique(offset[order], return_index=True)
+        order = order[first]
+
+        return cls(
+            device_id=device_id,
+            day=day,
+            offset=offset[order].astype(np.int32),
+            lat=np.asarray(lat, dtype=np.int64)[order].astype(np.int32),
+            lng=np.asarray(lng, dtype=np.int64)[order].astype(np.int32),
+            speed=np.clip(np.asarray(speed, dtype=np.int64)[order], 0, 65535).astype(np.uint16),
+            heading=(np.asarray(heading, dtype=np.int64)[order] % 360).astype(np.uint16),
+        )
+
+    def __len__(self) -> int:
+        return len(self.offset)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name in COLUMNS)
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        """Hora de cada punto como datetime64[s]"""
+        return (np.datetime64(self.day.isoformat(), 's') + self.offset.astype('timedelta64[s]'))
+
+    @property
+    def latitudes(self) -> np.ndarray:
+        return self.lat / 1000000.0
+
+    @property
+    def longitudes(self) -> np.ndarray:
+        return self.lng / 1000000.0
+
+    @property
+    def speeds_kmh(self) -> np.ndarray:
+        return self.speed / 10.0
+
+    @property
+    def distance_m(self) -> float:
+        """Distancia recorrida en metros"""
+        return path_length(self.latitudes, self.longitudes)
+
+    def bounding_box(self, padding: float = 0.0):
+        """Rectángulo (lat_min, lng_min, lat_max, lng_max) del recorrido"""
+        return bounding_box(self.latitudes, self.longitudes, padding)
+
+    def between(self, start: datetime, end: datetime) -> 'TrackArrays':
+        """Puntos entre dos horas del día (ambas incluidas), sin copiar datos"""
+        base = datetime.combine(self.day, datetime.min.time())
+        low = np.searchsorted(self.offset, int((start - base).total_seconds()), side='left')
+        high = np.searchsorted(self.offset, int((end - base).total_seconds()), side='right')
+        return TrackArrays(self.device_id, self.day,
+                           *(getattr(self, name)[low:high] for name in COLUMNS))
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Convierte a diccionarios (para serializar a JSON en las vistas)"""
+        times = self.timestamps.astype(str)
+        return [
+            {'gt': t.replace('T', ' '), 'lat': float(la), 'lng': float(lo),
+             'speed': float(sp), 'heading': int(hx)}
+            for t, la, lo, sp, hx in zip(times, self.latitudes, self.longitudes,
+                                         self.speeds_kmh, self.heading)
+        ]
+
+
+def fetch_track_day(api, device_id: str, day: date, slices: int = 8, workers: int = 8,
+                    page_records: int = 1000, **kwargs) -> TrackArrays:
+    """
+    Descarga el track de un día dividiéndolo en franjas pedidas en paralelo
+
+    Args:
+        api: Instancia de GPSCameraAPI
+        device_id: ID del dispositivo
+        day: Día a descargar
+        slices: Franjas en las que se divide el día
+        workers: Franjas a pedir en paralelo
+        page_records: Puntos por página
+        **kwargs: Resto de parámetros de get_device_track
+
+    Returns:
+        TrackArrays del día
+    """
+    start = f'{day:%Y-%m-%d} 00:00:00'
+    end = f'{day:%Y-%m-%d} 23:59:59'
+    points = api.iter_device_track(
+        device_id, start, end,
+        page_records=page_records,
+        window=timedelta(seconds=SECONDS_PER_DAY // max(1, slices)),
+        workers=workers,
+        **kwargs
+    )
+    track = TrackArrays.from_points(device_id, day, points)
+    logger.debug(f"Track {device_id} {day}: {len(track)} puntos ({track.nbytes} bytes)")
+    return track
+
+
+class TrackStore:
+    """
+    Cache de tracks por dispositivo y día: LRU en memoria + ``.npz`` en disco
+
+    Solo se cachean días terminados hace más de ``grace_hours`` y con
+    puntos; el resto se descarga en cada consulta.
+    """
+
+    def __init__(self, root: str, api=None, memory_items: int = 256,
+                 slices: int = 8, workers: int = 8,
+                 grace_hours: float = DEFAULT_GRACE_HOURS):
+        """
+        Args:
+            root: Directorio del cache en disco
+            api: Instancia de GPSCameraAPI para los días que no están en cache
+            memory_items: Días (dispositivo x día) a mantener en memoria
+            slices: Franjas en las que se divide cada día al descargar
+            workers: Franjas a pedir en paralelo
+            grace_hours: Horas desde el fin del día hasta poder cachearlo
+        """
+        self.root = root
+        self.api = api
+        self.memory_items = memory_items
+        self.slices = slices
+        self.workers = workers
+        self.grace = timedelta(hours=grace_hours)
+        self._memory: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def path(self, device_id: str, day: date) -> str:
+        safe_device = re.sub(r'[^\w.-]', '_', str(device_id))
+        return os.path.join(self.root, safe_device, f'{day:%Y-%m-%d}.npz')
+
+    def get(self, device_id: str, day: date, refresh: bool = False) -> TrackArrays:
+        """
+        Obtiene el track de un día (memoria, disco o servidor, en ese orden)
+
+        Args:
+            device_id: ID del dispositivo
+            day: Día
+            refresh: Ignorar el cache y volver a descargar
+
+        Returns:
+            TrackArrays del día
+        """
+        key = (str(device_id), day)
+        finished = self.is_final(day)
+
+        if not refresh and finished:
+            with self._lock:
+                track = self._memory.get(key)
+                if track is not None:
+                    self._memory.move_to_end(key)
+                    return track
+
+            track = self._load(device_id, day)
+            if track is not None:
+                self._remember(key, track)
+                return track
+
+        if self.api is None:
+            raise LookupError(f"Track {device_id} {day} no está en cache y no hay API configurada")
+
+        track = fetch_track_day(self.api, str(device_id), day,
+                                slices=self.slices, workers=self.workers)
+        # Un día vacío puede ser un equipo que todavía no subió sus puntos
+        if finished and len(track):
+            self._save(track)
+            self._remember(key, track)
+        return track
+
+    def is_final(self, day: date, now: datetime = None) -> bool:
+        """Indica si el día terminó hace más de ``grace_hours`` (se puede cachear)"""
+        day_end = datetime.combine(day + timedelta(days=1), datetime.min.time())
+        return day_end + self.grace <= (now or datetime.now())
+
+    def get_fleet(self, device_ids: Iterable[str], day: date,
+                  workers: int = 4) -> Dict[str, TrackArrays]:
+        """
+        Obtiene el track de un día de varios dispositivos
+
+        Returns:
+            Diccionario {device_id: TrackArrays}
+        """
+        device_ids = [str(device_id) for device_id in device_ids]
+        with ThreadPoolExecutor(max_workers=max(1, workers),
+                                thread_name_prefix='citos-tracks') as executor:
+            tracks = executor.map(lambda device_id: self.get(device_id, day), device_ids)
+            return dict(zip(device_ids, tracks))
+
+    def invalidate(self, device_id: str, day: date):
+        """Borra un día del cache (memoria y disco)"""
+        with self._lock:
+            self._memory.pop((str(device_id), day), None)
+        try:
+            os.remove(self.path(device_id, day))
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, key, track: TrackArrays):
+        with self._lock:
+            self._memory[key] = track
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+
+    def _load(self, device_id: str, day: date) -> Optional[TrackArrays]:
+        path = self.path(device_id, day)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                columns = {name: data[name].astype(dtype, copy=False)
+                           for name, dtype in COLUMNS.items()}
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Track en cache ilegible {path}: {e}")
+            return None
+        return TrackArrays(device_id=str(device_id), day=day, **columns)
+
+    def _save(self, track: TrackArrays):
+        path = self.path(track.device_id, track.day)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Nombre temporal único: otro hilo puede estar guardando el mismo día
+        fd, partial = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **{name: getattr(track, name) for name in COLUMNS})
+            os.replace(partial, path)
+        except BaseException:
+            try:
+                os.remove(partial)
+            except FileNotFoundError:
+                pass
+            raise
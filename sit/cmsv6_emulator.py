@@ -0,0 +1,577 @@
+"""
+Emulador local de la API CMSV6 para pruebas de carga
+===================================================
+
+Servidor HTTP independiente que implementa los endpoints
+``StandardApiAction_*`` usados por ``citos_library.py``, ``sit/utils.py`` y
+``adapted_utils.py``, con una flota sintética que escala a decenas de miles
+de vehículos. Permite medir y ajustar descargas y vistas de mapa sin tocar
+el servidor real.
+
+Endpoints:
+    login, logout, queryUserVehicle, getDeviceOlStatus, vehicleStatus,
+    getDeviceStatus, queryPhoto, queryAlarmDetail, queryTrackDetail,
+    downloadFile, y los comandos capturePicture, vehicleTTS,
+    vehicleControlGPSReport y vehicleControlOthers (código 32 si el
+    dispositivo está desconectado)
+
+Los listados paginados se calculan por índice (no se materializa la flota
+completa de fotos o puntos), por lo que pedir una página cuesta lo mismo
+con 100 que con 10.000 vehículos. ``downloadFile`` soporta HTTP Range.
+
+Latencia (base + jitter) y errores (respuestas con código 6 o conexiones
+cortadas) se configuran al crear el emulador.
+
+Ejemplo:
+
+    with CMSV6Emulator(SyntheticFleet(vehicles=10000), port=0) as emulator:
+        api = GPSCameraAPI(base_url=emulator.base_url)
+        api.login('admin', 'admin')
+
+También disponible como ``python manage.py cmsv6_emulator``.
+
+Este módulo no depende de Django.
+
+Archivo: sit/cmsv6_emulator.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import hashlib
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs, unquote
+
+logger = logging.getLogger(__name__)
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Centro de la flota sintética (Santa Fe)
+BASE_LATITUDE = -31.6333
+BASE_LONGITUDE = -60.7000
+
+
+def _clean_param(value: str) -> str:
+    """Deshace la codificación múltiple que aplica el cliente citos"""
+    for _ in range(3):
+        decoded = unquote(value)
+        if decoded == value:
+            break
+        value = decoded
+    return value
+
+
+# Las horas de las consultas se tratan sin zona horaria (como el servidor)
+EPOCH = datetime(1970, 1, 1)
+
+
+def _epoch(value: datetime) -> float:
+    return (value - EPOCH).total_seconds()
+
+
+def _from_epoch(seconds: float) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, TIME_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def _paginate(total: int, params: Dict[str, str]) -> Tuple[int, int, Dict[str, int]]:
+    """Calcula el rango [inicio, fin) de la página pedida y el bloque 'pagination'"""
+    try:
+        page = max(1, int(params.get('currentPage') or 1))
+        page_records = max(1, int(params.get('pageRecords') or 50))
+    except ValueError:
+        page, page_records = 1, 50
+
+    total_pages = max(1, math.ceil(total / page_records)) if total else 0
+    start = (page - 1) * page_records
+    end = min(total, start + page_records)
+    pagination = {
+        'totalPages': total_pages,
+        'currentPage': page,
+        'pageRecords': page_records,
+        'totalRecords': total,
+        'startRecord': start,
+        'hasNextPage': page < total_pages,
+        'hasPreviousPage': page > 1,
+    }
+    return start, max(start, end), pagination
+
+
+class SyntheticFleet:
+    """
+    Flota sintética determinística
+
+    Cada vehículo tiene un dispositivo; las posiciones, fotos, alarmas y
+    tracks se derivan del índice del vehículo y del tiempo, sin guardar nada.
+    """
+
+    def __init__(self, vehicles: int = 100, companies: int = 5, seed: int = 42,
+                 photo_interval: int = 600, track_interval: int = 30,
+                 alarm_interval: int = 1800):
+        """
+        Args:
+            vehicles: Cantidad de vehículos
+            companies: Cantidad de empresas principales
+            seed: Semilla para datos reproducibles
+            photo_interval: Segundos entre fotos de seguridad por vehículo
+            track_interval: Segundos entre puntos de track
+            alarm_interval: Segundos entre alarmas por vehículo
+        """
+        self.size = vehicles
+        self.seed = seed
+        self.photo_interval = photo_interval
+        self.track_interval = track_interval
+        self.alarm_interval = alarm_interval
+
+        rng = random.Random(seed)
+        self.companys = [{'id': n, 'nm': f'Empresa {n}', 'pId': 0} for n in range(1, companies + 1)]
+        self.vehicles = []
+        self._by_vehicle: Dict[str, int] = {}
+        self._by_device: Dict[str, int] = {}
+
+        for index in range(vehicles):
+            company = self.companys[index % companies]
+            ficha = str(1000 + index)
+            device = f'{900000 + index}'
+            self.vehicles.append({
+                'id': index + 1,
+                'nm': ficha,
+                'ic': 1,
+                'pid': company['id'],
+                'pnm': company['nm'],
+                'pt': '',
+                'dl': [{'id': device, 'pid': company['id'], 'cc': 4, 'md': 0, 'sim': ''}],
+            })
+            self._by_vehicle[ficha] = index
+            self._by_device[device] = index
+
+        self._phase = [rng.random() * 2 * math.pi for _ in range(vehicles)]
+
+    def select(self, vehicle_ids: Optional[str] = None, device_ids: Optional[str] = None) -> List[int]:
+        """Índices de los vehículos pedidos (todos si no hay filtro)"""
+        if vehicle_ids:
+            return [self._by_vehicle[v] for v in vehicle_ids.split(',') if v in self._by_vehicle]
+        if device_ids:
+            return [self._by_device[d] for d in device_ids.split(',') if d in self._by_device]
+        return list(range(self.size))
+
+    def ficha(self, index: int) -> str:
+        return self.vehicles[index]['nm']
+
+    def device(self, index: int) -> str:
+        return self.vehicles[index]['dl'][0]['id']
+
+    def online(self, index: int) -> bool:
+        """Uno de cada 17 vehículos está siempre desconectado"""
+        return index % 17 != 0
+
+    def position(self, index: int, at: float) -> Tuple[int, int, int, int]:
+        """(lng, lat, velocidad, rumbo) en formato API para el instante ``at``"""
+        angle = self._phase[index] + at / 900.0
+        radius = 0.02 + (index % 50) * 0.001
+        lat = BASE_LATITUDE + radius * math.sin(angle)
+        lng = BASE_LONGITUDE + radius * math.cos(angle)
+        speed = int(300 + 250 * math.sin(angle * 3))  # décimas de km/h
+        heading = int(math.degrees(angle + math.pi / 2)) % 360
+        return int(lng * 1000000), int(lat * 1000000), max(0, speed), heading
+
+    def status(self, index: int, at: float) -> Dict[str, Any]:
+        lng, lat, speed, heading = self.position(index, at)
+        return {
+            'id': self.device(index),
+            'vid': self.ficha(index),
+            'lng': lng, 'lat': lat,
+            'mlng': f'{lng / 1000000.0:.6f}', 'mlat': f'{lat / 1000000.0:.6f}',
+            'sp': speed, 'hx': heading,
+            'ol': 1 if self.online(index) else 0,
+            'gt': _from_epoch(at).strftime(TIME_FORMAT),
+            'lc': int(at) % 1000000, 'yl': 5000 + index % 3000,
+            's1': 3, 's2': 0, 's3': 0, 's4': 0,
+            'adas1': 0, 'adas2': 0,
+            'ps': '',
+        }
+
+    def vehicle_status(self, index: int, at: float) -> Dict[str, Any]:
+        """Registro en el formato de vehicleStatus (jd/wd/tm)"""
+        lng, lat, _, _ = self.position(index, at)
+        return {'vi': self.ficha(index), 'jd': lng, 'wd': lat, 'tm': int(at * 1000), 'pos': ''}
+
+    def photo(self, index: int, at: datetime, base_url: str) -> Dict[str, Any]:
+        device = self.device(index)
+        path = f'/photos/{device}/{at.strftime("%Y%m%d%H%M%S")}.jpg'
+        return {
+            'vehiIdno': self.ficha(index),
+            'devIdno': device,
+            'fileTimeStr': at.strftime(TIME_FORMAT),
+            'fileTime': int(_epoch(at) * 1000),
+            'chn': 0,
+            'FPATH': path,
+            'downloadUrl': f'{base_url}/StandardApiAction_downloadFile.action?filePath={path}',
+        }
+
+    def alarm(self, index: int, at: datetime, alarm_type: int) -> Dict[str, Any]:
+        lng, lat, speed, _ = self.position(index, _epoch(at))
+        return {
+            'guid': uuid.uuid5(uuid.NAMESPACE_OID, f'{self.seed}-{index}-{_epoch(at)}-{alarm_type}').hex,
+            'atp': alarm_type,
+            'did': self.device(index),
+            'vid': self.ficha(index),
+            'pid': self.vehicles[index]['pid'],
+            'stm': int(_epoch(at) * 1000),
+            'etm': int(_epoch(at) * 1000) + 5000,
+            'hd': 0,
+            'desc': '',
+            'p1': 0, 'p2': 0, 'p3': 0, 'p4': 0,
+            'Gps': {'lng': lng, 'lat': lat, 'sp': speed},
+        }
+
+    def track_point(self, index: int, at: float) -> Dict[str, Any]:
+        return self.status(index, at)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Handler HTTP: delega todo en el emulador asociado al servidor"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.emulator.handle(self)
+
+    def do_POST(self):
+        self.server.emulator.handle(self)
+
+    def log_message(self, format, *args):
+        logger.debug("CMSV6 emulator: " + format % args)
+
+
+class CMSV6Emulator:
+    """
+    Servidor HTTP que emula la API CMSV6 sobre una flota sintética
+    """
+
+    def __init__(self, fleet: SyntheticFleet = None, host: str = '127.0.0.1', port: int = 0,
+                 latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 drop_rate: float = 0.0, photo_size: int = 64 * 1024,
+                 require_session: bool = True, account: str = None, password: str = None,
+                 max_time_range: timedelta = None, serialize_sessions: bool = False,
+                 max_sessions: int = None):
+        """
+        Args:
+            fleet: Flota sintética (por defecto 100 vehículos)
+            host: Interfaz donde escuchar
+            port: Puerto (0 = cualquiera libre)
+            latency_ms: Latencia base por petición
+            jitter_ms: Variación aleatoria máxima sobre la latencia
+            error_rate: Fracción de respuestas con código 6 (excepción del sistema)
+            drop_rate: Fracción de conexiones cortadas sin respuesta
+            photo_size: Tamaño en bytes de cada archivo de downloadFile
+            require_session: Si rechazar (código 5) jsession desconocidos
+            account: Cuenta aceptada en login (None = cualquiera)
+            password: Contraseña aceptada (texto plano o MD5; None = cualquiera)
+            max_time_range: Rango máximo de las consultas por tiempo
+                (más largo responde código 10; None = sin límite)
+            serialize_sessions: Atender en serie las peticiones de un mismo
+                jsession (como algunos servidores CMSV6)
+            max_sessions: Sesiones simultáneas admitidas (más responde
+                código 28; None = sin límite)
+        """
+        self.fleet = fleet or SyntheticFleet()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.photo_size = max(64, photo_size)
+        self.require_session = require_session
+        self.account = account
+        self.password = password
+        self.max_time_range = max_time_range
+        self.serialize_sessions = serialize_sessions
+        self.max_sessions = max_sessions
+
+        self.sessions = set()
+        self._session_locks: Dict[str, threading.Lock] = {}
+        self.request_counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.fleet.seed)
+        self._thread = None
+
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.emulator = self
+
+        self._routes = {
+            'StandardApiAction_login.action': self._login,
+            'StandardApiAction_logout.action': self._logout,
+            'StandardApiAction_queryUserVehicle.action': self._query_user_vehicle,
+            'StandardApiAction_getDeviceOlStatus.action': self._device_online_status,
+            'StandardApiAction_vehicleStatus.action': self._vehicle_status,
+            'StandardApiAction_getDeviceStatus.action': self._device_status,
+            'StandardApiAction_queryPhoto.action': self._query_photo,
+            'StandardApiAction_queryAlarmDetail.action': self._query_alarm_detail,
+            'StandardApiAction_queryTrackDetail.action': self._query_track_detail,
+            'StandardApiAction_capturePicture.action': self._device_command,
+            'StandardApiAction_vehicleTTS.action': self._device_command,
+            'StandardApiAction_vehicleControlGPSReport.action': self._device_command,
+            'StandardApiAction_vehicleControlOthers.action': self._device_command,
+        }
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    # =====================================================================
+    # CICLO DE VIDA
+    # =====================================================================
+
+    def start(self) -> 'CMSV6Emulator':
+        """Arranca el servidor en un hilo de fondo"""
+        self._thread = threading.Thread(target=self.server.serve_forever,
+                                        name='cmsv6-emulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Atiende peticiones en el hilo actual hasta ``stop``"""
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    # =====================================================================
+    # DESPACHO
+    # =====================================================================
+
+    def handle(self, request: BaseHTTPRequestHandler):
+        """Atiende una petición: latencia, inyección de errores y ruteo"""
+        parts = urlsplit(request.path)
+        action = parts.path.rstrip('/').rsplit('/', 1)[-1]
+        params = {k: _clean_param(v[-1]) for k, v in parse_qs(parts.query).items()}
+
+        if request.command == 'POST':
+            length = int(request.headers.get('Content-Length') or 0)
+            body = request.rfile.read(length).decode('utf-8', 'replace') if length else ''
+            if body and not body.lstrip().startswith('{'):
+                params.update({k: _clean_param(v[-1]) for k, v in parse_qs(body).items()})
+
+        with self._lock:
+            self.request_counts[action] = self.request_counts.get(action, 0) + 1
+            jitter = self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+            roll = self._rng.random()
+
+        if self.serialize_sessions and params.get('jsession'):
+            with self._lock:
+                session_lock = self._session_locks.setdefault(params['jsession'], threading.Lock())
+            with session_lock:
+                return self._dispatch(request, action, params, jitter, roll)
+        return self._dispatch(request, action, params, jitter, roll)
+
+    def _dispatch(self, request: BaseHTTPRequestHandler, action: str,
+                  params: Dict[str, str], jitter: float, roll: float):
+        delay = (self.latency_ms + jitter) / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+
+        if roll < self.drop_rate:
+            request.close_connection = True
+            return
+
+        if action == 'StandardApiAction_downloadFile.action':
+            return self._download_file(request, params)
+
+        route = self._routes.get(action)
+        if route is None:
+            return self._send_json(request, {'result': 7, 'message': f'Acción no emulada: {action}'})
+
+        if roll < self.drop_rate + self.error_rate:
+            return self._send_json(request, {'result': 6})
+
+        if (action != 'StandardApiAction_login.action' and self.require_session
+                and params.get('jsession') not in self.sessions):
+            return self._send_json(request, {'result': 5})
+
+        self._send_json(request, route(params))
+
+    def _send_json(self, request: BaseHTTPRequestHandler, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        request.send_response(200)
+        request.send_header('Content-Type', 'application/json; charset=utf-8')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+    # =====================================================================
+    # ENDPOINTS
+    # =====================================================================
+
+    def _login(self, params: Dict[str, str]) -> Dict[str, Any]:
+        account, password = params.get('account'), params.get('password')
+
+        if self.account is not None and account != self.account:
+            return {'result': 1}
+        if self.password is not None:
+            hashed = hashlib.md5(self.password.encode('utf-8')).hexdigest()
+            if password not in (self.password, hashed):
+                return {'result': 2}
+
+        jsession = uuid.uuid4().hex
+        with self._lock:
+            if self.max_sessions is not None and len(self.sessions) >= self.max_sessions:
+                return {'result': 28}
+            self.sessions.add(jsession)
+        return {'result': 0, 'jsession': jsession, 'account_name': account, 'JSESSIONID': jsession}
+
+    def _logout(self, params: Dict[str, str]) -> Dict[str, Any]:
+        with self._lock:
+            self.sessions.discard(params.get('jsession'))
+        return {'result': 0}
+
+    def _query_user_vehicle(self, params: Dict[str, str]) -> Dict[str, Any]:
+        return {'result': 0, 'companys': self.fleet.companys, 'vehicles': self.fleet.vehicles}
+
+    def _device_online_status(self, params: Dict[str, str]) -> Dict[str, Any]:
+        indexes = self.fleet.select(params.get('vehiIdno'), params.get('devIdno'))
+        onlines = [{'did': self.fleet.device(i), 'vid': self.fleet.ficha(i),
+                    'online': 1 if self.fleet.online(i) else 0} for i in indexes]
+        if params.get('status') not in (None, ''):
+            onlines = [o for o in onlines if o['online'] == int(params['status'])]
+        return {'result': 0, 'onlines': onlines}
+
+    def _device_command(self, params: Dict[str, str]) -> Dict[str, Any]:
+        """Comandos a un dispositivo: código 32 si está desconectado"""
+        indexes = self.fleet.select(device_ids=params.get('DevIDNO'))
+        if not indexes:
+            return {'result': 19}
+        if not self.fleet.online(indexes[0]):
+            return {'result': 32}
+        return {'result': 0}
+
+    def _vehicle_status(self, params: Dict[str, str]) -> Dict[str, Any]:
+        indexes = self.fleet.select(params.get('vehiIdno'), params.get('devIdno'))
+        start, end, pagination = _paginate(len(indexes), params)
+        now = time.time()
+        infos = [self.fleet.vehicle_status(i, now) for i in indexes[start:end]]
+        return {'result': 0, 'infos': infos, 'pagination': pagination}
+
+    def _device_status(self, params: Dict[str, str]) -> Dict[str, Any]:
+        indexes = self.fleet.select(params.get('vehiIdno'), params.get('devIdno'))
+        now = time.time()
+        return {'result': 0, 'status': [self.fleet.status(i, now) for i in indexes]}
+
+    def _time_slots(self, params: Dict[str, str], interval: int) -> Optional[Tuple[datetime, int]]:
+        """Primer instante alineado al intervalo y cantidad de instantes del rango"""
+        begin = _parse_time(params.get('begintime'))
+        end = _parse_time(params.get('endtime'))
+        if begin is None or end is None or end < begin:
+            return None
+        first = math.ceil(_epoch(begin) / interval) * interval
+        count = max(0, int((_epoch(end) - first) // interval) + 1)
+        return _from_epoch(first), count
+
+    def _time_span(self, params: Dict[str, str]) -> timedelta:
+        return _parse_time(params.get('endtime')) - _parse_time(params.get('begintime'))
+
+    def _indexed_page(self, params: Dict[str, str], interval: int, key: str, build) -> Dict[str, Any]:
+        """Página de registros vehículo x instante, calculada por índice"""
+        slots = self._time_slots(params, interval)
+        if slots is None:
+            return {'result': 9}
+        if self.max_time_range is not None and self._time_span(params) > self.max_time_range:
+            return {'result': 10}
+        first, per_vehicle = slots
+
+        indexes = self.fleet.select(params.get('vehiIdno'), params.get('devIdno'))
+        start, end, pagination = _paginate(len(indexes) * per_vehicle, params)
+
+        records = []
+        for position in range(start, end):
+            vehicle, slot = divmod(position, per_vehicle)
+            records.append(build(indexes[vehicle], first + timedelta(seconds=slot * interval)))
+
+        return {'result': 0, key: records, 'pagination': pagination}
+
+    def _query_photo(self, params: Dict[str, str]) -> Dict[str, Any]:
+        return self._indexed_page(
+            params, self.fleet.photo_interval, 'infos',
+            lambda index, at: self.fleet.photo(index, at, self.base_url)
+        )
+
+    def _query_alarm_detail(self, params: Dict[str, str]) -> Dict[str, Any]:
+        alarm_types = [int(t) for t in (params.get('armType') or '1').split(',') if t.strip().isdigit()]
+        alarm_type = alarm_types[0] if alarm_types else 1
+        return self._indexed_page(
+            params, self.fleet.alarm_interval, 'alarms',
+            lambda index, at: self.fleet.alarm(index, at, alarm_type)
+        )
+
+    def _query_track_detail(self, params: Dict[str, str]) -> Dict[str, Any]:
+        if not params.get('devIdno'):
+            return {'result': 7}
+        return self._indexed_page(
+            params, self.fleet.track_interval, 'tracks',
+            lambda index, at: self.fleet.track_point(index, _epoch(at))
+        )
+
+    def _file_body(self, path: str) -> bytes:
+        """Contenido JPEG sintético, distinto por ruta y de tamaño fijo"""
+        header = b'\xff\xd8\xff\xe0' + path.encode('utf-8')
+        filler = (path.encode('utf-8') * (self.photo_size // max(1, len(path)) + 1))
+        body = header + filler
+        return body[:self.photo_size - 2] + b'\xff\xd9'
+
+    def _download_file(self, request: BaseHTTPRequestHandler, params: Dict[str, str]):
+        path = params.get('filePath') or params.get('FPATH')
+        if not path:
+            request.send_error(404)
+            return
+
+        body = self._file_body(path)
+        total = len(body)
+        status, start, end = 200, 0, total - 1
+
+        range_header = request.headers.get('Range', '')
+        if range_header.startswith('bytes='):
+            first, _, last = range_header[6:].partition('-')
+            try:
+                start = int(first) if first else total - int(last)
+                end = int(last) if first and last else total - 1
+            except ValueError:
+                start, end = 0, total - 1
+            if start >= total:
+                request.send_response(416)
+                request.send_header('Content-Range', f'bytes */{total}')
+                request.send_header('Content-Length', '0')
+                request.end_headers()
+                return
+            status = 206
+
+        chunk = body[start:end + 1]
+        request.send_response(status)
+        request.send_header('Content-Type', 'image/jpeg')
+        request.send_header('Accept-Ranges', 'bytes')
+        request.send_header('Content-Length', str(len(chunk)))
+        if status == 206:
+            request.send_header('Content-Range', f'bytes {start}-{end}/{total}')
+        request.end_headers()
+        request.wfile.write(chunk)
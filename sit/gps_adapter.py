@@ -13,10 +13,15 @@ Versión: 1.0.0
 """
 
 import logging
+import threading
 from typing import Dict, List, Optional, Union, Any, Tuple
 from django.conf import settings
 from django.core.cache import cache
-from .citos_library import GPSCameraAPI, APIError
+from .citos_library import GPSCameraAPI, APIError, ErrorCodes, parse_coordinates, format_speed
+from .citos_cache import ResponseCache, DjangoCacheBackend
+from .citos_batching import StatusCoalescer
+from .citos_resilience import get_default_policy
+from .citos_session_broker import get_session_broker
 
 logger = logging.getLogger(__name__)
 
@@ -29,48 +34,92 @@ class StreamBusGPSAdapter:
     
     def __init__(self):
         """Inicializa el adapter con configuración de StreamBus"""
+        # Vehículos, dispositivos y áreas se cachean en el cache de Django
+        response_cache = None
+        if getattr(settings, 'GPS_RESPONSE_CACHE', True):
+            response_cache = ResponseCache(DjangoCacheBackend())
+        
         self.api = GPSCameraAPI(
             base_url=getattr(settings, 'GPS_BASE_URL', 'http://190.183.254.253:8088'),
             timeout=getattr(settings, 'GPS_TIMEOUT', 30),
-            verify_ssl=getattr(settings, 'GPS_VERIFY_SSL', True)
+            verify_ssl=getattr(settings, 'GPS_VERIFY_SSL', True),
+            cache=response_cache,
+            resilience=get_default_policy()
         )
         self._session_cache_key = 'streambus_gps_session'
+        self._track_store = None
+        self._alarm_stream = None
+        self._session_pool = None
+        self._lazy_lock = threading.Lock()
+        
+        # Consultas de ubicación concurrentes se agrupan en una petición multi-vehículo
+        self._status_coalescer = StatusCoalescer(
+            self.api,
+            window=getattr(settings, 'GPS_STATUS_BATCH_WINDOW_MS', 10) / 1000.0,
+            max_batch=getattr(settings, 'GPS_STATUS_BATCH_SIZE', 50)
+        )
         self._login_credentials = {
             'account': getattr(settings, 'GPS_ACCOUNT', None),
             'password': getattr(settings, 'GPS_PASSWORD', None)
         }
+        
+        # El cliente renueva la sesión solo (código 5 o TTL): publicar el nuevo jsession
+        if self._login_credentials['account'] and self._login_credentials['password']:
+            self.api.set_credentials(
+                self._login_credentials['account'],
+                self._login_credentials['password']
+            )
+        self.api.on_session_change = self._publish_session
+        
+        # Sesión compartida con el resto de los procesos (configurada en SitConfig.ready)
+        self.api.session_broker = get_session_broker()
+    
+    def _publish_session(self, jsession: str):
+        """Guarda el jsession en cache y en settings para el código legacy"""
+        # Con broker la sesión ya quedó guardada en su almacén
+        if self.api.session_broker is None:
+            cache.set(self._session_cache_key, jsession, 1800)
+        
+        # Actualizar settings global para compatibilidad
+        settings.JSESSION_GPS = jsession
     
     def _ensure_session(self) -> bool:
         """
         Asegura que tenemos una sesión válida, creando una nueva si es necesario
         
+        No hace peticiones de verificación: la validez se sigue desde la
+        última respuesta y, si el servidor rechaza la sesión, el cliente
+        hace re-login y reintenta la petición.
+        
         Returns:
             True si la sesión es válida, False en caso contrario
         """
         try:
             # Verificar si ya tenemos una sesión válida
-            if self.api.jsession and self.api.is_session_valid():
+            if self.api.is_session_valid():
                 return True
             
+            # Tomar la sesión compartida (el broker hace login solo si hace falta)
+            broker = self.api.session_broker
+            if broker is not None:
+                jsession = broker.get()
+                if jsession and jsession != self.api.jsession:
+                    self.api.adopt_session(jsession)
+                return bool(jsession)
+            
             # Intentar restaurar sesión desde cache
             cached_session = cache.get(self._session_cache_key)
-            if cached_session:
-                self.api.jsession = cached_session
-                if self.api.is_session_valid():
-                    return True
+            if cached_session and cached_session != self.api.jsession:
+                self.api.adopt_session(cached_session)
+                return True
             
             # Crear nueva sesión
             if self._login_credentials['account'] and self._login_credentials['password']:
-                result = self.api.login(
+                self.api.login(
                     self._login_credentials['account'],
                     self._login_credentials['password']
                 )
-                
-                # Guardar sesión en cache por 30 minutos
-                cache.set(self._session_cache_key, self.api.jsession, 1800)
-                
-                # Actualizar settings global para compatibilidad
-                settings.JSESSION_GPS = self.api.jsession
+                self._publish_session(self.api.jsession)
                 
                 logger.info("Nueva sesión GPS creada exitosamente")
                 return True
@@ -85,6 +134,30 @@ class StreamBusGPSAdapter:
             logger.error(f"Error inesperado en sesión GPS: {e}")
             return False
     
+    def _require_session(self, func_name: str):
+        """
+        Asegura la sesión para la ruta citos de ``func_name``
+        
+        Raises:
+            APIError: Si no hay sesión GPS (código 5)
+        """
+        if not self._ensure_session():
+            raise APIError(ErrorCodes.SESSION_NOT_EXISTS.value, f"No hay sesión GPS para {func_name}")
+    
+    def ejecutar_sin_fallback(self, func_name: str, *args, **kwargs):
+        """
+        Ejecuta la ruta citos de una función (``_citos_<func_name>``) sin el fallback a legacy
+        
+        Para el modo sombra (``_run_citos_or_legacy``): si citos falla, el
+        error se propaga y se registra como error de citos en lugar de
+        devolver el resultado de legacy con el nombre de citos.
+        
+        Raises:
+            APIError: Sin sesión GPS o error de la API
+            Exception: Cualquier otro error de la ruta citos
+        """
+        return getattr(self, f'_citos_{func_name}')(*args, **kwargs)
+    
     def _fallback_to_legacy(self, func_name: str, *args, **kwargs):
         """Fallback a funciones legacy en caso de error con citos"""
         logger.info(f"🔄 Usando fallback legacy para {func_name}")
@@ -122,46 +195,118 @@ class StreamBusGPSAdapter:
             Tupla: (latitud, longitud, velocidad, timestamp, dirección)
         """
         try:
-            if not self._ensure_session():
-                return self._fallback_to_legacy('obtener_ultima_ubicacion', 
-                                               vehi_idno, to_map, geoaddress, 
-                                               current_page, page_records)
-            
-            # Usar la nueva API de citos
+            return self._citos_obtener_ultima_ubicacion(vehi_idno, to_map, geoaddress,
+                                                        current_page, page_records)
+        except APIError as e:
+            logger.error(f"Error API citos en obtener_ultima_ubicacion: {e}")
+        except Exception as e:
+            logger.error(f"Error inesperado en obtener_ultima_ubicacion: {e}")
+        return self._fallback_to_legacy('obtener_ultima_ubicacion', 
+                                       vehi_idno, to_map, geoaddress, 
+                                       current_page, page_records)
+    
+    def _citos_obtener_ultima_ubicacion(self, vehi_idno: str = None, to_map: int = 2,
+                                        geoaddress: int = 0, current_page: int = 1,
+                                        page_records: int = 50) -> Tuple:
+        """
+        Ruta citos de obtener_ultima_ubicacion, sin fallback
+        
+        Raises:
+            APIError: Sin sesión GPS o error de la API
+        """
+        self._require_session('obtener_ultima_ubicacion')
+        
+        # Usar la nueva API de citos
+        if vehi_idno:
+            info = self._status_coalescer.get_status(
+                vehicle_id=vehi_idno,
+                geo_address=bool(geoaddress),
+                map_type=to_map
+            )
+        else:
             result = self.api.get_device_status(
-                vehicle_ids=vehi_idno,
                 geo_address=bool(geoaddress),
                 map_type=to_map
             )
+            info = result['status'][0] if result.get('status') else None
+        
+        if not info:
+            logger.warning(f"No se encontró información para vehículo {vehi_idno}")
+            return None, None, None, None, None
+        
+        # Convertir al formato esperado por StreamBus
+        if info.get('lat') and info.get('lng'):
+            longitud, latitud = parse_coordinates(info['lng'], info['lat'])
+        else:
+            latitud = longitud = None
+        velocidad = format_speed(info['sp']) if info.get('sp') is not None else None
+        timestamp = info.get('gt')  # Timestamp en milisegundos
+        direccion = info.get('ps', '')  # Dirección
+        
+        logger.debug(f"Ubicación obtenida para vehículo {vehi_idno}: "
+                   f"lat={latitud}, lng={longitud}")
+        
+        return latitud, longitud, velocidad, timestamp, direccion
+    
+    def obtener_ubicaciones_flota(self, fichas: List[str], to_map: int = 2) -> Dict[str, Tuple]:
+        """
+        Obtiene la última ubicación de varios vehículos (compatible con función actual)
+        
+        Args:
+            fichas: IDs de vehículo
+            to_map: Tipo de mapa (1=Google, 2=Baidu)
             
-            if result.get('status') and len(result['status']) > 0:
-                info = result['status'][0]
-                
-                # Convertir al formato esperado por StreamBus
-                latitud = info.get('lat') / 1000000.0 if info.get('lat') else None
-                longitud = info.get('lng') / 1000000.0 if info.get('lng') else None
-                velocidad = info.get('sp') / 10.0 if info.get('sp') is not None else None
-                timestamp = info.get('gt')  # Timestamp en milisegundos
-                direccion = info.get('ps', '')  # Dirección
-                
-                logger.debug(f"Ubicación obtenida para vehículo {vehi_idno}: "
-                           f"lat={latitud}, lng={longitud}")
-                
-                return latitud, longitud, velocidad, timestamp, direccion
-            else:
-                logger.warning(f"No se encontró información para vehículo {vehi_idno}")
-                return None, None, None, None, None
-                
+        Returns:
+            Diccionario ficha -> (latitud, longitud, velocidad, timestamp, dirección),
+            solo para los vehículos con posición conocida
+        """
+        try:
+            return self._citos_obtener_ubicaciones_flota(fichas, to_map)
         except APIError as e:
-            logger.error(f"Error API citos en obtener_ultima_ubicacion: {e}")
-            return self._fallback_to_legacy('obtener_ultima_ubicacion', 
-                                           vehi_idno, to_map, geoaddress, 
-                                           current_page, page_records)
+            logger.error(f"Error API citos en obtener_ubicaciones_flota: {e}")
         except Exception as e:
-            logger.error(f"Error inesperado en obtener_ultima_ubicacion: {e}")
-            return self._fallback_to_legacy('obtener_ultima_ubicacion', 
-                                           vehi_idno, to_map, geoaddress, 
-                                           current_page, page_records)
+            logger.error(f"Error inesperado en obtener_ubicaciones_flota: {e}")
+        return self._fallback_to_legacy('obtener_ubicaciones_flota', fichas, to_map)
+    
+    def _citos_obtener_ubicaciones_flota(self, fichas: List[str], to_map: int = 2) -> Dict[str, Tuple]:
+        """
+        Ruta citos de obtener_ubicaciones_flota, sin fallback
+        
+        Las fichas pasan por el agrupador de estado (lotes de
+        settings.GPS_STATUS_BATCH_SIZE, compartidos con las consultas de
+        otros hilos) y las coordenadas se convierten todas juntas.
+        
+        Raises:
+            APIError: Sin sesión GPS o error de la API
+        """
+        from .citos_geo import parse_coordinates_array
+        
+        self._require_session('obtener_ubicaciones_flota')
+        
+        fichas = [str(ficha) for ficha in fichas if ficha]
+        if not fichas:
+            return {}
+        
+        statuses = self._status_coalescer.get_statuses(vehicle_ids=fichas, map_type=to_map)
+        found = [(ficha, info) for ficha, info in statuses.items() if info]
+        if not found:
+            return {}
+        
+        longitudes, latitudes = parse_coordinates_array(
+            [info.get('lng') or 0 for _, info in found],
+            [info.get('lat') or 0 for _, info in found],
+            missing_as_nan=True
+        )
+        
+        ubicaciones = {}
+        for (ficha, info), lat, lon in zip(found, latitudes.tolist(), longitudes.tolist()):
+            if lat != lat:  # NaN: sin posición
+                continue
+            velocidad = format_speed(info['sp']) if info.get('sp') is not None else None
+            ubicaciones[ficha] = (lat, lon, velocidad, info.get('gt'), info.get('ps', ''))
+        
+        logger.debug(f"Ubicaciones obtenidas: {len(ubicaciones)} de {len(fichas)} vehículos")
+        return ubicaciones
     
     def obtener_vehiculos(self, language: str = 'es') -> List[Dict[str, Any]]:
         """
@@ -174,27 +319,33 @@ class StreamBusGPSAdapter:
             Lista de vehículos con información detallada
         """
         try:
-            if not self._ensure_session():
-                return self._fallback_to_legacy('obtener_vehiculos')
-            
-            # Mapear idioma a formato de API
-            api_language = 'en' if language == 'es' else language
-            
-            result = self.api.get_user_vehicles(language=api_language)
-            
-            if result.get('vehicles'):
-                logger.info(f"Obtenidos {len(result['vehicles'])} vehículos")
-                return result['vehicles']
-            else:
-                logger.warning("No se encontraron vehículos")
-                return []
-                
+            return self._citos_obtener_vehiculos(language)
         except APIError as e:
             logger.error(f"Error API citos en obtener_vehiculos: {e}")
-            return self._fallback_to_legacy('obtener_vehiculos')
         except Exception as e:
             logger.error(f"Error inesperado en obtener_vehiculos: {e}")
-            return self._fallback_to_legacy('obtener_vehiculos')
+        return self._fallback_to_legacy('obtener_vehiculos')
+    
+    def _citos_obtener_vehiculos(self, language: str = 'es') -> List[Dict[str, Any]]:
+        """
+        Ruta citos de obtener_vehiculos, sin fallback
+        
+        Raises:
+            APIError: Sin sesión GPS o error de la API
+        """
+        self._require_session('obtener_vehiculos')
+        
+        # Mapear idioma a formato de API
+        api_language = 'en' if language == 'es' else language
+        
+        result = self.api.get_user_vehicles(language=api_language)
+        
+        if result.get('vehicles'):
+            logger.info(f"Obtenidos {len(result['vehicles'])} vehículos")
+            return result['vehicles']
+        
+        logger.warning("No se encontraron vehículos")
+        return []
     
     def query_security_photos(self, begintime: str, endtime: str, 
                              current_page: int = 1, page_records: int = 50) -> Optional[Dict[str, Any]]:
@@ -214,55 +365,200 @@ class StreamBusGPSAdapter:
         page_records = 50
 
         try:
-            if not self._ensure_session():
-                return self._fallback_to_legacy('query_security_photos', 
-                                               begintime, endtime, 
-                                               current_page, page_records)
-            
-            # Usar get_device_alarms para obtener eventos con fotos
-            result = self.api.get_device_alarms(
-                start_time=begintime,
-                end_time=endtime,
-                alarm_types=[1, 72, 78],  # Tipos de alarma que generan fotos
-                current_page=current_page,
-                page_records=page_records,
-                geo_address=True
-            )
+            return self._citos_query_security_photos(begintime, endtime, current_page, page_records)
+        except APIError as e:
+            logger.error(f"Error API citos en query_security_photos: {e}")
+        except Exception as e:
+            logger.error(f"Error inesperado en query_security_photos: {e}")
+        return self._fallback_to_legacy('query_security_photos', 
+                                       begintime, endtime, 
+                                       current_page, page_records)
+    
+    def _citos_query_security_photos(self, begintime: str, endtime: str,
+                                     current_page: int = 1, page_records: int = 50) -> Dict[str, Any]:
+        """
+        Ruta citos de query_security_photos, sin fallback
+        
+        Raises:
+            APIError: Sin sesión GPS o error de la API
+        """
+        self._require_session('query_security_photos')
+        
+        # Usar get_device_alarms para obtener eventos con fotos
+        result = self.api.get_device_alarms(
+            start_time=begintime,
+            end_time=endtime,
+            alarm_types=[1, 72, 78],  # Tipos de alarma que generan fotos
+            current_page=current_page,
+            page_records=page_records,
+            geo_address=True
+        )
+        
+        # Adaptar formato de respuesta para compatibilidad
+        if 'infos' in result:
+            # Convertir alarmas a formato de fotos de seguridad
+            adapted_result = {
+                'result': 0,
+                'infos': [],
+                'pagination': result.get('pagination', {})
+            }
             
-            # Adaptar formato de respuesta para compatibilidad
-            if 'infos' in result:
-                # Convertir alarmas a formato de fotos de seguridad
-                adapted_result = {
-                    'result': 0,
-                    'infos': [],
-                    'pagination': result.get('pagination', {})
+            for alarm in result['infos']:
+                # Convertir alarma a formato foto
+                photo_info = {
+                    'devIdno': alarm.get('devIdno'),
+                    'vehiIdno': alarm.get('vehiIdno'), 
+                    'fileTimeStr': alarm.get('startTime'),
+                    'position': alarm.get('position', ''),
+                    # Agregar más campos según necesidad
                 }
-                
-                for alarm in result['infos']:
-                    # Convertir alarma a formato foto
-                    photo_info = {
-                        'devIdno': alarm.get('devIdno'),
-                        'vehiIdno': alarm.get('vehiIdno'), 
-                        'fileTimeStr': alarm.get('startTime'),
-                        'position': alarm.get('position', ''),
-                        # Agregar más campos según necesidad
-                    }
-                    adapted_result['infos'].append(photo_info)
-                
-                return adapted_result
+                adapted_result['infos'].append(photo_info)
             
-            return result
+            return adapted_result
+        
+        return result
+    
+    def obtener_track_dia(self, device_id: str, fecha) -> Optional[Any]:
+        """
+        Obtiene el recorrido de un dispositivo en un día como arreglos NumPy
+        
+        Los días terminados hace más de 36 horas quedan en cache (memoria
+        y disco en settings.GPS_TRACK_STORE_DIR).
+        
+        Args:
+            device_id: ID del dispositivo
+            fecha: Día (date)
             
+        Returns:
+            TrackArrays del día o None si falla
+        """
+        from .citos_tracks import TrackStore
+        
+        if self._track_store is None:
+            self._track_store = TrackStore(
+                getattr(settings, 'GPS_TRACK_STORE_DIR', 'track_store'),
+                self._api_lotes()
+            )
+        
+        try:
+            if not self._ensure_session():
+                return None
+            return self._track_store.get(device_id, fecha)
         except APIError as e:
-            logger.error(f"Error API citos en query_security_photos: {e}")
-            return self._fallback_to_legacy('query_security_photos', 
-                                           begintime, endtime, 
-                                           current_page, page_records)
+            logger.error(f"Error API citos en obtener_track_dia: {e}")
+            return None
         except Exception as e:
-            logger.error(f"Error inesperado en query_security_photos: {e}")
-            return self._fallback_to_legacy('query_security_photos', 
-                                           begintime, endtime, 
-                                           current_page, page_records)
+            logger.error(f"Error inesperado en obtener_track_dia: {e}")
+            return None
+    
+    def obtener_pool_sesiones(self):
+        """
+        Obtiene el pool de sesiones GPS (ver sit/citos_session_pool.py)
+        
+        Returns:
+            SessionPool con settings.GPS_SESSION_POOL_SIZE sesiones, o None
+            si el pool está deshabilitado (tamaño 1) o no hay credenciales
+        """
+        from .citos_session_pool import SessionPool
+        
+        size = getattr(settings, 'GPS_SESSION_POOL_SIZE', 1)
+        account = self._login_credentials['account']
+        password = self._login_credentials['password']
+        if size <= 1 or not account or not password:
+            return None
+        
+        with self._lazy_lock:
+            if self._session_pool is None:
+                try:
+                    self._session_pool = SessionPool(
+                        self.api.base_url, account, password,
+                        size=size,
+                        max_inflight=getattr(settings, 'GPS_SESSION_POOL_INFLIGHT', 1),
+                        timeout=self.api.timeout,
+                        verify_ssl=self.api.verify_ssl,
+                        cache=self.api.cache,
+                        resilience=self.api.resilience
+                    ).start()
+                except APIError as e:
+                    logger.error(f"No se pudo iniciar el pool de sesiones GPS: {e}")
+                    return None
+            return self._session_pool
+    
+    def _api_lotes(self):
+        """Cliente para trabajos con muchas peticiones: el pool si está activo"""
+        pool = self.obtener_pool_sesiones()
+        return pool.api() if pool is not None else self.api
+    
+    def enviar_comando_flota(self, command: str, device_ids: List[str] = None,
+                             empresa_ids: List[int] = None, **params) -> Dict[str, Any]:
+        """
+        Envía un comando a varios dispositivos a la vez (ver sit/citos_broadcast.py)
+        
+        Args:
+            command: 'capture_picture', 'send_tts_message',
+                'control_gps_reporting' o 'control_vehicle'
+            device_ids: IDs de dispositivo
+            empresa_ids: IDs de empresa (se suman sus dispositivos)
+            **params: Parámetros del comando
+            
+        Returns:
+            Reporte por dispositivo ({'counts': ..., 'results': [...]})
+            o {'error': ...} si falla
+        """
+        from .citos_broadcast import FleetBroadcaster, devices_for_companies
+        
+        try:
+            if not self._ensure_session():
+                return {'error': 'No hay sesión GPS'}
+            
+            devices = list(device_ids or [])
+            if empresa_ids:
+                devices.extend(devices_for_companies(self.api, empresa_ids))
+            
+            broadcaster = FleetBroadcaster(
+                self._api_lotes(),
+                workers=getattr(settings, 'GPS_BROADCAST_WORKERS', 16)
+            )
+            return broadcaster.run(command, devices, **params).to_dict()
+        except (APIError, ValueError) as e:
+            logger.error(f"Error en enviar_comando_flota: {e}")
+            return {'error': str(e)}
+        except Exception as e:
+            logger.error(f"Error inesperado en enviar_comando_flota: {e}")
+            return {'error': str(e)}
+    
+    def crear_stream_alarmas(self):
+        """
+        Crea un stream de alarmas con la configuración de settings.GPS_ALARM_STREAM_*
+        
+        Returns:
+            AlarmStream sin iniciar
+        """
+        from .citos_alarms import AlarmStream
+        
+        self._ensure_session()
+        return AlarmStream(
+            self.api,
+            alarm_types=getattr(settings, 'GPS_ALARM_STREAM_TYPES', [1, 72, 78]),
+            interval=getattr(settings, 'GPS_ALARM_STREAM_INTERVAL', 5),
+            ring_size=getattr(settings, 'GPS_ALARM_STREAM_RING', 1000)
+        )
+    
+    def obtener_stream_alarmas(self):
+        """
+        Obtiene el stream de alarmas del proceso para la pantalla y los SSE (lo inicia la primera vez)
+        
+        No encola tareas de Celery: eso lo hace un único proceso,
+        ``manage.py gps_alarm_stream``, para no repetir cada alarma por
+        cada proceso web ni depender de que alguien abra la pantalla.
+        
+        Returns:
+            AlarmStream compartido por todo el proceso
+        """
+        with self._lazy_lock:
+            if self._alarm_stream is None:
+                self._alarm_stream = self.crear_stream_alarmas().start()
+            return self._alarm_stream
     
     def gps_login(self, account: str, password: str) -> Optional[str]:
         """
@@ -279,8 +575,11 @@ class StreamBusGPSAdapter:
             result = self.api.login(account, password)
             
             if result.get('jsession'):
-                # Guardar en cache y settings global
-                cache.set(self._session_cache_key, result['jsession'], 1800)
+                # Guardar en el broker (o cache) y settings global
+                if self.api.session_broker is not None:
+                    self.api.session_broker.publish(result['jsession'])
+                else:
+                    cache.set(self._session_cache_key, result['jsession'], 1800)
                 settings.JSESSION_GPS = result['jsession']
                 
                 logger.info(f"Login GPS exitoso para usuario: {account}")
@@ -309,7 +608,9 @@ class StreamBusGPSAdapter:
         try:
             result = self.api.logout()
             
-            # Limpiar cache y settings
+            # Limpiar broker, cache y settings
+            if self.api.session_broker is not None:
+                self.api.session_broker.clear()
             cache.delete(self._session_cache_key)
             if hasattr(settings, 'JSESSION_GPS'):
                 settings.JSESSION_GPS = None
@@ -0,0 +1,178 @@
+"""
+Pool de conexiones HTTP compartido para el servidor GPS (CMSV6)
+===============================================================
+
+Centraliza las conexiones HTTP hacia el servidor GPS para que todas las
+llamadas (cliente citos, funciones legacy y descargadores de fotos)
+reutilicen conexiones keep-alive en lugar de abrir un socket TCP nuevo
+por cada petición.
+
+Cada hilo obtiene su propia ``requests.Session`` (las sesiones no son
+thread-safe), pero todas comparten el mismo ``HTTPAdapter`` y por lo tanto
+el mismo pool de conexiones de urllib3, que sí es thread-safe.
+
+El adapter compartido se puede reemplazar con ``set_transport`` (por
+ejemplo por el grabador/reproductor de ``sit/citos_cassette.py``).
+
+Este módulo no depende de Django: se usa tanto desde la aplicación web
+como desde la aplicación de escritorio (main.py).
+
+Archivo: sit/http_pool.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import threading
+from typing import Dict, Any
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto del pool
+DEFAULT_POOL_CONFIG = {
+    'pool_connections': 4,   # Cantidad de hosts distintos a cachear
+    'pool_maxsize': 32,      # Conexiones keep-alive por host
+    'pool_block': False,     # Si bloquear cuando el pool está agotado
+}
+
+DEFAULT_HEADERS = {
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+_lock = threading.Lock()
+_local = threading.local()
+_config: Dict[str, Any] = dict(DEFAULT_POOL_CONFIG)
+_adapter = None
+_transport = None
+_generation = 0
+
+
+def configure_http_pool(pool_connections: int = None, pool_maxsize: int = None,
+                        pool_block: bool = None) -> Dict[str, Any]:
+    """
+    Configura el tamaño del pool de conexiones compartido
+
+    Las sesiones existentes se descartan y se recrean en el próximo uso
+    con la nueva configuración.
+
+    Args:
+        pool_connections: Cantidad de pools (hosts) a mantener
+        pool_maxsize: Conexiones máximas por host
+        pool_block: Si bloquear cuando no hay conexiones libres
+
+    Returns:
+        Configuración efectiva del pool
+    """
+    global _adapter, _generation
+
+    with _lock:
+        if pool_connections is not None:
+            _config['pool_connections'] = max(1, int(pool_connections))
+        if pool_maxsize is not None:
+            _config['pool_maxsize'] = max(1, int(pool_maxsize))
+        if pool_block is not None:
+            _config['pool_block'] = bool(pool_block)
+
+        old_adapter = _adapter
+        _adapter = None
+        _generation += 1
+        config = dict(_config)
+
+    if old_adapter is not None:
+        old_adapter.close()
+
+    logger.info(f"Pool HTTP configurado: {config}")
+    return config
+
+
+def get_pool_config() -> Dict[str, Any]:
+    """Retorna la configuración actual del pool"""
+    with _lock:
+        return dict(_config)
+
+
+def _build_adapter(config: Dict[str, Any]) -> HTTPAdapter:
+    return HTTPAdapter(
+        pool_connections=config['pool_connections'],
+        pool_maxsize=config['pool_maxsize'],
+        pool_block=config['pool_block'],
+        max_retries=0
+    )
+
+
+def create_adapter() -> HTTPAdapter:
+    """Crea un HTTPAdapter nuevo con la configuración actual del pool"""
+    return _build_adapter(get_pool_config())
+
+
+def set_transport(transport=None):
+    """
+    Reemplaza el adapter de todas las sesiones del pool
+
+    Args:
+        transport: Adapter de requests (``BaseAdapter``) a usar en lugar del
+            pool, o None para volver al pool normal
+    """
+    global _transport, _generation
+
+    with _lock:
+        _transport = transport
+        _generation += 1
+
+    logger.info(f"Transporte HTTP: {type(transport).__name__ if transport else 'pool compartido'}")
+
+
+def get_transport():
+    """Retorna el transporte instalado con ``set_transport`` (o None)"""
+    with _lock:
+        return _transport
+
+
+def _get_adapter():
+    """Obtiene (o crea) el adapter compartido y su generación"""
+    global _adapter
+
+    with _lock:
+        if _transport is not None:
+            return _transport, _generation
+        if _adapter is None:
+            _adapter = _build_adapter(_config)
+        return _adapter, _generation
+
+
+def get_http_session() -> requests.Session:
+    """
+    Obtiene la sesión HTTP del hilo actual conectada al pool compartido
+
+    Returns:
+        requests.Session con keep-alive y compresión gzip habilitados
+    """
+    adapter, generation = _get_adapter()
+
+    session = getattr(_local, 'session', None)
+    if session is None or getattr(_local, 'generation', None) != generation:
+        session = requests.Session()
+        session.headers.update(DEFAULT_HEADERS)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+        _local.generation = generation
+
+    return session
+
+
+def close_http_pool():
+    """Cierra todas las conexiones del pool compartido"""
+    global _adapter, _generation
+
+    with _lock:
+        old_adapter = _adapter
+        _adapter = None
+        _generation += 1
+
+    if old_adapter is not None:
+        old_adapter.close()
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+
+
+class Command(BaseCommand):
+    help = 'Levanta un emulador local de la API CMSV6 para pruebas de carga'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Interfaz donde escuchar')
+        parser.add_argument('--port', type=int, default=8088, help='Puerto HTTP')
+        parser.add_argument('--vehicles', type=int, default=1000, help='Vehículos de la flota sintética')
+        parser.add_argument('--companies', type=int, default=5, help='Empresas de la flota sintética')
+        parser.add_argument('--seed', type=int, default=42, help='Semilla de los datos sintéticos')
+        parser.add_argument('--latency-ms', type=float, default=0, help='Latencia base por petición')
+        parser.add_argument('--jitter-ms', type=float, default=0, help='Variación aleatoria de la latencia')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='Fracción de respuestas con código 6 (0-1)')
+        parser.add_argument('--drop-rate', type=float, default=0.0,
+                            help='Fracción de conexiones cortadas sin respuesta (0-1)')
+        parser.add_argument('--photo-size', type=int, default=64 * 1024,
+                            help='Tamaño en bytes de los archivos de downloadFile')
+        parser.add_argument('--photo-interval', type=int, default=600,
+                            help='Segundos entre fotos de seguridad por vehículo')
+        parser.add_argument('--any-session', action='store_true',
+                            help='Aceptar cualquier jsession (no responder código 5)')
+        parser.add_argument('--serialize-sessions', action='store_true',
+                            help='Atender en serie las peticiones de un mismo jsession')
+        parser.add_argument('--max-sessions', type=int, default=None,
+                            help='Sesiones simultáneas admitidas (más responde código 28)')
+
+    def handle(self, *args, **options):
+        fleet = SyntheticFleet(
+            vehicles=options['vehicles'],
+            companies=options['companies'],
+            seed=options['seed'],
+            photo_interval=options['photo_interval'],
+        )
+        emulator = CMSV6Emulator(
+            fleet,
+            host=options['host'],
+            port=options['port'],
+            latency_ms=options['latency_ms'],
+            jitter_ms=options['jitter_ms'],
+            error_rate=options['error_rate'],
+            drop_rate=options['drop_rate'],
+            photo_size=options['photo_size'],
+            require_session=not options['any_session'],
+            serialize_sessions=options['serialize_sessions'],
+            max_sessions=options['max_sessions'],
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f'🛰️ Emulador CMSV6 escuchando en {emulator.base_url} '
+            f'({fleet.size} vehículos, latencia {options["latency_ms"]}±{options["jitter_ms"]} ms, '
+            f'errores {options["error_rate"]:.0%})'
+        ))
+        self.stdout.write('   Ctrl+C para detener')
+
+        try:
+            emulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            emulator.server.server_close()
+
+        self.stdout.write('📊 Peticiones atendidas:')
+        for action, count in sorted(emulator.request_counts.items()):
+            self.stdout.write(f'   {action}: {count}')
+        self.stdout.write('🏁 Emulador detenido')
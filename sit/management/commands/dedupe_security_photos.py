@@ -0,0 +1,45 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sit.photo_blobs import get_blob_store
+
+
+class Command(BaseCommand):
+    help = 'Pasa las fotos de seguridad guardadas al almacén por contenido (una copia por imagen)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos-dir', default=None,
+                            help='Directorio de fotos (por defecto MEDIA_ROOT/security_photos)')
+        parser.add_argument('--gc', action='store_true',
+                            help='Borrar además los blobs que ya no tienen fotos enlazadas')
+        parser.add_argument('--json', action='store_true', help='Imprimir los contadores en JSON')
+
+    def handle(self, *args, **options):
+        photos_dir = options['photos_dir'] or os.path.join(settings.MEDIA_ROOT, 'security_photos')
+        if not os.path.isdir(photos_dir):
+            raise CommandError(f'No existe el directorio de fotos: {photos_dir}')
+
+        blobs = get_blob_store(photos_dir)
+        if not blobs.supports_links():
+            # Con copias el almacén duplicaría cada foto en lugar de liberar espacio
+            raise CommandError(f'El sistema de archivos de {blobs.root} no admite enlaces duros')
+
+        self.stdout.write(f"🧬 Deduplicando {photos_dir}")
+        counts = blobs.dedupe_tree(photos_dir)
+        if options['gc']:
+            counts['blobs_removed'] = blobs.gc()
+
+        if options['json']:
+            self.stdout.write(json.dumps({**counts, **blobs.stats()}, indent=2))
+            return
+
+        self.stdout.write(f"   Fotos revisadas:     {counts['files']}")
+        self.stdout.write(f"   Imágenes únicas:     {counts['adopted']} nuevas en el almacén")
+        self.stdout.write(f"   Copias reemplazadas: {counts['deduplicated']}")
+        self.stdout.write(f"   Espacio liberado:    {counts['bytes_saved'] / 1024 / 1024:.1f} MB")
+        if options['gc']:
+            self.stdout.write(f"   Blobs borrados:      {counts['blobs_removed']}")
+        self.stdout.write(self.style.SUCCESS('🏁 Almacén por contenido actualizado'))
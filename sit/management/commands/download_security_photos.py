@@ -1,10 +1,15 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from datetime import datetime, timedelta
 import logging
 import os
 import sys
-import requests
+
+from sit.photo_pipeline import RUN_COMPLETED
+from sit.utils import (
+    download_security_photos, incremental_photo_range, photo_download_job, photo_job_store,
+    query_photo_page
+)
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +33,29 @@ class Command(BaseCommand):
             action='store_true',
             help='Solo mostrar qué se haría, sin descargar'
         )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Descargar la ventana completa en lugar de desde la marca de agua'
+        )
+        parser.add_argument(
+            '--begin',
+            help='Inicio de un rango fijo "YYYY-MM-DD HH:MM:SS" (backfill; requiere --end)'
+        )
+        parser.add_argument(
+            '--end',
+            help='Fin del rango fijo "YYYY-MM-DD HH:MM:SS"'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Retomar las descargas que quedaron sin terminar'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignorar el avance guardado del rango y empezar desde la página 1'
+        )
 
     def handle(self, *args, **options):
         self.stdout.write(
@@ -41,13 +69,29 @@ class Command(BaseCommand):
         empresa_id = 1
         dry_run = options['dry_run']
         
-        # Calcular rango de tiempo
-        now = datetime.now()
-        end_time = now.replace(minute=0, second=0, microsecond=0)
-        start_time = end_time - timedelta(hours=hours_back)
-        
-        begin_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
-        end_time_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
+        if options['resume']:
+            self.resume_pending_jobs(dry_run)
+            return
+        
+        # Calcular rango de tiempo: rango fijo (--begin/--end), o desde la marca de
+        # agua de los dispositivos (hours_back como máximo) salvo con --full.
+        # Solo el rango fijo guarda el avance por página: los otros terminan
+        # "ahora" y cambian en cada ejecución
+        checkpoint = bool(options['begin'] or options['end'])
+        window_hours = None if checkpoint else hours_back
+        if checkpoint:
+            if not (options['begin'] and options['end']):
+                raise CommandError('--begin y --end se indican juntos')
+            begin_time_str, end_time_str = options['begin'], options['end']
+        elif options['full']:
+            now = datetime.now()
+            end_time = now.replace(minute=0, second=0, microsecond=0)
+            start_time = end_time - timedelta(hours=hours_back)
+            
+            begin_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
+            end_time_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            begin_time_str, end_time_str = incremental_photo_range(hours_back)
         
         self.stdout.write(f"📅 Rango: {begin_time_str} → {end_time_str}")
         
@@ -65,7 +109,10 @@ class Command(BaseCommand):
                 begin_time_str, 
                 end_time_str, 
                 empresa_id, 
-                dry_run
+                dry_run,
+                restart=options['restart'],
+                checkpoint=checkpoint,
+                window_hours=window_hours
             )
             
             # Mostrar resultados
@@ -86,19 +133,20 @@ class Command(BaseCommand):
             self.log_error(str(e), begin_time_str, end_time_str)
             sys.exit(1)
 
-    def execute_download_basic(self, begin_time, end_time, empresa_id=None, dry_run=False):
-        """
-        Versión básica usando requests directamente
+    def execute_download_basic(self, begin_time, end_time, empresa_id=None, dry_run=False,
+                               restart=False, job=None, empresa_filter=None, checkpoint=False,
+                               window_hours=None):
         """
-        start_timestamp = datetime.now()
-        
-        # Usar API directamente con requests (más simple)
-        photos_data = self.query_photos_api(begin_time, end_time)
-        
-        total_photos = len(photos_data)
-        self.stdout.write(f"📊 Total encontradas: {total_photos} fotos")
+        Descarga con el motor en pipeline compartido con las vistas
         
+        Con ``checkpoint`` (o un ``job``) el avance se guarda por página: si
+        el proceso se corta, volver a lanzar el mismo rango (o --resume) sigue
+        desde las páginas pendientes.
+        """
         if dry_run:
+            first_page = query_photo_page(begin_time, end_time, 1)
+            total_photos = ((first_page or {}).get('pagination') or {}).get('totalRecords', 0)
+            self.stdout.write(f"📊 Total encontradas: {total_photos} fotos")
             return {
                 'photos_downloaded': 0,
                 'photos_total': total_photos,
@@ -106,108 +154,72 @@ class Command(BaseCommand):
                 'dry_run': True
             }
         
-        # Descargar fotos
-        photos_dir = os.path.join(settings.MEDIA_ROOT, 'security_photos')
-        os.makedirs(photos_dir, exist_ok=True)
+        def on_progress(run):
+            self.stdout.write(f"📥 Progreso: {run.processed}/{run.total_records} ({run.progress}%)")
         
-        downloaded_count = 0
+        if job is None and checkpoint:
+            # La descarga no filtra por empresa: el avance se guarda para todas
+            job = photo_download_job(begin_time, end_time, restart=restart)
         
-        for i, photo in enumerate(photos_data, 1):
-            try:
-                # Crear estructura de carpetas simple
-                vehiIdno = photo.get('vehiIdno', 'unknown')
-                devIdno = photo.get('devIdno', 'unknown')
-                fileTimeStr = photo.get('fileTimeStr', 'unknown')
-                
-                # Carpeta por vehículo
-                vehicle_folder = f"vehiculo_{vehiIdno}"
-                vehicle_dir = os.path.join(photos_dir, vehicle_folder)
-                os.makedirs(vehicle_dir, exist_ok=True)
-                
-                # Nombre de archivo simple
-                timestamp = fileTimeStr.replace(' ', '_').replace(':', '-')
-                file_name = f"{timestamp}_dev_{devIdno}.jpg"
-                file_path = os.path.join(vehicle_dir, file_name)
-                
-                # Verificar si ya existe
-                if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-                    continue
-                
-                # Descargar archivo
-                download_url = photo.get('downloadUrl')
-                if not download_url:
-                    file_path_api = photo.get('FPATH')
-                    if file_path_api:
-                        download_url = f"http://190.183.254.253:8088/StandardApiAction_downloadFile.action?jsession={settings.JSESSION_GPS}&filePath={file_path_api}"
-                
-                if download_url and self.download_image(download_url, file_path):
-                    downloaded_count += 1
-                    
-                # Progreso cada 10 fotos
-                if i % 10 == 0:
-                    self.stdout.write(f"📥 Progreso: {i}/{total_photos}")
-                    
-            except Exception as e:
-                self.stdout.write(f"⚠️ Error foto {i}: {e}")
-                continue
+        run = download_security_photos(begin_time, end_time, empresa_filter,
+                                       page_records=job.page_records if job else 50,
+                                       on_progress=on_progress, job=job, window_hours=window_hours)
+        if run.error:
+            raise RuntimeError(run.error)
+        if job is not None and job.status != RUN_COMPLETED:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️ Descarga {job.job_id} {job.status}: "
+                f"{len(job.done_pages)}/{job.total_pages} páginas completas (retomar con --resume)"
+            ))
         
-        duration = (datetime.now() - start_timestamp).total_seconds()
+        self.stdout.write(
+            f"📊 Total encontradas: {run.total_records} fotos "
+            f"({run.stats['ya_existen']} ya existían, {run.stats['errores']} con error)"
+        )
         
         return {
-            'photos_downloaded': downloaded_count,
-            'photos_total': total_photos,
-            'duration': duration,
+            'photos_downloaded': run.stats['descargadas'],
+            'photos_total': run.total_records,
+            'duration': run.duration,
             'dry_run': False
         }
 
-    def query_photos_api(self, begin_time, end_time):
+    def resume_pending_jobs(self, dry_run=False):
         """
-        Consulta fotos usando requests directamente
+        Retoma las descargas que quedaron sin terminar, la más nueva primero
+        (las que no avanzan hace más de JOB_MAX_AGE se borran, ver sit/photo_jobs.py)
         """
-        url = "http://190.183.254.253:8088/StandardApiAction_queryPhoto.action"
-        
-        params = {
-            "jsession": settings.JSESSION_GPS,
-            "filetype": 2,
-            "alarmType": 1,
-            "begintime": begin_time,
-            "endtime": end_time,
-            "currentPage": 1,
-            "pageRecords": 500,
-        }
+        from sit.tasks import _empresa_filter
         
-        try:
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            data = response.json()
-            
-            if data.get("result") == 0:
-                return data.get("infos", [])
-            else:
-                self.stdout.write(f"⚠️ API error: {data}")
-                return []
-                
-        except Exception as e:
-            self.stdout.write(f"❌ Error API: {e}")
-            return []
-
-    def download_image(self, url, file_path):
-        """
-        Descarga una imagen usando requests
-        """
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-            
-            with open(file_path, 'wb') as f:
-                f.write(response.content)
-            
-            # Verificar que se escribió correctamente
-            return os.path.getsize(file_path) > 0
-            
-        except Exception as e:
-            self.stdout.write(f"❌ Error descargando {url}: {e}")
-            return False
+        store = photo_job_store()
+        if not dry_run:
+            store.expire()
+        pending = store.pending()
+        if not pending:
+            self.stdout.write("✅ No hay descargas pendientes")
+            return
+        
+        for job in pending:
+            self.stdout.write(
+                f"♻️ {job.job_id}: {job.begin_time} → {job.end_time} "
+                f"empresa {job.empresa or 'todas'} ({job.status}, "
+                f"{len(job.done_pages)}/{job.total_pages} páginas)"
+            )
+            if dry_run:
+                continue
+            job = store.claim(job.job_id)
+            if job is None:
+                self.stdout.write("   ⏭️ Ya la retomó otro proceso")
+                continue
+            try:
+                result = self.execute_download_basic(
+                    job.begin_time, job.end_time, job.empresa,
+                    job=job, empresa_filter=_empresa_filter(job.empresa)
+                )
+                self.log_result(result, job.begin_time, job.end_time, job.empresa)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ Error retomando {job.job_id}: {e}"))
+                self.log_error(str(e), job.begin_time, job.end_time)
 
     def log_result(self, result, begin_time, end_time, empresa_id):
         """Log exitoso a archivo"""
@@ -0,0 +1,31 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sit.gps_adapter import get_gps_adapter
+from sit.tasks import enqueue_gps_alarms
+
+
+class Command(BaseCommand):
+    help = 'Consulta las alarmas GPS en un único proceso y encola cada alarma nueva en Celery'
+
+    def handle(self, *args, **options):
+        if not getattr(settings, 'GPS_ALARM_CELERY', False):
+            raise CommandError('GPS_ALARM_CELERY está desactivado: no hay a quién entregar las alarmas')
+
+        stream = get_gps_adapter().crear_stream_alarmas()
+        stream.subscribe(enqueue_gps_alarms)
+        stream.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"🚨 Stream de alarmas en marcha (tipos {stream.alarm_types}, cada {stream.interval}s); Ctrl+C para salir"
+        ))
+
+        try:
+            while stream.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            stream.stop(timeout=stream.interval + 5)
+            self.stdout.write(f"Stream detenido: {stream.status()}")
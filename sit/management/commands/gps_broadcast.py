@@ -0,0 +1,62 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sit.citos_broadcast import BROADCAST_COMMANDS, STATUS_OK, STATUS_OFFLINE, STATUS_FAILED, STATUS_UNKNOWN
+from sit.gps_adapter import get_gps_adapter
+
+
+def _parse_param(value):
+    """'clave=valor' -> (clave, valor); los valores numéricos se convierten a int"""
+    if '=' not in value:
+        raise CommandError(f'Parámetro inválido (se espera clave=valor): {value}')
+    key, raw = value.split('=', 1)
+    try:
+        return key, int(raw)
+    except ValueError:
+        return key, raw
+
+
+class Command(BaseCommand):
+    help = 'Envía un comando a varios dispositivos GPS a la vez (por empresa o por lista)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('command', choices=sorted(BROADCAST_COMMANDS), help='Comando a enviar')
+        parser.add_argument('--company', type=int, action='append', default=[],
+                            help='ID de empresa (se puede repetir)')
+        parser.add_argument('--device', action='append', default=[],
+                            help='ID de dispositivo (se puede repetir)')
+        parser.add_argument('--param', action='append', default=[],
+                            help='Parámetro del comando como clave=valor, ej. text="Volver a base"')
+        parser.add_argument('--json', action='store_true', help='Imprimir el reporte completo en JSON')
+
+    def handle(self, *args, **options):
+        if not options['company'] and not options['device']:
+            raise CommandError('Indique al menos una --company o un --device')
+
+        params = dict(_parse_param(value) for value in options['param'])
+        report = get_gps_adapter().enviar_comando_flota(
+            options['command'],
+            device_ids=options['device'],
+            empresa_ids=options['company'],
+            **params
+        )
+
+        if 'error' in report:
+            raise CommandError(report['error'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        counts = report['counts']
+        self.stdout.write(self.style.SUCCESS(
+            f"📣 {report['command']}: {counts[STATUS_OK]} ok, {counts[STATUS_OFFLINE]} desconectados, "
+            f"{counts[STATUS_FAILED]} con error, {counts[STATUS_UNKNOWN]} sin confirmar "
+            f"en {report['elapsed']}s"
+        ))
+        for result in report['results']:
+            if result['status'] == STATUS_FAILED:
+                self.stdout.write(f"   ❌ {result['device_id']}: {result['code']} {result['message']}")
+            elif result['status'] == STATUS_UNKNOWN:
+                self.stdout.write(f"   ❓ {result['device_id']}: {result['message']}")
@@ -0,0 +1,83 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sit.citos_library import APIError
+from sit.citos_session_pool import SessionPool, run_benchmark
+
+
+OPERATIONS = {
+    'status': lambda api, n: api.get_device_status(),
+    'online': lambda api, n: api.get_device_online_status(),
+    'vehicles': lambda api, n: api.get_user_vehicles(),
+}
+
+
+class Command(BaseCommand):
+    help = 'Mide el rendimiento de la API GPS con distintos tamaños del pool de sesiones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,2,4,8',
+                            help='Tamaños de pool a probar, separados por coma')
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por tamaño')
+        parser.add_argument('--inflight', type=int, default=1,
+                            help='Peticiones simultáneas por sesión')
+        parser.add_argument('--operation', choices=sorted(OPERATIONS), default='status',
+                            help='Petición a repetir')
+        parser.add_argument('--emulator', action='store_true',
+                            help='Medir contra un emulador local en lugar del servidor configurado')
+        parser.add_argument('--latency-ms', type=float, default=50,
+                            help='Latencia del emulador')
+        parser.add_argument('--serialize-sessions', action='store_true',
+                            help='El emulador atiende en serie cada jsession')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError('--sizes debe ser una lista de enteros, ej. 1,2,4,8')
+
+        emulator = None
+        if options['emulator']:
+            from sit.cmsv6_emulator import CMSV6Emulator, SyntheticFleet
+            emulator = CMSV6Emulator(
+                SyntheticFleet(vehicles=200),
+                latency_ms=options['latency_ms'],
+                serialize_sessions=options['serialize_sessions'],
+            ).start()
+            base_url, account, password = emulator.base_url, 'admin', 'admin'
+        else:
+            base_url = settings.GPS_BASE_URL
+            account, password = settings.GPS_ACCOUNT, settings.GPS_PASSWORD
+
+        operation = OPERATIONS[options['operation']]
+        self.stdout.write(f"📊 {options['operation']} x {options['requests']} contra {base_url}")
+        self.stdout.write(f"{'sesiones':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'errores':>8} {'x':>6}")
+
+        baseline = None
+        try:
+            for size in sizes:
+                pool = SessionPool(base_url, account, password, size=size,
+                                   max_inflight=options['inflight'],
+                                   timeout=getattr(settings, 'GPS_TIMEOUT', 30))
+                try:
+                    pool.start()
+                    result = run_benchmark(pool, operation, requests=options['requests'])
+                except APIError as e:
+                    raise CommandError(f'No se pudo iniciar sesión: {e}')
+                finally:
+                    pool.close()
+
+                baseline = baseline or result['throughput'] or 1.0
+                self.stdout.write(
+                    f"{result['sessions']:>9} {result['throughput']:>8} {result['p50_ms']:>8} "
+                    f"{result['p95_ms']:>8} {result['errors']:>8} {result['throughput'] / baseline:>6.2f}"
+                )
+                if pool.limited:
+                    self.stdout.write(self.style.WARNING(
+                        f'   La cuenta no admite {size} sesiones; se detiene la prueba'))
+                    break
+        finally:
+            if emulator is not None:
+                emulator.stop()
+
+        self.stdout.write(self.style.SUCCESS('🏁 Benchmark terminado'))
@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sit import utils
+from sit.citos_shadow import ShadowComparator
+from sit.gps_adapter import get_gps_adapter
+
+
+FUNCTIONS = {
+    'obtener_ultima_ubicacion': utils.obtener_ultima_ubicacion_legacy,
+    'obtener_vehiculos': utils.obtener_vehiculos_legacy,
+}
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta una función GPS por las rutas citos y legacy y compara latencia, tamaño y resultado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('function', choices=sorted(FUNCTIONS), help='Función a comparar')
+        parser.add_argument('--calls', type=int, default=20, help='Llamadas a realizar')
+        parser.add_argument('--vehicle', action='append', default=[],
+                            help='Ficha para obtener_ultima_ubicacion (se puede repetir; '
+                                 'por defecto las primeras de la flota)')
+        parser.add_argument('--primary', choices=['citos', 'legacy'], default='legacy',
+                            help='Implementación que se ejecuta primero en cada llamada')
+        parser.add_argument('--json', action='store_true', help='Imprimir el reporte completo en JSON')
+
+    def handle(self, *args, **options):
+        function_name = options['function']
+        calls = max(1, options['calls'])
+        legacy_function = FUNCTIONS[function_name]
+        adapter = get_gps_adapter()
+
+        if function_name == 'obtener_ultima_ubicacion':
+            fichas = options['vehicle'] or [
+                str(vehicle.get('nm')) for vehicle in utils.obtener_vehiculos_legacy()[:calls]
+                if vehicle.get('nm')
+            ]
+            if not fichas:
+                raise CommandError('No hay vehículos para consultar; indique --vehicle')
+            arguments = [(fichas[n % len(fichas)],) for n in range(calls)]
+        else:
+            arguments = [()] * calls
+
+        # Todas las llamadas en la muestra; la alternativa se mide en su hilo
+        shadow = ShadowComparator(sample_rate=1.0, workers=1, max_pending=calls)
+        implementations = {
+            'legacy': lambda args: (lambda: legacy_function(*args)),
+            'citos': lambda args: (lambda: getattr(adapter, function_name)(*args)),
+        }
+        primary = options['primary']
+        secondary = 'citos' if primary == 'legacy' else 'legacy'
+
+        self.stdout.write(f"👥 {function_name} x {calls} ({primary} primero)")
+        try:
+            for args in arguments:
+                try:
+                    shadow.run(function_name,
+                               (primary, implementations[primary](args)),
+                               (secondary, implementations[secondary](args)))
+                except Exception as e:
+                    self.stdout.write(self.style.WARNING(f"   {primary} falló: {e}"))
+                # De a una llamada para no superponer las dos rutas
+                shadow.wait_idle()
+        finally:
+            shadow.close()
+
+        if options['json']:
+            self.stdout.write(json.dumps(shadow.report(), ensure_ascii=False, indent=2, default=str))
+            return
+
+        self.stdout.write(shadow.render_text())
+        self.stdout.write(self.style.SUCCESS('🏁 Comparación terminada'))
@@ -0,0 +1,40 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sit.photo_manifest import get_photo_manifest
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el manifiesto de fotos descargadas a partir de los archivos en disco'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--photos-dir', default=None,
+                            help='Directorio de fotos (por defecto MEDIA_ROOT/security_photos)')
+        parser.add_argument('--checksum', action='store_true',
+                            help='Calcular sha256 de cada archivo agregado (lee todas las fotos)')
+        parser.add_argument('--json', action='store_true', help='Imprimir los contadores en JSON')
+
+    def handle(self, *args, **options):
+        photos_dir = options['photos_dir'] or os.path.join(settings.MEDIA_ROOT, 'security_photos')
+        if not os.path.isdir(photos_dir):
+            raise CommandError(f'No existe el directorio de fotos: {photos_dir}')
+
+        manifest = get_photo_manifest(photos_dir, getattr(settings, 'PHOTO_MANIFEST_PATH', '') or None)
+        self.stdout.write(f"📒 Reconciliando {manifest.path} con {photos_dir}")
+        counts = manifest.reconcile(photos_dir, checksum=options['checksum'])
+
+        if options['json']:
+            self.stdout.write(json.dumps({**counts, **manifest.stats()}, indent=2))
+            return
+
+        self.stdout.write(f"   Archivos en disco:   {counts['files']}")
+        self.stdout.write(f"   Agregadas:           {counts['added']}")
+        self.stdout.write(f"   Tamaño corregido:    {counts['updated']}")
+        self.stdout.write(f"   Eliminadas:          {counts['removed']}")
+        if counts['unparsed']:
+            self.stdout.write(self.style.WARNING(
+                f"   Nombres no reconocidos: {counts['unparsed']}"))
+        self.stdout.write(self.style.SUCCESS(f"🏁 Manifiesto con {len(manifest)} fotos"))
@@ -0,0 +1,237 @@
+"""
+Almacén de fotos por contenido
+==============================
+
+La misma imagen podía quedar guardada varias veces bajo distintas carpetas
+``ficha_X_mdvr_Y`` (un equipo que pasa a otro vehículo, un ``vehiIdno``
+vacío, el nombre truncado de ``crear_nombre_carpeta_vehiculo``). Con
+``BlobStore`` cada imagen se guarda una sola vez, con el sha256 como nombre,
+en directorios repartidos por prefijo:
+
+    security_photos/.blobs/ab/cd/abcd…ef.jpg
+
+El árbol legible por vehículo y fecha se arma encima con enlaces duros al
+blob (mismo contenido, sin ocupar espacio de nuevo). Donde el sistema de
+archivos no los admite el almacén no se usa (``linked_blob_store`` retorna
+None): copiar duplicaría cada foto y ``gc`` no podría liberar nada. El
+sha256 queda en el manifiesto (``photo_manifest.py``), que funciona de
+índice foto -> blob.
+
+- ``store(tmp, destino)``: incorpora una descarga y la enlaza en el árbol;
+- ``dedupe_tree(photos_dir)``: migra las fotos ya guardadas (comando
+  ``dedupe_security_photos``);
+- ``gc()``: borra los blobs que ya no tienen ningún enlace en el árbol.
+  Un blob recién creado o reutilizado por ``store`` tiene un único enlace
+  hasta que se lo enlaza en el árbol: ``gc`` respeta los modificados hace
+  menos de ``GC_GRACE_SECONDS`` (``store`` actualiza la fecha del blob
+  que reutiliza).
+
+Este módulo no depende de Django.
+
+Archivo: sit/photo_blobs.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from .photo_manifest import file_checksum
+
+logger = logging.getLogger(__name__)
+
+# Directorio de los blobs dentro del directorio de fotos
+BLOBS_DIRNAME = '.blobs'
+
+# Antigüedad mínima (segundos desde la última modificación) de un blob para que gc lo borre
+GC_GRACE_SECONDS = 3600
+
+
+class BlobStore:
+    """Fotos guardadas una vez por contenido, enlazadas en el árbol por vehículo"""
+
+    def __init__(self, root: str):
+        """
+        Args:
+            root: Directorio de los blobs (por ejemplo ``photos_dir/.blobs``)
+        """
+        self.root = root
+        self._links_supported: Optional[bool] = None
+        os.makedirs(root, exist_ok=True)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.jpg")
+
+    def store(self, tmp_path: str, dest_path: str) -> str:
+        """
+        Incorpora un archivo descargado y lo deja visible en ``dest_path``
+
+        Si la imagen ya estaba en el almacén el archivo temporal se descarta.
+
+        Returns:
+            sha256 de la imagen
+        """
+        digest = file_checksum(tmp_path)
+        blob = self.blob_path(digest)
+        try:
+            # Fecha al día: gc no borra el blob mientras se lo enlaza
+            os.utime(blob)
+            exists = True
+        except FileNotFoundError:
+            exists = False
+        if exists:
+            os.remove(tmp_path)
+            logger.debug(f"🧬 Imagen repetida {digest[:12]} enlazada en {os.path.basename(dest_path)}")
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(tmp_path, blob)
+        self.link(digest, dest_path)
+        return digest
+
+    def link(self, digest: str, dest_path: str):
+        """Enlaza el blob en ``dest_path`` con un enlace duro"""
+        blob = self.blob_path(digest)
+        if os.path.exists(dest_path):
+            if os.path.samefile(blob, dest_path):
+                return
+            os.remove(dest_path)
+        os.link(blob, dest_path)
+
+    def supports_links(self) -> bool:
+        """Si el sistema de archivos del almacén admite enlaces duros (se prueba una vez)"""
+        if self._links_supported is None:
+            probe = os.path.join(self.root, f".probe-{os.getpid()}-{threading.get_ident()}")
+            try:
+                with open(probe, 'wb'):
+                    pass
+                os.link(probe, f"{probe}.link")
+                os.remove(f"{probe}.link")
+                self._links_supported = True
+            except OSError as e:
+                self._links_supported = False
+                logger.warning(f"⚠️ Sin enlaces duros en {self.root} ({e}): almacén por contenido desactivado")
+            finally:
+                if os.path.exists(probe):
+                    os.remove(probe)
+        return self._links_supported
+
+    def dedupe_tree(self, photos_dir: str) -> Dict[str, int]:
+        """
+        Pasa las fotos ya guardadas al almacén
+
+        Cada foto se convierte en un enlace al blob de su contenido: la
+        primera copia de una imagen pasa a ser el blob y las repetidas se
+        reemplazan por enlaces.
+
+        Returns:
+            Contadores: files, adopted, deduplicated, bytes_saved
+
+        Raises:
+            OSError: Si el sistema de archivos no admite enlaces duros
+        """
+        if not self.supports_links():
+            raise OSError(f"El sistema de archivos de {self.root} no admite enlaces duros")
+        counts = {'files': 0, 'adopted': 0, 'deduplicated': 0, 'bytes_saved': 0}
+
+        for folder in sorted(os.listdir(photos_dir)):
+            folder_path = os.path.join(photos_dir, folder)
+            if folder.startswith('.') or not os.path.isdir(folder_path):
+                continue
+            with os.scandir(folder_path) as entries:
+                files = [entry.path for entry in entries
+                         if entry.is_file() and entry.name.endswith('.jpg')]
+
+            for path in files:
+                counts['files'] += 1
+                digest = file_checksum(path)
+                blob = self.blob_path(digest)
+                if not os.path.exists(blob):
+                    os.makedirs(os.path.dirname(blob), exist_ok=True)
+                    os.link(path, blob)
+                    counts['adopted'] += 1
+                    continue
+                if os.path.samefile(blob, path):
+                    continue
+
+                size = os.path.getsize(path)
+                # Reemplazo atómico: la foto sigue visible durante la migración
+                tmp_link = f"{path}.link"
+                try:
+                    os.link(blob, tmp_link)
+                except OSError:
+                    continue
+                os.replace(tmp_link, path)
+                counts['deduplicated'] += 1
+                counts['bytes_saved'] += size
+
+        logger.info(f"🧬 Fotos pasadas al almacén por contenido: {counts}")
+        return counts
+
+    def gc(self, grace: float = GC_GRACE_SECONDS) -> int:
+        """
+        Borra los blobs sin enlaces en el árbol (fotos eliminadas)
+
+        Sin enlaces duros no se borra nada (todos los blobs tendrían un
+        único enlace). Se puede correr con descargas en curso: los blobs
+        modificados hace menos de ``grace`` segundos pueden estar por
+        enlazarse y no se tocan.
+
+        Args:
+            grace: Antigüedad mínima en segundos de los blobs a borrar
+
+        Returns:
+            Cantidad de blobs borrados
+        """
+        if not self.supports_links():
+            return 0
+        removed = 0
+        cutoff = time.time() - grace
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    info = os.stat(path)
+                    if info.st_nlink != 1 or info.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    # Lo borró otro proceso
+                    continue
+                removed += 1
+        if removed:
+            logger.info(f"🧹 {removed} blobs sin fotos borrados")
+        return removed
+
+    def stats(self) -> Dict[str, int]:
+        blobs = size = 0
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                blobs += 1
+                size += os.path.getsize(os.path.join(directory, name))
+        return {'blobs': blobs, 'bytes': size}
+
+
+_stores: Dict[str, BlobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(photos_dir: str, root: Optional[str] = None) -> BlobStore:
+    """Almacén por contenido del directorio de fotos (uno por directorio y proceso)"""
+    root = os.path.abspath(root or os.path.join(photos_dir, BLOBS_DIRNAME))
+    with _stores_lock:
+        store = _stores.get(root)
+        if store is None:
+            store = _stores[root] = BlobStore(root)
+        return store
+
+
+def linked_blob_store(photos_dir: str, root: Optional[str] = None) -> Optional[BlobStore]:
+    """
+    Almacén por contenido para guardar las descargas, o None si el sistema
+    de archivos no admite enlaces duros (se guarda cada foto como antes)
+    """
+    store = get_blob_store(photos_dir, root)
+    return store if store.supports_links() else None
@@ -0,0 +1,358 @@
+"""
+Descargas de fotos con punto de control
+=======================================
+
+Una descarga de un rango grande (un backfill de varios días) se cortaba
+con cualquier reinicio del proceso (deploy, servicio de Windows) y volvía
+a empezar desde la página 1. ``PhotoJobStore`` persiste el plan de cada
+descarga y las páginas completas:
+
+- el id de la descarga sale del rango, la empresa y las fotos por página:
+  volver a lanzar la misma descarga la retoma (re-ejecuciones idempotentes);
+- una página queda completa cuando todas sus fotos están guardadas (ver
+  ``on_page_done`` en ``photo_pipeline.py``); las páginas con errores o
+  canceladas se vuelven a pedir al retomar;
+- al retomar solo se piden las páginas pendientes (``iter_pages`` con
+  ``skip_pages``) y el manifiesto evita descargar de nuevo lo que ya está.
+
+Solo se guarda el avance de los rangos fijos (backfills, rangos elegidos
+en las vistas): una descarga incremental termina "ahora" y tendría un id
+distinto en cada ejecución; la retoma la marca de agua del manifiesto.
+Las descargas que no avanzan hace más de ``JOB_MAX_AGE`` no se retoman
+(``pending``) y ``expire`` las borra.
+
+Una descarga en curso renueva ``updated_at`` a medida que avanza (latido,
+ver ``PhotoJob.track``). ``pending`` no lista las que están ``running``
+con un latido de menos de ``JOB_LEASE``: siguen en otro proceso o hilo.
+Para retomar una se la toma con ``claim``, que la marca ``running`` solo
+si nadie la tiene (un único UPDATE, atómico entre procesos).
+
+Si el total de registros de la consulta cambió desde el plan (fotos que
+llegaron tarde desplazan la paginación) se descartan las páginas marcadas
+y se recorre todo de nuevo: con el manifiesto solo se descarga lo que falta.
+
+Ejemplo:
+
+    job = get_photo_job_store(photos_dir).open(begin, end, empresa_id)
+    download_security_photos(begin, end, job=job)
+    job.status  # 'completed' o 'partial'/'cancelled'/'error' para retomar
+
+Este módulo no depende de Django.
+
+Archivo: sit/photo_jobs.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Any, List, Optional, Set
+
+from .photo_manifest import DEFAULT_FILENAME, SQLiteStore
+from .photo_pipeline import RUN_COMPLETED, RUN_ERROR, RUN_RUNNING
+
+logger = logging.getLogger(__name__)
+
+# Terminó la consulta pero quedaron páginas con fotos sin guardar
+JOB_PARTIAL = 'partial'
+
+# Antigüedad (segundos sin avanzar) a partir de la cual no se retoma una descarga
+JOB_MAX_AGE = 3 * 24 * 3600
+
+# Segundos sin latido tras los cuales una descarga 'running' se considera cortada
+JOB_LEASE = 10 * 60
+
+# Intervalo mínimo en segundos entre latidos de una descarga en curso
+JOB_HEARTBEAT = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id         TEXT    PRIMARY KEY,
+    begin_time     TEXT    NOT NULL,
+    end_time       TEXT    NOT NULL,
+    empresa        TEXT    NOT NULL DEFAULT '',
+    page_records   INTEGER NOT NULL,
+    total_records  INTEGER NOT NULL DEFAULT 0,
+    total_pages    INTEGER NOT NULL DEFAULT 0,
+    status         TEXT    NOT NULL,
+    stats          TEXT    NOT NULL DEFAULT '{}',
+    created_at     REAL    NOT NULL,
+    updated_at     REAL    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_pages (
+    job_id   TEXT    NOT NULL,
+    page     INTEGER NOT NULL,
+    done_at  REAL    NOT NULL,
+    PRIMARY KEY (job_id, page)
+);
+"""
+
+
+def job_id_for(begin_time: str, end_time: str, empresa: Any = None, page_records: int = 50) -> str:
+    """Id estable de una descarga (la misma descarga tiene siempre el mismo id)"""
+    key = f"{begin_time}|{end_time}|{empresa or ''}|{page_records}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+
+class PhotoJob:
+    """Plan y avance persistidos de una descarga"""
+
+    def __init__(self, store: 'PhotoJobStore', row: Dict[str, Any], done_pages: Set[int]):
+        self.store = store
+        self.job_id = row['job_id']
+        self.begin_time = row['begin_time']
+        self.end_time = row['end_time']
+        self.empresa = row['empresa'] or None
+        self.page_records = row['page_records']
+        self.total_records = row['total_records']
+        self.total_pages = row['total_pages']
+        self.status = row['status']
+        self.stats = json.loads(row['stats'] or '{}')
+        self.done_pages = done_pages
+        self._planned = False
+        self._beat = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def resumed(self) -> bool:
+        """Ya había páginas completas de una ejecución anterior"""
+        return bool(self.done_pages)
+
+    def plan(self, total_records: int, total_pages: int) -> Set[int]:
+        """
+        Registra el tamaño de la consulta (primera página)
+
+        Returns:
+            Páginas ya completas que no hace falta volver a pedir
+        """
+        with self._lock:
+            if self.total_records and total_records != self.total_records and self.done_pages:
+                logger.warning(
+                    f"⚠️ Descarga {self.job_id}: la consulta pasó de {self.total_records} a "
+                    f"{total_records} fotos, se recorre de nuevo"
+                )
+                self.store._clear_pages(self.job_id)
+                self.done_pages = set()
+            self.total_records = total_records
+            self.total_pages = total_pages
+            self.status = RUN_RUNNING
+            self._planned = True
+            self.store._update(self.job_id, total_records=total_records,
+                               total_pages=total_pages, status=RUN_RUNNING)
+            if self.done_pages:
+                logger.info(
+                    f"♻️ Retomando descarga {self.job_id}: "
+                    f"{len(self.done_pages)}/{total_pages} páginas ya completas"
+                )
+            return set(self.done_pages)
+
+    def mark_page(self, page: int):
+        """Todas las fotos de la página quedaron guardadas"""
+        with self._lock:
+            if page in self.done_pages:
+                return
+            self.done_pages.add(page)
+        self.store._mark_page(self.job_id, page)
+
+    def finish(self, run):
+        """Guarda el resultado de la descarga (un PipelineRun terminado)"""
+        status = run.status
+        if status == RUN_COMPLETED and not self._planned:
+            # No se pudo obtener la primera página
+            status = RUN_ERROR
+        elif status == RUN_COMPLETED and len(self.done_pages) < self.total_pages:
+            status = JOB_PARTIAL
+        self.status = status
+        self.stats = run.summary()
+        self.store._update(self.job_id, status=status, stats=json.dumps(self.stats, default=str))
+        logger.info(
+            f"💾 Descarga {self.job_id} {status}: "
+            f"{len(self.done_pages)}/{self.total_pages} páginas completas"
+        )
+
+    def heartbeat(self):
+        """Renueva el latido de la descarga en curso (como mucho cada JOB_HEARTBEAT)"""
+        now = time.monotonic()
+        if now - self._beat < JOB_HEARTBEAT:
+            return
+        self._beat = now
+        self.store._touch(self.job_id)
+
+    def track(self, on_progress: Optional[Callable] = None) -> Callable:
+        """Callback de progreso que renueva el latido y guarda el resultado al terminar"""
+        def callback(run):
+            if run.finished is not None:
+                self.finish(run)
+            else:
+                self.heartbeat()
+            if on_progress is not None:
+                on_progress(run)
+        return callback
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'begin_time': self.begin_time,
+            'end_time': self.end_time,
+            'empresa': self.empresa,
+            'page_records': self.page_records,
+            'total_records': self.total_records,
+            'total_pages': self.total_pages,
+            'done_pages': len(self.done_pages),
+            'status': self.status,
+        }
+
+
+class PhotoJobStore(SQLiteStore):
+    """Descargas persistidas en SQLite (por defecto en la base del manifiesto)"""
+
+    schema = _SCHEMA
+
+    def open(self, begin_time: str, end_time: str, empresa: Any = None,
+             page_records: int = 50, restart: bool = False) -> PhotoJob:
+        """
+        Descarga del rango: la crea o retoma la existente
+
+        Args:
+            begin_time, end_time: Rango "YYYY-MM-DD HH:MM:SS"
+            empresa: Id de la empresa filtrada (o None)
+            page_records: Fotos por página de la consulta
+            restart: Olvidar las páginas completas y empezar de nuevo
+        """
+        job_id = job_id_for(begin_time, end_time, empresa, page_records)
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR IGNORE INTO jobs (job_id, begin_time, end_time, empresa, page_records, '
+                'status, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job_id, begin_time, end_time, str(empresa or ''), page_records, RUN_RUNNING, now, now)
+            )
+            if restart:
+                conn.execute('DELETE FROM job_pages WHERE job_id = ?', (job_id,))
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[PhotoJob]:
+        conn = self._connection()
+        cursor = conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        row = dict(zip([column[0] for column in cursor.description], row))
+        pages = {page for (page,) in conn.execute(
+            'SELECT page FROM job_pages WHERE job_id = ?', (job_id,))}
+        return PhotoJob(self, row, pages)
+
+    def pending(self, max_age: Optional[float] = JOB_MAX_AGE, lease: float = JOB_LEASE) -> List[PhotoJob]:
+        """
+        Descargas sin terminar (cortadas, canceladas, con error o parciales), la más nueva primero
+
+        No incluye las que siguen en curso (``running`` con latido reciente).
+
+        Args:
+            max_age: Ignorar las que no avanzan hace más de estos segundos
+                     (None para todas)
+            lease: Segundos sin latido para dar por cortada una descarga en curso
+        """
+        now = time.time()
+        since = now - max_age if max_age is not None else 0
+        rows = self._connection().execute(
+            'SELECT job_id FROM jobs WHERE status != ? AND updated_at >= ? '
+            'AND NOT (status = ? AND updated_at >= ?) ORDER BY updated_at DESC',
+            (RUN_COMPLETED, since, RUN_RUNNING, now - lease)
+        ).fetchall()
+        return [self.get(job_id) for (job_id,) in rows]
+
+    def claim(self, job_id: str, lease: float = JOB_LEASE) -> Optional[PhotoJob]:
+        """
+        Toma una descarga sin terminar para retomarla
+
+        Se marca ``running`` en un solo UPDATE, así dos procesos que la
+        encontraron en ``pending`` no la retoman a la vez.
+
+        Returns:
+            La descarga o None si terminó o está en curso en otro lado
+        """
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                'UPDATE jobs SET status = ?, updated_at = ? WHERE job_id = ? AND status != ? '
+                'AND NOT (status = ? AND updated_at >= ?)',
+                (RUN_RUNNING, now, job_id, RUN_COMPLETED, RUN_RUNNING, now - lease)
+            )
+        return self.get(job_id) if cursor.rowcount == 1 else None
+
+    def expire(self, max_age: float = JOB_MAX_AGE) -> int:
+        """
+        Borra las descargas sin terminar que no avanzan hace más de ``max_age`` segundos
+
+        Returns:
+            Cantidad de descargas borradas
+        """
+        conn = self._connection()
+        with conn:
+            stale = [job_id for (job_id,) in conn.execute(
+                'SELECT job_id FROM jobs WHERE status != ? AND updated_at < ?',
+                (RUN_COMPLETED, time.time() - max_age))]
+            for job_id in stale:
+                conn.execute('DELETE FROM job_pages WHERE job_id = ?', (job_id,))
+                conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+        if stale:
+            logger.info(f"🧹 {len(stale)} descargas sin terminar vencidas borradas")
+        return len(stale)
+
+    def forget(self, job_id: str):
+        """Borra una descarga y su avance"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM job_pages WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def _update(self, job_id: str, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._connection()
+        with conn:
+            conn.execute(f'UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?',
+                         (*fields.values(), time.time(), job_id))
+
+    def _touch(self, job_id: str):
+        conn = self._connection()
+        with conn:
+            conn.execute('UPDATE jobs SET updated_at = ? WHERE job_id = ? AND status = ?',
+                         (time.time(), job_id, RUN_RUNNING))
+
+    def _mark_page(self, job_id: str, page: int):
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR IGNORE INTO job_pages (job_id, page, done_at) VALUES (?, ?, ?)',
+                         (job_id, page, time.time()))
+
+    def _clear_pages(self, job_id: str):
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM job_pages WHERE job_id = ?', (job_id,))
+
+
+_stores: Dict[str, PhotoJobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_photo_job_store(photos_dir: str, path: str = None) -> PhotoJobStore:
+    """
+    Descargas persistidas del directorio de fotos (una instancia por archivo y proceso)
+
+    Args:
+        photos_dir: Directorio base de las fotos
+        path: Archivo de la base (por defecto el del manifiesto)
+    """
+    path = os.path.abspath(path or os.path.join(photos_dir, DEFAULT_FILENAME))
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = PhotoJobStore(path)
+        return store
@@ -0,0 +1,429 @@
+"""
+Manifiesto de fotos de seguridad descargadas
+============================================
+
+Antes de cada descarga se verificaba con ``os.path.exists``/``getsize`` si
+la foto ya estaba en disco: en una ventana de varias horas son decenas de
+miles de llamadas al sistema de archivos (y una línea de log por foto).
+``PhotoManifest`` guarda en SQLite una fila por foto descargada:
+
+    (dev_idno, file_time, channel) -> path, size, checksum (sha256)
+
+- ``lookup(keys)``: una consulta indexada por página en lugar de un stat
+  por foto (ver ``PhotoSaver.lookup`` en ``photo_pipeline.py``);
+- ``add(...)``: registra cada foto descargada (o encontrada en disco);
+- ``reconcile(photos_dir)``: reconstruye el manifiesto a partir de los
+  archivos (``python manage.py reconcile_photo_manifest``). Los archivos
+  no guardan el canal: las filas reconstruidas quedan con
+  ``UNKNOWN_CHANNEL`` y valen para cualquier canal.
+
+Además guarda por dispositivo la marca de agua (``fileTimeStr`` de la foto
+más nueva guardada). Solo avanza con ``advance_watermarks`` cuando una
+descarga del rango terminó sin errores: los workers guardan en cualquier
+orden y una foto anterior que falló no debe quedar detrás de la marca.
+``latest()`` responde la foto más reciente con una
+consulta indexada (antes un ``os.walk`` de todo el árbol, ver
+``ultima_foto.py``) e ``incremental_begin()`` calcula desde dónde pedir
+fotos en las descargas programadas: solo lo posterior a la marca de agua,
+con un solapamiento para las fotos que el equipo sube tarde.
+
+La base se abre en modo WAL con una conexión por hilo, así los workers de
+descarga escriben sin bloquear las lecturas del productor.
+
+Este módulo no depende de Django.
+
+Archivo: sit/photo_manifest.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import hashlib
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Nombre por defecto de la base dentro del directorio de fotos
+DEFAULT_FILENAME = '.manifest.sqlite3'
+
+# Canal de las filas reconstruidas desde disco (el nombre del archivo no lo incluye)
+UNKNOWN_CHANNEL = -1
+
+# Pares (dispositivo, fecha) por consulta (límite de variables de SQLite)
+LOOKUP_CHUNK = 400
+
+# Formato de fileTimeStr y de las marcas de agua (se comparan como texto)
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+_TIME_STR = re.compile(r'^\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}$')
+
+# Patrón GLOB de un fileTimeStr (descarta las fechas en otro formato)
+_TIME_GLOB = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] *'
+
+# '2025-05-20_10-15-30_dev_900001.jpg' (ver crear_nombre_archivo_foto)
+_FILE_NAME = re.compile(r'^(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})-(\d{2})_dev_([^.]+)\.jpg$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    dev_idno   TEXT    NOT NULL,
+    file_time  TEXT    NOT NULL,
+    channel    INTEGER NOT NULL,
+    path       TEXT    NOT NULL,
+    size       INTEGER NOT NULL,
+    checksum   TEXT    NOT NULL DEFAULT '',
+    stored_at  REAL    NOT NULL,
+    PRIMARY KEY (dev_idno, file_time, channel)
+);
+CREATE INDEX IF NOT EXISTS photos_path ON photos (path);
+CREATE INDEX IF NOT EXISTS photos_time ON photos (file_time);
+CREATE TABLE IF NOT EXISTS watermarks (
+    dev_idno   TEXT    PRIMARY KEY,
+    file_time  TEXT    NOT NULL
+);
+CREATE INDEX IF NOT EXISTS watermarks_time ON watermarks (file_time);
+"""
+
+Key = Tuple[str, str, int]
+
+
+def manifest_key(photo: Dict[str, Any]) -> Key:
+    """Clave de una foto de queryPhoto: (dispositivo sin 'C', fileTimeStr, canal)"""
+    dev_idno = str(photo.get('devIdno', '')).replace('C', '').replace('c', '')
+    file_time = photo.get('fileTimeStr') or str(photo.get('fileTime', ''))
+    try:
+        channel = int(photo.get('chn') or 0)
+    except (TypeError, ValueError):
+        channel = 0
+    return dev_idno, file_time, channel
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 16) -> str:
+    """sha256 del archivo"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_photo_file(file_name: str) -> Optional[Tuple[str, str]]:
+    """
+    (dispositivo, fileTimeStr) a partir del nombre de archivo de una foto
+
+    Returns:
+        None si el nombre no tiene el formato de crear_nombre_archivo_foto
+    """
+    match = _FILE_NAME.match(file_name)
+    if not match:
+        return None
+    day, hour, minute, second, dev_idno = match.groups()
+    return dev_idno, f"{day} {hour}:{minute}:{second}"
+
+
+class SQLiteStore:
+    """Base SQLite en modo WAL con una conexión por hilo"""
+
+    schema = ''
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Archivo de la base SQLite (se crea si no existe)
+        """
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(self.schema)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        """Cierra la conexión del hilo actual"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class PhotoManifest(SQLiteStore):
+    """Índice SQLite de las fotos ya descargadas"""
+
+    schema = _SCHEMA
+
+    # =====================================================================
+    # CONSULTA Y REGISTRO
+    # =====================================================================
+
+    def lookup(self, keys: Iterable[Key]) -> Dict[Key, str]:
+        """
+        Busca varias fotos en una sola pasada
+
+        Returns:
+            {clave: path relativo} de las que están en el manifiesto (una
+            fila con ``UNKNOWN_CHANNEL`` vale para cualquier canal)
+        """
+        keys = list(keys)
+        pairs = list({(dev_idno, file_time) for dev_idno, file_time, _ in keys})
+        rows: Dict[Tuple[str, str], Dict[int, str]] = {}
+
+        conn = self._connection()
+        for start in range(0, len(pairs), LOOKUP_CHUNK):
+            chunk = pairs[start:start + LOOKUP_CHUNK]
+            values = ','.join('(?, ?)' for _ in chunk)
+            params = [value for pair in chunk for value in pair]
+            for dev_idno, file_time, channel, path in conn.execute(
+                    f'SELECT dev_idno, file_time, channel, path FROM photos '
+                    f'WHERE (dev_idno, file_time) IN (VALUES {values})', params):
+                rows.setdefault((dev_idno, file_time), {})[channel] = path
+
+        found = {}
+        for key in keys:
+            channels = rows.get(key[:2])
+            if not channels:
+                continue
+            path = channels.get(key[2]) or channels.get(UNKNOWN_CHANNEL)
+            if path:
+                found[key] = path
+        return found
+
+    def add(self, key: Key, path: str, size: int, checksum: str = ''):
+        """
+        Registra (o actualiza) una foto guardada en ``path`` (relativo al
+        directorio de fotos)
+
+        No toca la marca de agua: ver ``advance_watermarks``.
+        """
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO photos (dev_idno, file_time, channel, path, size, checksum, stored_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key[0], key[1], key[2], path, size, checksum, time.time())
+            )
+
+    def remove(self, key: Key):
+        """Olvida una foto (por ejemplo si se borró el archivo)"""
+        conn = self._connection()
+        with conn:
+            conn.execute('DELETE FROM photos WHERE dev_idno = ? AND file_time = ? AND channel = ?', key)
+
+    # =====================================================================
+    # MARCAS DE AGUA
+    # =====================================================================
+
+    def watermark(self, dev_idno: str) -> Optional[str]:
+        """fileTimeStr de la foto más nueva guardada del dispositivo"""
+        row = self._connection().execute(
+            'SELECT file_time FROM watermarks WHERE dev_idno = ?', (str(dev_idno),)).fetchone()
+        return row[0] if row else None
+
+    def advance_watermarks(self, begin_time: str, end_time: str,
+                           window_hours: Optional[float] = None) -> int:
+        """
+        Avanza las marcas de agua tras descargar sin errores todo el rango
+
+        Cada dispositivo pasa a la foto más nueva guardada dentro del rango.
+        Solo se avanzan los dispositivos sin marca o con la marca dentro del
+        rango: si la marca es anterior a ``begin_time`` el hueco entre ambas
+        no se descargó en esta ejecución. Con ``window_hours``, si el rango
+        empieza en el piso de la ventana (``end_time - window_hours``, ver
+        ``incremental_begin``) se descargó todo lo permitido y también
+        avanzan las marcas anteriores: si no, un dispositivo desconectado
+        más de la ventana no volvería a avanzar nunca.
+
+        Args:
+            begin_time, end_time: Rango "YYYY-MM-DD HH:MM:SS" de la descarga
+            window_hours: Ventana máxima de la descarga (max_hours de incremental_begin)
+
+        Returns:
+            Cantidad de dispositivos cuya marca cambió
+        """
+        if not (_TIME_STR.match(begin_time) and _TIME_STR.match(end_time)):
+            return 0
+        oldest_kept = begin_time
+        if window_hours is not None:
+            floor = datetime.strptime(end_time, TIME_FORMAT) - timedelta(hours=window_hours)
+            if begin_time <= floor.strftime(TIME_FORMAT):
+                oldest_kept = ''
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO watermarks (dev_idno, file_time) '
+                'SELECT dev_idno, MAX(file_time) FROM photos WHERE file_time BETWEEN ? AND ? '
+                'GROUP BY dev_idno '
+                'ON CONFLICT (dev_idno) DO UPDATE SET file_time = excluded.file_time '
+                'WHERE watermarks.file_time >= ? AND excluded.file_time > watermarks.file_time',
+                (begin_time, end_time, oldest_kept)
+            )
+        if cursor.rowcount:
+            logger.debug(f"📒 Marcas de agua avanzadas hasta {end_time}: {cursor.rowcount} dispositivos")
+        return max(cursor.rowcount, 0)
+
+    def latest(self) -> Optional[datetime]:
+        """
+        Fecha de la foto más reciente guardada (None si no hay ninguna)
+
+        Se lee de las fotos y no de las marcas de agua, que no avanzan
+        mientras las descargas terminen con errores.
+        """
+        row = self._connection().execute(
+            'SELECT file_time FROM photos WHERE file_time GLOB ? ORDER BY file_time DESC LIMIT 1',
+            (_TIME_GLOB,)).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT) if row and row[0] else None
+
+    def incremental_begin(self, end_time: datetime, max_hours: float, overlap_minutes: float = 30,
+                          devices: Optional[Iterable[str]] = None) -> datetime:
+        """
+        Inicio de la consulta para traer solo las fotos nuevas
+
+        Se toma la marca de agua más vieja entre los dispositivos activos
+        (con fotos dentro de las últimas ``max_hours``) menos el
+        solapamiento. La consulta de fotos es por rango para toda la flota,
+        así ningún dispositivo activo se queda atrás; los inactivos no
+        frenan la ventana. Sin marcas de agua es ``end_time - max_hours``
+        (la ventana fija de antes).
+
+        Args:
+            end_time: Fin de la consulta
+            max_hours: Ventana máxima hacia atrás
+            overlap_minutes: Margen antes de la marca de agua para fotos que llegan tarde
+            devices: Limitar a estos dispositivos (por ejemplo los de una empresa)
+        """
+        floor = end_time - timedelta(hours=max_hours)
+        query = 'SELECT dev_idno, file_time FROM watermarks WHERE file_time >= ?'
+        rows = self._connection().execute(query, (floor.strftime(TIME_FORMAT),)).fetchall()
+        if devices is not None:
+            devices = {str(device) for device in devices}
+            rows = [row for row in rows if row[0] in devices]
+        if not rows:
+            return floor
+
+        oldest = datetime.strptime(min(file_time for _, file_time in rows), TIME_FORMAT)
+        return min(end_time, max(floor, oldest - timedelta(minutes=overlap_minutes)))
+
+    def __len__(self) -> int:
+        return self._connection().execute('SELECT COUNT(*) FROM photos').fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        count, size = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM photos').fetchone()
+        return {'path': self.path, 'photos': count, 'bytes': size}
+
+    # =====================================================================
+    # RECONSTRUCCIÓN DESDE DISCO
+    # =====================================================================
+
+    def reconcile(self, photos_dir: str, checksum: bool = False) -> Dict[str, int]:
+        """
+        Sincroniza el manifiesto con los archivos de ``photos_dir``
+
+        Agrega las fotos que están en disco y no en el manifiesto, corrige
+        el tamaño de las que cambiaron y borra las filas cuyo archivo ya no
+        existe. Se conserva el canal de las filas existentes y se recalculan
+        las marcas de agua.
+
+        Args:
+            photos_dir: Directorio base de las fotos (carpeta por vehículo)
+            checksum: Calcular sha256 de cada archivo (lee todos los archivos)
+
+        Returns:
+            Contadores: files, added, updated, removed, unparsed
+        """
+        counts = {'files': 0, 'added': 0, 'updated': 0, 'removed': 0, 'unparsed': 0}
+        on_disk: Dict[str, Tuple[str, str, int]] = {}
+
+        for folder in sorted(os.listdir(photos_dir)) if os.path.isdir(photos_dir) else []:
+            folder_path = os.path.join(photos_dir, folder)
+            if folder.startswith('.') or not os.path.isdir(folder_path):
+                continue
+            with os.scandir(folder_path) as entries:
+                for entry in entries:
+                    if not entry.is_file() or not entry.name.endswith('.jpg'):
+                        continue
+                    parsed = parse_photo_file(entry.name)
+                    if parsed is None:
+                        counts['unparsed'] += 1
+                        continue
+                    size = entry.stat().st_size
+                    if size <= 0:
+                        continue
+                    counts['files'] += 1
+                    on_disk[f"{folder}/{entry.name}"] = (parsed[0], parsed[1], size)
+
+        conn = self._connection()
+        existing: Dict[str, List[Tuple[Key, int]]] = {}
+        for dev_idno, file_time, channel, path, size in conn.execute(
+                'SELECT dev_idno, file_time, channel, path, size FROM photos'):
+            existing.setdefault(path, []).append(((dev_idno, file_time, channel), size))
+
+        now = time.time()
+        with conn:
+            for path, rows in existing.items():
+                if path not in on_disk:
+                    conn.executemany(
+                        'DELETE FROM photos WHERE dev_idno = ? AND file_time = ? AND channel = ?',
+                        [key for key, _ in rows])
+                    counts['removed'] += len(rows)
+                    continue
+                size = on_disk[path][2]
+                for key, stored_size in rows:
+                    if stored_size != size:
+                        digest = file_checksum(os.path.join(photos_dir, path)) if checksum else ''
+                        conn.execute(
+                            'UPDATE photos SET size = ?, checksum = ?, stored_at = ? '
+                            'WHERE dev_idno = ? AND file_time = ? AND channel = ?',
+                            (size, digest, now) + key)
+                        counts['updated'] += 1
+
+            for path, (dev_idno, file_time, size) in on_disk.items():
+                if path in existing:
+                    continue
+                digest = file_checksum(os.path.join(photos_dir, path)) if checksum else ''
+                conn.execute(
+                    'INSERT OR REPLACE INTO photos (dev_idno, file_time, channel, path, size, checksum, stored_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (dev_idno, file_time, UNKNOWN_CHANNEL, path, size, digest, now))
+                counts['added'] += 1
+
+            conn.execute('DELETE FROM watermarks')
+            conn.execute(
+                'INSERT INTO watermarks (dev_idno, file_time) '
+                "SELECT dev_idno, MAX(file_time) FROM photos "
+                "WHERE file_time GLOB ? GROUP BY dev_idno", (_TIME_GLOB,))
+
+        logger.info(f"📒 Manifiesto de fotos reconciliado: {counts}")
+        return counts
+
+
+_manifests: Dict[str, PhotoManifest] = {}
+_manifests_lock = threading.Lock()
+
+
+def get_photo_manifest(photos_dir: str, path: str = None) -> PhotoManifest:
+    """
+    Manifiesto del directorio de fotos (uno por archivo y proceso)
+
+    Args:
+        photos_dir: Directorio base de las fotos
+        path: Archivo de la base (por defecto ``photos_dir/.manifest.sqlite3``)
+    """
+    path = os.path.abspath(path or os.path.join(photos_dir, DEFAULT_FILENAME))
+    with _manifests_lock:
+        manifest = _manifests.get(path)
+        if manifest is None:
+            manifest = _manifests[path] = PhotoManifest(path)
+        return manifest
@@ -0,0 +1,575 @@
+"""
+Motor de descarga de fotos de seguridad en pipeline
+===================================================
+
+Un solo algoritmo para todas las descargas de fotos (vistas web, tarea de
+Celery, comando ``download_security_photos`` y la app de escritorio):
+
+- un productor por descarga recorre las páginas de ``queryPhoto`` (con
+  ``iter_pages`` la página siguiente ya está en vuelo), aplica el filtro
+  de empresa y encola cada foto;
+- una cola acotada entre el productor y los workers: si los workers van
+  atrasados el productor espera, así nunca hay más de ``queue_size``
+  fotos listadas sin descargar;
+- un pool de workers persistente (se crea una vez por proceso y lo
+  comparten todas las descargas) guarda cada foto con un ``PhotoSaver``;
+- con un ``PhotoManifest`` (``photo_manifest.py``) el productor consulta
+  una vez por página qué fotos ya están descargadas y no las encola: no
+  hay un stat por foto ni trabajo para los workers.
+
+El listado de la página N+1 se superpone con la descarga de la página N
+y no hay una pausa por página esperando a la foto más lenta.
+
+Ejemplo:
+
+    engine = PhotoDownloadEngine(workers=15)
+    run = engine.run(iter_pages(fetch_page), saver, accept=empresa_predicate(filtro))
+    run.stats['descargadas'], run.photos
+
+Este módulo no depende de Django.
+
+Archivo: sit/photo_pipeline.py
+Autor: StreamBus Development Team
+Versión: 1.0.0
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+
+from .photo_blobs import BlobStore
+from .photo_manifest import PhotoManifest, file_checksum, manifest_key
+
+logger = logging.getLogger(__name__)
+
+# Resultado de guardar una foto
+STATUS_DOWNLOADED = 'descargada'
+STATUS_EXISTS = 'ya_existe'
+
+# Estados de una descarga
+RUN_RUNNING = 'running'
+RUN_COMPLETED = 'completed'
+RUN_CANCELLED = 'cancelled'
+RUN_ERROR = 'error'
+
+_STOP = object()
+
+
+def photo_keys(photo: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Ficha y dispositivo de una foto (el dispositivo sin el prefijo 'C')
+
+    Raises:
+        ValueError: Si el devIdno no es numérico
+    """
+    dev_idno = int(str(photo.get('devIdno', '0')).replace('C', '').replace('c', ''))
+    return str(photo.get('vehiIdno', '')), str(dev_idno)
+
+
+def empresa_predicate(empresa_filter: Optional[Dict[str, Any]]) -> Optional[Callable[[str, str], bool]]:
+    """
+    Filtro de empresa: acepta la foto si la ficha o el dispositivo son de la empresa
+
+    Args:
+        empresa_filter: Diccionario con 'vehiIdnos' y 'devIdnos' (o None)
+
+    Returns:
+        Función ``accept(ficha, dispositivo)`` o None si no hay filtro
+    """
+    if not empresa_filter:
+        return None
+    fichas = {str(ficha) for ficha in empresa_filter.get('vehiIdnos', [])}
+    devices = {str(device) for device in empresa_filter.get('devIdnos', [])}
+    return lambda ficha, device: ficha in fichas or device in devices
+
+
+class PhotoSaver:
+    """
+    Guarda una foto en ``photos_dir/<carpeta del vehículo>/<archivo>``
+
+    Con ``manifest`` cada foto guardada (o encontrada en disco) queda
+    registrada y ``lookup`` resuelve una página entera con una consulta.
+    Con ``blobs`` la descarga se guarda una vez por contenido y el archivo
+    del vehículo es un enlace al blob (ver photo_blobs.py).
+    """
+
+    def __init__(self, photos_dir: str, folder_name: Callable, file_name: Callable,
+                 file_exists: Callable[[str], bool], download: Callable[[str, str], bool],
+                 file_url: Callable[[str], str], local_prefix: str = 'security_photos',
+                 manifest: Optional[PhotoManifest] = None, blobs: Optional[BlobStore] = None):
+        """
+        Args:
+            photos_dir: Directorio base de las fotos
+            folder_name: ``folder_name(vehiIdno, devIdno)`` carpeta del vehículo
+            file_name: ``file_name(vehiIdno, devIdno, fileTimeStr)`` nombre del archivo
+            file_exists: ``file_exists(path)`` si la foto ya está guardada
+            download: ``download(url, path)`` descarga y retorna True si salió bien
+            file_url: ``file_url(FPATH)`` URL de descarga cuando la foto no trae downloadUrl
+            local_prefix: Prefijo de ``local_path`` (relativo a MEDIA_ROOT)
+            manifest: Manifiesto de fotos descargadas (opcional)
+            blobs: Almacén por contenido (opcional)
+        """
+        self.photos_dir = photos_dir
+        self.folder_name = folder_name
+        self.file_name = file_name
+        self.file_exists = file_exists
+        self.download = download
+        self.file_url = file_url
+        self.local_prefix = local_prefix
+        self.manifest = manifest
+        self.blobs = blobs
+
+    def lookup(self, photos: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Qué fotos ya están descargadas según el manifiesto (una consulta)
+
+        A las encontradas les agrega ``local_path``. Sin manifiesto ninguna
+        se da por descargada y cada una se verifica al guardarla.
+        """
+        if self.manifest is None or not photos:
+            return [False] * len(photos)
+        keys = [manifest_key(photo) for photo in photos]
+        found = self.manifest.lookup(keys)
+        flags = []
+        for photo, key in zip(photos, keys):
+            path = found.get(key)
+            if path:
+                photo['local_path'] = f"{self.local_prefix}/{path}"
+            flags.append(bool(path))
+        return flags
+
+    def _register(self, photo: Dict[str, Any], relative_path: str, file_path: str,
+                  checksum: Optional[str] = None):
+        if self.manifest is None:
+            return
+        try:
+            self.manifest.add(manifest_key(photo), relative_path,
+                              os.path.getsize(file_path), checksum or file_checksum(file_path))
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo registrar {relative_path} en el manifiesto: {e}")
+
+    def __call__(self, photo: Dict[str, Any]) -> Optional[str]:
+        """
+        Guarda la foto y le agrega ``local_path``
+
+        Returns:
+            STATUS_DOWNLOADED, STATUS_EXISTS o None si no se pudo descargar
+        """
+        vehi_idno = photo.get('vehiIdno')
+        dev_idno = photo.get('devIdno')
+
+        folder = self.folder_name(vehi_idno, dev_idno)
+        vehicle_dir = os.path.join(self.photos_dir, folder)
+        os.makedirs(vehicle_dir, exist_ok=True)
+
+        file_name = self.file_name(vehi_idno, dev_idno, photo.get('fileTimeStr'))
+        file_path = os.path.join(vehicle_dir, file_name)
+        relative_path = f"{folder}/{file_name}"
+        local_path = f"{self.local_prefix}/{relative_path}"
+
+        if self.file_exists(file_path):
+            # Descargada antes del manifiesto (o por otra vía): queda registrada
+            self._register(photo, relative_path, file_path)
+            photo['local_path'] = local_path
+            return STATUS_EXISTS
+
+        url = photo.get('downloadUrl')
+        if not url:
+            if not photo.get('FPATH'):
+                return None
+            url = self.file_url(photo['FPATH'])
+
+        if self.blobs is None:
+            if not self.download(url, file_path):
+                return None
+            self._register(photo, relative_path, file_path)
+        else:
+            # Se descarga aparte y el archivo del vehículo queda enlazado al blob
+            download_path = f"{file_path}.download"
+            try:
+                if not self.download(url, download_path):
+                    return None
+                digest = self.blobs.store(download_path, file_path)
+            except Exception as e:
+                logger.info(f"[💾 ERROR] No se pudo guardar {relative_path}: {e}")
+                return None
+            finally:
+                if os.path.exists(download_path):
+                    os.remove(download_path)
+            self._register(photo, relative_path, file_path, digest)
+        photo['local_path'] = local_path
+        return STATUS_DOWNLOADED
+
+
+class PipelineRun:
+    """Una descarga en curso: contadores, fotos guardadas y estado"""
+
+    def __init__(self, save: Callable[[Dict[str, Any]], Optional[str]],
+                 accept: Optional[Callable[[str, str], bool]] = None,
+                 on_progress: Optional[Callable[['PipelineRun'], None]] = None,
+                 progress_interval: float = 0.5,
+                 on_page_done: Optional[Callable[[int], None]] = None):
+        self.save = save
+        self.accept = accept
+        self.on_progress = on_progress
+        self.on_page_done = on_page_done
+        self.progress_interval = progress_interval
+        self.status = RUN_RUNNING
+        self.error: Optional[str] = None
+        self.total_records = 0
+        self.total_pages = 0
+        self.photos: List[Dict[str, Any]] = []
+        self.stats: Dict[str, Any] = {
+            'total_procesadas': 0,
+            'incluidas': 0,
+            'excluidas': 0,
+            'ya_existen': 0,
+            'descargadas': 0,
+            'errores': 0,
+            'paginas': 0,
+            'vehiculos': set(),
+            'dispositivos': set(),
+        }
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self._pending = 0
+        self._page_pending: Dict[int, int] = {}
+        self._page_failed: set = set()
+        self._listing_done = False
+        self._cancelled = threading.Event()
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._last_progress = 0.0
+
+    # Estado -------------------------------------------------------------
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def processed(self) -> int:
+        """Fotos listadas que ya se resolvieron (guardadas, excluidas o con error)"""
+        stats = self.stats
+        return stats['excluidas'] + stats['ya_existen'] + stats['descargadas'] + stats['errores']
+
+    @property
+    def progress(self) -> int:
+        """Porcentaje de avance sobre totalRecords (100 solo al terminar)"""
+        if self.finished is not None:
+            return 100
+        if not self.total_records:
+            return 0
+        return min(99, int(self.processed * 100 / self.total_records))
+
+    @property
+    def duration(self) -> float:
+        return (self.finished or time.time()) - self.started
+
+    def complete(self, skipped_pages: int = 0) -> bool:
+        """
+        Terminó sin errores y se listaron todas las páginas
+
+        Args:
+            skipped_pages: Páginas que no se pidieron por estar completas de
+                una ejecución anterior (``skip_pages`` de iter_pages)
+        """
+        with self._lock:
+            listed = self.stats['paginas'] + skipped_pages
+            return (self.status == RUN_COMPLETED and not self.stats['errores']
+                    and listed >= max(self.total_pages, 1))
+
+    def wait(self, timeout: float = None) -> bool:
+        """Espera a que termine la descarga"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        """Detiene el listado y descarta las fotos aún en cola"""
+        self._cancelled.set()
+
+    def summary(self) -> Dict[str, Any]:
+        """Contadores serializables (sin los conjuntos)"""
+        with self._lock:
+            stats = {key: value for key, value in self.stats.items() if not isinstance(value, set)}
+            stats['vehiculos'] = len(self.stats['vehiculos'])
+            stats['dispositivos'] = len(self.stats['dispositivos'])
+        stats.update({
+            'status': self.status,
+            'total_records': self.total_records,
+            'total_pages': self.total_pages,
+            'total_disponibles': stats['descargadas'] + stats['ya_existen'],
+            'duration': round(self.duration, 1),
+        })
+        return stats
+
+    # Productor y workers ------------------------------------------------
+
+    def _classify(self, photo: Dict[str, Any]) -> bool:
+        """Cuenta la foto y decide si se descarga (con el lock tomado)"""
+        self.stats['total_procesadas'] += 1
+        try:
+            ficha, device = photo_keys(photo)
+        except ValueError:
+            self.stats['errores'] += 1
+            logger.info(f"[ERROR] No se pudo interpretar devIdno: {photo.get('devIdno')}")
+            return False
+        if self.accept is not None and not self.accept(ficha, device):
+            self.stats['excluidas'] += 1
+            return False
+        self.stats['incluidas'] += 1
+        self.stats['vehiculos'].add(ficha)
+        self.stats['dispositivos'].add(device)
+        self._pending += 1
+        return True
+
+    def _record(self, photo: Dict[str, Any], status: Optional[str], page: int = None):
+        page_done = False
+        with self._lock:
+            if status == STATUS_DOWNLOADED:
+                self.stats['descargadas'] += 1
+            elif status == STATUS_EXISTS:
+                self.stats['ya_existen'] += 1
+            elif not self.cancelled:
+                self.stats['errores'] += 1
+            if status is not None:
+                self.photos.append(photo)
+            self._pending -= 1
+            if page is not None:
+                if status is None:
+                    self._page_failed.add(page)
+                self._page_pending[page] -= 1
+                if not self._page_pending[page]:
+                    del self._page_pending[page]
+                    page_done = page not in self._page_failed
+            finished = self._listing_done and self._pending == 0
+        if page_done:
+            self._page_completed(page)
+        if finished:
+            self._finish()
+        else:
+            self._report_progress()
+
+    def _end_listing(self, error: Optional[str] = None):
+        with self._lock:
+            self._listing_done = True
+            if error:
+                self.error = error
+            finished = self._pending == 0
+        if finished:
+            self._finish()
+
+    def _finish(self):
+        with self._lock:
+            if self._done.is_set():
+                return
+            self.finished = time.time()
+            if self.error:
+                self.status = RUN_ERROR
+            elif self.cancelled:
+                self.status = RUN_CANCELLED
+            else:
+                self.status = RUN_COMPLETED
+        self._report_progress(force=True)
+        self._done.set()
+
+    def _page_completed(self, page: int):
+        """Todas las fotos de la página quedaron guardadas"""
+        if self.on_page_done is None:
+            return
+        try:
+            self.on_page_done(page)
+        except Exception as e:
+            logger.error(f"❌ Error registrando la página {page} completa: {e}")
+
+    def _report_progress(self, force: bool = False):
+        if self.on_progress is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = now
+        try:
+            self.on_progress(self)
+        except Exception as e:
+            logger.error(f"❌ Error en callback de progreso: {e}")
+
+
+class PhotoDownloadEngine:
+    """Pool de workers persistente que descarga las fotos de una o varias descargas"""
+
+    def __init__(self, workers: int = 15, queue_size: int = None, progress_interval: float = 0.5):
+        """
+        Args:
+            workers: Descargas simultáneas
+            queue_size: Fotos listadas en espera (por defecto 4 por worker)
+            progress_interval: Segundos mínimos entre llamadas a ``on_progress``
+        """
+        self.workers = max(1, workers)
+        self.queue_size = queue_size or self.workers * 4
+        self.progress_interval = progress_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def _ensure_workers(self):
+        with self._lock:
+            if self._threads:
+                return
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'photo-worker-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            logger.info(f"📥 Pool de descarga de fotos: {self.workers} workers")
+
+    def submit(self, pages: Iterable[Tuple[int, Dict[str, Any]]],
+               save: Callable[[Dict[str, Any]], Optional[str]],
+               accept: Optional[Callable[[str, str], bool]] = None,
+               on_progress: Optional[Callable[[PipelineRun], None]] = None,
+               on_page_done: Optional[Callable[[int], None]] = None) -> PipelineRun:
+        """
+        Inicia una descarga sin esperar a que termine
+
+        Args:
+            pages: Iterable de (número, respuesta de queryPhoto), por ejemplo
+                ``iter_pages(fetch_page)`` o ``[(1, pagina)]``
+            save: Guarda una foto (ver PhotoSaver)
+            accept: Filtro ``accept(ficha, dispositivo)`` (ver empresa_predicate)
+            on_progress: Se llama con la descarga a medida que avanza y al terminar
+            on_page_done: Se llama con el número de página cuando todas sus
+                fotos quedaron guardadas (para retomar una descarga, ver photo_jobs.py)
+
+        Returns:
+            PipelineRun de la descarga
+        """
+        self._ensure_workers()
+        run = PipelineRun(save, accept, on_progress, self.progress_interval, on_page_done)
+        producer = threading.Thread(target=self._produce, args=(run, pages),
+                                    name='photo-producer', daemon=True)
+        producer.start()
+        return run
+
+    def run(self, pages: Iterable[Tuple[int, Dict[str, Any]]],
+            save: Callable[[Dict[str, Any]], Optional[str]],
+            accept: Optional[Callable[[str, str], bool]] = None,
+            on_progress: Optional[Callable[[PipelineRun], None]] = None,
+            on_page_done: Optional[Callable[[int], None]] = None) -> PipelineRun:
+        """Como ``submit`` pero espera a que termine la descarga"""
+        run = self.submit(pages, save, accept, on_progress, on_page_done)
+        run.wait()
+        return run
+
+    def _produce(self, run: PipelineRun, pages: Iterable[Tuple[int, Dict[str, Any]]]):
+        error = None
+        try:
+            for page, page_result in pages:
+                if run.cancelled:
+                    break
+                with run._lock:
+                    run.stats['paginas'] += 1
+                    if not run.total_records:
+                        pagination = page_result.get('pagination') or {}
+                        run.total_records = int(pagination.get('totalRecords') or 0)
+                        run.total_pages = int(pagination.get('totalPages') or 0)
+
+                with run._lock:
+                    included = [photo for photo in page_result.get('infos') or []
+                                if run._classify(photo)]
+                    if included:
+                        run._page_pending[page] = run._page_pending.get(page, 0) + len(included)
+                if not included:
+                    run._page_completed(page)
+                stored = self._stored(run, included)
+
+                for n, photo in enumerate(included):
+                    if run.cancelled:
+                        for skipped in included[n:]:
+                            run._record(skipped, None, page)
+                        break
+                    if n in stored:
+                        run._record(photo, STATUS_EXISTS, page)
+                        continue
+                    self._put(run, page, photo)
+                logger.debug(f"📄 Página {page}/{run.total_pages} encolada")
+        except Exception as e:
+            error = str(e)
+            logger.error(f"❌ Error listando fotos: {e}")
+        finally:
+            # Cerrar el generador de páginas (cancela el prefetch pendiente)
+            close = getattr(pages, 'close', None)
+            if close is not None:
+                close()
+            run._end_listing(error)
+
+    def _stored(self, run: PipelineRun, photos: List[Dict[str, Any]]) -> set:
+        """Índices de las fotos de la página que ya están descargadas"""
+        lookup = getattr(run.save, 'lookup', None)
+        if lookup is None or not photos:
+            return set()
+        try:
+            return {n for n, stored in enumerate(lookup(photos)) if stored}
+        except Exception as e:
+            # Sin manifiesto cada foto se verifica en disco al guardarla
+            logger.warning(f"⚠️ No se pudo consultar el manifiesto de fotos: {e}")
+            return set()
+
+    def _put(self, run: PipelineRun, page: int, photo: Dict[str, Any]):
+        # Espera con la cola llena sin dejar de atender la cancelación
+        while True:
+            try:
+                self._queue.put((run, page, photo), timeout=0.5)
+                return
+            except queue.Full:
+                if run.cancelled:
+                    run._record(photo, None, page)
+                    return
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            run, page, photo = item
+            status = None
+            if not run.cancelled:
+                try:
+                    status = run.save(photo)
+                except Exception as e:
+                    logger.info(f"[💥 ERROR] {photo.get('vehiIdno')}-{photo.get('devIdno')}: {e}")
+            run._record(photo, status, page)
+
+    def close(self):
+        """Detiene los workers cuando terminen las fotos en cola"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+
+
+_engine: Optional[PhotoDownloadEngine] = None
+_engine_lock = threading.Lock()
+
+
+def configure_photo_engine(workers: int = 15, **kwargs) -> PhotoDownloadEngine:
+    """Configura el motor de descarga del proceso"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.close()
+        _engine = PhotoDownloadEngine(workers, **kwargs)
+    return _engine
+
+
+def get_photo_engine() -> PhotoDownloadEngine:
+    """Retorna el motor de descarga del proceso (lo crea con valores por defecto)"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PhotoDownloadEngine()
+        return _engine
@@ -17,42 +17,62 @@ def test_task():
     return "Test exitoso desde sit.tasks"
 
 @shared_task(bind=True, max_retries=3)
-def auto_download_security_photos(self, empresa_id=1, custom_hours=2):
+def auto_download_security_photos(self, empresa_id=1, custom_hours=2, incremental=True,
+                                  begin_time=None, end_time=None, checkpoint=None):
     """
-    Tarea básica de descarga - SIN importar funciones complejas aún
+    Descarga automática de las fotos de seguridad de las últimas horas
+    (motor en pipeline compartido, ver sit/photo_pipeline.py)
+    
+    Con ``incremental`` solo se piden las fotos posteriores a la marca de
+    agua de cada dispositivo (ver sit/photo_manifest.py); ``custom_hours``
+    queda como ventana máxima.
+    
+    Con ``begin_time``/``end_time`` se descarga ese rango fijo (backfill) con
+    el avance guardado por página (``checkpoint``, por defecto solo para los
+    rangos fijos). Los reintentos reciben el rango de la primera ejecución:
+    el manifiesto evita bajar de nuevo lo ya guardado.
     """
     task_id = self.request.id
     logger.info(f"🚀 [TASK {task_id}] Iniciando descarga automática")
     
+    if checkpoint is None:
+        checkpoint = bool(begin_time and end_time)
+    begin_time_str, end_time_str = begin_time, end_time
+    window_hours = None
     try:
-        # Calcular rango temporal
-        now = datetime.now()
-        end_time = now.replace(minute=0, second=0, microsecond=0)
-        start_time = end_time - timedelta(hours=custom_hours)
+        empresa_filter = _empresa_filter(empresa_id)
         
-        begin_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
-        end_time_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
+        # Calcular rango temporal (salvo que venga fijo o de la primera ejecución)
+        if not (begin_time_str and end_time_str):
+            window_hours = custom_hours
+            if incremental:
+                from .utils import incremental_photo_range
+                begin_time_str, end_time_str = incremental_photo_range(custom_hours, empresa_filter)
+            else:
+                now = datetime.now()
+                end_time = now.replace(minute=0, second=0, microsecond=0)
+                start_time = end_time - timedelta(hours=custom_hours)
+                
+                begin_time_str = start_time.strftime("%Y-%m-%d %H:%M:%S")
+                end_time_str = end_time.strftime("%Y-%m-%d %H:%M:%S")
         
-        logger.info(f"📅 Rango: {begin_time_str} → {end_time_str}")
+        logger.info(f"📅 Rango: {begin_time_str} → {end_time_str}{' (incremental)' if incremental else ''}")
         logger.info(f"🏢 Empresa ID: {empresa_id}")
         
-        # SIMULACIÓN por ahora - después integraremos tu sistema real
-        import time
-        time.sleep(3)  # Simular trabajo de descarga
-        
-        # Aquí es donde después llamaremos a tu función real
-        # result = call_existing_download_system(begin_time_str, end_time_str, empresa_id)
+        result = integrate_with_existing_download_system(begin_time_str, end_time_str, empresa_id,
+                                                         empresa_filter=empresa_filter,
+                                                         checkpoint=checkpoint, window_hours=window_hours)
         
-        logger.info("✅ Descarga simulada completada")
+        logger.info(f"✅ Descarga completada: {result['photos_downloaded']} nuevas de {result['photos_total']}")
         
         return {
             'task_id': task_id,
             'time_range': f"{begin_time_str} - {end_time_str}",
             'empresa_id': empresa_id,
             'custom_hours': custom_hours,
+            'incremental': incremental,
             'status': 'success',
-            'photos_simulated': 25,  # Simulado
-            'message': 'Descarga simulada - listo para integrar sistema real'
+            **result
         }
         
     except Exception as exc:
@@ -60,7 +80,12 @@ def auto_download_security_photos(self, empresa_id=1, custom_hours=2):
         
         if self.request.retries < self.max_retries:
             logger.warning(f"🔄 Reintentando en 5 minutos...")
-            raise self.retry(countdown=300, exc=exc)
+            # El reintento repite el mismo rango (no uno nuevo que termine "ahora")
+            kwargs = {'empresa_id': empresa_id, 'custom_hours': custom_hours,
+                      'incremental': incremental, 'checkpoint': checkpoint}
+            if begin_time_str and end_time_str:
+                kwargs.update(begin_time=begin_time_str, end_time=end_time_str)
+            raise self.retry(countdown=300, exc=exc, kwargs=kwargs)
         
         raise exc
 
@@ -70,20 +95,87 @@ def simple_notification_task(message):
     logger.info(f"📧 Notificación: {message}")
     return f"Notificación enviada: {message}"
 
-# Función auxiliar para después integrar tu sistema
-def integrate_with_existing_download_system(begin_time, end_time, empresa_id=None):
+@shared_task
+def process_gps_alarm(alarm):
+    """
+    Procesa una alarma nueva del stream en tiempo real (sit/citos_alarms.py)
+    
+    Punto de extensión para notificaciones, registro en base de datos o
+    descarga de la evidencia asociada.
+    """
+    logger.info(
+        f"🚨 Alarma {alarm.get('atp')} vehículo {alarm.get('vid') or alarm.get('vehiIdno')} "
+        f"({alarm.get('guid')})"
+    )
+    return alarm.get('guid')
+
+# Segundos que se recuerda una alarma ya encolada (cubre el solapamiento entre consultas)
+ALARM_DEDUPE_TTL = 24 * 3600
+
+def enqueue_gps_alarms(events):
     """
-    Esta función será donde integremos tu sistema existente
-    Por ahora retorna datos simulados
+    Suscriptor del stream de alarmas: encola una tarea por alarma nueva
+    
+    Lo usa ``manage.py gps_alarm_stream``. La marca ``alarm:<guid>`` en el
+    cache compartido evita encolar dos veces la misma alarma si corre más
+    de un poller (por ejemplo durante un deploy).
     """
-    # TODO: Integrar con:
-    # - tu función query_security_photos()
-    # - tu función background_download_process() 
-    # - tu sistema de empresas y filtros
+    from django.core.cache import cache
+    
+    for seq, alarm in events:
+        guid = alarm.get('guid')
+        if not cache.add(f'alarm:{guid}', seq, ALARM_DEDUPE_TTL):
+            continue
+        try:
+            process_gps_alarm.delay(alarm)
+        except Exception as exc:
+            cache.delete(f'alarm:{guid}')
+            logger.error(f"❌ No se pudo encolar la alarma {guid}: {exc}")
+
+def _empresa_filter(empresa_id):
+    """Fichas y dispositivos de la empresa (None para todas)"""
+    if not empresa_id:
+        return None
+    from .views.gps_views import obtener_vehiculos_por_empresa
+    empresa_filter = obtener_vehiculos_por_empresa(str(empresa_id))
+    if not empresa_filter:
+        raise ValueError(f"No se pudo obtener información de la empresa {empresa_id}")
+    return empresa_filter
+
+def integrate_with_existing_download_system(begin_time, end_time, empresa_id=None, empresa_filter=None,
+                                            checkpoint=False, window_hours=None):
+    """
+    Descarga las fotos de un rango con el motor compartido de las vistas
+    
+    Args:
+        checkpoint: Guardar el avance por página (solo para rangos fijos: una
+                    nueva ejecución del mismo rango retoma desde las páginas
+                    completas)
+        window_hours: Horas hacia atrás con las que se calculó el rango (ver
+                      PhotoManifest.advance_watermarks)
+    
+    Returns:
+        dict con photos_downloaded, photos_existing, photos_total, errors,
+        duration, job_id, job_status y empresa_info
+    """
+    from .utils import download_security_photos, photo_download_job
+    
+    if empresa_filter is None:
+        empresa_filter = _empresa_filter(empresa_id)
+    
+    job = photo_download_job(begin_time, end_time, empresa_id) if checkpoint else None
+    run = download_security_photos(begin_time, end_time, empresa_filter, job=job,
+                                   window_hours=window_hours)
+    if run.error:
+        raise RuntimeError(run.error)
     
     return {
-        'photos_downloaded': 25,
-        'photos_total': 30,
-        'duration': 45.2,
-        'empresa_info': {'id': empresa_id, 'name': 'Empresa Test'}
-    }
\ No newline at end of file
+        'photos_downloaded': run.stats['descargadas'],
+        'photos_existing': run.stats['ya_existen'],
+        'photos_total': run.stats['incluidas'],
+        'errors': run.stats['errores'],
+        'duration': round(run.duration, 1),
+        'job_id': job.job_id if job else None,
+        'job_status': job.status if job else run.status,
+        'empresa_info': empresa_filter['empresa_info'] if empresa_filter else None
+    }
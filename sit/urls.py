@@ -12,6 +12,8 @@ urlpatterns = [
     path('vehiculos/', views.ubicaciones_vehiculos, name='ubicaciones_vehiculos'),
     path("direccion/", views.direccion_por_coordenadas, name="direccion"),
     path("alarmas/", views.alarmas_view, name="alarmas"),
+    path("alarmas/stream/", views.alarm_stream_sse, name="alarm_stream_sse"),
+    path("alarmas/recientes/", views.alarm_stream_recent, name="alarm_stream_recent"),
     path('api/security-photos-ajax/', views.get_security_photos_ajax, name='get_security_photos_ajax'), # ¡Nueva ruta!
 
     path('security-photos/', views.security_photos_form, name='security_photos_form'),
@@ -21,6 +23,10 @@ urlpatterns = [
     path('security-photos/view/', views.view_security_photos, name='view_security_photos'),
     path('security-photos/clear/', views.clear_security_photos_session, name='clear_security_photos_session'),
 
+    # Métricas del cliente GPS (formato Prometheus)
+    path('metrics/citos/', views.citos_metrics, name='citos_metrics'),
+    path('metrics/citos/shadow/', views.citos_shadow_report, name='citos_shadow_report'),
+
     # URLs de prueba para verificar logging con usuario
     path('test-logging/', test_logging_anonymous, name='test_logging_anonymous'),
     path('test-logging-auth/', test_logging_authenticated, name='test_logging_authenticated'),
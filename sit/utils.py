@@ -3,6 +3,7 @@ import os
 import re
 import requests
 import time
+from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional, Union, Any, Tuple
 from django.db import connections
@@ -12,7 +13,16 @@ from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from urllib.parse import urlencode
 from .models import informe_sit
-from .citos_library import GPSCameraAPI, APIError
+from .citos_library import GPSCameraAPI, APIError, download_to_file, iter_pages
+from .http_pool import get_http_session
+from .citos_resilience import get_default_policy, CircuitOpenError
+from .citos_metrics import get_metrics
+from .citos_session_broker import get_session_broker
+from .citos_shadow import get_shadow
+from .photo_pipeline import PhotoSaver, empresa_predicate, get_photo_engine
+from .photo_manifest import get_photo_manifest
+from .photo_blobs import linked_blob_store
+from .photo_jobs import get_photo_job_store
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +54,47 @@ def _should_use_citos(function_name: str) -> bool:
     enabled_functions = getattr(settings, 'CITOS_ENABLED_FUNCTIONS', {})
     return enabled_functions.get(function_name, False)
 
+def _shadow_adapter():
+    """Adapter para ejecutar la ruta citos en sombra aunque no esté habilitada"""
+    if _adapter is not None:
+        return _adapter
+    from .gps_adapter import get_gps_adapter
+    return get_gps_adapter()
+
+def _run_citos_or_legacy(function_name: str, legacy_function, *args):
+    """
+    Ejecuta la implementación citos o legacy de una función según _should_use_citos
+    
+    Con el modo sombra activo (settings.GPS_SHADOW_SAMPLE_RATE) una muestra de
+    las llamadas ejecuta además la otra implementación fuera del request para
+    comparar latencia, tamaño y resultado (ver sit/citos_shadow.py).
+    
+    En la comparación la ruta citos corre sin el fallback a legacy del
+    adapter: sus errores cuentan como errores de citos. El fallback se
+    aplica solo al resultado que recibe quien llamó.
+    """
+    def legacy():
+        # IMPORTANTE: Llamar directamente a legacy SIN pasar por la función pública
+        return legacy_function(*args)
+    
+    def citos_raw():
+        return _shadow_adapter().ejecutar_sin_fallback(function_name, *args)
+    
+    comparator = get_shadow()
+    
+    if not _should_use_citos(function_name):
+        if comparator is None:
+            return legacy()
+        return comparator.run(function_name, ('legacy', legacy), ('citos', citos_raw))
+    
+    try:
+        if comparator is None:
+            return getattr(_adapter, function_name)(*args)
+        return comparator.run(function_name, ('citos', citos_raw), ('legacy', legacy))
+    except Exception as e:
+        logger.info(f"⚠️ Citos falló, usando legacy: {e}")
+        return legacy()
+
 
 
 BASE_URL = "http://190.183.254.253:8088"
@@ -62,7 +113,7 @@ def gps_login(account: str, password: str) -> str:
 
     try:
         gps_url_login = BASE_URL+"/StandardApiAction_login.action"
-        response = requests.post(gps_url_login, data=payload, headers=headers)        
+        response = get_http_session().post(gps_url_login, data=payload, headers=headers)        
 
         if response.headers.get("Content-Type", "").startswith("application/json"):
             data = response.json()
@@ -83,7 +134,7 @@ def logout_api(jsession):
     params = {"jsession": jsession}
     
     try:
-        response = requests.get(url, params=params)      
+        response = get_http_session().get(url, params=params)      
         response.raise_for_status()        
         return response.json()
     
@@ -92,6 +143,32 @@ def logout_api(jsession):
     except ValueError as e:
         raise Exception(f"Error al procesar la respuesta JSON: {str(e)}")
 
+def current_jsession() -> Optional[str]:
+    """
+    jsession vigente compartido por web, Celery y comandos
+    
+    Lo entrega el broker de sesiones (sit/citos_session_broker.py), que hace
+    login solo si no hay una sesión guardada o venció.
+    """
+    broker = get_session_broker()
+    if broker is None:
+        return getattr(settings, 'JSESSION_GPS', None)
+    return broker.get()
+
+def renew_jsession(stale: Optional[str]) -> Optional[str]:
+    """
+    Renueva la sesión tras un rechazo del servidor (código 5)
+    
+    Si otro proceso ya la renovó se reutiliza esa en lugar de hacer login.
+    """
+    broker = get_session_broker()
+    if broker is None:
+        jsession = gps_login(settings.GPS_ACCOUNT, settings.GPS_PASSWORD)
+        if jsession:
+            settings.JSESSION_GPS = jsession
+        return jsession
+    return broker.refresh(stale)
+
 def obtener_informe_sit(idinforme):
     with connections['SIT'].cursor() as cursor:
         cursor.execute("SELECT * FROM SIT.dbo.PerInformeDetalladoByIdInforme(%s)", [idinforme])
@@ -103,24 +180,16 @@ def obtener_informe_sit(idinforme):
     return resultados
 
 def obtener_ultima_ubicacion(vehi_idno=None, to_map=2, geoaddress=0, current_page=1, page_records=50): 
-    # Decidir qué implementación usar
-    if _should_use_citos('obtener_ultima_ubicacion'):
-        try:
-            return _adapter.obtener_ultima_ubicacion(vehi_idno, to_map, geoaddress, current_page, page_records)
-        except Exception as e:
-            logger.info(f"⚠️ Citos falló, usando legacy: {e}")
-            # IMPORTANTE: Llamar directamente a legacy SIN pasar por esta función
-            return obtener_ultima_ubicacion_legacy(vehi_idno, to_map, geoaddress, current_page, page_records)
-    
-    # Si no usamos citos, usar legacy directamente
-    return obtener_ultima_ubicacion_legacy(vehi_idno, to_map, geoaddress, current_page, page_records)
+    # Decidir qué implementación usar (y compararlas en modo sombra)
+    return _run_citos_or_legacy('obtener_ultima_ubicacion', obtener_ultima_ubicacion_legacy,
+                                vehi_idno, to_map, geoaddress, current_page, page_records)
 
 def obtener_ultima_ubicacion_legacy(vehi_idno=None, to_map=2, geoaddress=0, current_page=1, page_records=50):
     """Función legacy original - NUNCA MODIFICAR"""
     url = BASE_URL+"/StandardApiAction_vehicleStatus.action"
     
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "toMap": to_map,
         "geoaddress": geoaddress,
         "currentPage": current_page,
@@ -131,7 +200,7 @@ def obtener_ultima_ubicacion_legacy(vehi_idno=None, to_map=2, geoaddress=0, curr
         params["vehiIdno"] = vehi_idno
 
     try:
-        response = requests.get(url, params=params, timeout=DEFAULT_TIMEOUT)
+        response = get_http_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         
@@ -151,39 +220,99 @@ def obtener_ultima_ubicacion_legacy(vehi_idno=None, to_map=2, geoaddress=0, curr
         logger.info(f"Error de conexión: {e}")
         return None, None, None, None, None
 
+# Fichas por consulta de vehicleStatus (limita el largo de la URL)
+UBICACIONES_POR_CONSULTA = 200
+
+def obtener_ubicaciones_flota(fichas, to_map=2):
+    """
+    Última ubicación de varios vehículos con consultas por lote
+
+    Reemplaza el bucle de ``obtener_ultima_ubicacion`` por vehículo de las
+    vistas de ubicaciones. Como las demás funciones GPS, elige entre citos
+    y legacy con CITOS_ENABLED_FUNCTIONS (y las compara en modo sombra).
+
+    Returns:
+        Diccionario ficha -> (latitud, longitud, velocidad, timestamp, dirección),
+        solo para los vehículos con posición conocida
+    """
+    return _run_citos_or_legacy('obtener_ubicaciones_flota', obtener_ubicaciones_flota_legacy,
+                                fichas, to_map)
+
+def obtener_ubicaciones_flota_legacy(fichas, to_map=2):
+    """
+    Implementación legacy de obtener_ubicaciones_flota (también es el fallback del adapter)
+
+    Una consulta vehicleStatus por lote de UBICACIONES_POR_CONSULTA fichas,
+    por ``make_request`` (política de resiliencia, métricas y renovación de
+    sesión); las coordenadas se convierten todas juntas con
+    ``citos_geo.parse_coordinates_array``.
+    """
+    from .citos_geo import parse_coordinates_array
+
+    fichas = [str(ficha) for ficha in fichas if ficha]
+    infos = []
+
+    for start in range(0, len(fichas), UBICACIONES_POR_CONSULTA):
+        lote = fichas[start:start + UBICACIONES_POR_CONSULTA]
+        params = {
+            "jsession": current_jsession(),
+            "vehiIdno": ",".join(lote),
+            "toMap": to_map,
+            "geoaddress": 0,
+            "currentPage": 1,
+            "pageRecords": len(lote),
+        }
+        try:
+            data = make_request("StandardApiAction_vehicleStatus.action", params)
+        except AlarmAPIError as e:
+            logger.info(f"Error consultando ubicaciones: {e}")
+            continue
+        infos.extend(data.get("infos") or [])
+
+    if not infos:
+        return {}
+
+    longitudes, latitudes = parse_coordinates_array(
+        [info.get("jd") or 0 for info in infos],
+        [info.get("wd") or 0 for info in infos],
+        missing_as_nan=True
+    )
+
+    ubicaciones = {}
+    for info, lat, lon in zip(infos, latitudes.tolist(), longitudes.tolist()):
+        if lat != lat:  # NaN: sin posición
+            continue
+        ubicaciones[str(info.get("vi"))] = (lat, lon, None, info.get("tm"), info.get("pos", ""))
+    return ubicaciones
+
 def obtener_vehiculos():
+    return _run_citos_or_legacy('obtener_vehiculos', obtener_vehiculos_legacy)
+
+def obtener_vehiculos_legacy():
+    """Función legacy original (también es el fallback del adapter)"""
     url = BASE_URL+"/StandardApiAction_queryUserVehicle.action"
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "language": "en"
     }
 
     try:
-        response = requests.get(url, params=params, timeout=DEFAULT_TIMEOUT)
+        response = get_http_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         logger.info("------------------>>>", data)
         # Verificar si estamos desconectados o la sesión expiró
         if data.get("result") in [2, 4, 5] or 'error' in data.get("errmsg", "").lower() or 'expired' in data.get("errmsg", "").lower():
-            logger.info("Sesión expirada o desconectada. Intentando reconexión...")
+            logger.info("Sesión expirada o desconectada. Renovando por el broker de sesiones...")
             
-            # Intentar desconectar la sesión actual primero (por si acaso)
-            try:
-                logout_api(settings.JSESSION_GPS)
-            except Exception as e:
-                logger.info(f"Error al desconectar la sesión anterior: {e}")
-                
-            # Realizar un nuevo login
-            new_jsession = gps_login(settings.GPS_ACCOUNT, settings.GPS_PASSWORD)
+            new_jsession = renew_jsession(params["jsession"])
             
             if new_jsession:
-                # Actualizar la sesión en settings
-                settings.JSESSION_GPS = new_jsession
                 logger.info(f"Reconexión exitosa. Nueva jsession: {new_jsession[:10]}...")
                 
                 # Volver a intentar obtener los vehículos con la nueva sesión
                 params["jsession"] = new_jsession
-                response = requests.get(url, params=params, timeout=10)
+                response = get_http_session().get(url, params=params, timeout=10)
                 response.raise_for_status()
                 data = response.json()
         
@@ -196,16 +325,14 @@ def obtener_vehiculos():
         # Intentar reconexión en caso de cualquier error
         try:
             logger.info("Intentando reconexión debido a error...")
-            new_jsession = gps_login(settings.GPS_ACCOUNT, settings.GPS_PASSWORD)
+            new_jsession = renew_jsession(params["jsession"])
             
             if new_jsession:
-                # Actualizar la sesión en settings
-                settings.JSESSION_GPS = new_jsession
                 logger.info(f"Reconexión exitosa. Nueva jsession: {new_jsession[:10]}...")
                 
                 # Volver a intentar obtener los vehículos con la nueva sesión
                 params["jsession"] = new_jsession
-                response = requests.get(url, params=params, timeout=10)
+                response = get_http_session().get(url, params=params, timeout=10)
                 response.raise_for_status()
                 data = response.json()
                 
@@ -221,7 +348,7 @@ def obtener_estado_dispositivo(vehi_idno=None, dev_idno=None, to_map=2, geoaddre
     url = BASE_URL+"/StandardApiAction_getDeviceStatus.action"
 
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "toMap": to_map,
         "geoaddress": geoaddress,
         "driver": driver,
@@ -237,7 +364,7 @@ def obtener_estado_dispositivo(vehi_idno=None, dev_idno=None, to_map=2, geoaddre
         return None, None, None, None, None, None
 
     try:
-        response = requests.get(url, params=params, timeout=DEFAULT_TIMEOUT)
+        response = get_http_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()
         data = response.json()
         
@@ -285,24 +412,47 @@ def obtener_estado_dispositivo(vehi_idno=None, dev_idno=None, to_map=2, geoaddre
 #--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
 
 class AlarmAPIError(Exception):
-    pass
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code  # Código 'result' de la API, si lo hay
 
 # Es una función auxiliar que hace la petición HTTP al servidor usando requests. 
 # Envía los parámetros, verifica errores y devuelve la respuesta en formato dict.
+# Pasa por la política compartida (limitador, reintentos en 6/24 y circuit breaker).
 def make_request(endpoint, params, method="GET"):
-    url = f"{BASE_URL}/{endpoint}"    
-    try:
-        if method.upper() == "POST":
-            response = requests.post(url, data=params, timeout=DEFAULT_TIMEOUT)
-        else:
-            response = requests.get(url, params=params, timeout=DEFAULT_TIMEOUT)
+    url = f"{BASE_URL}/{endpoint}"
+
+    def send():
+        started = time.perf_counter()
+        code, nbytes = 24, 0
+        try:
+            if method.upper() == "POST":
+                response = get_http_session().post(url, data=params, timeout=DEFAULT_TIMEOUT)
+            else:
+                response = get_http_session().get(url, params=params, timeout=DEFAULT_TIMEOUT)
+
+            response.raise_for_status()
+            nbytes, code = len(response.content), 6
+            data = response.json()
+            code = data.get("result")
+        finally:
+            get_metrics().record_request(endpoint, time.perf_counter() - started, nbytes, code)
 
-        response.raise_for_status()
-        data = response.json()
         if data.get("result") != 0:
-            raise AlarmAPIError(f"API error: {data}")
+            raise AlarmAPIError(f"API error: {data}", code=data.get("result"))
         return data
-    except (requests.RequestException, ValueError) as e:
+
+    try:
+        try:
+            return get_default_policy().execute(send, action=endpoint)
+        except AlarmAPIError as e:
+            # Sesión vencida: renovar por el broker y reintentar una vez
+            new_jsession = renew_jsession(params["jsession"]) if e.code == 5 and params.get("jsession") else None
+            if not new_jsession:
+                raise
+            params = dict(params, jsession=new_jsession)
+            return get_default_policy().execute(send, action=endpoint)
+    except (requests.RequestException, ValueError, CircuitOpenError) as e:
         raise AlarmAPIError(f"Request failed: {e}")
 
 # 1. Security Evidence Inquiry
@@ -317,7 +467,7 @@ def make_request(endpoint, params, method="GET"):
 def get_performance_report_photos(vehi_idno, begintime, endtime, alarm_type,media_type=0, to_map=None, current_page=None, page_records=None
 ):
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "vehiIdno": vehi_idno,
         "begintime": begintime,
         "endtime": endtime,
@@ -340,7 +490,7 @@ def get_performance_report_photos(vehi_idno, begintime, endtime, alarm_type,medi
 # Consulta detalles de una evidencia específica (con guid), incluyendo posibles fotos relacionadas.
 def get_alarm_evidence(dev_idno, begintime, alarm_type, guid, to_map=None, md5=None):
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "devIdno": dev_idno,
         "begintime": begintime,
         "alarmType": alarm_type,
@@ -358,7 +508,7 @@ def get_alarm_evidence(dev_idno, begintime, alarm_type, guid, to_map=None, md5=N
 # Lista alarmas de seguridad detectadas por los dispositivos.
 def get_device_alarm(current_page=None, page_records=None):
     params = {
-        "jsession": settings.JSESSION_GPS
+        "jsession": current_jsession()
     }
     if current_page is not None:
         params["currentPage"] = current_page
@@ -371,7 +521,7 @@ def get_device_alarm(current_page=None, page_records=None):
 # 4. Download Evidence
 # Devuelve la URL para descargar un archivo .zip con las evidencias asociadas a un evento.
 def get_zip_alarm_evidence_url(extra_params: dict):
-    params = {"jsession": settings.JSESSION_GPS}
+    params = {"jsession": current_jsession()}
     params.update(extra_params)
     query_string = urlencode(params)
     return f"{BASE_URL}/StandardApiAction_zipAlarmEvidence.action?{query_string}"
@@ -388,7 +538,7 @@ def old_download_and_save_image(url, filename):
         return True
     
     try:
-        response = requests.get(url, timeout=DEFAULT_TIMEOUT)
+        response = get_http_session().get(url, timeout=DEFAULT_TIMEOUT)
         response.raise_for_status()  # Para detectar errores HTTP
     except requests.RequestException as e:
         logger.info(f"Error descargando {url}: {e}")
@@ -483,7 +633,7 @@ def verificar_archivo_existe(file_path):
             # Verificar que el archivo no esté corrupto (tamaño > 0)
             size = os.path.getsize(file_path)
             if size > 0:
-                logger.info(f"[⏭️ EXISTE] Archivo ya existe: {os.path.basename(file_path)} ({size} bytes)")
+                logger.debug(f"[⏭️ EXISTE] Archivo ya existe: {os.path.basename(file_path)} ({size} bytes)")
                 return True
             else:
                 logger.info(f"[🗑️ CORRUPTO] Archivo existe pero está vacío: {file_path}")
@@ -538,35 +688,215 @@ def download_and_save_image(url, full_file_path):
     if os.path.exists(full_file_path):
         file_size = os.path.getsize(full_file_path)
         if file_size > 0:
-            logger.info(f"[⏭️ SKIP] Archivo ya existe: {os.path.basename(full_file_path)}")
+            logger.debug(f"[⏭️ SKIP] Archivo ya existe: {os.path.basename(full_file_path)}")
             return True
         else:
             # Eliminar archivo corrupto
             os.remove(full_file_path)
     
     try:
-        response = requests.get(url, timeout=DEFAULT_TIMEOUT)
-        response.raise_for_status()
-        
-        # Escribir archivo
-        with open(full_file_path, 'wb') as f:
-            f.write(response.content)
-        
-        # Verificar que se escribió correctamente
-        if os.path.getsize(full_file_path) > 0:
-            return True
-        else:
-            logger.info(f"[❌ ERROR] Archivo descargado está vacío: {full_file_path}")
-            os.remove(full_file_path)
-            return False
+        # Streaming a archivo temporal, con reanudación y renombrado atómico
+        download_to_file(url, full_file_path, timeout=DEFAULT_TIMEOUT)
+        return True
             
-    except requests.RequestException as e:
-        logger.info(f"[🌐 ERROR] Error descargando {url}: {e}")
+    except APIError as e:
+        logger.info(f"[🌐 ERROR] Error descargando {url}: {e} {e.details or ''}")
         return False
     except IOError as e:
         logger.info(f"[💾 ERROR] Error escribiendo archivo {full_file_path}: {e}")
         return False
 
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+#  DESCARGA DE FOTOS DE SEGURIDAD (motor en pipeline, ver sit/photo_pipeline.py)
+#--------------------------------------------------------------------------------------------------------------------------------------------------------------------------------------
+
+def photo_session_pool():
+    """
+    Pool de sesiones GPS para la descarga de fotos (ver StreamBusGPSAdapter.obtener_pool_sesiones)
+    
+    Returns:
+        SessionPool o None si está deshabilitado (se usa la sesión compartida)
+    """
+    from .gps_adapter import get_gps_adapter
+    return get_gps_adapter().obtener_pool_sesiones()
+
+def pooled_download(pool, url, full_file_path):
+    """
+    download_and_save_image con una sesión prestada del pool
+    
+    Las URLs de downloadFile sin jsession (ver photo_saver) se completan con
+    la sesión prestada; la sesión queda ocupada mientras dura la descarga.
+    """
+    with pool.checkout() as api:
+        if 'jsession=' not in url and url.startswith(f"{BASE_URL}/StandardApiAction_downloadFile.action"):
+            url = f"{url}&jsession={api.jsession}"
+        return download_and_save_image(url, full_file_path)
+
+def photo_saver(photos_dir=None):
+    """
+    PhotoSaver con las carpetas y nombres de archivo de StreamBus
+    
+    Con el pool de sesiones activo cada descarga usa una sesión del pool.
+    
+    Args:
+        photos_dir: Directorio base (por defecto MEDIA_ROOT/security_photos)
+    """
+    photos_dir = photos_dir or os.path.join(settings.MEDIA_ROOT, 'security_photos')
+    os.makedirs(photos_dir, exist_ok=True)
+    pool = photo_session_pool()
+    if pool is not None:
+        download = lambda url, path: pooled_download(pool, url, path)
+        file_url = lambda fpath: f"{BASE_URL}/StandardApiAction_downloadFile.action?filePath={fpath}"
+    else:
+        download = download_and_save_image
+        file_url = lambda fpath: f"{BASE_URL}/StandardApiAction_downloadFile.action?jsession={current_jsession()}&filePath={fpath}"
+    return PhotoSaver(
+        photos_dir,
+        folder_name=crear_nombre_carpeta_vehiculo,
+        file_name=crear_nombre_archivo_foto,
+        file_exists=verificar_archivo_existe,
+        download=download,
+        file_url=file_url,
+        manifest=photo_manifest(photos_dir),
+        blobs=linked_blob_store(photos_dir) if getattr(settings, 'PHOTO_BLOB_STORE', True) else None
+    )
+
+def query_photo_page(begintime, endtime, current_page=1, page_records=50):
+    """Una página de StandardApiAction_queryPhoto (None si la página falló)"""
+    pool = photo_session_pool()
+    if pool is not None:
+        try:
+            return pool.call('query_security_photos', begintime, endtime,
+                             current_page=current_page, page_records=page_records)
+        except APIError as e:
+            logger.warning(f"⚠️ Error en página {current_page} de fotos: {e}")
+            return None
+    
+    params = {
+        "jsession": current_jsession(),
+        "filetype": 2,
+        "alarmType": 1,
+        "begintime": begintime,
+        "endtime": endtime,
+        "currentPage": current_page,
+        "pageRecords": page_records,
+    }
+    try:
+        return make_request("StandardApiAction_queryPhoto.action", params)
+    except AlarmAPIError as e:
+        logger.warning(f"⚠️ Error en página {current_page} de fotos: {e}")
+        return None
+
+def photo_manifest(photos_dir=None):
+    """Manifiesto de fotos descargadas del directorio (por defecto MEDIA_ROOT/security_photos)"""
+    photos_dir = photos_dir or os.path.join(settings.MEDIA_ROOT, 'security_photos')
+    return get_photo_manifest(photos_dir, getattr(settings, 'PHOTO_MANIFEST_PATH', '') or None)
+
+def incremental_photo_range(max_hours, empresa_filter=None, photos_dir=None, end_time=None):
+    """
+    Rango de la próxima descarga programada: desde la marca de agua de los
+    dispositivos (menos PHOTO_WATERMARK_OVERLAP_MINUTES) hasta ahora
+    
+    Args:
+        max_hours: Ventana máxima hacia atrás (la de las descargas por rango fijo)
+        empresa_filter: Tomar solo las marcas de agua de los dispositivos de la empresa
+        photos_dir: Directorio base (por defecto MEDIA_ROOT/security_photos)
+        end_time: Fin del rango (por defecto ahora)
+        
+    Returns:
+        tuple: (begin_time, end_time) como "YYYY-MM-DD HH:MM:SS"
+    """
+    end_time = end_time or datetime.now().replace(microsecond=0)
+    devices = None
+    if empresa_filter:
+        devices = {str(device) for device in empresa_filter.get('devIdnos', [])}
+    begin_time = photo_manifest(photos_dir).incremental_begin(
+        end_time, max_hours,
+        overlap_minutes=getattr(settings, 'PHOTO_WATERMARK_OVERLAP_MINUTES', 30),
+        devices=devices
+    )
+    return begin_time.strftime("%Y-%m-%d %H:%M:%S"), end_time.strftime("%Y-%m-%d %H:%M:%S")
+
+def download_security_photos(begin_time, end_time, empresa_filter=None, photos_dir=None,
+                             page_records=50, fetch_page=None, first_page=None,
+                             on_progress=None, wait=True, job=None, skip_done=True,
+                             window_hours=None):
+    """
+    Descarga las fotos de seguridad de un rango con el motor compartido
+    
+    Args:
+        begin_time, end_time: Rango "YYYY-MM-DD HH:MM:SS"
+        empresa_filter: Filtro de empresa (ver obtener_vehiculos_por_empresa)
+        photos_dir: Directorio base (por defecto MEDIA_ROOT/security_photos)
+        page_records: Fotos por página de la consulta
+        fetch_page: fetch_page(page) alternativo (por defecto query_photo_page)
+        first_page: Primera página ya consultada por el llamador
+        on_progress: Se llama con el PipelineRun a medida que avanza
+        wait: Si False retorna enseguida y la descarga sigue en background
+        job: PhotoJob para guardar las páginas completas y retomar desde
+             ahí (ver photo_download_job)
+        skip_done: No volver a pedir las páginas completas del job (False
+                   para listarlas igual, por ejemplo para mostrar todas las
+                   fotos; el manifiesto evita descargarlas de nuevo)
+        window_hours: Ventana en horas con la que se calculó el rango (ver
+                      PhotoManifest.advance_watermarks)
+        
+    Returns:
+        PipelineRun con estadísticas (run.stats) y fotos guardadas (run.photos)
+    """
+    if fetch_page is None:
+        fetch_page = lambda page: query_photo_page(begin_time, end_time, page, page_records)
+    
+    skip_pages, on_page_done = (), None
+    if job is not None:
+        if first_page is None:
+            first_page = fetch_page(1)
+        if first_page:
+            pagination = first_page.get('pagination') or {}
+            done_pages = job.plan(int(pagination.get('totalRecords') or 0),
+                                  int(pagination.get('totalPages') or 1))
+            if skip_done:
+                skip_pages = done_pages
+        on_progress = job.track(on_progress)
+        on_page_done = job.mark_page
+    on_progress = _advance_watermarks_on_success(begin_time, end_time, photos_dir,
+                                                 len(skip_pages), on_progress, window_hours)
+    
+    pages = iter_pages(fetch_page, first_page=first_page, skip_pages=skip_pages)
+    engine = get_photo_engine()
+    submit = engine.run if wait else engine.submit
+    return submit(pages, photo_saver(photos_dir), empresa_predicate(empresa_filter), on_progress,
+                  on_page_done)
+
+def _advance_watermarks_on_success(begin_time, end_time, photos_dir, skipped_pages, on_progress=None,
+                                   window_hours=None):
+    """
+    Callback de progreso que avanza las marcas de agua del manifiesto solo
+    si la descarga del rango terminó sin errores (ver PipelineRun.complete)
+    """
+    def callback(run):
+        if run.finished is not None and run.complete(skipped_pages):
+            photo_manifest(photos_dir).advance_watermarks(begin_time, end_time, window_hours)
+        if on_progress is not None:
+            on_progress(run)
+    return callback
+
+def photo_download_job(begin_time, end_time, empresa_id=None, photos_dir=None, page_records=50,
+                       restart=False):
+    """
+    Descarga persistida del rango (la misma descarga se retoma donde quedó)
+    
+    Returns:
+        PhotoJob para pasar a download_security_photos
+    """
+    return photo_job_store(photos_dir).open(begin_time, end_time, empresa_id, page_records,
+                                            restart=restart)
+
+def photo_job_store(photos_dir=None):
+    """Descargas persistidas (misma base que el manifiesto de fotos)"""
+    photos_dir = photos_dir or os.path.join(settings.MEDIA_ROOT, 'security_photos')
+    return get_photo_job_store(photos_dir, getattr(settings, 'PHOTO_MANIFEST_PATH', '') or None)
+
 def test_folder_creation():
     """
     Función de testing para verificar creación de nombres de carpeta
@@ -10,6 +10,8 @@ Estructura:
 - alarmas_views.py: Consultas de alarmas y fotos de seguridad
 - photo_download_views.py: Descarga de fotos de seguridad
 - informes_views.py: Informes y reportes PDF
+- metrics_views.py: Métricas de las llamadas al servidor GPS
+- alarm_stream_views.py: Alarmas en tiempo real (server-sent events)
 - stats.py: Clases de estadísticas
 """
 
@@ -40,16 +42,12 @@ from .photo_download_views import (
     clear_security_photos_session,
     check_download_progress,
     security_photos_form,
-    process_photos_page,
     begin_download_process,
-    process_photos_page_with_filter,
     background_download_process,
     fetch_security_photos,
     basic_optimized_check_progress,
     basic_optimized_begin_download,
     basic_optimized_query_photos,
-    process_photos_page_optimized,
-    download_photo_basic_optimized,
 )
 
 # Importar vistas de informes
@@ -58,6 +56,18 @@ from .informes_views import (
     descargar_expediente_pdf,
 )
 
+# Importar vistas de métricas
+from .metrics_views import (
+    citos_metrics,
+    citos_shadow_report,
+)
+
+# Importar vistas del stream de alarmas
+from .alarm_stream_views import (
+    alarm_stream_sse,
+    alarm_stream_recent,
+)
+
 # Importar clases de estadísticas
 from .stats import (
     DownloadStatistics,
@@ -86,19 +96,21 @@ __all__ = [
     'clear_security_photos_session',
     'check_download_progress',
     'security_photos_form',
-    'process_photos_page',
     'begin_download_process',
-    'process_photos_page_with_filter',
     'background_download_process',
     'fetch_security_photos',
     'basic_optimized_check_progress',
     'basic_optimized_begin_download',
     'basic_optimized_query_photos',
-    'process_photos_page_optimized',
-    'download_photo_basic_optimized',
     # Informes Views
     'listar_informes_sit',
     'descargar_expediente_pdf',
+    # Metrics Views
+    'citos_metrics',
+    'citos_shadow_report',
+    # Alarm Stream Views
+    'alarm_stream_sse',
+    'alarm_stream_recent',
     # Stats Classes
     'DownloadStatistics',
     'BasicOptimizedStats',
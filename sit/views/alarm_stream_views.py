@@ -0,0 +1,85 @@
+import json
+import logging
+import time
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from ..gps_adapter import get_gps_adapter
+from StreamBus.logging_mixins import log_view
+
+logger = logging.getLogger('sit.views.alarm_stream')
+
+# Comentario keep-alive para que proxies no corten la conexión
+SSE_KEEPALIVE_SECONDS = 15
+# Duración máxima de una conexión; el navegador reconecta solo con Last-Event-ID
+SSE_MAX_SECONDS = 300
+
+
+def _start_seq(request, stream):
+    """
+    Secuencia desde la que enviar: la alarma de Last-Event-ID o ?since (guid)
+
+    Cada proceso web numera sus alarmas por su cuenta, por eso se retoma
+    por guid; si la alarma ya no está en el anillo, solo alarmas nuevas.
+    """
+    guid = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('since')
+    seq = stream.seq_of(guid) if guid else None
+    return seq if seq is not None else stream.last_seq
+
+
+def _sse_events(stream, seq):
+    yield 'retry: 3000\n\n'
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    while time.monotonic() < deadline:
+        events = stream.wait(seq, timeout=SSE_KEEPALIVE_SECONDS)
+        for event_seq, alarm in events:
+            seq = event_seq
+            yield f'id: {alarm.get("guid")}\nevent: alarm\ndata: {json.dumps(alarm, ensure_ascii=False)}\n\n'
+        if stream.stopped:
+            # wait() ya no bloquea: cerrar y que el navegador reconecte
+            break
+        if not events:
+            yield ': keepalive\n\n'
+
+
+@log_view
+@require_GET
+def alarm_stream_sse(request):
+    """
+    Alarmas en tiempo real como server-sent events
+
+    Cada evento lleva como id el guid de la alarma; al reconectar (aunque
+    sea a otro proceso) el navegador envía Last-Event-ID y recibe solo lo
+    que le faltó (mientras siga en el anillo de alarmas recientes).
+    """
+    stream = get_gps_adapter().obtener_stream_alarmas()
+    response = StreamingHttpResponse(_sse_events(stream, _start_seq(request, stream)),
+                                     content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@log_view
+@require_GET
+def alarm_stream_recent(request):
+    """
+    Alarmas recientes del stream en JSON
+
+    Parámetros: since (guid de la última alarma vista) o limit (cantidad,
+    por defecto 100).
+    """
+    stream = get_gps_adapter().obtener_stream_alarmas()
+    if 'since' in request.GET:
+        events = stream.since(_start_seq(request, stream))
+    else:
+        try:
+            limit = max(1, int(request.GET.get('limit', 100)))
+        except ValueError:
+            limit = 100
+        events = stream.recent(limit)
+
+    return JsonResponse({
+        'last_seq': stream.last_seq,
+        'alarms': [dict(alarm, seq=seq) for seq, alarm in events],
+        'status': stream.status(),
+    })
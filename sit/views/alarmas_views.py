@@ -30,7 +30,8 @@ from ..utils import obtener_ultima_ubicacion, verificar_archivo_existe
 from ..utils import obtener_vehiculos, crear_nombre_archivo_foto
 from ..utils import crear_nombre_carpeta_vehiculo
 from ..utils import get_performance_report_photos, download_and_save_image
-from ..utils import make_request, AlarmAPIError
+from ..utils import make_request, AlarmAPIError, current_jsession
+from ..gps_adapter import get_gps_adapter
 from StreamBus.logging_mixins import LoggingMixin, DetailedLoggingMixin, log_view, log_view_detailed
 
 
@@ -131,7 +132,14 @@ def alarmas_view(request):
                 'pageSize': default_page_records,
             }
 
+    # Alarmas recientes del anillo del stream: abrir o refrescar la pantalla
+    # no consulta al servidor GPS (las nuevas llegan por alarm_stream_sse)
+    stream = get_gps_adapter().obtener_stream_alarmas()
+    alarmas_recientes = [dict(alarm, seq=seq) for seq, alarm in stream.recent(default_page_records)]
+
     context = {
+        'alarmas_recientes': alarmas_recientes,
+        'alarm_stream_seq': stream.last_seq,
         'photos': photos,
         'error_message': error_message,
         'default_begin_date': default_begin_date,
@@ -214,7 +222,7 @@ def query_security_photos(
     endpoint = "StandardApiAction_queryPhoto.action"
     
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "filetype": 2,
         "alarmType": 1,
         "begintime": begintime,
@@ -26,11 +26,11 @@ from urllib.parse import urlencode
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from ..utils import obtener_informe_sit
-from ..utils import obtener_ultima_ubicacion, verificar_archivo_existe
+from ..utils import obtener_ultima_ubicacion, obtener_ubicaciones_flota, verificar_archivo_existe
 from ..utils import obtener_vehiculos, crear_nombre_archivo_foto
 from ..utils import crear_nombre_carpeta_vehiculo
 from ..utils import get_performance_report_photos, download_and_save_image
-from ..utils import make_request, AlarmAPIError
+from ..utils import make_request, AlarmAPIError, current_jsession
 from StreamBus.logging_mixins import LoggingMixin, DetailedLoggingMixin, log_view, log_view_detailed
 
 
@@ -91,7 +91,7 @@ def ubicaciones_vehiculos(request):
     try:
         response = requests.get(
             "http://190.183.254.253:8088/StandardApiAction_queryUserVehicle.action",
-            params={"jsession": settings.JSESSION_GPS},
+            params={"jsession": current_jsession()},
             timeout=10
         )
         response.raise_for_status()
@@ -111,14 +111,17 @@ def ubicaciones_vehiculos(request):
             empresa_ids.append(selected_id)
             vehiculos_data = [v for v in vehiculos_data if v.get("pid") in empresa_ids]
 
+        # Una consulta por lote de vehículos en lugar de una por vehículo
+        posiciones = obtener_ubicaciones_flota([veh.get("nm") for veh in vehiculos_data])
+
         vehiculos = []
         for veh in vehiculos_data:
             try:
                 ficha = veh.get("nm")
                 dispositivo = veh.get("dl", [{}])[0].get("id")
-                posicion = obtener_ultima_ubicacion(ficha)
+                posicion = posiciones.get(str(ficha))
 
-                if posicion and len(posicion) == 5:
+                if posicion:
                     lat, lon, velocidad, gps_timestamp, direccion = posicion
                     if gps_timestamp is not None:
                         ultima_fecha = datetime.fromtimestamp(gps_timestamp / 1000, tz=timezone.utc)
@@ -161,7 +164,7 @@ def ubicaciones_vehiculos_json(request):
     try:
         response = requests.get(
             "http://190.183.254.253:8088/StandardApiAction_queryUserVehicle.action",
-            params={"jsession": settings.JSESSION_GPS},
+            params={"jsession": current_jsession()},
             timeout=10
         )
         response.raise_for_status()
@@ -187,14 +190,17 @@ def ubicaciones_vehiculos_json(request):
                    filtro in str(v.get("dl", [{}])[0].get("id", "")).lower()
             ]
 
+        # Una consulta por lote de vehículos en lugar de una por vehículo
+        posiciones = obtener_ubicaciones_flota([veh.get("nm") for veh in vehiculos_data])
+
         vehiculos = []
         for veh in vehiculos_data:
             try:
                 ficha = veh.get("nm")
                 dispositivo = veh.get("dl", [{}])[0].get("id")
 
-                posicion = obtener_ultima_ubicacion(ficha)
-                if posicion and len(posicion) == 5:
+                posicion = posiciones.get(str(ficha))
+                if posicion:
                     lat, lon, velocidad, gps_timestamp, direccion = posicion
                     if gps_timestamp:
                         ultima_fecha = datetime.fromtimestamp(gps_timestamp / 1000, tz=timezone.utc)
@@ -308,7 +314,7 @@ def obtener_empresas_disponibles():
     try:
         response = requests.get(
             "http://190.183.254.253:8088/StandardApiAction_queryUserVehicle.action",
-            params={"jsession": settings.JSESSION_GPS, "language": "es"},
+            params={"jsession": current_jsession(), "language": "es"},
             timeout=10
         )
         response.raise_for_status()
@@ -357,7 +363,7 @@ def obtener_vehiculos_por_empresa(empresa_id):
     try:
         response = requests.get(
             "http://190.183.254.253:8088/StandardApiAction_queryUserVehicle.action",
-            params={"jsession": settings.JSESSION_GPS, "language": "es"},
+            params={"jsession": current_jsession(), "language": "es"},
             timeout=10
         )
         response.raise_for_status()
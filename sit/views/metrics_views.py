@@ -0,0 +1,62 @@
+import logging
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, HttpResponseForbidden
+from django.views.decorators.http import require_GET
+from ..citos_metrics import get_metrics, render_prometheus
+from ..citos_shadow import get_shadow
+
+logger = logging.getLogger('sit.views.metrics')
+
+
+def _metrics_allowed(request):
+    """Solo staff o IPs habilitadas en settings.METRICS_ALLOWED_IPS (scraper de Prometheus)"""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+    allowed_ips = getattr(settings, 'METRICS_ALLOWED_IPS', ['127.0.0.1'])
+    return request.META.get('REMOTE_ADDR') in allowed_ips
+
+
+@require_GET
+def citos_metrics(request):
+    """
+    Métricas de las llamadas al servidor GPS
+
+    Por defecto en formato de texto Prometheus; con ?format=json
+    retorna el snapshot por acción.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden("No autorizado")
+
+    if request.GET.get('format') == 'json':
+        snapshot = get_metrics().snapshot()
+        for data in snapshot.values():
+            data['latency_buckets'] = {str(k): v for k, v in data['latency_buckets'].items()}
+            data['codes'] = {str(k): v for k, v in data['codes'].items()}
+        return JsonResponse(snapshot)
+
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@require_GET
+def citos_shadow_report(request):
+    """
+    Reporte del modo sombra (citos contra legacy) de este proceso
+
+    En JSON; con ?format=text retorna la tabla de texto.
+    """
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden("No autorizado")
+
+    shadow = get_shadow()
+    if shadow is None:
+        return JsonResponse({'error': 'Modo sombra apagado (GPS_SHADOW_SAMPLE_RATE=0)'}, status=404)
+
+    if request.GET.get('format') == 'text':
+        return HttpResponse(shadow.render_text() + '\n', content_type='text/plain; charset=utf-8')
+
+    return JsonResponse({
+        'sample_rate': shadow.sample_rate,
+        'dropped': shadow.dropped,
+        'functions': shadow.report(),
+    }, json_dumps_params={'ensure_ascii': False})
@@ -5,7 +5,6 @@ import threading
 import datetime
 import time
 import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone, timedelta
 from django.conf import settings
 from django.contrib import messages
@@ -30,7 +29,9 @@ from ..utils import obtener_ultima_ubicacion, verificar_archivo_existe
 from ..utils import obtener_vehiculos, crear_nombre_archivo_foto
 from ..utils import crear_nombre_carpeta_vehiculo
 from ..utils import get_performance_report_photos, download_and_save_image
-from ..utils import make_request, AlarmAPIError
+from ..utils import make_request, AlarmAPIError, current_jsession
+from ..utils import download_security_photos, photo_download_job
+from ..photo_pipeline import get_photo_engine
 from StreamBus.logging_mixins import LoggingMixin, DetailedLoggingMixin, log_view, log_view_detailed
 
 
@@ -160,146 +161,9 @@ def security_photos_form(request):
     
     return render(request, 'sit/security_photos_form.html', context)
 
-def process_photos_page(page_result, photos_dir, all_photos, global_stats=None):
-    """
-    VERSIÓN DINÁMICA CON FILTRADO POR EMPRESA SELECCIONADA
-    """
-    prephotos = page_result.get('infos', [])
-    photos = []
-    
-    page_stats = {
-        'total_procesadas': 0,
-        'incluidas': 0,
-        'excluidas_empresa': 0,
-        'ya_existen': 0,
-        'descargadas': 0,
-        'errores': 0,
-        'vehiculos': set(),
-        'dispositivos': set()
-    }
-    
-    # OBTENER FILTRO DE EMPRESA desde variable global
-    empresa_filter = getattr(process_photos_page, 'empresa_filter', None)
-    
-    if empresa_filter:
-        fichas_validas = empresa_filter.get('vehiIdnos', [])
-        devices_validos = [str(d) for d in empresa_filter.get('devIdnos', [])]
-        empresa_nombre = empresa_filter['empresa_info']['nombre']
-        
-        logger.info(f"[🏢 APLICANDO FILTRO] {empresa_nombre}")
-        logger.info(f"├── Fichas válidas: {fichas_validas}")
-        logger.info(f"└── Devices válidos: {devices_validos}")
-    else:
-        logger.info("[🌐 SIN FILTRO] Procesando todas las empresas")
-        fichas_validas = None
-        devices_validos = None
-        empresa_nombre = "Todas"
-    
-    # PROCESAR CADA FOTO
-    for photo in prephotos:
-        page_stats['total_procesadas'] += 1
-        
-        try:
-            devIdno_raw = photo.get('devIdno', '0')
-            devIdno = int(str(devIdno_raw).replace('C', '').replace('c', ''))
-            vehiIdno = str(photo.get('vehiIdno', ''))
-            
-            # SI HAY FILTRO DE EMPRESA, APLICARLO
-            if empresa_filter:
-                # Verificar si la ficha está en la empresa
-                ficha_valida = vehiIdno in fichas_validas
-                
-                # Verificar si el device está en la empresa
-                device_valido = str(devIdno) in devices_validos
-                
-                # Debe cumplir al menos uno de los criterios
-                if not (ficha_valida or device_valido):
-                    page_stats['excluidas_empresa'] += 1
-                    logger.info(f"[🚫 EXCLUIDA] Ficha {vehiIdno} / Device {devIdno} → NO pertenece a {empresa_nombre}")
-                    continue
-                else:
-                    logger.info(f"[✅ INCLUIDA] Ficha {vehiIdno} / Device {devIdno} → SÍ pertenece a {empresa_nombre}")
-            
-            # Si llega aquí, la foto pasa el filtro (o no hay filtro)
-            photos.append(photo)
-            page_stats['incluidas'] += 1
-            page_stats['vehiculos'].add(vehiIdno)
-            page_stats['dispositivos'].add(str(devIdno))
-                
-        except ValueError:
-            page_stats['errores'] += 1
-            logger.info(f"[ERROR] No se pudo interpretar devIdno: {photo.get('devIdno')}")
-            continue
-
-    # RESTO DE LA LÓGICA DE DESCARGA (sin cambios)
-    def download_photo(photo_info):        
-        vehiIdno = photo_info.get('vehiIdno')
-        devIdno = photo_info.get('devIdno')
-        fileTimeStr = photo_info.get('fileTimeStr')
-        
-        try:
-            vehicle_folder = crear_nombre_carpeta_vehiculo(vehiIdno, devIdno)
-            vehicle_dir = os.path.join(photos_dir, vehicle_folder)
-            os.makedirs(vehicle_dir, exist_ok=True)
-            
-            file_name = crear_nombre_archivo_foto(vehiIdno, devIdno, fileTimeStr)
-            file_path = os.path.join(vehicle_dir, file_name)
-            
-            if verificar_archivo_existe(file_path):
-                page_stats['ya_existen'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            
-            download_url = photo_info.get('downloadUrl')
-            if not download_url:
-                file_path_api = photo_info.get('FPATH')
-                if file_path_api:
-                    download_url = f"{BASE_URL}/StandardApiAction_downloadFile.action?jsession={settings.JSESSION_GPS}&filePath={file_path_api}"
-                else:
-                    page_stats['errores'] += 1
-                    return None
-            
-            if download_and_save_image(download_url, file_path):
-                page_stats['descargadas'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            else:
-                page_stats['errores'] += 1
-                return None
-                
-        except Exception as e:
-            page_stats['errores'] += 1
-            logger.info(f"[💥 ERROR] {vehiIdno}-{devIdno}: {e}")
-            return None
-
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(download_photo, photo): photo for photo in photos}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                all_photos.append(result)
-
-    logger.info(f"""
-[📊 ESTADÍSTICAS - {empresa_nombre}]
-├── Total procesadas: {page_stats['total_procesadas']}
-├── ✅ Incluidas: {page_stats['incluidas']}
-├── 🚫 Excluidas por empresa: {page_stats['excluidas_empresa']}
-├── ⏭️ Ya existían: {page_stats['ya_existen']}
-├── 📥 Descargadas nuevas: {page_stats['descargadas']}
-├── 🚌 Vehículos únicos: {len(page_stats['vehiculos'])}
-└── 💥 Errores: {page_stats['errores']}
-""")
-    
-    if global_stats:
-        global_stats.add_page_stats(page_stats)
-    
-    return page_stats
-
 def begin_download_process(request):
     """
-    VERSIÓN CORREGIDA - Pasa filtro directamente a process_photos_page
+    VERSIÓN CORREGIDA - Descarga todas las páginas con download_security_photos
     """
     job_info = request.session.get('security_photos_job', {})
     query_params = request.session.get('photo_query_params', {})
@@ -354,37 +218,24 @@ def begin_download_process(request):
     photos_dir = os.path.join(settings.MEDIA_ROOT, 'security_photos')
     os.makedirs(photos_dir, exist_ok=True)
     
-    # Lista para almacenar todos los datos de las fotos
-    all_photos = []
-    
     logger.info(f"🚀 INICIANDO DESCARGA: {total_pages} páginas, {total_records} fotos estimadas")
     
-    # ⭐ PASAR FILTRO DIRECTAMENTE A process_photos_page
-    process_photos_page_with_filter(first_page_result, photos_dir, all_photos, global_stats, empresa_filter)
-    
-    # Actualizar progreso
-    job_info['downloaded_photos'] = len(all_photos)
-    job_info['progress'] = int((len(all_photos) / total_records) * 100)
-    request.session['security_photos_job'] = job_info
-    request.session.modified = True
-    
-    # Descargar las páginas restantes
-    for page in range(2, total_pages + 1):
-        logger.info(f"📄 Procesando página {page}/{total_pages}...")
-        
-        page_result = query_security_photos(begin_time, end_time, page)
-        if not page_result or page_result.get('result') != 0:
-            continue
-        
-        # ⭐ PASAR FILTRO DIRECTAMENTE
-        process_photos_page_with_filter(page_result, photos_dir, all_photos, global_stats, empresa_filter)
-        
-        # Actualizar progreso
-        job_info['downloaded_photos'] = len(all_photos)
-        job_info['progress'] = min(99, int((len(all_photos) / total_records) * 100))
+    def on_progress(run):
+        job_info['downloaded_photos'] = len(run.photos)
+        job_info['progress'] = run.progress
         request.session['security_photos_job'] = job_info
         request.session.modified = True
     
+    # Listado y descargas en pipeline (la página siguiente se lista mientras se descarga la actual)
+    run = download_security_photos(
+        begin_time, end_time, empresa_filter, photos_dir,
+        fetch_page=_security_photos_page_fetcher(begin_time, end_time),
+        first_page=first_page_result, on_progress=on_progress
+    )
+    all_photos = run.photos
+    _log_run_stats(run, empresa_filter['empresa_info']['nombre'] if empresa_filter else "Todas")
+    global_stats.add_page_stats(run.stats)
+    
     # Finalizar estadísticas
     global_stats.finalize()
     final_report = global_stats.get_final_report()
@@ -406,138 +257,31 @@ def begin_download_process(request):
     request.session['security_photos_job'] = job_info
     request.session.modified = True
 
-def process_photos_page_with_filter(page_result, photos_dir, all_photos, global_stats, empresa_filter):
-    """
-    VERSIÓN QUE RECIBE EL FILTRO DIRECTAMENTE COMO PARÁMETRO
-    """
-    prephotos = page_result.get('infos', [])
-    photos = []
-    
-    page_stats = {
-        'total_procesadas': 0,
-        'incluidas': 0,
-        'excluidas_empresa': 0,
-        'ya_existen': 0,
-        'descargadas': 0,
-        'errores': 0,
-        'vehiculos': set(),
-        'dispositivos': set()
-    }
-    
-    if empresa_filter:
-        fichas_validas = empresa_filter.get('vehiIdnos', [])
-        devices_validos = [str(d) for d in empresa_filter.get('devIdnos', [])]
-        empresa_nombre = empresa_filter['empresa_info']['nombre']
-        
-        logger.info(f"[🏢 APLICANDO FILTRO] {empresa_nombre}")
-        logger.info(f"├── Fichas válidas: {fichas_validas}")
-        logger.info(f"└── Devices válidos: {devices_validos}")
-    else:
-        logger.info("[🌐 SIN FILTRO] Procesando todas las empresas")
-        fichas_validas = None
-        devices_validos = None
-        empresa_nombre = "Todas"
-    
-    # PROCESAR CADA FOTO
-    for photo in prephotos:
-        page_stats['total_procesadas'] += 1
-        
-        try:
-            devIdno_raw = photo.get('devIdno', '0')
-            devIdno = int(str(devIdno_raw).replace('C', '').replace('c', ''))
-            vehiIdno = str(photo.get('vehiIdno', ''))
-            
-            # SI HAY FILTRO DE EMPRESA, APLICARLO
-            if empresa_filter:
-                # Verificar si la ficha está en la empresa
-                ficha_valida = vehiIdno in fichas_validas
-                
-                # Verificar si el device está en la empresa
-                device_valido = str(devIdno) in devices_validos
-                
-                # Debe cumplir al menos uno de los criterios
-                if not (ficha_valida or device_valido):
-                    page_stats['excluidas_empresa'] += 1
-                    logger.info(f"[🚫 EXCLUIDA] Ficha {vehiIdno} / Device {devIdno} → NO pertenece a {empresa_nombre}")
-                    continue
-                else:
-                    logger.info(f"[✅ INCLUIDA] Ficha {vehiIdno} / Device {devIdno} → SÍ pertenece a {empresa_nombre}")
-            
-            # Si llega aquí, la foto pasa el filtro (o no hay filtro)
-            photos.append(photo)
-            page_stats['incluidas'] += 1
-            page_stats['vehiculos'].add(vehiIdno)
-            page_stats['dispositivos'].add(str(devIdno))
-                
-        except ValueError:
-            page_stats['errores'] += 1
-            logger.info(f"[ERROR] No se pudo interpretar devIdno: {photo.get('devIdno')}")
-            continue
-
-    # DESCARGA (mismo código que antes)
-    def download_photo(photo_info):        
-        vehiIdno = photo_info.get('vehiIdno')
-        devIdno = photo_info.get('devIdno')
-        fileTimeStr = photo_info.get('fileTimeStr')
-        
-        try:
-            vehicle_folder = crear_nombre_carpeta_vehiculo(vehiIdno, devIdno)
-            vehicle_dir = os.path.join(photos_dir, vehicle_folder)
-            os.makedirs(vehicle_dir, exist_ok=True)
-            
-            file_name = crear_nombre_archivo_foto(vehiIdno, devIdno, fileTimeStr)
-            file_path = os.path.join(vehicle_dir, file_name)
-            
-            if verificar_archivo_existe(file_path):
-                page_stats['ya_existen'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            
-            download_url = photo_info.get('downloadUrl')
-            if not download_url:
-                file_path_api = photo_info.get('FPATH')
-                if file_path_api:
-                    download_url = f"{BASE_URL}/StandardApiAction_downloadFile.action?jsession={settings.JSESSION_GPS}&filePath={file_path_api}"
-                else:
-                    page_stats['errores'] += 1
-                    return None
-            
-            if download_and_save_image(download_url, file_path):
-                page_stats['descargadas'] += 1
-                photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-                return photo_info
-            else:
-                page_stats['errores'] += 1
-                return None
-                
-        except Exception as e:
-            page_stats['errores'] += 1
-            logger.info(f"[💥 ERROR] {vehiIdno}-{devIdno}: {e}")
-            return None
-
-    from concurrent.futures import ThreadPoolExecutor, as_completed
-    
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(download_photo, photo): photo for photo in photos}
-        for future in as_completed(futures):
-            result = future.result()
-            if result:
-                all_photos.append(result)
-
+def _log_run_stats(run, empresa_nombre):
+    """Resumen de una descarga del motor en el log"""
     logger.info(f"""
 [📊 ESTADÍSTICAS - {empresa_nombre}]
-├── Total procesadas: {page_stats['total_procesadas']}
-├── ✅ Incluidas: {page_stats['incluidas']}
-├── 🚫 Excluidas por empresa: {page_stats['excluidas_empresa']}
-├── ⏭️ Ya existían: {page_stats['ya_existen']}
-├── 📥 Descargadas nuevas: {page_stats['descargadas']}
-└── 💥 Errores: {page_stats['errores']}
+├── Total procesadas: {run.stats['total_procesadas']}
+├── ✅ Incluidas: {run.stats['incluidas']}
+├── 🚫 Excluidas por empresa: {run.stats['excluidas']}
+├── ⏭️ Ya existían: {run.stats['ya_existen']}
+├── 📥 Descargadas nuevas: {run.stats['descargadas']}
+├── 🚌 Vehículos únicos: {len(run.stats['vehiculos'])}
+└── 💥 Errores: {run.stats['errores']}
 """)
-    
-    if global_stats:
-        global_stats.add_page_stats(page_stats)
-    
-    return page_stats
+
+def _security_photos_page_fetcher(begin_time, end_time):
+    """
+    Retorna una función que consulta una página de fotos de seguridad
+    para usar con iter_pages (None si la página falla)
+    """
+    def fetch_page(page):
+        page_result = query_security_photos(begin_time, end_time, page)
+        if not page_result or page_result.get('result') != 0:
+            logger.warning(f"⚠️ Error en página {page}, continuando...")
+            return None
+        return page_result
+    return fetch_page
 
 def background_download_process(job_id, job_info):
     """
@@ -585,34 +329,39 @@ def background_download_process(job_id, job_info):
     job_info['start_time'] = time.time()
     download_jobs[job_id] = job_info
 
-    all_photos = []
-    
-    # ⭐ PROCESAR PRIMERA PÁGINA CON FILTRO
-    process_photos_page_with_filter(first_page_result, photos_dir, all_photos, global_stats, empresa_filter)
-    job_info['downloaded_photos'] = len(all_photos)
-
-    # Procesar páginas restantes
-    for page in range(2, total_pages + 1):
-        page_result = query_security_photos(begin_time, end_time, page)
-        if not page_result or page_result.get('result') != 0:
-            continue
-            
-        # ⭐ PROCESAR PÁGINA CON FILTRO
-        process_photos_page_with_filter(page_result, photos_dir, all_photos, global_stats, empresa_filter)
-        job_info['downloaded_photos'] = len(all_photos)
-
+    def on_progress(run):
         elapsed = time.time() - job_info['start_time']
-        estimated_total_time = (elapsed / page) * total_pages
-        remaining = max(0, estimated_total_time - elapsed)
-
+        processed = run.processed
+        remaining = elapsed / processed * (total_records - processed) if processed else 0
+        
+        job_info['downloaded_photos'] = len(run.photos)
         job_info['message'] = (
-            f"Página {page}/{total_pages} - "
-            f"{global_stats.descargadas + global_stats.ya_existen} fotos - "
-            f"Restante: {timedelta(seconds=int(remaining))}"
+            f"Página {run.stats['paginas']}/{total_pages} - "
+            f"{run.stats['descargadas'] + run.stats['ya_existen']} fotos - "
+            f"Restante: {timedelta(seconds=int(max(0, remaining)))}"
         )
-        job_info['progress'] = min(99, int((len(all_photos) / total_records) * 100))
+        job_info['progress'] = run.progress
         download_jobs[job_id] = job_info
-
+    
+    # Avance persistido: si el proceso se reinicia, la misma descarga no vuelve a
+    # bajar las páginas completas (se listan igual para armar la galería)
+    checkpoint = photo_download_job(
+        begin_time, end_time,
+        empresa_filter['empresa_info']['id'] if empresa_filter else None,
+        photos_dir, page_records=25
+    )
+    job_info['checkpoint'] = checkpoint.job_id
+    
+    # ⭐ LISTADO Y DESCARGAS EN PIPELINE CON FILTRO
+    run = download_security_photos(
+        begin_time, end_time, empresa_filter, photos_dir,
+        fetch_page=_security_photos_page_fetcher(begin_time, end_time),
+        first_page=first_page_result, on_progress=on_progress,
+        job=checkpoint, skip_done=False
+    )
+    all_photos = run.photos
+    global_stats.add_page_stats(run.stats)
+    
     # Finalizar con estadísticas completas
     global_stats.finalize()
     logger.info(global_stats.get_final_report())
@@ -762,7 +511,7 @@ def basic_optimized_check_progress(request):
 def basic_optimized_begin_download(request):
     """
     Versión básica optimizada del proceso de descarga
-    Usa ThreadPoolExecutor mejorado y procesamiento por lotes
+    Usa el motor de descarga en pipeline y consultas por lotes
     """
     job_info = request.session.get('security_photos_job', {})
     query_params = request.session.get('photo_query_params', {})
@@ -775,10 +524,9 @@ def basic_optimized_begin_download(request):
         try:
             # Obtener configuración optimizada
             config = getattr(settings, 'DOWNLOAD_OPTIMIZATION', {})
-            max_workers = config.get('MAX_DOWNLOAD_WORKERS', 15)
             batch_size = config.get('API_BATCH_SIZE', 30)
             
-            logger.info(f"🚀 [BASIC OPTIMIZED] Iniciando con {max_workers} workers, batch size {batch_size}")
+            logger.info(f"🚀 [BASIC OPTIMIZED] Iniciando con {get_photo_engine().workers} workers, batch size {batch_size}")
             
             # Usar la función de stats optimizada básica
             stats = BasicOptimizedStats()
@@ -812,32 +560,29 @@ def basic_optimized_begin_download(request):
             photos_dir = os.path.join(settings.MEDIA_ROOT, 'security_photos')
             os.makedirs(photos_dir, exist_ok=True)
             
-            all_photos = []
-            
-            # Procesar páginas con ThreadPoolExecutor optimizado
-            with ThreadPoolExecutor(max_workers=max_workers) as executor:
-                
-                # Procesar primera página
-                process_photos_page_optimized(
-                    first_page_result, photos_dir, all_photos, stats, empresa_filter, executor
+            def fetch_page(page):
+                page_result = basic_optimized_query_photos(
+                    begin_time, end_time, page, batch_size, empresa_filter
                 )
-                
-                # Procesar páginas restantes
-                for page in range(2, total_pages + 1):
-                    page_result = basic_optimized_query_photos(
-                        begin_time, end_time, page, batch_size, empresa_filter
-                    )
-                    
-                    if page_result and page_result.get('result') == 0:
-                        process_photos_page_optimized(
-                            page_result, photos_dir, all_photos, stats, empresa_filter, executor
-                        )
-                    
-                    # Actualizar progreso
-                    job_info['downloaded_photos'] = len(all_photos)
-                    job_info['progress'] = min(99, int((len(all_photos) / total_records) * 100))
-                    job_info['message'] = f"Página {page}/{total_pages} - {len(all_photos)} fotos procesadas"
-                    download_jobs['default_job'] = job_info
+                if page_result and page_result.get('result') == 0:
+                    return page_result
+                return None
+            
+            def on_progress(run):
+                job_info['downloaded_photos'] = len(run.photos)
+                job_info['progress'] = run.progress
+                job_info['message'] = (f"Página {run.stats['paginas']}/{total_pages} - "
+                                       f"{len(run.photos)} fotos procesadas")
+                download_jobs['default_job'] = job_info
+            
+            # Listado y descargas en pipeline sobre el pool de workers compartido
+            run = download_security_photos(
+                begin_time, end_time, empresa_filter, photos_dir,
+                fetch_page=fetch_page, first_page=first_page_result, on_progress=on_progress
+            )
+            all_photos = run.photos
+            for key in ('incluidas', 'excluidas', 'ya_existen', 'descargadas', 'errores'):
+                stats.update(key, run.stats[key])
             
             # Finalizar
             stats.finalize()
@@ -874,7 +619,7 @@ def basic_optimized_query_photos(begintime, endtime, current_page, page_records,
     Aplica filtrado PRE-API cuando es posible
     """
     params = {
-        "jsession": settings.JSESSION_GPS,
+        "jsession": current_jsession(),
         "filetype": 2,
         "alarmType": 1,
         "begintime": begintime,
@@ -895,101 +640,3 @@ def basic_optimized_query_photos(begintime, endtime, current_page, page_records,
     except Exception as e:
         logger.info(f"[❌ ERROR API] {e}")
         return None
-
-def process_photos_page_optimized(page_result, photos_dir, all_photos, stats, empresa_filter, executor):
-    """
-    Versión optimizada básica del procesamiento de páginas
-    Usa ThreadPoolExecutor y filtrado mejorado
-    """
-    prephotos = page_result.get('infos', [])
-    photos_to_download = []
-    
-    # Aplicar filtros POST-API si es necesario
-    for photo in prephotos:
-        try:
-            vehiIdno = str(photo.get('vehiIdno', ''))
-            devIdno_raw = photo.get('devIdno', '0')
-            devIdno = str(int(str(devIdno_raw).replace('C', '').replace('c', '')))
-            
-            # Si hay filtro de empresa, verificar
-            if empresa_filter:
-                fichas_validas = empresa_filter.get('vehiIdnos', [])
-                devices_validos = [str(d) for d in empresa_filter.get('devIdnos', [])]
-                
-                if not (vehiIdno in fichas_validas or devIdno in devices_validos):
-                    stats.update('excluidas', 1)
-                    continue
-            
-            photos_to_download.append(photo)
-            stats.update('incluidas', 1)
-            
-        except Exception as e:
-            stats.update('errores', 1)
-            continue
-    
-    # Descargar fotos en paralelo con el executor proporcionado
-    def download_single_photo(photo_info):
-        return download_photo_basic_optimized(photo_info, photos_dir, stats)
-    
-    # Enviar tareas al executor
-    futures = [executor.submit(download_single_photo, photo) for photo in photos_to_download]
-    
-    # Recoger resultados
-    for future in futures:
-        try:
-            result = future.result(timeout=30)  # Timeout de 30 segundos por foto
-            if result:
-                all_photos.append(result)
-        except Exception as e:
-            stats.update('errores', 1)
-            logger.info(f"[❌ DOWNLOAD ERROR] {e}")
-
-def download_photo_basic_optimized(photo_info, photos_dir, stats):
-    """
-    Versión básica optimizada de descarga individual
-    Manejo mejorado de errores y paths
-    """
-    try:
-        vehiIdno = photo_info.get('vehiIdno')
-        devIdno = photo_info.get('devIdno')
-        fileTimeStr = photo_info.get('fileTimeStr')
-        
-        # Crear directorio del vehículo
-        vehicle_folder = crear_nombre_carpeta_vehiculo(vehiIdno, devIdno)
-        vehicle_dir = os.path.join(photos_dir, vehicle_folder)
-        os.makedirs(vehicle_dir, exist_ok=True)
-        
-        # Generar nombre de archivo
-        file_name = crear_nombre_archivo_foto(vehiIdno, devIdno, fileTimeStr)
-        file_path = os.path.join(vehicle_dir, file_name)
-        
-        # Verificar si ya existe
-        if verificar_archivo_existe(file_path):
-            stats.update('ya_existen', 1)
-            photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-            return photo_info
-        
-        # Obtener URL de descarga
-        download_url = photo_info.get('downloadUrl')
-        if not download_url:
-            file_path_api = photo_info.get('FPATH')
-            if file_path_api:
-                download_url = f"{BASE_URL}/StandardApiAction_downloadFile.action?jsession={settings.JSESSION_GPS}&filePath={file_path_api}"
-            else:
-                stats.update('errores', 1)
-                return None
-        
-        # Descargar con timeout optimizado
-        if download_and_save_image(download_url, file_path):
-            stats.update('descargadas', 1)
-            photo_info['local_path'] = f"security_photos/{vehicle_folder}/{file_name}"
-            return photo_info
-        else:
-            stats.update('errores', 1)
-            return None
-            
-    except Exception as e:
-        stats.update('errores', 1)
-        logger.info(f"[❌ ERROR INDIVIDUAL] {vehiIdno}-{devIdno}: {e}")
-        return None
-
@@ -43,7 +43,7 @@ class DownloadStatistics:
         self.ya_existen += page_stats.get('ya_existen', 0)
         self.descargadas += page_stats.get('descargadas', 0)
         self.errores += page_stats.get('errores', 0)
-        self.paginas_procesadas += 1
+        self.paginas_procesadas += page_stats.get('paginas', 1)
 
         # Agregar vehículos y dispositivos únicos si están disponibles
         if 'vehiculos' in page_stats:
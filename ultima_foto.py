@@ -1,11 +1,16 @@
 import os
-import re
 from datetime import datetime
 
+from sit.photo_manifest import DEFAULT_FILENAME, TIME_FORMAT, get_photo_manifest, parse_photo_file
+
 def fecha_mas_actual_jpg(carpeta_base):
     """
-    Busca la fecha más actual en nombres de archivos JPG con formato yyyy-mm-dd_hh-mm-ss*.jpg
-    en todas las subcarpetas de la carpeta especificada.
+    Fecha de la foto más reciente descargada en la carpeta especificada.
+    
+    Se lee del manifiesto de fotos (una consulta, sin recorrer las
+    subcarpetas). Si la carpeta no tiene manifiesto o está vacío se buscan
+    los archivos yyyy-mm-dd_hh-mm-ss_dev_*.jpg sin crear ni escribir el
+    manifiesto.
     
     Args:
         carpeta_base (str): Ruta de la carpeta base donde buscar
@@ -13,26 +18,23 @@ def fecha_mas_actual_jpg(carpeta_base):
     Returns:
         datetime: Fecha más actual encontrada, o None si no hay archivos
     """
-    patron = re.compile(r'(\d{4})-(\d{2})-(\d{2})_(\d{2})-(\d{2})-(\d{2}).*\.jpg$', re.IGNORECASE)
-    fecha_maxima = None
+    if not os.path.isdir(carpeta_base):
+        return None
     
-    for ruta, dirs, archivos in os.walk(carpeta_base):
+    if os.path.isfile(os.path.join(carpeta_base, DEFAULT_FILENAME)):
+        fecha_maxima = get_photo_manifest(carpeta_base).latest()
+        if fecha_maxima is not None:
+            return fecha_maxima
+    
+    fecha_maxima = None
+    for _, _, archivos in os.walk(carpeta_base):
         for archivo in archivos:
-            match = patron.match(archivo)
-            if match:
-                try:
-                    fecha = datetime(
-                        int(match.group(1)),  # año
-                        int(match.group(2)),  # mes
-                        int(match.group(3)),  # día
-                        int(match.group(4)),  # hora
-                        int(match.group(5)),  # minuto
-                        int(match.group(6))   # segundo
-                    )
-                    if fecha_maxima is None or fecha > fecha_maxima:
-                        fecha_maxima = fecha
-                except ValueError:
-                    continue  # Ignorar fechas inválidas
+            parsed = parse_photo_file(archivo)
+            if parsed is None:
+                continue
+            fecha = datetime.strptime(parsed[1], TIME_FORMAT)
+            if fecha_maxima is None or fecha > fecha_maxima:
+                fecha_maxima = fecha
     
     return fecha_maxima
 